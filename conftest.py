@@ -7,7 +7,13 @@ import os
 import pytest
 from agent0.test_fixtures import cycle_trade_policy
 from chainsync.test_fixtures import database_engine, db_session, dummy_session, psql_docker
-from ethpy.test_fixtures import local_chain, local_hyperdrive_chain
+from ethpy.test_fixtures import (
+    local_chain,
+    local_hyperdrive_chain,
+    reverting_hyperdrive_chain,
+    session_chain,
+    session_hyperdrive_chain,
+)
 
 # Hack to allow for vscode debugger to throw exception immediately
 # instead of allowing pytest to catch the exception and report
@@ -54,5 +60,8 @@ __all__ = [
     "psql_docker",
     "local_chain",
     "local_hyperdrive_chain",
+    "session_chain",
+    "session_hyperdrive_chain",
+    "reverting_hyperdrive_chain",
     "cycle_trade_policy",
 ]
@@ -8,12 +8,10 @@ from agent0.hyperdrive.agents import HyperdriveAgent
 from eth_account.account import Account
 from ethpy import EthConfig
 from ethpy.base import (
-    eth_transfer,
-    get_account_balance,
+    fund_accounts,
     initialize_web3_with_http_provider,
+    is_anvil_chain,
     load_abi_from_file,
-    smart_contract_read,
-    smart_contract_transact,
 )
 from ethpy.hyperdrive import HyperdriveAddresses
 
@@ -53,40 +51,13 @@ def fund_agents(
         abi=base_contract_abi, address=web3.to_checksum_address(contract_addresses.base_token)
     )
 
-    for agent_account, agent_eth_budget, agent_base_budget in zip(
-        agent_accounts, account_key_config.AGENT_ETH_BUDGETS, account_key_config.AGENT_BASE_BUDGETS
-    ):
-        # fund Ethereum
-        user_eth_balance = get_account_balance(web3, user_account.checksum_address)
-        if user_eth_balance is None:
-            raise AssertionError("User has no Ethereum balance")
-        if user_eth_balance < agent_eth_budget:
-            raise AssertionError(
-                f"User account {user_account.checksum_address=} has {user_eth_balance=}, "
-                f"which must be >= {agent_eth_budget=}"
-            )
-        _ = eth_transfer(
-            web3,
-            user_account,
-            agent_account.checksum_address,
-            agent_eth_budget,
-        )
-        #  fund base
-        user_base_balance = smart_contract_read(
-            base_token_contract,
-            "balanceOf",
-            user_account.checksum_address,
-        )["value"]
-        if user_base_balance < agent_base_budget:
-            raise AssertionError(
-                f"User account {user_account.checksum_address=} has {user_base_balance=}, "
-                f"which must be >= {agent_base_budget=}"
-            )
-        _ = smart_contract_transact(
-            web3,
-            base_token_contract,
-            user_account,
-            "transfer",
-            agent_account.checksum_address,
-            agent_base_budget,
-        )
+    # Send all transfers with pipelined nonces; on anvil, the ETH balances are set directly in one batch
+    _ = fund_accounts(
+        web3,
+        user_account,
+        [agent_account.checksum_address for agent_account in agent_accounts],
+        [int(budget) for budget in account_key_config.AGENT_ETH_BUDGETS],
+        base_token_contract,
+        [int(budget) for budget in account_key_config.AGENT_BASE_BUDGETS],
+        set_anvil_eth_balances=is_anvil_chain(web3),
+    )
@@ -8,7 +8,7 @@ from agent0 import AccountKeyConfig
 from agent0.base.config import AgentConfig
 from agent0.hyperdrive.agents import HyperdriveAgent
 from eth_account.account import Account
-from ethpy.base import get_account_balance, smart_contract_read, smart_contract_transact
+from ethpy.base import get_account_balance, send_pipelined_transactions, smart_contract_read
 from fixedpointmath import FixedPoint
 from numpy.random._generator import Generator as NumpyGenerator
 from web3 import Web3
@@ -47,7 +47,7 @@ def get_agent_accounts(
         A list of Agent objects that contain a wallet address and Elfpy Agent for determining trades
     """
     # TODO: raise issue on failure by looking at `rpc_response`, `tx_receipt` returned from function
-    #   Do this for `set_anvil_account_balance`, `smart_contract_transact(mint)`, `smart_contract_transact(approve)`
+    #   Do this for `set_anvil_account_balance`, `smart_contract_transact(mint)`
     agents: list[HyperdriveAgent] = []
     num_agents_so_far: list[int] = []  # maintains the total number of agents for each agent type
     agent_base_budgets = [int(budget) for budget in account_key_config.AGENT_BASE_BUDGETS]
@@ -77,16 +77,13 @@ def get_agent_accounts(
             agent_base_funds = smart_contract_read(base_token_contract, "balanceOf", eth_agent.checksum_address)
             if agent_base_funds["value"] == 0:
                 raise AssertionError("Agent needs Base tokens to operate! Did you fund their accounts?")
-            # establish max approval for the hyperdrive contract
-            _ = smart_contract_transact(
-                web3,
-                base_token_contract,
-                eth_agent,
-                "approve",
-                hyperdrive_address,
-                eth_utils.conversions.to_int(eth_utils.currency.MAX_WEI),
-            )
             agents.append(eth_agent)
         num_agents_so_far.append(agent_info.number_of_agents)
+    # establish max approval for the hyperdrive contract, sending all approvals at once
+    approve_data = base_token_contract.encodeABI(
+        fn_name="approve", args=[hyperdrive_address, eth_utils.conversions.to_int(eth_utils.currency.MAX_WEI)]
+    )
+    approvals = [(eth_agent, {"to": base_token_contract.address, "data": approve_data}) for eth_agent in agents]
+    _ = send_pipelined_transactions(web3, approvals)  # type: ignore
     logging.info("Added %d agents", sum(num_agents_so_far))
     return agents
@@ -1,6 +1,7 @@
 """A checkpoint bot for Hyperdrive"""
 from __future__ import annotations
 
+import asyncio
 import datetime
 import logging
 import os
@@ -13,6 +14,8 @@ from elfpy.utils import logs
 from eth_account.account import Account
 from ethpy import EthConfig, build_eth_config
 from ethpy.base import (
+    BlockHeader,
+    BlockStream,
     initialize_web3_with_http_provider,
     load_all_abis,
     set_anvil_account_balance,
@@ -21,6 +24,7 @@ from ethpy.base import (
 )
 from ethpy.hyperdrive import fetch_hyperdrive_address_from_url, get_hyperdrive_config
 from fixedpointmath import FixedPoint
+from web3 import Web3
 from web3.contract.contract import Contract
 
 # The portion of the checkpoint that the bot will wait before attempting to
@@ -34,6 +38,56 @@ def does_checkpoint_exist(hyperdrive_contract: Contract, checkpoint_time: int) -
     return smart_contract_read(hyperdrive_contract, "getCheckpoint", int(checkpoint_time))["sharePrice"] > 0
 
 
+def checkpoint_if_needed(
+    web3: Web3, hyperdrive_contract: Contract, sender: EthAgent, checkpoint_duration: int, timestamp: int
+) -> int:
+    """Mints a new checkpoint if the waiting period of the current checkpoint has passed and it doesn't exist.
+
+    This bot waits for a portion of the checkpoint to reduce the probability of needing a checkpoint.
+    After the waiting period, the bot will attempt to mint a checkpoint.
+
+    Arguments
+    ---------
+    web3: Web3
+        web3 provider object
+    hyperdrive_contract: Contract
+        The deployed hyperdrive contract
+    sender: EthAgent
+        The agent that signs the checkpoint transaction
+    checkpoint_duration: int
+        The checkpoint duration from the pool config, in seconds
+    timestamp: int
+        The latest block timestamp
+
+    Returns
+    -------
+    int
+        The number of seconds elapsed in the current checkpoint
+    """
+    checkpoint_portion_elapsed = timestamp % checkpoint_duration
+    checkpoint_time = timestamp - timestamp % checkpoint_duration
+    if checkpoint_portion_elapsed >= CHECKPOINT_WAITING_PERIOD * checkpoint_duration and not does_checkpoint_exist(
+        hyperdrive_contract, checkpoint_time
+    ):
+        logging.info("Submitting a checkpoint for checkpointTime=%s...", checkpoint_time)
+        # TODO: We will run into issues with the gas price being too low
+        # with testnets and mainnet. When we get closer to production, we
+        # will need to make this more robust so that we retry this
+        # transaction if the transaction gets stuck.
+        receipt = smart_contract_transact(
+            web3,
+            hyperdrive_contract,
+            sender,
+            "checkpoint",
+            (checkpoint_time),
+        )
+        logging.info(
+            "Checkpoint successfully mined with receipt=%s",
+            receipt["transactionHash"].hex(),
+        )
+    return checkpoint_portion_elapsed
+
+
 def get_config() -> Tuple[EthConfig, EnvironmentConfig]:
     """Gets the hyperdrive configuration."""
 
@@ -88,36 +142,28 @@ def main() -> None:
     # to reduce the probability of needing to mint a checkpoint.
     config = get_hyperdrive_config(hyperdrive_contract)
     checkpoint_duration = config["checkpointDuration"]
+    if eth_config.WS_URL is not None:
+        # Check every new block as it is pushed over the websocket, instead of sleeping between polls
+        block_stream = BlockStream(web3, ws_url=eth_config.WS_URL, halt_on_errors=env_config.halt_on_errors)
+
+        async def _checkpoint_on_new_block(header: BlockHeader) -> None:
+            await asyncio.to_thread(
+                checkpoint_if_needed, web3, hyperdrive_contract, sender, checkpoint_duration, header.timestamp
+            )
+
+        block_stream.register(_checkpoint_on_new_block)
+        asyncio.run(block_stream.run())
+        return
     while True:
         # Get the latest block time and check to see if a new checkpoint should
-        # be minted. This bot waits for a portion of the checkpoint to reduce
-        # the probability of needing a checkpoint. After the waiting period,
-        # the bot will attempt to mint a checkpoint.
+        # be minted.
         latest_block = web3.eth.get_block("latest")
         timestamp = latest_block.get("timestamp", None)
         if timestamp is None:
             raise AssertionError(f"{latest_block=} has no timestamp")
-        checkpoint_portion_elapsed = timestamp % checkpoint_duration
-        checkpoint_time = timestamp - timestamp % checkpoint_duration
-        if checkpoint_portion_elapsed >= CHECKPOINT_WAITING_PERIOD * checkpoint_duration and not does_checkpoint_exist(
-            hyperdrive_contract, checkpoint_time
-        ):
-            logging.info("Submitting a checkpoint for checkpointTime=%s...", checkpoint_time)
-            # TODO: We will run into issues with the gas price being too low
-            # with testnets and mainnet. When we get closer to production, we
-            # will need to make this more robust so that we retry this
-            # transaction if the transaction gets stuck.
-            receipt = smart_contract_transact(
-                web3,
-                hyperdrive_contract,
-                sender,
-                "checkpoint",
-                (checkpoint_time),
-            )
-            logging.info(
-                "Checkpoint successfully mined with receipt=%s",
-                receipt["transactionHash"].hex(),
-            )
+        checkpoint_portion_elapsed = checkpoint_if_needed(
+            web3, hyperdrive_contract, sender, checkpoint_duration, timestamp
+        )
 
         # Sleep for enough time that the block timestamp would have advanced
         # far enough to consider minting a new checkpoint.
@@ -0,0 +1,39 @@
+"""Script to migrate the hyperdrive tables of an existing database to blockNumber range partitions."""
+from __future__ import annotations
+
+import argparse
+
+from chainsync.db.base import (
+    create_block_number_partitions,
+    get_latest_block_number_from_table,
+    initialize_session,
+    partition_table_by_block_number,
+)
+from chainsync.db.hyperdrive.schema import BLOCK_PARTITIONED_TABLES, PoolInfo
+from elfpy.utils import logs as log_utils
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="partition_db",
+        description=(
+            "Script for range partitioning the hyperdrive tables on blockNumber. "
+            "Run it again to add partitions as the chain grows; rows past the last partition go to a default one."
+        ),
+    )
+    parser.add_argument("--partition-size", help="The number of blocks in each partition.", type=int, default=100_000)
+    parser.add_argument(
+        "--lookahead",
+        help="The number of blocks past the latest block in the db to create partitions for.",
+        type=int,
+        default=500_000,
+    )
+    args = parser.parse_args()
+
+    log_utils.setup_logging(".logging/partition_db.log", log_stdout=True)
+    # Also creates any missing tables and indexes
+    session = initialize_session()
+    end_block = get_latest_block_number_from_table(PoolInfo, session) + args.lookahead
+    for table_name in BLOCK_PARTITIONED_TABLES:
+        # Converts the table the first time, then only adds partitions
+        partition_table_by_block_number(session, table_name, args.partition_size, end_block)
+        create_block_number_partitions(session, table_name, args.partition_size, end_block)
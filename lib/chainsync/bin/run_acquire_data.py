@@ -1,9 +1,34 @@
 """Script to format on-chain hyperdrive pool, config, and transaction data post-processing."""
 from __future__ import annotations
 
-from chainsync.exec import acquire_data
+import argparse
+
+from chainsync.exec import acquire_data, acquire_data_pipelined
 from elfpy.utils import logs as log_utils
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="run_acquire_data",
+        description="Script for writing hyperdrive chain data to postgres.",
+    )
+    parser.add_argument(
+        "--pipelined",
+        help="Fetch, decode, convert and write consecutive blocks concurrently.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--wallet-verification-rate",
+        help=(
+            "Track wallet balances from the wallet deltas, verifying this fraction of the updated balances on chain, "
+            "instead of querying every balance of every wallet that transacted."
+        ),
+        type=float,
+        default=None,
+    )
+    args = parser.parse_args()
+
     log_utils.setup_logging(".logging/acquire_data.log", log_stdout=True)
-    acquire_data()
+    if args.pipelined:
+        acquire_data_pipelined(wallet_verification_rate=args.wallet_verification_rate)
+    else:
+        acquire_data(wallet_verification_rate=args.wallet_verification_rate)
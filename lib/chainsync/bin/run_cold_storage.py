@@ -0,0 +1,39 @@
+"""Script to roll closed block ranges of the historical hyperdrive tables out of postgres into parquet files."""
+from __future__ import annotations
+
+import argparse
+
+from chainsync.db.base import get_cold_storage_dir, initialize_session, roll_out_to_cold_storage
+from chainsync.db.hyperdrive.schema import COLD_STORAGE_TABLES
+from elfpy.utils import logs as log_utils
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="run_cold_storage",
+        description=(
+            "Script for exporting closed block ranges to parquet files. "
+            "Set CHAINSYNC_COLD_STORAGE_DIR to the same directory for the get_* functions to read them back."
+        ),
+    )
+    parser.add_argument("--root-dir", help="The cold storage directory.", type=str, default=get_cold_storage_dir())
+    parser.add_argument("--range-size", help="The number of blocks in each parquet file.", type=int, default=10_000)
+    parser.add_argument(
+        "--keep-blocks", help="The number of recent blocks to keep in postgres.", type=int, default=50_000
+    )
+    parser.add_argument(
+        "--keep-rows", help="Keep the exported rows in postgres instead of deleting them.", action="store_true"
+    )
+    args = parser.parse_args()
+    if args.root_dir is None:
+        parser.error("--root-dir or CHAINSYNC_COLD_STORAGE_DIR must be set")
+
+    log_utils.setup_logging(".logging/cold_storage.log", log_stdout=True)
+    session = initialize_session()
+    roll_out_to_cold_storage(
+        session,
+        COLD_STORAGE_TABLES,
+        args.root_dir,
+        range_size=args.range_size,
+        keep_blocks=args.keep_blocks,
+        delete_rows=not args.keep_rows,
+    )
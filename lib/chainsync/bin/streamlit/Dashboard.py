@@ -5,49 +5,55 @@
 
 from __future__ import annotations
 
-import time
+from functools import partial
 
 import mplfinance as mpf
 import streamlit as st
 from chainsync.dashboard import (
-    build_fixed_rate,
-    build_leaderboard,
-    build_ohlcv,
-    build_outstanding_positions,
-    build_ticker,
-    get_user_lookup,
+    DashboardCache,
+    Leaderboard,
+    PoolRollupWindow,
+    UserLookupCache,
+    build_dashboard_frames,
     plot_fixed_rate,
     plot_ohlcv,
     plot_outstanding_positions,
 )
-from chainsync.db.base import get_user_map, initialize_session
-from chainsync.db.hyperdrive import (
-    get_all_traders,
-    get_pool_analysis,
-    get_pool_config,
-    get_pool_info,
-    get_ticker,
-    get_wallet_pnl,
-)
-from ethpy import build_eth_config
+from chainsync.db.base import USER_MAP_CHANNEL, NotificationListener, initialize_session
 
 # pylint: disable=invalid-name
 
 st.set_page_config(page_title="Trading Competition Dashboard", layout="wide")
 st.set_option("deprecation.showPyplotGlobalUse", False)
 
-# Load and connect to postgres
-session = initialize_session()
-
-# TODO remove this connection and add in process to periodically calculate closing pnl
-eth_config = build_eth_config()
+max_live_blocks = 14400
 
-# pool config data is static, so just read once
-config_data = get_pool_config(session, coerce_float=False)
 
-config_data = config_data.iloc[0]
+@st.cache_resource
+def get_dashboard_cache() -> DashboardCache:
+    """Start the cache of the dashboard data, once per server process, shared by every session."""
+    # The plots are built from 5 minute candles, rolled up by the analysis as blocks arrive,
+    # so each refresh only reads the candles that changed; 576 candles are 48 hours, about max_live_blocks blocks
+    pool_rollup_window = PoolRollupWindow(resolution=300, num_buckets=576)
+    # Load and connect to postgres, with a session owned by the cache thread
+    session = initialize_session()
+    # Usernames are cached, and read again when addresses are registered
+    leaderboard = Leaderboard(UserLookupCache(NotificationListener(session.get_bind(), USER_MAP_CHANNEL)))
+    cache = DashboardCache(
+        session,
+        partial(
+            build_dashboard_frames,
+            leaderboard=leaderboard,
+            pool_rollup_window=pool_rollup_window,
+            max_live_blocks=max_live_blocks,
+        ),
+    )
+    cache.start()
+    return cache
+
+
+dashboard_cache = get_dashboard_cache()
 
-max_live_blocks = 14400
 # Live ticker
 ticker_placeholder = st.empty()
 # OHLCV
@@ -56,37 +62,21 @@ main_placeholder = st.empty()
 main_fig = mpf.figure(style="mike", figsize=(15, 15))
 (ax_ohlcv, ax_fixed_rate, ax_positions) = main_fig.subplots(3, 1, sharex=True)
 
+shown_block_number = None
 while True:
-    # Wallet addr to username mapping
-    agents = get_all_traders(session)
-    user_map = get_user_map(session)
-    user_lookup = get_user_lookup(agents, user_map)
-
-    pool_info = get_pool_info(session, start_block=-max_live_blocks, coerce_float=False)
-    pool_analysis = get_pool_analysis(session, start_block=-max_live_blocks, coerce_float=False)
-    ticker = get_ticker(session, start_block=-max_live_blocks, coerce_float=False)
-    # Adds user lookup to the ticker
-    display_ticker = build_ticker(ticker, user_lookup)
-
-    # get wallet pnl and calculate leaderboard
-    # Get the latest updated block
-    latest_wallet_pnl = get_wallet_pnl(session, start_block=-1, coerce_float=False)
-    comb_rank, ind_rank = build_leaderboard(latest_wallet_pnl, user_lookup)
-
-    # build ohlcv and volume
-    ohlcv = build_ohlcv(pool_analysis, freq="5T")
-    # build fixed rate
-    fixed_rate = build_fixed_rate(pool_analysis)
-    # build outstanding positions plots
-    outstanding_positions = build_outstanding_positions(pool_info)
+    # Sessions only redraw when the shared cache has data for a new block
+    frames = dashboard_cache.wait_for_update(shown_block_number, timeout=10)
+    if frames is None or frames.block_number == shown_block_number:
+        continue
+    shown_block_number = frames.block_number
 
     with ticker_placeholder.container():
         st.header("Ticker")
-        st.dataframe(display_ticker, height=200, use_container_width=True)
+        st.dataframe(frames.ticker, height=200, use_container_width=True)
         st.header("Total Leaderboard")
-        st.dataframe(comb_rank, height=500, use_container_width=True)
+        st.dataframe(frames.comb_rank, height=500, use_container_width=True)
         st.header("Wallet Leaderboard")
-        st.dataframe(ind_rank, height=500, use_container_width=True)
+        st.dataframe(frames.ind_rank, height=500, use_container_width=True)
 
     with main_placeholder.container():
         # Clears all axes
@@ -94,9 +84,9 @@ while True:
         ax_fixed_rate.clear()
         ax_positions.clear()
 
-        plot_ohlcv(ohlcv, ax_ohlcv)
-        plot_fixed_rate(fixed_rate, ax_fixed_rate)
-        plot_outstanding_positions(outstanding_positions, ax_positions)
+        plot_ohlcv(frames.ohlcv, ax_ohlcv)
+        plot_fixed_rate(frames.fixed_rate, ax_fixed_rate)
+        plot_outstanding_positions(frames.outstanding_positions, ax_positions)
 
         ax_ohlcv.tick_params(axis="both", which="both")
         ax_fixed_rate.tick_params(axis="both", which="both")
@@ -104,5 +94,3 @@ while True:
         main_fig.autofmt_xdate()
         # streamlit doesn't play nice with types
         st.pyplot(fig=main_fig)  # type: ignore
-
-    time.sleep(1)
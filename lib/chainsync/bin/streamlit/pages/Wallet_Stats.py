@@ -53,7 +53,10 @@ ticker = get_ticker(session, coerce_float=False, wallet_address=selected_address
 display_ticker = build_ticker(ticker, user_lookup)
 
 # Get latest wallet pnl and show open positions
-latest_wallet_pnl = wallet_pnl[wallet_pnl["blockNumber"] == wallet_pnl["blockNumber"].max()].copy()
+# Wallets are snapshotted at different blocks in between full snapshots, so take the latest snapshot of each wallet
+latest_wallet_pnl = wallet_pnl[
+    wallet_pnl["blockNumber"] == wallet_pnl.groupby("walletAddress")["blockNumber"].transform("max")
+].copy()
 # Get usernames
 latest_wallet_pnl["username"] = (
     user_lookup.set_index("address").loc[latest_wallet_pnl["walletAddress"]]["username"].values
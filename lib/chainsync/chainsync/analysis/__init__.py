@@ -1,6 +1,6 @@
 """Analysis for trading."""
 from .calc_fixed_rate import calc_fixed_rate
-from .calc_pnl import calc_closeout_pnl, calc_single_closeout
+from .calc_pnl import calc_closeout_pnl, calc_closeout_pnl_local, calc_single_closeout, verify_closeout_pnl
 from .calc_spot_price import calc_spot_price, calculate_spot_price_for_position
 from .calc_ticker import calc_ticker
-from .data_to_analysis import data_to_analysis
+from .data_to_analysis import data_to_analysis, snapshot_wallet_pnl
@@ -1,11 +1,13 @@
 """Calculates the amount of base set aside that can't be withdrawn"""
+from __future__ import annotations
+
 from decimal import Decimal
 
 import pandas as pd
 
 
 def calc_base_buffer(
-    longs_outstanding: pd.Series, share_price: pd.Series, minimum_share_reserves: Decimal
+    longs_outstanding: pd.Series, share_price: pd.Series, minimum_share_reserves: Decimal | float
 ) -> pd.Series:
     """Calculates the amount of base set aside that can't be withdrawn
 
@@ -15,8 +17,8 @@ def calc_base_buffer(
         The number of longs outstanding from the pool info
     share_price: pd.Series
         The share price from the pool info
-    minimum_share_reserves: Decimal
-        The minimum share reserves from the pool config
+    minimum_share_reserves: Decimal | float
+        The minimum share reserves from the pool config; a float with float series for a vectorized result
 
     """
     # Pandas is smart enough to be able to broadcast with internal Decimal types at runtime
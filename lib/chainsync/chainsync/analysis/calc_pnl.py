@@ -1,29 +1,30 @@
 """Calculates the pnl."""
 from __future__ import annotations
 
+import calendar
 import logging
+import time
 from decimal import Decimal
 
+import numpy as np
 import pandas as pd
 from eth_typing import ChecksumAddress, HexAddress, HexStr
-from ethpy.base import smart_contract_preview_transaction
+from ethpy.base import (
+    PreviewTransaction,
+    smart_contract_preview_transaction,
+    smart_contract_preview_transactions,
+)
 from fixedpointmath import FixedPoint
 from web3.contract.contract import Contract
 
 
-def calc_single_closeout(
-    position: pd.Series, contract: Contract, pool_info: pd.DataFrame, min_output: int, as_underlying: bool
-) -> Decimal:
-    """Calculate the closeout pnl for a single position.
+def _build_closeout_preview(position: pd.Series, min_output: int, as_underlying: bool) -> PreviewTransaction | Decimal:
+    """Build the transaction that would close out a single position.
 
     Arguments
     ---------
-    position: pd.DataFrame
-        The position to calculate the closeout pnl for (one row in current_wallet)
-    contract: Contract
-        The contract object
-    pool_info: pd.DataFrame
-        The pool info
+    position: pd.Series
+        The position to close out (one row in current_wallet)
     min_output: int
         The minimum output to be accepted, as part of slippage tolerance
     as_underlying: bool
@@ -31,8 +32,8 @@ def calc_single_closeout(
 
     Returns
     -------
-    Decimal
-        The closeout pnl
+    PreviewTransaction | Decimal
+        The closeout transaction to preview, or the pnl itself if it does not require a contract call
     """
     # pnl is itself
     if position["baseTokenType"] == "BASE":
@@ -45,7 +46,6 @@ def calc_single_closeout(
     address = position["walletAddress"]
     tokentype = position["baseTokenType"]
     sender = ChecksumAddress(HexAddress(HexStr(address)))
-    preview_result = None
     maturity = 0
     if tokentype in ["LONG", "SHORT"]:
         maturity = position["maturityTime"]
@@ -54,64 +54,90 @@ def calc_single_closeout(
         assert isinstance(maturity, int)
     assert isinstance(tokentype, str)
 
-    out_pnl = Decimal("nan")
-
     if tokentype == "LONG":
+        function_name = "closeLong"
         fn_args = (maturity, amount, min_output, address, as_underlying)
-        try:
-            preview_result = smart_contract_preview_transaction(
-                contract, sender, "closeLong", *fn_args, block_identifier=position["blockNumber"]
-            )
-            out_pnl = Decimal(preview_result["value"]) / Decimal(1e18)
-        except Exception as exception:  # pylint: disable=broad-except
-            logging.warning("Exception caught, ignoring: %s", exception)
-
     elif tokentype == "SHORT":
+        function_name = "closeShort"
         fn_args = (maturity, amount, min_output, address, as_underlying)
-        try:
-            preview_result = smart_contract_preview_transaction(
-                contract, sender, "closeShort", *fn_args, block_identifier=position["blockNumber"]
-            )
-            out_pnl = preview_result["value"] / Decimal(1e18)
-        except Exception as exception:  # pylint: disable=broad-except
-            logging.warning("Exception caught, ignoring: %s", exception)
-
     elif tokentype == "LP":
+        function_name = "removeLiquidity"
         fn_args = (amount, min_output, address, as_underlying)
-        # If this fails, keep as nan and continue iterating
-        try:
-            preview_result = smart_contract_preview_transaction(
-                contract, sender, "removeLiquidity", *fn_args, block_identifier=position["blockNumber"]
-            )
-            out_pnl = Decimal(
-                preview_result["baseProceeds"]
-                + preview_result["withdrawalShares"]
-                * pool_info["sharePrice"].values[-1]
-                * pool_info["lpSharePrice"].values[-1]
-            ) / Decimal(1e18)
-        except Exception as exception:  # pylint: disable=broad-except
-            logging.warning("Exception caught, ignoring: %s", exception)
-
     elif tokentype == "WITHDRAWAL_SHARE":
+        function_name = "redeemWithdrawalShares"
         fn_args = (amount, min_output, address, as_underlying)
-        try:
-            preview_result = smart_contract_preview_transaction(
-                contract, sender, "redeemWithdrawalShares", *fn_args, block_identifier=position["blockNumber"]
-            )
-            out_pnl = preview_result["proceeds"] / Decimal(1e18)
-        except Exception as exception:  # pylint: disable=broad-except
-            logging.warning("Exception caught, ignoring: %s", exception)
     else:
         # Should never get here
         raise ValueError(f"Unexpected token type: {tokentype}")
+    return PreviewTransaction(sender, function_name, fn_args, block_identifier=int(position["blockNumber"]))
+
+
+def _preview_result_to_pnl(function_name: str, preview_result: dict, pool_info: pd.DataFrame) -> Decimal:
+    """Convert the return values of a closeout preview to pnl."""
+    if function_name in ["closeLong", "closeShort"]:
+        return Decimal(preview_result["value"]) / Decimal(1e18)
+    if function_name == "removeLiquidity":
+        return Decimal(
+            preview_result["baseProceeds"]
+            + preview_result["withdrawalShares"]
+            * pool_info["sharePrice"].values[-1]
+            * pool_info["lpSharePrice"].values[-1]
+        ) / Decimal(1e18)
+    if function_name == "redeemWithdrawalShares":
+        return Decimal(preview_result["proceeds"]) / Decimal(1e18)
+    # Should never get here
+    raise ValueError(f"Unexpected closeout function: {function_name}")
+
+
+def calc_single_closeout(
+    position: pd.Series, contract: Contract, pool_info: pd.DataFrame, min_output: int, as_underlying: bool
+) -> Decimal:
+    """Calculate the closeout pnl for a single position.
+
+    Arguments
+    ---------
+    position: pd.DataFrame
+        The position to calculate the closeout pnl for (one row in current_wallet)
+    contract: Contract
+        The contract object
+    pool_info: pd.DataFrame
+        The pool info
+    min_output: int
+        The minimum output to be accepted, as part of slippage tolerance
+    as_underlying: bool
+        Whether or not to use the underlying token
+
+    Returns
+    -------
+    Decimal
+        The closeout pnl
+    """
+    preview = _build_closeout_preview(position, min_output, as_underlying)
+    if isinstance(preview, Decimal):
+        return preview
+    out_pnl = Decimal("nan")
+    # If this fails, keep as nan and continue iterating
+    try:
+        preview_result = smart_contract_preview_transaction(
+            contract,
+            preview.signer_address,
+            preview.function_name_or_signature,
+            *preview.fn_args,
+            block_identifier=preview.block_identifier,
+        )
+        out_pnl = _preview_result_to_pnl(preview.function_name_or_signature, preview_result, pool_info)
+    except Exception as exception:  # pylint: disable=broad-except
+        logging.warning("Exception caught, ignoring: %s", exception)
     return out_pnl
 
 
 def calc_closeout_pnl(
     current_wallet: pd.DataFrame, pool_info: pd.DataFrame, hyperdrive_contract: Contract
-) -> pd.DataFrame:
+) -> pd.Series:
     """Calculate closeout value of agent positions.
 
+    All closeout previews are sent to the chain in a single batched request.
+
     Arguments
     ---------
     current_wallet: pd.DataFrame
@@ -123,18 +149,248 @@ def calc_closeout_pnl(
 
     Returns
     -------
-    Decimal
-        The closeout pnl
+    pd.Series
+        The closeout pnl of each position, indexed like `current_wallet`
     """
+    out_pnl = pd.Series(Decimal("nan"), index=current_wallet.index, dtype=object)
+    previews: list[PreviewTransaction] = []
+    preview_index = []
+    for index, position in current_wallet.iterrows():
+        preview = _build_closeout_preview(position, min_output=0, as_underlying=True)
+        if isinstance(preview, Decimal):
+            out_pnl[index] = preview
+        else:
+            previews.append(preview)
+            preview_index.append(index)
+    if len(previews) == 0:
+        return out_pnl
+    preview_results = smart_contract_preview_transactions(hyperdrive_contract, previews)
+    for index, preview, preview_result in zip(preview_index, previews, preview_results):
+        # If this fails, keep as nan and continue iterating
+        if not preview_result.success:
+            logging.warning("Closeout preview failed, ignoring: %s", preview_result.revert_reason)
+            continue
+        out_pnl[index] = _preview_result_to_pnl(preview.function_name_or_signature, preview_result.values, pool_info)
+    return out_pnl
 
-    # Define a function to handle the calculation for each group
-    out_pnl = current_wallet.apply(
-        calc_single_closeout,  # type: ignore
-        contract=hyperdrive_contract,
-        pool_info=pool_info,
-        min_output=0,
-        as_underlying=True,
-        axis=1,
+
+def _pool_state_to_float(pool_state: pd.Series, pool_config: pd.Series) -> dict[str, float]:
+    """Pull the parameters of the closeout math out of a pool info row and the pool config, as floats."""
+    return {
+        "share_reserves": float(pool_state["shareReserves"]),
+        "bond_reserves": float(pool_state["bondReserves"]),
+        "share_price": float(pool_state["sharePrice"]),
+        "lp_share_price": float(pool_state["lpSharePrice"]),
+        "initial_share_price": float(pool_config["initialSharePrice"]),
+        # The contract's time stretch is stored as `invTimeStretch`, see `ethpy.hyperdrive.get_hyperdrive_config`
+        "time_stretch": float(pool_config["invTimeStretch"]),
+        "position_duration": float(pool_config["positionDuration"]),
+        "curve_fee": float(pool_config["curveFee"]),
+        "flat_fee": float(pool_config["flatFee"]),
+    }
+
+
+def _calc_shares_out_given_bonds_in(bonds_in: np.ndarray, pool: dict[str, float]) -> np.ndarray:
+    r"""The shares received from selling bonds on the YieldSpace curve, without fees.
+
+    Solves :math:`k = \frac{c}{\mu} (\mu z)^{1 - t} + y^{1 - t}` for the shares out, written with `log1p`/`expm1`
+    so that small trades against large reserves do not lose their precision to cancellation.
+    """
+    exponent = 1 - pool["time_stretch"]
+    z = pool["share_reserves"]
+    y = pool["bond_reserves"]
+    c_over_mu = pool["share_price"] / pool["initial_share_price"]
+    # y^(1 - t) / ((c / mu) * (mu * z)^(1 - t))
+    reserve_ratio = np.exp(
+        exponent * np.log(y) - np.log(c_over_mu) - exponent * np.log(pool["initial_share_price"] * z)
+    )
+    curve_ratio = -reserve_ratio * np.expm1(exponent * np.log1p(bonds_in / y))
+    return -z * np.expm1(np.log1p(curve_ratio) / exponent)
+
+
+def _calc_shares_in_given_bonds_out(bonds_out: np.ndarray, pool: dict[str, float]) -> np.ndarray:
+    """The shares paid to buy bonds on the YieldSpace curve, without fees."""
+    exponent = 1 - pool["time_stretch"]
+    z = pool["share_reserves"]
+    y = pool["bond_reserves"]
+    c_over_mu = pool["share_price"] / pool["initial_share_price"]
+    reserve_ratio = np.exp(
+        exponent * np.log(y) - np.log(c_over_mu) - exponent * np.log(pool["initial_share_price"] * z)
+    )
+    curve_ratio = -reserve_ratio * np.expm1(exponent * np.log1p(-bonds_out / y))
+    return z * np.expm1(np.log1p(curve_ratio) / exponent)
+
+
+def _lookup_open_share_prices(
+    maturity_times: np.ndarray, position_duration: float, checkpoint_info: pd.DataFrame | None, default: float
+) -> np.ndarray:
+    """Find the share price of the checkpoint each short was opened in.
+
+    The opening checkpoint starts one position duration before maturity; its share price is the one recorded by the
+    first checkpoint row at or after that time. Positions without a recorded checkpoint fall back to `default`.
+    """
+    open_share_prices = np.full(len(maturity_times), default)
+    if checkpoint_info is None or len(checkpoint_info) == 0 or len(maturity_times) == 0:
+        return open_share_prices
+    # checkpoint_info timestamps are naive local time
+    checkpoint_epochs = checkpoint_info["timestamp"].map(lambda timestamp: time.mktime(timestamp.timetuple()))
+    checkpoint_times = checkpoint_epochs.to_numpy(dtype=float)
+    checkpoint_share_prices = checkpoint_info["sharePrice"].to_numpy(dtype=float)
+    order = np.argsort(checkpoint_times)
+    checkpoint_times = checkpoint_times[order]
+    checkpoint_share_prices = checkpoint_share_prices[order]
+    lookup = np.searchsorted(checkpoint_times, maturity_times - position_duration, side="left")
+    found = lookup < len(checkpoint_times)
+    open_share_prices[found] = checkpoint_share_prices[lookup[found]]
+    return np.where(np.isnan(open_share_prices), default, open_share_prices)
+
+
+def calc_closeout_pnl_local(
+    current_wallet: pd.DataFrame,
+    pool_info: pd.DataFrame,
+    pool_config: pd.Series,
+    checkpoint_info: pd.DataFrame | None = None,
+) -> pd.Series:
+    """Calculate the closeout value of agent positions locally, without calling the chain.
+
+    Every position is valued at once against the latest row of `pool_info`, mirroring the contract math:
+
+    - LONG: bonds sold back to the pool; the unmatured part trades on the YieldSpace curve and the matured part
+      redeems 1:1, less the curve fee on the curve part and the flat fee on the matured part.
+    - SHORT: the bond face value grown by the interest since the opening checkpoint, less the cost of buying the
+      bonds back from the pool, fees included.
+    - LP and WITHDRAWAL_SHARE: the shares priced at the LP share price.
+
+    The result is computed in float64, so it differs from the contract's fixed point results in the last digits.
+    Use `verify_closeout_pnl` to check a sample of the positions against the chain.
+
+    Arguments
+    ---------
+    current_wallet: pd.DataFrame
+        A dataframe resulting from `get_current_wallet` that describes the current wallet position
+    pool_info: pd.DataFrame
+        The pool info, with the block to value the positions at as the last row
+    pool_config: pd.Series
+        The pool config
+    checkpoint_info: pd.DataFrame | None, optional
+        The checkpoint info from `get_checkpoint_info`, used to find the share price that shorts were opened at.
+        If not set, shorts are valued as if no interest accrued since they were opened.
+
+    Returns
+    -------
+    pd.Series
+        The closeout pnl of each position, indexed like `current_wallet`
+    """
+    # pylint: disable=too-many-locals
+    out_pnl = pd.Series(np.nan, index=current_wallet.index, dtype=float)
+    if len(current_wallet) == 0:
+        return out_pnl
+    pool_state = pool_info.iloc[-1]
+    pool = _pool_state_to_float(pool_state, pool_config)
+    share_price = pool["share_price"]
+
+    token_types = current_wallet["baseTokenType"].to_numpy()
+    values = current_wallet["value"].astype(float).to_numpy()
+    maturity_times = current_wallet["maturityTime"].astype(float).to_numpy()
+    # pool_info timestamps are naive UTC
+    block_time = calendar.timegm(pool_state["timestamp"].utctimetuple())
+    normalized_time_remaining = np.clip((maturity_times - block_time) / pool["position_duration"], 0, 1)
+    spot_price = (pool["initial_share_price"] * pool["share_reserves"] / pool["bond_reserves"]) ** pool["time_stretch"]
+
+    is_base = token_types == "BASE"
+    out_pnl[is_base] = values[is_base]
+
+    # Fees are the same for both sides of a close, in base
+    is_long = token_types == "LONG"
+    is_short = token_types == "SHORT"
+    is_trade = (is_long | is_short) & (values != 0)
+    curve_bonds = values[is_trade] * normalized_time_remaining[is_trade]
+    flat_bonds = values[is_trade] - curve_bonds
+    fees = (1 - spot_price) * pool["curve_fee"] * curve_bonds + pool["flat_fee"] * flat_bonds
+    trade_pnl = np.zeros(len(curve_bonds))
+
+    trade_is_long = is_long[is_trade]
+    trade_pnl[trade_is_long] = (
+        share_price * _calc_shares_out_given_bonds_in(curve_bonds[trade_is_long], pool)
+        + flat_bonds[trade_is_long]
+        - fees[trade_is_long]
     )
 
+    trade_is_short = is_short[is_trade]
+    open_share_prices = _lookup_open_share_prices(
+        maturity_times[is_trade][trade_is_short], pool["position_duration"], checkpoint_info, share_price
+    )
+    cost_to_close = (
+        share_price * _calc_shares_in_given_bonds_out(curve_bonds[trade_is_short], pool)
+        + flat_bonds[trade_is_short]
+        + fees[trade_is_short]
+    )
+    trade_pnl[trade_is_short] = values[is_trade][trade_is_short] * share_price / open_share_prices - cost_to_close
+    out_pnl[is_trade] = trade_pnl
+
+    is_lp_share = np.isin(token_types, ["LP", "WITHDRAWAL_SHARE"])
+    out_pnl[is_lp_share] = values[is_lp_share] * pool["lp_share_price"] * share_price
+
+    out_pnl[(is_long | is_short) & (values == 0)] = 0
     return out_pnl
+
+
+def verify_closeout_pnl(
+    current_wallet: pd.DataFrame,
+    local_pnl: pd.Series,
+    pool_info: pd.DataFrame,
+    hyperdrive_contract: Contract,
+    sample_rate: float,
+    rtol: float = 1e-3,
+    seed: int | np.random.Generator | None = None,
+) -> pd.Series:
+    """Check a random sample of the locally calculated closeout pnl against closeout previews on the chain.
+
+    Mismatches are logged as warnings, and do not change the local values.
+
+    Arguments
+    ---------
+    current_wallet: pd.DataFrame
+        The positions that `local_pnl` was calculated for
+    local_pnl: pd.Series
+        The result of `calc_closeout_pnl_local`
+    pool_info: pd.DataFrame
+        The pool info that `local_pnl` was calculated with
+    hyperdrive_contract: Contract
+        The hyperdrive contract object
+    sample_rate: float
+        The fraction of positions to preview on the chain, between 0 and 1
+    rtol: float, optional
+        The relative difference between the local and the previewed pnl that is logged as a mismatch
+    seed: int | np.random.Generator | None, optional
+        The seed of the random sample
+
+    Returns
+    -------
+    pd.Series
+        The relative difference of each sampled position, indexed like `current_wallet`
+    """
+    # pylint: disable=too-many-arguments
+    if not 0 <= sample_rate <= 1:
+        raise ValueError(f"{sample_rate=} must be between 0 and 1")
+    rng = np.random.default_rng(seed)
+    sample = current_wallet[
+        (current_wallet["baseTokenType"] != "BASE") & (rng.random(len(current_wallet)) < sample_rate)
+    ].copy()
+    if len(sample) == 0:
+        return pd.Series(dtype=float)
+    # The local pnl is as of the last pool info block, rather than the block each position last changed in
+    sample["blockNumber"] = pool_info["blockNumber"].iloc[-1]
+    chain_pnl = calc_closeout_pnl(sample, pool_info, hyperdrive_contract).astype(float)
+    sample_pnl = local_pnl[sample.index].astype(float)
+    relative_difference = (sample_pnl - chain_pnl).abs() / chain_pnl.abs().clip(lower=np.finfo(float).eps)
+    mismatches = relative_difference[(relative_difference > rtol) | relative_difference.isna()]
+    for index in mismatches.index:
+        logging.warning(
+            "Local closeout pnl of %s %s is %s, but the chain preview is %s",
+            sample.loc[index, "walletAddress"],
+            sample.loc[index, "tokenType"],
+            sample_pnl[index],
+            chain_pnl[index],
+        )
+    return relative_difference
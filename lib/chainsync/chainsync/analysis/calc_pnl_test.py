@@ -0,0 +1,138 @@
+"""Tests for calc_pnl.py"""
+import time
+from datetime import datetime
+from decimal import Decimal, getcontext
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from .calc_pnl import calc_closeout_pnl_local
+
+POOL_CONFIG = pd.Series(
+    {
+        "initialSharePrice": Decimal("1"),
+        "invTimeStretch": Decimal("0.045"),
+        "positionDuration": 365 * 24 * 60 * 60,
+        "curveFee": Decimal("0.1"),
+        "flatFee": Decimal("0.0005"),
+    }
+)
+# Pool info timestamps are naive UTC
+BLOCK_TIMESTAMP = 1_700_000_000
+BLOCK_TIME = datetime.utcfromtimestamp(BLOCK_TIMESTAMP)
+POOL_INFO = pd.DataFrame(
+    {
+        "blockNumber": [10],
+        "timestamp": [BLOCK_TIME],
+        "shareReserves": [Decimal("1000000")],
+        "bondReserves": [Decimal("2500000")],
+        "sharePrice": [Decimal("1.05")],
+        "lpSharePrice": [Decimal("0.98")],
+    }
+)
+
+
+def _yieldspace_shares_out(bonds_in: Decimal) -> Decimal:
+    """Shares out given bonds in, straight from the invariant, at high precision."""
+    getcontext().prec = 60
+    exponent = 1 - POOL_CONFIG["invTimeStretch"]
+    z, y = POOL_INFO["shareReserves"][0], POOL_INFO["bondReserves"][0]
+    c_over_mu = POOL_INFO["sharePrice"][0] / POOL_CONFIG["initialSharePrice"]
+    k = c_over_mu * (POOL_CONFIG["initialSharePrice"] * z) ** exponent + y**exponent
+    return z - ((k - (y + bonds_in) ** exponent) / c_over_mu) ** (1 / exponent) / POOL_CONFIG["initialSharePrice"]
+
+
+def _position(base_token_type, value, maturity_time=None):
+    return {
+        "walletAddress": "0x1",
+        "baseTokenType": base_token_type,
+        "tokenType": base_token_type,
+        "value": Decimal(value),
+        "maturityTime": None if maturity_time is None else Decimal(maturity_time),
+        "blockNumber": 5,
+    }
+
+
+def test_calc_closeout_pnl_local():
+    """Closeout values of each token type match the contract formulas."""
+    now = BLOCK_TIMESTAMP
+    half_term_maturity = now + POOL_CONFIG["positionDuration"] // 2
+    current_wallet = pd.DataFrame(
+        [
+            _position("BASE", "7"),
+            _position("LONG", "100", half_term_maturity),
+            _position("LONG", "100", now - 1),
+            _position("SHORT", "0", half_term_maturity),
+            _position("LP", "10"),
+            _position("WITHDRAWAL_SHARE", "2"),
+            _position("SHORT", "100", half_term_maturity),
+        ]
+    )
+    pnl = calc_closeout_pnl_local(current_wallet, POOL_INFO, POOL_CONFIG)
+    assert pnl.index.equals(current_wallet.index)
+    assert pnl[0] == 7
+
+    # Half the long trades on the curve, the other half redeems 1:1
+    spot_price = (Decimal("1000000") / Decimal("2500000")) ** POOL_CONFIG["invTimeStretch"]
+    expected_long = (
+        Decimal("1.05") * _yieldspace_shares_out(Decimal(50))
+        + 50
+        - (1 - spot_price) * POOL_CONFIG["curveFee"] * 50
+        - POOL_CONFIG["flatFee"] * 50
+    )
+    assert pnl[1] == pytest.approx(float(expected_long), rel=1e-12)
+    # Matured longs only pay the flat fee
+    assert pnl[2] == pytest.approx(100 * (1 - 0.0005), rel=1e-12)
+    assert pnl[3] == 0
+    assert pnl[4] == pytest.approx(10 * 0.98 * 1.05, rel=1e-12)
+    assert pnl[5] == pytest.approx(2 * 0.98 * 1.05, rel=1e-12)
+    # Without interest, the short is worth less than the trader's margin, and less than the long is worth
+    assert 0 < pnl[6] < 100 - pnl[1]
+
+
+def test_short_interest_and_precision():
+    """Shorts earn the interest since their opening checkpoint, and tiny positions keep their precision."""
+    now = BLOCK_TIMESTAMP
+    maturity_time = now + POOL_CONFIG["positionDuration"] // 2
+    current_wallet = pd.DataFrame([_position("SHORT", "100", maturity_time), _position("LONG", "1e-12", now + 1)])
+    checkpoint_info = pd.DataFrame(
+        {
+            "timestamp": [datetime.fromtimestamp(maturity_time - POOL_CONFIG["positionDuration"] + 12)],
+            "sharePrice": [Decimal("1")],
+        }
+    )
+    without_interest = calc_closeout_pnl_local(current_wallet, POOL_INFO, POOL_CONFIG)
+    with_interest = calc_closeout_pnl_local(current_wallet, POOL_INFO, POOL_CONFIG, checkpoint_info)
+    assert with_interest[0] - without_interest[0] == pytest.approx(100 * (1.05 - 1), rel=1e-12)
+    # A nearly mature dust long is worth about its face value
+    assert with_interest[1] == pytest.approx(1e-12, rel=1e-6)
+    assert not np.isnan(with_interest).any()
+
+
+def test_local_timezone(monkeypatch):
+    """Closeout values don't depend on the local timezone of the host."""
+    maturity_time = BLOCK_TIMESTAMP + 60 * 60
+    current_wallet = pd.DataFrame([_position("LONG", "100", maturity_time), _position("SHORT", "100", maturity_time)])
+    pnls = []
+    try:
+        for timezone in ["UTC", "Asia/Tokyo"]:
+            monkeypatch.setenv("TZ", timezone)
+            time.tzset()
+            # Checkpoint timestamps are naive local time
+            checkpoint_info = pd.DataFrame(
+                {
+                    "timestamp": [datetime.fromtimestamp(maturity_time - POOL_CONFIG["positionDuration"] + 12)],
+                    "sharePrice": [Decimal("1")],
+                }
+            )
+            # Timestamps can be pandas timestamps or python datetimes
+            for pool_info in [POOL_INFO, POOL_INFO.assign(timestamp=pd.Series([BLOCK_TIME], dtype=object))]:
+                pnls.append(calc_closeout_pnl_local(current_wallet, pool_info, POOL_CONFIG, checkpoint_info))
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+    for pnl in pnls[1:]:
+        pd.testing.assert_series_equal(pnl, pnls[0])
+    # An hour before maturity, part of the long still trades on the curve
+    assert pnls[0][0] != pytest.approx(100 * (1 - 0.0005), rel=1e-12)
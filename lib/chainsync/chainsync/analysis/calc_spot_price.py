@@ -1,4 +1,5 @@
 """Calculate the spot price."""
+from __future__ import annotations
 
 import logging
 from decimal import Decimal
@@ -11,10 +12,14 @@ import pandas as pd
 def calc_spot_price(
     share_reserves: pd.Series,
     bond_reserves: pd.Series,
-    initial_share_price: Decimal,
-    time_stretch: Decimal,
+    initial_share_price: Decimal | float,
+    time_stretch: Decimal | float,
 ):
-    """Calculate the spot price."""
+    """Calculate the spot price.
+
+    Pass Decimal series and parameters for fixed point results, or float series and parameters for a vectorized
+    float64 result.
+    """
     # Pandas is smart enough to be able to broadcast with internal Decimal types at runtime
     return ((initial_share_price * share_reserves) / bond_reserves) ** time_stretch  # type: ignore
 
@@ -1,19 +1,23 @@
 """Functions to gather data from postgres, do analysis, and add back into postgres"""
 import logging
+from datetime import datetime
 from typing import Type
 
-import numpy as np
 import pandas as pd
 from chainsync.db.base import Base
 from chainsync.db.hyperdrive import (
     CurrentWallet,
+    PnlSnapshot,
     PoolAnalysis,
-    Ticker,
     WalletPNL,
+    add_pnl_snapshot,
+    add_ticker_from_wallet_deltas,
+    get_checkpoint_info,
     get_current_wallet,
     get_pool_info,
-    get_transactions,
     get_wallet_deltas,
+    update_pool_rollup,
+    upsert_latest_wallet,
 )
 from sqlalchemy import exc
 from sqlalchemy.orm import Session
@@ -21,9 +25,9 @@ from web3.contract.contract import Contract
 
 from .calc_base_buffer import calc_base_buffer
 from .calc_fixed_rate import calc_fixed_rate
-from .calc_pnl import calc_closeout_pnl
+from .calc_pnl import calc_closeout_pnl_local, verify_closeout_pnl
 from .calc_spot_price import calc_spot_price
-from .calc_ticker import calc_ticker
+from .fixed_point_arrays import add_limbs, from_limbs, grouped_cumsum_limbs, to_limbs
 
 pd.set_option("display.max_columns", None)
 
@@ -78,29 +82,27 @@ def calc_current_wallet(wallet_deltas_df: pd.DataFrame, latest_wallet: pd.DataFr
     """
 
     # Ensure wallet_deltas are sorted by blockNumber
-    wallet_deltas_df = wallet_deltas_df.sort_values("blockNumber")
-    # Using np.cumsum because of decimal objects in dataframe
-    wallet_delta_by_block = wallet_deltas_df.groupby(["walletAddress", "tokenType"])["delta"].apply(np.cumsum)
-    # Use only the index of the original df
-    wallet_delta_by_block.index = wallet_delta_by_block.index.get_level_values(2)
-    # Add column
-    wallet_deltas_df["value"] = wallet_delta_by_block
-    # Drop unnecessary columns to match schema
-    wallet_deltas_df = wallet_deltas_df.drop(["id", "transactionHash", "delta"], axis=1)
+    wallet_deltas_df = wallet_deltas_df.sort_values("blockNumber", kind="stable")
+    # Exact cumulative sums of each position on int64 limbs, instead of a python loop over Decimals
+    position_codes = wallet_deltas_df.groupby(["walletAddress", "tokenType"], sort=False).ngroup().to_numpy()
+    has_position = position_codes >= 0
+    values = grouped_cumsum_limbs(to_limbs(wallet_deltas_df["delta"][has_position]), position_codes[has_position])
 
     # If there was a initial wallet, add deltas to initial wallet to calculate current positions
     if len(latest_wallet) > 0:
-        wallet_deltas_df = wallet_deltas_df.set_index(["walletAddress", "tokenType", "blockNumber"])
-        latest_wallet = latest_wallet.set_index(["walletAddress", "tokenType"])
-
-        # Add the latest wallet to each wallet delta position to calculate most current positions
-        # We broadcast latest wallet across all blockNumbers. If a position does not exist in latest_wallet,
-        # it will treat it as 0 (based on fill_value)
-        wallet_deltas_df["value"] = wallet_deltas_df["value"].add(latest_wallet["value"], fill_value=0)
-        wallet_deltas_df = wallet_deltas_df.reset_index()
-
+        # Look up the latest position of each delta. If a position does not exist in latest_wallet,
+        # it is treated as 0
         # In the case where latest_wallet has positions not in wallet_deltas, we can ignore them
         # since if they're not in wallet_deltas, there's no change in positions
+        latest_values = latest_wallet.set_index(["walletAddress", "tokenType"])["value"]
+        positions = pd.MultiIndex.from_frame(wallet_deltas_df.loc[has_position, ["walletAddress", "tokenType"]])
+        latest_values = latest_values.reindex(positions)
+        values = add_limbs(values, to_limbs(latest_values.where(latest_values.notna(), 0)))
+
+    # Drop unnecessary columns to match schema
+    wallet_deltas_df = wallet_deltas_df.drop(["id", "transactionHash", "delta"], axis=1)
+    wallet_deltas_df["value"] = None
+    wallet_deltas_df.loc[has_position, "value"] = from_limbs(values)
 
     # Need to keep zero positions in the db since a delta could have made the current wallet 0
     # We can filter zero positions after the query of current positions
@@ -117,17 +119,43 @@ def data_to_analysis(
     pool_config: pd.Series,
     db_session: Session,
     hyperdrive_contract: Contract,
-) -> None:
-    """Function to query postgres data tables and insert to analysis tables"""
+    pnl_verification_rate: float = 0.0,
+    calc_pnl: bool = True,
+) -> list[str]:
+    """Function to query postgres data tables and insert to analysis tables
+
+    Arguments
+    ---------
+    start_block : int
+        The first block to analyze
+    end_block : int
+        The block after the last block to analyze, matching python slicing notation
+    pool_config : pd.Series
+        The pool config
+    db_session : Session
+        The initialized session object
+    hyperdrive_contract : Contract
+        The hyperdrive contract object, used to cross check the closeout pnl
+    pnl_verification_rate : float, optional
+        The fraction of positions whose locally calculated closeout pnl is checked against a preview on the chain
+    calc_pnl : bool, optional
+        If True, add a full pnl snapshot at the last block. Otherwise, the caller snapshots the pnl
+
+    Returns
+    -------
+    list[str]
+        The wallets whose positions changed in the block range
+    """
     # Get data
-    pool_info = get_pool_info(db_session, start_block, end_block, coerce_float=False)
+    # The pool analysis is for the dashboard, so it is calculated on float64 columns, cast by postgres
+    pool_info = get_pool_info(db_session, start_block, end_block, coerce_float=True)
 
     # Calculate spot prices
     spot_price = calc_spot_price(
         pool_info["shareReserves"],
         pool_info["bondReserves"],
-        pool_config["initialSharePrice"],
-        pool_config["invTimeStretch"],
+        float(pool_config["initialSharePrice"]),
+        float(pool_config["invTimeStretch"]),
     )
 
     # Calculate fixed rate
@@ -135,53 +163,100 @@ def data_to_analysis(
 
     # Calculate base buffer
     base_buffer = calc_base_buffer(
-        pool_info["longsOutstanding"], pool_info["sharePrice"], pool_config["minimumShareReserves"]
+        pool_info["longsOutstanding"], pool_info["sharePrice"], float(pool_config["minimumShareReserves"])
     )
 
     pool_analysis_df = pd.concat([pool_info["blockNumber"], spot_price, fixed_rate, base_buffer], axis=1)
     pool_analysis_df.columns = ["blockNumber", "spot_price", "fixed_rate", "base_buffer"]
     _df_to_db(pool_analysis_df, PoolAnalysis, db_session)
+    # Fold the new blocks into the candles the dashboard reads
+    update_pool_rollup(db_session, start_block, end_block)
 
     # TODO calculate current wallet positions for this block
     # This should be done from the deltas, not queries from chain
     wallet_deltas_df = get_wallet_deltas(db_session, start_block, end_block, coerce_float=False)
     # Explicit check for empty wallet_deltas here
     if len(wallet_deltas_df) == 0:
-        return
+        return []
 
     # Get current wallet of previous timestamp here
     # If it doesn't exist, should be an empty dataframe
     latest_wallet = get_current_wallet(db_session, end_block=start_block, coerce_float=False)
     current_wallet_df = calc_current_wallet(wallet_deltas_df, latest_wallet)
+    # Committed together with the current wallet rows
+    upsert_latest_wallet(current_wallet_df, db_session)
     _df_to_db(current_wallet_df, CurrentWallet, db_session)
 
-    # calculate pnl through closeout pnl
-    # TODO this function might be slow due to contract call on chain
-    # and calculating for every position, wallet, and block
-    # This will get better when we have the rust implementation of `smart_contract_preview_transaction`.
-    # Alternatively, set sample rate so we don't calculate this every block
-    # We can set a sample rate by doing batch processing on this function
-    # since we only get the current wallet for the end_block
+    # The pnl snapshot can be left to the caller, so it can run on its own cadence, see `snapshot_wallet_pnl`
+    if calc_pnl:
+        snapshot_wallet_pnl(
+            end_block, pool_config, db_session, hyperdrive_contract, pnl_verification_rate=pnl_verification_rate
+        )
+
+    # Build ticker from wallet delta, joined with transactions and pool info in postgres
+    add_ticker_from_wallet_deltas(db_session, start_block, end_block)
+    return wallet_deltas_df["walletAddress"].dropna().unique().tolist()
+
+
+def snapshot_wallet_pnl(
+    end_block: int,
+    pool_config: pd.Series,
+    db_session: Session,
+    hyperdrive_contract: Contract,
+    wallet_addresses: list[str] | None = None,
+    pnl_verification_rate: float = 0.0,
+) -> None:
+    """Add the closeout pnl of wallet positions at the last block to the wallet_pnl table, and record the snapshot.
+
+    Storing every position at every block grows the wallet_pnl table as
+    number_of_blocks * number_of_addresses * number_of_open_positions, so callers snapshot on a cadence,
+    and in between full snapshots only snapshot the wallets that changed, see `get_latest_wallet_pnl`.
+
+    Arguments
+    ---------
+    end_block : int
+        The block after the block to snapshot, matching python slicing notation
+    pool_config : pd.Series
+        The pool config
+    db_session : Session
+        The initialized session object
+    hyperdrive_contract : Contract
+        The hyperdrive contract object, used to cross check the closeout pnl
+    wallet_addresses : list[str] | None, optional
+        The wallets to snapshot. If None, takes a full snapshot of every wallet
+    pnl_verification_rate : float, optional
+        The fraction of positions whose locally calculated closeout pnl is checked against a preview on the chain
+    """
+    # pylint: disable=too-many-arguments
+    pool_info = get_pool_info(db_session, end_block - 1, end_block, coerce_float=False)
+    if len(pool_info) == 0:
+        logging.warning("No pool info at block %s, skipping pnl snapshot", end_block - 1)
+        return
     wallet_pnl = get_current_wallet(db_session, end_block=end_block, coerce_float=False)
-    pnl_df = calc_closeout_pnl(wallet_pnl, pool_info, hyperdrive_contract)
-
-    # This sets the pnl to the current wallet dataframe, but there may be scaling issues here.
-    # This is because the `CurrentWallet` table has one entry per change in wallet position,
-    # and the `get_current_wallet` function handles getting all current positions at a block.
-    # If we add this current_wallet (plus pnl) to the database here, the final size in the db is
-    # number_of_blocks * number_of_addresses * number_of_open_positions, which is not scalable.
-    # We alleviate this by sampling periodically, and not calculate this for every block
-    # TODO implement sampling by setting the start + end block parameters in the caller of this function
-    # TODO If sampling, might want to move this to be a separate function, with the caller controlling
-    # the sampling rate. Otherwise, the e.g., ticker updates will also be on the sampling rate (won't miss data,
-    # just lower frequency updates)
-    # TODO do scaling tests to see the limit of this
-    wallet_pnl["pnl"] = pnl_df
-    # Add wallet_pnl to the database
-    _df_to_db(wallet_pnl, WalletPNL, db_session)
+    if wallet_addresses is not None:
+        wallet_pnl = wallet_pnl[wallet_pnl["walletAddress"].isin(wallet_addresses)].copy()
+
+    # The closeout values are calculated locally from the pool state, instead of previewing every position on chain
+    checkpoint_info = None
+    is_short = wallet_pnl["baseTokenType"] == "SHORT"
+    if is_short.any():
+        # Only the checkpoints since the oldest open short was opened are needed to find the opening share prices
+        first_open_time = datetime.fromtimestamp(
+            float(wallet_pnl.loc[is_short, "maturityTime"].min()) - float(pool_config["positionDuration"])
+        )
+        checkpoint_info = get_checkpoint_info(
+            db_session, end_block=end_block, coerce_float=False, start_time=first_open_time
+        )
+    wallet_pnl["pnl"] = calc_closeout_pnl_local(wallet_pnl, pool_info, pool_config, checkpoint_info)
+    if pnl_verification_rate > 0:
+        verify_closeout_pnl(wallet_pnl, wallet_pnl["pnl"], pool_info, hyperdrive_contract, pnl_verification_rate)
 
-    # Build ticker from wallet delta
-    transactions = get_transactions(db_session, start_block, end_block, coerce_float=False)
-    ticker_df = calc_ticker(wallet_deltas_df, transactions, pool_info)
-    # TODO add ticker to database
-    _df_to_db(ticker_df, Ticker, db_session)
+    _df_to_db(wallet_pnl, WalletPNL, db_session)
+    add_pnl_snapshot(
+        PnlSnapshot(
+            blockNumber=end_block - 1,
+            isFull=wallet_addresses is None,
+            numWallets=wallet_pnl["walletAddress"].nunique(),
+        ),
+        db_session,
+    )
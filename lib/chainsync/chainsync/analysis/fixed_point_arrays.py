@@ -0,0 +1,169 @@
+"""Exact 18 decimal fixed point arithmetic on arrays of int64 limbs, without python Decimal objects.
+
+A value is stored as three int64 limbs, `value * 1e18 = whole * 1e18 + high * 1e9 + low`, where `whole` is the
+floor of the value and `high` and `low` are in [0, 1e9). Sums of up to ~9.2e9 values fit in each fractional limb
+before carrying, so sums and cumulative sums are exact and run in numpy, for values whose magnitude is below ~9.2e18.
+"""
+from __future__ import annotations
+
+from decimal import Decimal, localcontext
+from typing import Iterable
+
+import numpy as np
+from chainsync.db.hyperdrive.fixed_numeric import FIXED_POINT_DECIMALS, unscale_to_decimal
+
+LIMB_BASE = 10**9
+WHOLE_BASE = LIMB_BASE * LIMB_BASE
+# The limbs are in the columns of a (n, 3) array
+WHOLE, HIGH, LOW = 0, 1, 2
+
+
+def _to_scaled_int(value: Decimal | float | int) -> int:
+    """Round a value to the nearest integer scaled by 1e18, like `Numeric(scale=18)` does."""
+    value = Decimal(str(value)) if isinstance(value, float) else Decimal(value)
+    if not value.is_finite():
+        raise ValueError(f"{value=} does not have a fixed point representation")
+    with localcontext() as context:
+        # Enough precision that rounding to an integer is the only rounding
+        context.prec = 100
+        return int(value.scaleb(FIXED_POINT_DECIMALS).to_integral_value())
+
+
+def to_limbs(values: Iterable[Decimal | float | int]) -> np.ndarray:
+    """Convert values to fixed point limbs.
+
+    This is the only per element python loop; do it once per column, and keep the limbs for the arithmetic.
+
+    Arguments
+    ---------
+    values: Iterable[Decimal | float | int]
+        Finite values, e.g. a Decimal column read with `coerce_float=False`
+
+    Returns
+    -------
+    np.ndarray
+        The (n, 3) int64 limbs
+    """
+    rows = []
+    for value in values:
+        whole, fraction = divmod(_to_scaled_int(value), WHOLE_BASE)
+        rows.append((whole, *divmod(fraction, LIMB_BASE)))
+    try:
+        return np.array(rows, dtype=np.int64).reshape(-1, 3)
+    except OverflowError as err:
+        raise ValueError("Values must be smaller than ~9.2e18 in magnitude to fit in int64 limbs") from err
+
+
+def from_limbs(limbs: np.ndarray) -> np.ndarray:
+    """Convert fixed point limbs to Decimals, e.g. to write them to the db.
+
+    Arguments
+    ---------
+    limbs: np.ndarray
+        The (n, 3) int64 limbs
+
+    Returns
+    -------
+    np.ndarray
+        An object array of exact Decimals
+    """
+    limbs = normalize_limbs(limbs)
+    return np.array(
+        [unscale_to_decimal(int(whole) * WHOLE_BASE + int(high) * LIMB_BASE + int(low)) for whole, high, low in limbs],
+        dtype=object,
+    )
+
+
+def to_float(limbs: np.ndarray) -> np.ndarray:
+    """Convert fixed point limbs to float64, for metrics that don't need to be exact.
+
+    Arguments
+    ---------
+    limbs: np.ndarray
+        The (n, 3) int64 limbs
+
+    Returns
+    -------
+    np.ndarray
+        The values as float64
+    """
+    limbs = normalize_limbs(limbs)
+    whole = limbs[:, WHOLE]
+    fraction = limbs[:, HIGH] * LIMB_BASE + limbs[:, LOW]
+    # Negative values are stored as floor + fraction; take the fraction off the ceiling instead,
+    # so small negative values don't cancel out
+    is_negative = (whole < 0) & (fraction > 0)
+    return np.where(is_negative, (whole + 1) - (WHOLE_BASE - fraction) / WHOLE_BASE, whole + fraction / WHOLE_BASE)
+
+
+def normalize_limbs(limbs: np.ndarray) -> np.ndarray:
+    """Carry the fractional limbs so they are back in [0, 1e9).
+
+    Arguments
+    ---------
+    limbs: np.ndarray
+        The (n, 3) int64 limbs, with fractional limbs of any size
+
+    Returns
+    -------
+    np.ndarray
+        The same values with fractional limbs in [0, 1e9)
+    """
+    carry_low, low = np.divmod(limbs[:, LOW], LIMB_BASE)
+    carry_high, high = np.divmod(limbs[:, HIGH] + carry_low, LIMB_BASE)
+    return np.stack([limbs[:, WHOLE] + carry_high, high, low], axis=1)
+
+
+def add_limbs(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Add two arrays of fixed point limbs elementwise.
+
+    Arguments
+    ---------
+    left: np.ndarray
+        The (n, 3) int64 limbs
+    right: np.ndarray
+        The (n, 3) int64 limbs
+
+    Returns
+    -------
+    np.ndarray
+        The exact sums
+    """
+    return normalize_limbs(left + right)
+
+
+def grouped_cumsum_limbs(limbs: np.ndarray, group_codes: np.ndarray) -> np.ndarray:
+    """Exact cumulative sums of fixed point limbs within groups, in the order of the rows.
+
+    Arguments
+    ---------
+    limbs: np.ndarray
+        The (n, 3) int64 limbs
+    group_codes: np.ndarray
+        The group of each row as integers in [0, number of groups), e.g. from `DataFrame.groupby(...).ngroup()`
+
+    Returns
+    -------
+    np.ndarray
+        The cumulative sum of each row's group up to and including the row
+    """
+    if len(limbs) == 0:
+        return limbs.reshape(-1, 3)
+    # Stable sort by group, so rows of a group are contiguous and in their original order
+    order = np.argsort(group_codes, kind="stable")
+    sorted_codes = group_codes[order]
+    running = np.cumsum(limbs[order], axis=0)
+    # Subtract the running total before the start of each group; the whole limb of the running total across
+    # all groups has to fit in int64 too
+    group_starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    offsets = np.zeros_like(running)
+    offsets[group_starts[1:]] = running[group_starts[1:] - 1]
+    cumsum = np.empty_like(running)
+    cumsum[order] = running - _forward_fill_rows(offsets, group_starts)
+    return normalize_limbs(cumsum)
+
+
+def _forward_fill_rows(offsets: np.ndarray, group_starts: np.ndarray) -> np.ndarray:
+    """Repeat the offset at the start of each group over the rows of the group."""
+    group_sizes = np.diff(np.r_[group_starts, len(offsets)])
+    return np.repeat(offsets[group_starts], group_sizes, axis=0)
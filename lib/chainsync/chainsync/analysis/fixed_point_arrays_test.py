@@ -0,0 +1,82 @@
+"""Tests for fixed_point_arrays.py"""
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from .data_to_analysis import calc_current_wallet
+from .fixed_point_arrays import add_limbs, from_limbs, grouped_cumsum_limbs, to_float, to_limbs
+
+VALUES = [
+    Decimal("0"),
+    Decimal("1.999999999999999999"),
+    Decimal("-0.000000000000000001"),
+    Decimal("123456789012.345678901234567891"),
+    Decimal("-98765.4321"),
+    Decimal("4000000000000000000"),
+]
+
+
+class TestLimbs:
+    """Testing exact arithmetic on int64 limbs"""
+
+    def test_round_trip(self):
+        """Values convert to limbs and back exactly, and floats round to 18 decimals."""
+        assert from_limbs(to_limbs(VALUES)).tolist() == VALUES
+        assert from_limbs(to_limbs([0.1, 2, 1e-19])).tolist() == [Decimal("0.1"), Decimal(2), Decimal(0)]
+        np.testing.assert_allclose(to_float(to_limbs(VALUES)), [float(value) for value in VALUES])
+        with pytest.raises(ValueError):
+            to_limbs([Decimal("nan")])
+        with pytest.raises(ValueError):
+            to_limbs([Decimal("1e19")])
+
+    def test_grouped_cumsum(self):
+        """Cumulative sums within groups are exact, including fractional limbs that carry many times."""
+        rng = np.random.default_rng(0)
+        values = [Decimal(int(scaled)).scaleb(-18) for scaled in rng.integers(-(10**18), 10**18, 200)]
+        group_codes = rng.integers(0, 3, 200)
+        cumsum = from_limbs(grouped_cumsum_limbs(to_limbs(values), group_codes))
+        expected = pd.Series(values, dtype=object).groupby(group_codes).apply(np.cumsum).droplevel(0).sort_index()
+        assert cumsum.tolist() == expected.tolist()
+        assert from_limbs(add_limbs(to_limbs(VALUES), to_limbs(VALUES))).tolist() == [value * 2 for value in VALUES]
+        assert grouped_cumsum_limbs(to_limbs([]), np.array([], dtype=int)).shape == (0, 3)
+
+
+def test_calc_current_wallet():
+    """Current positions are the latest positions plus the running sum of the deltas."""
+    wallet_deltas = pd.DataFrame(
+        {
+            "id": range(5),
+            "transactionHash": ["0x0", "0x1", "0x2", "0x3", "0x4"],
+            "blockNumber": [3, 1, 2, 2, 3],
+            "walletAddress": ["addr_0", "addr_0", "addr_0", "addr_1", None],
+            "tokenType": ["BASE", "BASE", "LP", "BASE", "BASE"],
+            "baseTokenType": ["BASE", "BASE", "LP", "BASE", "BASE"],
+            "delta": [Decimal("0.1"), Decimal("0.2"), Decimal("5"), Decimal("-1.000000000000000001"), Decimal(1)],
+            "maturityTime": [None] * 5,
+        }
+    )
+    latest_wallet = pd.DataFrame(
+        {"walletAddress": ["addr_0", "addr_2"], "tokenType": ["BASE", "BASE"], "value": [Decimal("10"), Decimal(1)]}
+    )
+    current_wallet = calc_current_wallet(wallet_deltas, latest_wallet)
+    assert current_wallet.columns.to_list() == [
+        "blockNumber",
+        "walletAddress",
+        "tokenType",
+        "baseTokenType",
+        "maturityTime",
+        "value",
+    ]
+    assert current_wallet[["blockNumber", "walletAddress", "tokenType", "value"]].values.tolist() == [
+        [1, "addr_0", "BASE", Decimal("10.2")],
+        [2, "addr_0", "LP", Decimal("5")],
+        [2, "addr_1", "BASE", Decimal("-1.000000000000000001")],
+        [3, "addr_0", "BASE", Decimal("10.3")],
+        [3, None, "BASE", None],
+    ]
+    assert calc_current_wallet(wallet_deltas, latest_wallet.iloc[:0])["value"].to_list()[:2] == [
+        Decimal("0.2"),
+        Decimal("5"),
+    ]
@@ -1,12 +1,21 @@
 """Dashboard utilities"""
 
 from .build_fixed_rate import build_fixed_rate
-from .build_leaderboard import build_leaderboard
-from .build_ohlcv import build_ohlcv
+from .build_leaderboard import Leaderboard, build_leaderboard
+from .build_ohlcv import build_ohlcv, build_ohlcv_from_rollup
 from .build_outstanding_positions import build_outstanding_positions
 from .build_ticker import build_ticker
+from .dashboard_cache import DashboardCache, DashboardFrames, build_dashboard_frames
 from .extract_data_logs import get_combined_data, read_json_to_pd
 from .plot_fixed_rate import plot_fixed_rate
 from .plot_ohlcv import plot_ohlcv
 from .plot_outstanding_positions import plot_outstanding_positions
-from .usernames import address_to_username, combine_usernames, get_user_lookup
+from .pool_rollup import PoolRollupWindow
+from .usernames import (
+    CLICK_ADDRESSES,
+    USERNAME_TO_USER,
+    UserLookupCache,
+    address_to_username,
+    combine_usernames,
+    get_user_lookup,
+)
@@ -3,12 +3,12 @@ import pandas as pd
 
 
 def build_fixed_rate(pool_analysis: pd.DataFrame) -> pd.DataFrame:
-    """Gets the proper columns from pool analysis for plotting fixed rate
+    """Gets the proper columns from pool analysis or pool rollups for plotting fixed rate
 
     Arguments
     ---------
     pool_analysis: pd.DataFrame
-        The pool analysis object from `get_pool_anlysis`
+        The pool analysis object from `get_pool_anlysis`, or the pool rollups from `get_pool_rollup`
 
     Returns
     -------
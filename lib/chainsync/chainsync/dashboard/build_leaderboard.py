@@ -1,7 +1,13 @@
 """Builds the leaderboard for the dashboard."""
+from __future__ import annotations
+
+from decimal import Decimal
+
 import pandas as pd
+from chainsync.db.hyperdrive import get_latest_pnl_snapshot_block, get_latest_wallet_pnl, get_wallet_pnl
+from sqlalchemy.orm import Session
 
-from .usernames import address_to_username, combine_usernames
+from .usernames import UserLookupCache, address_to_username, combine_usernames
 
 
 def build_leaderboard(wallet_pnl: pd.DataFrame, lookup: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
@@ -29,3 +35,138 @@ def build_leaderboard(wallet_pnl: pd.DataFrame, lookup: pd.DataFrame) -> tuple[p
 
     # Convert these leaderboards to strings, as streamlit doesn't like decimals
     return (comb_leaderboard.astype(str), ind_leaderboard.astype(str))
+
+
+class Leaderboard:
+    """Keeps the pnl totals of every wallet and user, updated from the wallet_pnl rows added since the last update.
+
+    Each update reads the new snapshot rows and the user map changes, and only recalculates the totals of the wallets
+    and users that changed. The ranked tables are the same as the ones from `build_leaderboard`.
+    """
+
+    def __init__(self, user_lookup: UserLookupCache):
+        """Initialize an empty leaderboard.
+
+        Arguments
+        ---------
+        user_lookup: UserLookupCache
+            The cache that resolves the username and user of each wallet
+        """
+        self.user_lookup = user_lookup
+        # The total pnl and the snapshot block of each wallet
+        self.wallet_pnl: dict[str, Decimal] = {}
+        self.wallet_blocks: dict[str, int] = {}
+        # The wallets and total pnl of each user
+        self.user_wallets: dict[str, set[str]] = {}
+        self.user_pnl: dict[str, Decimal] = {}
+        self._wallet_users: dict[str, str | None] = {}
+        self._last_block: int | None = None
+        self._full_snapshot_block: int | None = None
+        self._ranks: tuple[pd.DataFrame, pd.DataFrame] | None = None
+
+    def update(self, session: Session) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """Read the changes since the last update and rank the users and wallets.
+
+        Arguments
+        ---------
+        session: Session
+            The initialized session object
+
+        Returns
+        -------
+        tuple[pd.DataFrame, pd.DataFrame]
+            The combined leaderboard of users and the leaderboard of wallets, as strings
+        """
+        changed_wallets = {
+            address for address in self.user_lookup.refresh(session) if address in self.wallet_pnl
+        } | self._read_new_wallet_pnl(session)
+        if len(changed_wallets) > 0 or self._ranks is None:
+            self._update_users(changed_wallets)
+            self._ranks = self._rank()
+        return self._ranks
+
+    def _read_new_wallet_pnl(self, session: Session) -> set[str]:
+        """Update the wallet totals from the snapshots added since the last update, and return the changed wallets."""
+        if self._last_block is None:
+            # The latest snapshot of each wallet, see `get_latest_wallet_pnl`
+            new_pnl = get_latest_wallet_pnl(session, coerce_float=False)
+        else:
+            new_pnl = get_wallet_pnl(
+                session, start_block=self._last_block + 1, return_timestamp=False, coerce_float=False
+            )
+        changed_wallets = set()
+        if len(new_pnl) > 0:
+            self._last_block = int(new_pnl["blockNumber"].max())
+            # Only the latest snapshot of each wallet counts
+            latest_blocks = new_pnl.groupby("walletAddress")["blockNumber"].transform("max")
+            new_pnl = new_pnl[new_pnl["blockNumber"] == latest_blocks]
+            totals = new_pnl.groupby("walletAddress")["pnl"].sum()
+            blocks = new_pnl.groupby("walletAddress")["blockNumber"].max()
+            for address, pnl in totals.items():
+                self.wallet_pnl[address] = pnl
+                self.wallet_blocks[address] = int(blocks[address])
+                changed_wallets.add(address)
+        elif self._last_block is None:
+            self._last_block = -1
+
+        # Wallets that are not in the latest full snapshot are dropped, like `get_latest_wallet_pnl` does
+        full_snapshot_block = get_latest_pnl_snapshot_block(session, full_only=True)
+        if full_snapshot_block is not None and full_snapshot_block != self._full_snapshot_block:
+            self._full_snapshot_block = full_snapshot_block
+            for address, block_number in list(self.wallet_blocks.items()):
+                if block_number < full_snapshot_block:
+                    del self.wallet_pnl[address]
+                    del self.wallet_blocks[address]
+                    changed_wallets.add(address)
+        return changed_wallets
+
+    def _update_users(self, changed_wallets: set[str]) -> None:
+        """Move the changed wallets to their current users and recalculate the totals of the affected users."""
+        changed_users = set()
+        for address in changed_wallets:
+            previous_user = self._wallet_users.pop(address, None)
+            if previous_user is not None:
+                self.user_wallets[previous_user].discard(address)
+                changed_users.add(previous_user)
+            if address not in self.wallet_pnl:
+                continue
+            user = self.user_lookup.user(address)
+            self._wallet_users[address] = user
+            if user is not None:
+                self.user_wallets.setdefault(user, set()).add(address)
+                changed_users.add(user)
+        # Totals are summed again from the wallets of the user, so repeated updates don't accumulate rounding
+        for user in changed_users:
+            if len(self.user_wallets.get(user, ())) == 0:
+                self.user_wallets.pop(user, None)
+                self.user_pnl.pop(user, None)
+            else:
+                self.user_pnl[user] = sum(self.wallet_pnl[address] for address in self.user_wallets[user])
+
+    def _rank(self) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """Rank the users and wallets by pnl."""
+        addresses = list(self.wallet_pnl.keys())
+        ind_leaderboard = (
+            pd.DataFrame(
+                {
+                    "username": [self.user_lookup.username(address) for address in addresses],
+                    "walletAddress": addresses,
+                    "pnl": [self.wallet_pnl[address] for address in addresses],
+                },
+                columns=["username", "walletAddress", "pnl"],
+            )
+            .sort_values("pnl", ascending=False)  # type: ignore
+            .reset_index(drop=True)
+        )
+        comb_leaderboard = (
+            pd.DataFrame(
+                {"user": list(self.user_pnl.keys()), "pnl": list(self.user_pnl.values())}, columns=["user", "pnl"]
+            )
+            .sort_values("pnl", ascending=False)  # type: ignore
+            .reset_index(drop=True)
+        )
+        ind_leaderboard.index.name = "rank"
+        comb_leaderboard.index.name = "rank"
+
+        # Convert these leaderboards to strings, as streamlit doesn't like decimals
+        return (comb_leaderboard.astype(str), ind_leaderboard.astype(str))
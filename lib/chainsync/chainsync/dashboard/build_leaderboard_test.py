@@ -0,0 +1,135 @@
+"""Tests for build_leaderboard.py"""
+from decimal import Decimal
+
+import pandas as pd
+from chainsync.db.base import USER_MAP_CHANNEL, NotificationListener, add_user_map, get_user_map
+from chainsync.db.hyperdrive import PnlSnapshot, WalletPNL, add_pnl_snapshot, get_latest_wallet_pnl
+
+from . import usernames
+from .build_leaderboard import Leaderboard, build_leaderboard
+from .usernames import CLICK_ADDRESSES, UserLookupCache, get_user_lookup
+
+# fixture arguments in test function have to be the same as the fixture name
+# pylint: disable=redefined-outer-name
+
+CLICK_ADDRESS = "0x021f1Bbd2Ec870FB150bBCAdaaA1F85DFd72407C"
+
+
+class TestLeaderboard:
+    """Testing the incremental leaderboard against build_leaderboard"""
+
+    def test_incremental_updates(self, db_session):
+        """Partial snapshots, full snapshots and new usernames are reflected as they arrive."""
+        assert CLICK_ADDRESS in CLICK_ADDRESSES
+        add_user_map("slundquist", ["bot_0"], db_session)
+        listener = NotificationListener(db_session.get_bind(), USER_MAP_CHANNEL)
+        try:
+            leaderboard = Leaderboard(UserLookupCache(listener))
+            # Each wallet's pnl is split between a BASE and an LP position
+            db_session.add_all(
+                [
+                    WalletPNL(blockNumber=1, walletAddress=address, tokenType=token_type, pnl=Decimal(pnl) / 2)
+                    for address, pnl in {"bot_0": "3", "bot_1": "-1", CLICK_ADDRESS: "1", "bot_2": "0.5"}.items()
+                    for token_type in ["BASE", "LP"]
+                ]
+            )
+            db_session.commit()
+            add_pnl_snapshot(PnlSnapshot(blockNumber=1, isFull=True, numWallets=4), db_session)
+            latest_wallet_pnl = get_latest_wallet_pnl(db_session, coerce_float=False)
+            lookup = get_user_lookup(latest_wallet_pnl["walletAddress"].unique().tolist(), get_user_map(db_session))
+            for ranks, expected_ranks in zip(
+                leaderboard.update(db_session), build_leaderboard(latest_wallet_pnl, lookup)
+            ):
+                pd.testing.assert_frame_equal(ranks, expected_ranks)
+            assert leaderboard.user_pnl == {"Sheng Lundquist": Decimal(4)}
+
+            # Only the wallet in the partial snapshot changes
+            db_session.add_all(
+                [
+                    WalletPNL(blockNumber=2, walletAddress="bot_1", tokenType="BASE", pnl=Decimal("2.5")),
+                    WalletPNL(blockNumber=2, walletAddress="bot_1", tokenType="LP", pnl=Decimal("2.5")),
+                ]
+            )
+            db_session.commit()
+            add_pnl_snapshot(PnlSnapshot(blockNumber=2, isFull=False, numWallets=1), db_session)
+            latest_wallet_pnl = get_latest_wallet_pnl(db_session, coerce_float=False)
+            lookup = get_user_lookup(latest_wallet_pnl["walletAddress"].unique().tolist(), get_user_map(db_session))
+            for ranks, expected_ranks in zip(
+                leaderboard.update(db_session), build_leaderboard(latest_wallet_pnl, lookup)
+            ):
+                pd.testing.assert_frame_equal(ranks, expected_ranks)
+            assert leaderboard.wallet_blocks == {"bot_0": 1, "bot_1": 2, CLICK_ADDRESS: 1, "bot_2": 1}
+
+            # Registering a username moves the wallet to its user
+            add_user_map("slundquist", ["bot_1"], db_session)
+            lookup = get_user_lookup(latest_wallet_pnl["walletAddress"].unique().tolist(), get_user_map(db_session))
+            for ranks, expected_ranks in zip(
+                leaderboard.update(db_session), build_leaderboard(latest_wallet_pnl, lookup)
+            ):
+                pd.testing.assert_frame_equal(ranks, expected_ranks)
+            assert leaderboard.user_pnl == {"Sheng Lundquist": Decimal(9)}
+
+            # Wallets missing from a full snapshot are dropped
+            db_session.add_all(
+                [
+                    WalletPNL(blockNumber=3, walletAddress=address, tokenType=token_type, pnl=Decimal(pnl) / 2)
+                    for address, pnl in {"bot_0": "2", "bot_1": "5", CLICK_ADDRESS: "7"}.items()
+                    for token_type in ["BASE", "LP"]
+                ]
+            )
+            db_session.commit()
+            add_pnl_snapshot(PnlSnapshot(blockNumber=3, isFull=True, numWallets=3), db_session)
+            latest_wallet_pnl = get_latest_wallet_pnl(db_session, coerce_float=False)
+            lookup = get_user_lookup(latest_wallet_pnl["walletAddress"].unique().tolist(), get_user_map(db_session))
+            for ranks, expected_ranks in zip(
+                leaderboard.update(db_session), build_leaderboard(latest_wallet_pnl, lookup)
+            ):
+                pd.testing.assert_frame_equal(ranks, expected_ranks)
+            assert set(leaderboard.wallet_pnl) == {"bot_0", "bot_1", CLICK_ADDRESS}
+        finally:
+            listener.close()
+
+    def test_without_listener(self, db_session):
+        """Without a listener, the user map is read again on every update."""
+        leaderboard = Leaderboard(UserLookupCache())
+        db_session.add_all(
+            [
+                WalletPNL(blockNumber=1, walletAddress="bot_0", tokenType="BASE", pnl=Decimal(3)),
+                WalletPNL(blockNumber=1, walletAddress="bot_1", tokenType="BASE", pnl=Decimal(-1)),
+            ]
+        )
+        db_session.commit()
+        add_pnl_snapshot(PnlSnapshot(blockNumber=1, isFull=True, numWallets=2), db_session)
+        leaderboard.update(db_session)
+        add_user_map("slundquist", ["bot_0"], db_session)
+        latest_wallet_pnl = get_latest_wallet_pnl(db_session, coerce_float=False)
+        lookup = get_user_lookup(latest_wallet_pnl["walletAddress"].unique().tolist(), get_user_map(db_session))
+        for ranks, expected_ranks in zip(leaderboard.update(db_session), build_leaderboard(latest_wallet_pnl, lookup)):
+            pd.testing.assert_frame_equal(ranks, expected_ranks)
+        assert leaderboard.user_pnl == {"Sheng Lundquist": Decimal(3)}
+
+
+class TestUserLookupCache:
+    """Testing the cached usernames"""
+
+    def test_register_during_full_read(self, db_session, monkeypatch):
+        """An address registered while the user map is read in full is picked up by the next refresh."""
+        listener = NotificationListener(db_session.get_bind(), USER_MAP_CHANNEL)
+        try:
+            user_lookup = UserLookupCache(listener)
+
+            def get_user_map_then_register(session, *args):
+                # Registers an address right after the full read, before the refresh returns
+                user_map = get_user_map(session, *args)
+                if not args:
+                    add_user_map("slundquist", ["bot_0"], session)
+                return user_map
+
+            monkeypatch.setattr(usernames, "get_user_map", get_user_map_then_register)
+            assert user_lookup.refresh(db_session) == set()
+            assert user_lookup.username("bot_0") == "bot_0"
+            monkeypatch.undo()
+            assert user_lookup.refresh(db_session) == {"bot_0"}
+            assert user_lookup.username("bot_0") == "slundquist (bots)"
+        finally:
+            listener.close()
@@ -32,3 +32,25 @@ def build_ohlcv(pool_analysis, freq="D") -> pd.DataFrame:
     ohlcv = ohlcv.astype(float)
 
     return ohlcv
+
+
+def build_ohlcv_from_rollup(pool_rollup: pd.DataFrame) -> pd.DataFrame:
+    """Builds the ohlcv dataframe from candles that were already rolled up in the db
+
+    Arguments
+    ---------
+    pool_rollup: pd.DataFrame
+        The pool rollups of one resolution from `get_pool_rollup`
+
+    Returns
+    -------
+    pd.DataFrame
+        The ready to plot dataframe for ohlcv
+    """
+    ohlcv = pool_rollup.set_index("timestamp")[["open", "close", "high", "low"]]
+    ohlcv.columns = ["Open", "Close", "High", "Low"]
+    ohlcv.index.name = "Date"
+    # ohlcv must be floats
+    ohlcv = ohlcv.astype(float)
+
+    return ohlcv
@@ -8,7 +8,7 @@ def build_outstanding_positions(pool_info: pd.DataFrame) -> pd.DataFrame:
     Arguments
     ---------
     pool_info: pd.DataFrame
-        The pool info object from `get_pool_info`
+        The pool info object from `get_pool_info`, or the pool rollups from `get_pool_rollup`
 
     Returns
     -------
@@ -0,0 +1,179 @@
+"""A cache of the dashboard data, built once per new block and shared by every dashboard session."""
+from __future__ import annotations
+
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Callable
+
+import pandas as pd
+from chainsync.db.hyperdrive import get_latest_block_number_from_analysis_table, get_ticker
+from sqlalchemy.orm import Session
+
+from .build_fixed_rate import build_fixed_rate
+from .build_leaderboard import Leaderboard
+from .build_ohlcv import build_ohlcv_from_rollup
+from .build_outstanding_positions import build_outstanding_positions
+from .build_ticker import build_ticker
+from .pool_rollup import PoolRollupWindow
+
+
+@dataclass(frozen=True)
+class DashboardFrames:
+    """The data shown by the dashboard at a block."""
+
+    block_number: int
+    ticker: pd.DataFrame
+    comb_rank: pd.DataFrame
+    ind_rank: pd.DataFrame
+    ohlcv: pd.DataFrame
+    fixed_rate: pd.DataFrame
+    outstanding_positions: pd.DataFrame
+
+
+def build_dashboard_frames(
+    session: Session,
+    block_number: int,
+    leaderboard: Leaderboard,
+    pool_rollup_window: PoolRollupWindow,
+    max_live_blocks: int,
+) -> DashboardFrames:
+    """Query the db and build the dashboard data.
+
+    Arguments
+    ---------
+    session: Session
+        The initialized session object
+    block_number: int
+        The latest analyzed block
+    leaderboard: Leaderboard
+        The leaderboard, updated in place
+    pool_rollup_window: PoolRollupWindow
+        The window of candles to plot, updated in place
+    max_live_blocks: int
+        The number of blocks of ticker to show
+
+    Returns
+    -------
+    DashboardFrames
+        The ready to show data
+    """
+    # Reads the new wallet pnl and user map changes, and ranks the changed wallets
+    comb_rank, ind_rank = leaderboard.update(session)
+
+    ticker = get_ticker(session, start_block=-max_live_blocks, coerce_float=False)
+    # Adds the cached usernames to the ticker
+    user_lookup = leaderboard.user_lookup.get_lookup(ticker["walletAddress"].dropna().unique().tolist())
+    display_ticker = build_ticker(ticker, user_lookup)
+
+    pool_rollup = pool_rollup_window.update(session)
+    return DashboardFrames(
+        block_number=block_number,
+        ticker=display_ticker,
+        comb_rank=comb_rank,
+        ind_rank=ind_rank,
+        ohlcv=build_ohlcv_from_rollup(pool_rollup),
+        fixed_rate=build_fixed_rate(pool_rollup),
+        outstanding_positions=build_outstanding_positions(pool_rollup),
+    )
+
+
+class DashboardCache:
+    """Builds the dashboard data in a background thread whenever a new block is analyzed.
+
+    Dashboard sessions read the latest data from the cache instead of querying the db themselves,
+    so the db load doesn't grow with the number of viewers.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        build_frames: Callable[[Session, int], DashboardFrames],
+        refresh_interval: float = 1.0,
+    ):
+        """Initialize the cache, without building any data yet.
+
+        Arguments
+        ---------
+        session: Session
+            A session used only by the cache
+        build_frames: Callable[[Session, int], DashboardFrames]
+            Builds the data at a block, e.g. `build_dashboard_frames` with the other arguments bound
+        refresh_interval: float, optional
+            The number of seconds between checks for a new block
+        """
+        self.session = session
+        self.build_frames = build_frames
+        self.refresh_interval = refresh_interval
+        self._frames: DashboardFrames | None = None
+        self._updated = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def frames(self) -> DashboardFrames | None:
+        """The latest data, or None if nothing was built yet."""
+        return self._frames
+
+    def refresh(self) -> bool:
+        """Build the data if a new block was analyzed since the last build.
+
+        Returns
+        -------
+        bool
+            True if the data was rebuilt
+        """
+        block_number = get_latest_block_number_from_analysis_table(self.session)
+        if self._frames is not None and self._frames.block_number >= block_number:
+            return False
+        frames = self.build_frames(self.session, block_number)
+        with self._updated:
+            self._frames = frames
+            self._updated.notify_all()
+        return True
+
+    def wait_for_update(self, block_number: int | None, timeout: float) -> DashboardFrames | None:
+        """Wait for data newer than a block.
+
+        Arguments
+        ---------
+        block_number: int | None
+            The block of the data the caller has, or None if it has none
+        timeout: float
+            The maximum number of seconds to wait
+
+        Returns
+        -------
+        DashboardFrames | None
+            The latest data, which is not newer than `block_number` if the wait timed out
+        """
+        with self._updated:
+            self._updated.wait_for(
+                lambda: self._frames is not None and (block_number is None or self._frames.block_number > block_number),
+                timeout=timeout,
+            )
+            return self._frames
+
+    def start(self) -> None:
+        """Start refreshing in a background thread."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="dashboard-cache", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        """Refresh until stopped, logging errors instead of dying so the dashboard recovers from db hiccups."""
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("Error refreshing the dashboard cache")
+                self.session.rollback()
+            self._stop.wait(self.refresh_interval)
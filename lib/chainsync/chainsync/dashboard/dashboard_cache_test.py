@@ -0,0 +1,54 @@
+"""Tests for dashboard_cache.py"""
+import pandas as pd
+from chainsync.db.hyperdrive import PoolAnalysis
+
+from .dashboard_cache import DashboardCache, DashboardFrames
+
+# fixture arguments in test function have to be the same as the fixture name
+# pylint: disable=redefined-outer-name
+
+
+class _CountingBuilder:
+    """Builds empty frames and counts the builds"""
+
+    def __init__(self):
+        self.built_blocks = []
+
+    def __call__(self, session, block_number):
+        self.built_blocks.append(block_number)
+        empty = pd.DataFrame()
+        return DashboardFrames(block_number, empty, empty, empty, empty, empty, empty)
+
+
+class TestDashboardCache:
+    """Testing the shared dashboard cache"""
+
+    def test_refresh_once_per_block(self, db_session):
+        """The data is only rebuilt when a new block is analyzed."""
+        builder = _CountingBuilder()
+        cache = DashboardCache(db_session, builder)
+        db_session.add(PoolAnalysis(blockNumber=1))
+        db_session.commit()
+        assert cache.refresh()
+        assert not cache.refresh()
+        db_session.add(PoolAnalysis(blockNumber=2))
+        db_session.commit()
+        assert cache.refresh()
+        assert builder.built_blocks == [1, 2]
+        assert cache.frames is not None and cache.frames.block_number == 2
+
+    def test_background_refresh(self, db_session):
+        """Waiting sessions get the data for new blocks from the background thread."""
+        builder = _CountingBuilder()
+        cache = DashboardCache(db_session, builder, refresh_interval=0.01)
+        db_session.add(PoolAnalysis(blockNumber=1))
+        db_session.commit()
+        cache.start()
+        try:
+            frames = cache.wait_for_update(None, timeout=5)
+            assert frames is not None and frames.block_number == 1
+            # No new block, so the wait times out with the same data
+            assert cache.wait_for_update(1, timeout=0.1) is frames
+        finally:
+            cache.stop()
+        assert builder.built_blocks == [1]
@@ -0,0 +1,49 @@
+"""Keeps the pool rollups for the dashboard in memory, reading only the latest candles on each refresh."""
+from __future__ import annotations
+
+import pandas as pd
+from chainsync.db.hyperdrive import get_pool_rollup
+from sqlalchemy.orm import Session
+
+
+class PoolRollupWindow:
+    """A sliding window of the latest pool rollup buckets of one resolution."""
+
+    def __init__(self, resolution: int, num_buckets: int):
+        """Initialize an empty window.
+
+        Arguments
+        ---------
+        resolution: int
+            The bucket length in seconds, one of `chainsync.db.hyperdrive.POOL_ROLLUP_RESOLUTIONS`
+        num_buckets: int
+            The number of buckets to keep
+        """
+        self.resolution = resolution
+        self.num_buckets = num_buckets
+        self.rollup: pd.DataFrame | None = None
+
+    def update(self, session: Session) -> pd.DataFrame:
+        """Read the buckets that changed since the last update into the window.
+
+        The first update reads the whole window. After that, only the last bucket of the window, which may still be
+        filling up, and the buckets after it are read.
+
+        Arguments
+        ---------
+        session: Session
+            The initialized session object
+
+        Returns
+        -------
+        pd.DataFrame
+            The rollups in the window, following the schema of PoolRollup, sorted by timestamp
+        """
+        if self.rollup is None or len(self.rollup) == 0:
+            self.rollup = get_pool_rollup(session, self.resolution, num_buckets=self.num_buckets)
+            return self.rollup
+        last_bucket = self.rollup["timestamp"].iloc[-1]
+        new_rollup = get_pool_rollup(session, self.resolution, start_time=last_bucket)
+        self.rollup = pd.concat([self.rollup[self.rollup["timestamp"] < last_bucket], new_rollup], ignore_index=True)
+        self.rollup = self.rollup.iloc[-self.num_buckets :].reset_index(drop=True)
+        return self.rollup
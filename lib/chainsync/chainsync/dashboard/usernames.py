@@ -1,33 +1,62 @@
 """Helper functions for mapping addresses to usernames."""
+from __future__ import annotations
+
 import pandas as pd
+from chainsync.db.base import NotificationListener, get_user_map
+from sqlalchemy.orm import Session
+
+# Map usernames to a single user (e.g., combine click with bots)
+# TODO Hard coded mapping, should be a config file somewhere
+USERNAME_TO_USER = {
+    "Charles St. Louis (click)": "Charles St. Louis",
+    "Alim Khamisa (click)": "Alim Khamisa",
+    "Danny Delott (click)": "Danny Delott",
+    "Gregory Lisa (click)": "Gregory Lisa",
+    "Jonny Rhea (click)": "Jonny Rhea",
+    "Matt Brown (click)": "Matt Brown",
+    "Giovanni Effio (click)": "Giovanni Effio",
+    "Mihai Cosma (click)": "Mihai Cosma",
+    "Ryan Goree (click)": "Ryan Goree",
+    "Alex Towle (click)": "Alex Towle",
+    "Adelina Ruffolo (click)": "Adelina Ruffolo",
+    "Jacob Arruda (click)": "Jacob Arruda",
+    "Dylan Paiton (click)": "Dylan Paiton",
+    "Sheng Lundquist (click)": "Sheng Lundquist",
+    "ControlC Schmidt (click)": "ControlC Schmidt",
+    "George Towle (click)": "George Towle",
+    "Jack Burrus (click)": "Jack Burrus",
+    "Jordan J (click)": "Jordan J",
+    # Bot accounts
+    "slundquist (bots)": "Sheng Lundquist",
+}
+
+# Hard coded click addresses
+# TODO Hard coded mapping, should be a config file somewhere
+CLICK_ADDRESSES = {
+    "0x004dfC2dBA6573fa4dFb1E86e3723e1070C0CfdE": "Charles St. Louis (click)",
+    "0x005182C62DA59Ff202D53d6E42Cef6585eBF9617": "Alim Khamisa (click)",
+    "0x005BB73FddB8CE049eE366b50d2f48763E9Dc0De": "Danny Delott (click)",
+    "0x0065291E64E40FF740aE833BE2F68F536A742b70": "Gregory Lisa (click)",
+    "0x0076b154e60BF0E9088FcebAAbd4A778deC5ce2c": "Jonny Rhea (click)",
+    "0x00860d89A40a5B4835a3d498fC1052De04996de6": "Matt Brown (click)",
+    "0x00905A77Dc202e618d15d1a04Bc340820F99d7C4": "Giovanni Effio (click)",
+    "0x009ef846DcbaA903464635B0dF2574CBEE66caDd": "Mihai Cosma (click)",
+    "0x00D5E029aFCE62738fa01EdCA21c9A4bAeabd434": "Ryan Goree (click)",
+    "0x020A6F562884395A7dA2be0b607Bf824546699e2": "Alex Towle (click)",
+    "0x020a898437E9c9DCdF3c2ffdDB94E759C0DAdFB6": "Adelina Ruffolo (click)",
+    "0x020b42c1E3665d14275E2823bCef737015c7f787": "Jacob Arruda (click)",
+    "0x02147558D39cE51e19de3A2E1e5b7c8ff2778829": "Dylan Paiton (click)",
+    "0x021f1Bbd2Ec870FB150bBCAdaaA1F85DFd72407C": "Sheng Lundquist (click)",
+    "0x02237E07b7Ac07A17E1bdEc720722cb568f22840": "ControlC Schmidt (click)",
+    "0x022ca016Dc7af612e9A8c5c0e344585De53E9667": "George Towle (click)",
+    "0x0235037B42b4c0575c2575D50D700dD558098b78": "Jack Burrus (click)",
+    "0x0238811B058bA876Ae5F79cFbCAcCfA1c7e67879": "Jordan J (click)",
+}
 
 
 def combine_usernames(username: pd.Series) -> pd.DataFrame:
     """Map usernames to a single user (e.g., combine click with bots)."""
-    # TODO Hard coded mapping, should be a config file somewhere
-    user_mapping = {
-        "Charles St. Louis (click)": "Charles St. Louis",
-        "Alim Khamisa (click)": "Alim Khamisa",
-        "Danny Delott (click)": "Danny Delott",
-        "Gregory Lisa (click)": "Gregory Lisa",
-        "Jonny Rhea (click)": "Jonny Rhea",
-        "Matt Brown (click)": "Matt Brown",
-        "Giovanni Effio (click)": "Giovanni Effio",
-        "Mihai Cosma (click)": "Mihai Cosma",
-        "Ryan Goree (click)": "Ryan Goree",
-        "Alex Towle (click)": "Alex Towle",
-        "Adelina Ruffolo (click)": "Adelina Ruffolo",
-        "Jacob Arruda (click)": "Jacob Arruda",
-        "Dylan Paiton (click)": "Dylan Paiton",
-        "Sheng Lundquist (click)": "Sheng Lundquist",
-        "ControlC Schmidt (click)": "ControlC Schmidt",
-        "George Towle (click)": "George Towle",
-        "Jack Burrus (click)": "Jack Burrus",
-        "Jordan J (click)": "Jordan J",
-        # Bot accounts
-        "slundquist (bots)": "Sheng Lundquist",
-    }
-    user_mapping = pd.DataFrame.from_dict(user_mapping, orient="index")
+    user_mapping = pd.DataFrame.from_dict(USERNAME_TO_USER, orient="index")
     user_mapping.columns = ["user"]
     # Use merge in case mapping doesn't exist
     username_column = username.name
@@ -37,28 +66,7 @@ def combine_usernames(username: pd.Series) -> pd.DataFrame:
 
 def get_click_addresses() -> pd.DataFrame:
     """Return a dataframe of hard coded click addresses."""
-    # TODO Hard coded mapping, should be a config file somewhere
-    addresses = {
-        "0x004dfC2dBA6573fa4dFb1E86e3723e1070C0CfdE": "Charles St. Louis (click)",
-        "0x005182C62DA59Ff202D53d6E42Cef6585eBF9617": "Alim Khamisa (click)",
-        "0x005BB73FddB8CE049eE366b50d2f48763E9Dc0De": "Danny Delott (click)",
-        "0x0065291E64E40FF740aE833BE2F68F536A742b70": "Gregory Lisa (click)",
-        "0x0076b154e60BF0E9088FcebAAbd4A778deC5ce2c": "Jonny Rhea (click)",
-        "0x00860d89A40a5B4835a3d498fC1052De04996de6": "Matt Brown (click)",
-        "0x00905A77Dc202e618d15d1a04Bc340820F99d7C4": "Giovanni Effio (click)",
-        "0x009ef846DcbaA903464635B0dF2574CBEE66caDd": "Mihai Cosma (click)",
-        "0x00D5E029aFCE62738fa01EdCA21c9A4bAeabd434": "Ryan Goree (click)",
-        "0x020A6F562884395A7dA2be0b607Bf824546699e2": "Alex Towle (click)",
-        "0x020a898437E9c9DCdF3c2ffdDB94E759C0DAdFB6": "Adelina Ruffolo (click)",
-        "0x020b42c1E3665d14275E2823bCef737015c7f787": "Jacob Arruda (click)",
-        "0x02147558D39cE51e19de3A2E1e5b7c8ff2778829": "Dylan Paiton (click)",
-        "0x021f1Bbd2Ec870FB150bBCAdaaA1F85DFd72407C": "Sheng Lundquist (click)",
-        "0x02237E07b7Ac07A17E1bdEc720722cb568f22840": "ControlC Schmidt (click)",
-        "0x022ca016Dc7af612e9A8c5c0e344585De53E9667": "George Towle (click)",
-        "0x0235037B42b4c0575c2575D50D700dD558098b78": "Jack Burrus (click)",
-        "0x0238811B058bA876Ae5F79cFbCAcCfA1c7e67879": "Jordan J (click)",
-    }
-    addresses = pd.DataFrame.from_dict(addresses, orient="index")
+    addresses = pd.DataFrame.from_dict(CLICK_ADDRESSES, orient="index")
     addresses = addresses.reset_index()
     addresses.columns = ["address", "username"]
 
@@ -123,3 +131,110 @@ def address_to_username(lookup: pd.DataFrame, selected_list: pd.Series) -> pd.Se
     selected_list_column = selected_list.name
     out = selected_list.to_frame().merge(lookup, how="left", left_on=selected_list_column, right_on="address")
     return out["username"]
+
+
+class UserLookupCache:
+    """Caches the username and user of each address, so lookups don't merge against the user map every refresh.
+
+    With a listener on `chainsync.db.base.USER_MAP_CHANNEL`, only the addresses added to the user map since the last
+    refresh are read again. Without one, the user map is read on every refresh and compared to the cached one.
+    """
+
+    def __init__(self, user_map_listener: NotificationListener | None = None):
+        """Initialize an empty cache.
+
+        Arguments
+        ---------
+        user_map_listener: NotificationListener | None, optional
+            A listener on `chainsync.db.base.USER_MAP_CHANNEL`, used only by this cache
+        """
+        self.user_map_listener = user_map_listener
+        self._bot_usernames: dict[str, str] | None = None
+
+    def refresh(self, session: Session) -> set[str]:
+        """Read the changes to the user map.
+
+        Arguments
+        ---------
+        session: Session
+            The initialized session object
+
+        Returns
+        -------
+        set[str]
+            The addresses whose username may have changed
+        """
+        if self._bot_usernames is None or self.user_map_listener is None:
+            # Drain the pending notifications before the full read, which covers them. The notifications of addresses
+            # registered after the drain stay pending, so the next refresh reads them even if the full read missed them.
+            if self.user_map_listener is not None:
+                self.user_map_listener.wait(timeout=0)
+            user_map = get_user_map(session)
+            bot_usernames = dict(zip(user_map["address"], user_map["username"]))
+            previous = self._bot_usernames or {}
+            self._bot_usernames = bot_usernames
+            return {
+                address
+                for address in previous.keys() | bot_usernames.keys()
+                if previous.get(address) != bot_usernames.get(address)
+            }
+        changed_addresses = set(self.user_map_listener.wait(timeout=0))
+        for address in changed_addresses:
+            user_map = get_user_map(session, address)
+            if len(user_map) > 0:
+                self._bot_usernames[address] = user_map.iloc[0]["username"]
+            else:
+                self._bot_usernames.pop(address, None)
+        return changed_addresses
+
+    def username(self, address: str) -> str:
+        """Get the username of an address, like `get_user_lookup` does.
+
+        Arguments
+        ---------
+        address: str
+            The wallet address
+
+        Returns
+        -------
+        str
+            The registered username, or the address itself if it isn't registered
+        """
+        if address in CLICK_ADDRESSES:
+            return CLICK_ADDRESSES[address]
+        if self._bot_usernames is not None and address in self._bot_usernames:
+            return self._bot_usernames[address] + " (bots)"
+        return address
+
+    def user(self, address: str) -> str | None:
+        """Get the user that an address belongs to, like `combine_usernames` does.
+
+        Arguments
+        ---------
+        address: str
+            The wallet address
+
+        Returns
+        -------
+        str | None
+            The user, or None if the username isn't mapped to a user
+        """
+        return USERNAME_TO_USER.get(self.username(address))
+
+    def get_lookup(self, addresses: list[str]) -> pd.DataFrame:
+        """Generate the username to address mapping of some addresses.
+
+        Arguments
+        ---------
+        addresses: list[str]
+            The addresses to build a lookup for
+
+        Returns
+        -------
+        pd.DataFrame
+            A dataframe with "address" and "username" columns, like the one from `get_user_lookup`
+        """
+        return pd.DataFrame(
+            {"address": addresses, "username": [self.username(address) for address in addresses]},
+            columns=["address", "username"],
+        )
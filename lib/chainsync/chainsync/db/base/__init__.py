@@ -1,14 +1,32 @@
 """Generic database utilities"""
 
+from .cold_storage import (
+    COLD_STORAGE_DIR_ENV,
+    concat_cold_storage_rows,
+    export_block_range_to_parquet,
+    get_cold_storage_dir,
+    get_cold_storage_end_block,
+    load_manifest,
+    read_parquet_history,
+    roll_out_to_cold_storage,
+    split_cold_storage_query,
+)
 from .interface import (
+    USER_MAP_CHANNEL,
     TableWithBlockNumber,
     add_user_map,
     close_session,
+    create_block_number_partitions,
+    create_missing_indexes,
+    delete_duplicate_rows,
     drop_table,
     get_latest_block_number_from_table,
     get_user_map,
     initialize_engine,
     initialize_session,
+    partition_table_by_block_number,
     query_tables,
 )
+from .notifications import NotificationListener, notify
+from .readers import iter_query_chunks, read_query
 from .schema import Base, UserMap
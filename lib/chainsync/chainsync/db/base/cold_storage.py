@@ -0,0 +1,364 @@
+"""Roll closed block ranges of tables out of postgres into parquet files, and read them back."""
+from __future__ import annotations
+
+import json
+import logging
+import os
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Sequence, Type
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import Column, Table, exc
+from sqlalchemy.orm import Session
+
+from .interface import get_latest_block_number_from_table
+from .readers import DEFAULT_CHUNK_SIZE, iter_query_chunks
+from .schema import Base
+
+# When set, the get_* functions read block ranges that were rolled out of postgres from this directory
+COLD_STORAGE_DIR_ENV = "CHAINSYNC_COLD_STORAGE_DIR"
+MANIFEST_FILE = "manifest.json"
+
+# Parquet types of the columns by their python type; decimals are stored as strings, see `export_block_range_to_parquet`
+_PARQUET_TYPES: dict[type, pa.DataType] = {
+    Decimal: pa.string(),
+    str: pa.string(),
+    int: pa.int64(),
+    bool: pa.bool_(),
+    datetime: pa.timestamp("ns"),
+}
+
+
+def get_cold_storage_dir() -> str | None:
+    """Get the cold storage directory from the environment.
+
+    Returns
+    -------
+    str | None
+        The value of `CHAINSYNC_COLD_STORAGE_DIR`, or None if it is not set
+    """
+    return os.getenv(COLD_STORAGE_DIR_ENV)
+
+
+def load_manifest(root_dir: str) -> dict[str, list[dict[str, Any]]]:
+    """Load the manifest of exported block ranges.
+
+    Arguments
+    ---------
+    root_dir: str
+        The cold storage directory
+
+    Returns
+    -------
+    dict[str, list[dict[str, Any]]]
+        For each table name, the exported ranges in block order; each range has `start_block`, `end_block`,
+        `file` (relative to `root_dir`, or None if the range had no rows), `num_rows` and `decimal_columns`
+    """
+    manifest_path = os.path.join(root_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as file:
+        return json.load(file)["tables"]
+
+
+def get_cold_storage_end_block(root_dir: str, table_name: str) -> int:
+    """Get the block that the exported ranges of a table end at.
+
+    Arguments
+    ---------
+    root_dir: str
+        The cold storage directory
+    table_name: str
+        The name of the table
+
+    Returns
+    -------
+    int
+        Every block before this one is in cold storage; 0 if nothing was exported
+    """
+    ranges = load_manifest(root_dir).get(table_name, [])
+    if len(ranges) == 0:
+        return 0
+    return ranges[-1]["end_block"]
+
+
+def export_block_range_to_parquet(
+    session: Session,
+    table_obj: Type[Base],
+    start_block: int,
+    end_block: int,
+    root_dir: str,
+    delete_rows: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> None:
+    """Write the rows of a block range to a parquet file and add the range to the manifest.
+
+    Ranges of a table have to be exported in order, starting where the previous export ended, so that the
+    exported history is contiguous. The rows are streamed from postgres and written in chunks, so a range
+    doesn't have to fit in memory.
+
+    Arguments
+    ---------
+    session: Session
+        The initialized session object
+    table_obj: Type[Base]
+        The sqlalchemy class of the table, which must have a blockNumber column
+    start_block: int
+        The first block of the range
+    end_block: int
+        The block after the last block of the range, matching python slicing notation
+    root_dir: str
+        The cold storage directory
+    delete_rows: bool, optional
+        If True, delete the exported rows from postgres
+    chunk_size: int, optional
+        The maximum number of rows read and written at a time
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+    if not hasattr(table_obj, "blockNumber"):
+        raise ValueError("Table does not have a blockNumber column")
+    table = table_obj.__table__
+    table_name = table.name
+    manifest = load_manifest(root_dir)
+    table_ranges = manifest.setdefault(table_name, [])
+    expected_start_block = table_ranges[-1]["end_block"] if len(table_ranges) > 0 else start_block
+    if start_block != expected_start_block:
+        raise ValueError(f"Export of {table_name} must start at block {expected_start_block}, not {start_block=}")
+
+    block_number = table.c.blockNumber
+    query = session.query(table_obj).filter(block_number >= start_block, block_number < end_block)
+    # Parquet decimals are limited to 38 digits, so store decimals as strings to keep them lossless
+    decimal_columns = [column.name for column in table.columns if _get_python_type(column) is Decimal]
+    relative_path = os.path.join(table_name, f"blocks_{start_block:012d}_{end_block:012d}.parquet")
+    num_rows = 0
+    writer: pq.ParquetWriter | None = None
+    try:
+        for rows in iter_query_chunks(session, query.order_by(block_number).statement, False, chunk_size):
+            for column in decimal_columns:
+                rows[column] = rows[column].map(lambda value: str(value) if isinstance(value, Decimal) else None)
+            if writer is None:
+                # Every chunk is written with the schema of the table, even if a column is all None in a chunk
+                os.makedirs(os.path.join(root_dir, table_name), exist_ok=True)
+                writer = pq.ParquetWriter(
+                    os.path.join(root_dir, relative_path),
+                    _get_parquet_schema(table, pa.Schema.from_pandas(rows, preserve_index=False)),
+                )
+            writer.write_table(pa.Table.from_pandas(rows, schema=writer.schema, preserve_index=False))
+            num_rows += len(rows)
+    finally:
+        if writer is not None:
+            writer.close()
+    table_ranges.append(
+        {
+            "start_block": start_block,
+            "end_block": end_block,
+            "file": relative_path if num_rows > 0 else None,
+            "num_rows": num_rows,
+            "decimal_columns": decimal_columns,
+        }
+    )
+    _write_manifest(root_dir, manifest)
+    logging.info("Exported %s rows of %s in blocks [%s, %s)", num_rows, table_name, start_block, end_block)
+
+    if delete_rows:
+        try:
+            session.query(table_obj).filter(block_number >= start_block, block_number < end_block).delete()
+            session.commit()
+        except exc.DataError as err:
+            session.rollback()
+            logging.error("Error deleting exported rows of %s: %s", table_name, err)
+            raise err
+
+
+def roll_out_to_cold_storage(
+    session: Session,
+    table_objs: Sequence[Type[Base]],
+    root_dir: str,
+    range_size: int,
+    keep_blocks: int,
+    delete_rows: bool = True,
+) -> None:
+    """Export every closed block range of the tables that is not in cold storage yet.
+
+    Ranges are `range_size` blocks long and aligned to multiples of `range_size`. A range is closed when it ends at
+    least `keep_blocks` blocks before the latest block of the table.
+
+    Arguments
+    ---------
+    session: Session
+        The initialized session object
+    table_objs: Sequence[Type[Base]]
+        The sqlalchemy classes of the tables to export
+    root_dir: str
+        The cold storage directory
+    range_size: int
+        The number of blocks in each parquet file
+    keep_blocks: int
+        The number of most recent blocks to always keep in postgres
+    delete_rows: bool, optional
+        If True, delete the exported rows from postgres
+    """
+    # pylint: disable=too-many-arguments
+    if range_size <= 0:
+        raise ValueError(f"{range_size=} must be positive")
+    for table_obj in table_objs:
+        table_name = table_obj.__table__.name
+        latest_block = get_latest_block_number_from_table(table_obj, session)
+        start_block = get_cold_storage_end_block(root_dir, table_name)
+        while start_block + range_size <= latest_block - keep_blocks:
+            export_block_range_to_parquet(
+                session, table_obj, start_block, start_block + range_size, root_dir, delete_rows=delete_rows
+            )
+            start_block += range_size
+
+
+def read_parquet_history(
+    root_dir: str,
+    table_name: str,
+    start_block: int | None = None,
+    end_block: int | None = None,
+    filters: list[tuple[str, str, Any]] | None = None,
+    coerce_float: bool = True,
+) -> pd.DataFrame | None:
+    """Read the exported rows of a table in a block range.
+
+    Arguments
+    ---------
+    root_dir: str
+        The cold storage directory
+    table_name: str
+        The name of the table
+    start_block: int | None, optional
+        The first block to read
+    end_block: int | None, optional
+        The block after the last block to read, matching python slicing notation
+    filters: list[tuple[str, str, Any]] | None, optional
+        Extra pyarrow filters on the rows, e.g. [("walletAddress", "in", addresses)]
+    coerce_float: bool, optional
+        If true, will return floats in dataframe. Otherwise, will return fixed point Decimal
+
+    Returns
+    -------
+    pd.DataFrame | None
+        The rows in block order, or None if no exported range overlaps the block range
+    """
+    # pylint: disable=too-many-arguments
+    block_filters = list(filters or [])
+    if start_block is not None:
+        block_filters.append(("blockNumber", ">=", start_block))
+    if end_block is not None:
+        block_filters.append(("blockNumber", "<", end_block))
+    frames = []
+    for block_range in load_manifest(root_dir).get(table_name, []):
+        if block_range["file"] is None:
+            continue
+        if (start_block is not None and block_range["end_block"] <= start_block) or (
+            end_block is not None and block_range["start_block"] >= end_block
+        ):
+            continue
+        rows = pd.read_parquet(os.path.join(root_dir, block_range["file"]), filters=block_filters or None)
+        for column in block_range["decimal_columns"]:
+            rows[column] = rows[column].map(lambda value: Decimal(value) if value is not None else None)
+            if coerce_float:
+                rows[column] = rows[column].astype(float)
+        frames.append(rows)
+    if len(frames) == 0:
+        return None
+    return pd.concat(frames, ignore_index=True)
+
+
+def split_cold_storage_query(
+    table_obj: Type[Base],
+    start_block: int | None,
+    end_block: int | None,
+    filters: list[tuple[str, str, Any]] | None = None,
+    coerce_float: bool = True,
+) -> tuple[pd.DataFrame | None, int | None]:
+    """Read the part of a block range query that is in cold storage, when cold storage is configured.
+
+    Arguments
+    ---------
+    table_obj: Type[Base]
+        The sqlalchemy class of the table
+    start_block: int | None
+        The first block of the query, after resolving negative indices
+    end_block: int | None
+        The block after the last block of the query, after resolving negative indices
+    filters: list[tuple[str, str, Any]] | None, optional
+        Extra pyarrow filters on the cold rows
+    coerce_float: bool, optional
+        If true, will return floats in dataframe. Otherwise, will return fixed point Decimal
+
+    Returns
+    -------
+    tuple[pd.DataFrame | None, int | None]
+        The rows read from cold storage (or None), and the start block for the postgres part of the query,
+        which skips every block that is in cold storage
+    """
+    root_dir = get_cold_storage_dir()
+    if root_dir is None:
+        return None, start_block
+    table_name = table_obj.__table__.name
+    cold_end_block = get_cold_storage_end_block(root_dir, table_name)
+    if cold_end_block == 0 or (start_block is not None and start_block >= cold_end_block):
+        return None, start_block
+    cold_rows = read_parquet_history(
+        root_dir,
+        table_name,
+        start_block,
+        cold_end_block if end_block is None else min(end_block, cold_end_block),
+        filters=filters,
+        coerce_float=coerce_float,
+    )
+    return cold_rows, cold_end_block
+
+
+def concat_cold_storage_rows(cold_rows: pd.DataFrame | None, hot_rows: pd.DataFrame) -> pd.DataFrame:
+    """Prepend the rows read from cold storage to the rows read from postgres.
+
+    Arguments
+    ---------
+    cold_rows: pd.DataFrame | None
+        The rows from `split_cold_storage_query`
+    hot_rows: pd.DataFrame
+        The rows from postgres
+
+    Returns
+    -------
+    pd.DataFrame
+        The rows from both
+    """
+    if cold_rows is None or len(cold_rows) == 0:
+        return hot_rows
+    if len(hot_rows) == 0:
+        return cold_rows[hot_rows.columns].reset_index(drop=True)
+    return pd.concat([cold_rows[hot_rows.columns], hot_rows], ignore_index=True)
+
+
+def _get_python_type(column: Column) -> type | None:
+    """Get the python type of a column's values, or None if sqlalchemy doesn't know it."""
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return None
+
+
+def _get_parquet_schema(table: Table, inferred_schema: pa.Schema) -> pa.Schema:
+    """Build the parquet schema of a table, falling back to the schema inferred from the rows for other types."""
+    fields = []
+    for field in inferred_schema:
+        parquet_type = _PARQUET_TYPES.get(_get_python_type(table.c[field.name]))  # type: ignore
+        fields.append(field if parquet_type is None else pa.field(field.name, parquet_type))
+    return pa.schema(fields)
+
+
+def _write_manifest(root_dir: str, manifest: dict[str, list[dict[str, Any]]]) -> None:
+    """Replace the manifest file atomically, so readers never see a partial manifest."""
+    os.makedirs(root_dir, exist_ok=True)
+    manifest_path = os.path.join(root_dir, MANIFEST_FILE)
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump({"version": 1, "tables": manifest}, file, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
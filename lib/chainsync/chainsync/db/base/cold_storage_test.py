@@ -0,0 +1,142 @@
+"""Tests for cold_storage.py"""
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from chainsync.db.hyperdrive import (
+    PoolAnalysis,
+    PoolInfo,
+    WalletDelta,
+    WalletPNL,
+    get_all_traders,
+    get_pool_analysis,
+    get_pool_info,
+    get_pool_rollup,
+    get_wallet_deltas,
+    get_wallet_pnl,
+    rebuild_pool_rollup,
+)
+from chainsync.db.hyperdrive.schema import COLD_STORAGE_TABLES
+
+from .cold_storage import (
+    COLD_STORAGE_DIR_ENV,
+    export_block_range_to_parquet,
+    get_cold_storage_end_block,
+    load_manifest,
+    read_parquet_history,
+    roll_out_to_cold_storage,
+)
+
+# fixture arguments in test function have to be the same as the fixture name
+# pylint: disable=redefined-outer-name
+
+
+class TestColdStorage:
+    """Testing rolling block ranges out to parquet and reading them back"""
+
+    def test_roll_out_and_read_back(self, db_session, tmp_path, monkeypatch):
+        """Closed ranges are moved to parquet, and get_* returns the same rows as before."""
+        db_session.add_all(
+            [
+                WalletDelta(
+                    transactionHash=f"0x{block}",
+                    blockNumber=block,
+                    walletAddress=f"wallet_{block % 2}",
+                    tokenType="BASE",
+                    # More digits than parquet decimals can hold
+                    delta=Decimal(f"{block}123456789012345678901234.123456789012345678"),
+                )
+                for block in range(1, 26)
+            ]
+        )
+        db_session.commit()
+        expected = get_wallet_deltas(db_session, coerce_float=False)
+
+        roll_out_to_cold_storage(db_session, [WalletDelta], str(tmp_path), range_size=10, keep_blocks=5)
+        # [0, 10) and [10, 20) are closed, [20, 30) is not
+        assert get_cold_storage_end_block(str(tmp_path), "wallet_delta") == 20
+        assert [block_range["num_rows"] for block_range in load_manifest(str(tmp_path))["wallet_delta"]] == [9, 10]
+        assert len(get_wallet_deltas(db_session)) == 6
+
+        monkeypatch.setenv(COLD_STORAGE_DIR_ENV, str(tmp_path))
+        deltas = get_wallet_deltas(db_session, coerce_float=False)
+        assert deltas["blockNumber"].to_list() == list(range(1, 26))
+        assert deltas["delta"].to_list() == expected["delta"].to_list()
+        assert get_wallet_deltas(db_session, start_block=8, end_block=22)["blockNumber"].to_list() == list(range(8, 22))
+        assert get_wallet_deltas(db_session, start_block=-3)["blockNumber"].to_list() == [23, 24, 25]
+
+        cold_rows = read_parquet_history(
+            str(tmp_path), "wallet_delta", filters=[("walletAddress", "in", ["wallet_0"])], coerce_float=True
+        )
+        assert cold_rows is not None
+        assert cold_rows["blockNumber"].to_list() == list(range(2, 20, 2))
+        assert cold_rows["delta"].dtype == float
+
+    def test_export_in_chunks(self, db_session, tmp_path):
+        """Chunks with missing values are written with the same parquet schema."""
+        db_session.add_all(
+            [
+                WalletDelta(transactionHash=f"0x{block}", blockNumber=block)
+                if block < 3
+                else WalletDelta(
+                    transactionHash=f"0x{block}",
+                    blockNumber=block,
+                    walletAddress="wallet_0",
+                    tokenType="BASE",
+                    delta=Decimal("1.5"),
+                )
+                for block in range(1, 6)
+            ]
+        )
+        db_session.commit()
+        export_block_range_to_parquet(db_session, WalletDelta, 0, 10, str(tmp_path), chunk_size=2)
+        cold_rows = read_parquet_history(str(tmp_path), "wallet_delta", coerce_float=False)
+        assert cold_rows is not None
+        assert cold_rows["blockNumber"].to_list() == [1, 2, 3, 4, 5]
+        assert cold_rows["walletAddress"].to_list() == [None, None, "wallet_0", "wallet_0", "wallet_0"]
+        assert cold_rows["delta"].to_list() == [None, None, Decimal("1.5"), Decimal("1.5"), Decimal("1.5")]
+
+    def test_export_must_be_contiguous(self, db_session, tmp_path, monkeypatch):
+        """Ranges are appended in order, and kept rows are not read twice."""
+        db_session.add_all(
+            [PoolInfo(blockNumber=block, timestamp=datetime.fromtimestamp(block)) for block in (1, 2, 3)]
+        )
+        db_session.commit()
+        export_block_range_to_parquet(db_session, PoolInfo, 0, 2, str(tmp_path))
+        with pytest.raises(ValueError):
+            export_block_range_to_parquet(db_session, PoolInfo, 3, 4, str(tmp_path))
+
+        monkeypatch.setenv(COLD_STORAGE_DIR_ENV, str(tmp_path))
+        assert get_pool_info(db_session)["blockNumber"].to_list() == [1, 2, 3]
+
+    def test_readers_after_roll_out(self, db_session, tmp_path, monkeypatch):
+        """Readers that join pool_info or list the traders keep every block after the tables are rolled out."""
+        db_session.add_all(
+            [PoolInfo(blockNumber=block, timestamp=datetime(2023, 1, 1, 0, 0, block)) for block in range(1, 26)]
+            + [PoolAnalysis(blockNumber=block, spot_price=Decimal("0.9")) for block in range(1, 26)]
+            # The first wallet only traded in blocks that are rolled out
+            + [
+                WalletDelta(
+                    transactionHash=f"0x{block}",
+                    blockNumber=block,
+                    walletAddress="wallet_0" if block < 10 else "wallet_1",
+                    tokenType="BASE",
+                )
+                for block in range(1, 26)
+            ]
+            # wallet_pnl trails the other tables
+            + [WalletPNL(blockNumber=block, walletAddress="wallet_1", pnl=Decimal(block)) for block in range(1, 20)]
+        )
+        db_session.commit()
+        roll_out_to_cold_storage(db_session, COLD_STORAGE_TABLES, str(tmp_path), range_size=10, keep_blocks=5)
+        assert get_cold_storage_end_block(str(tmp_path), "wallet_delta") == 20
+        assert get_cold_storage_end_block(str(tmp_path), "wallet_pnl") == 10
+
+        monkeypatch.setenv(COLD_STORAGE_DIR_ENV, str(tmp_path))
+        assert get_pool_analysis(db_session)["blockNumber"].to_list() == list(range(1, 26))
+        wallet_pnl = get_wallet_pnl(db_session)
+        assert wallet_pnl["blockNumber"].to_list() == list(range(1, 20))
+        assert wallet_pnl["timestamp"].to_list() == [datetime(2023, 1, 1, 0, 0, block) for block in range(1, 20)]
+        rebuild_pool_rollup(db_session, resolutions=[60])
+        assert get_pool_rollup(db_session, 60)[["firstBlock", "lastBlock"]].values.tolist() == [[1, 25]]
+        assert sorted(get_all_traders(db_session)) == ["wallet_0", "wallet_1"]
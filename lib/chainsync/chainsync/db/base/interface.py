@@ -15,11 +15,16 @@ from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.sql import text
 
+from .notifications import notify
+from .readers import read_query
 from .schema import Base, UserMap
 
 # classes for sqlalchemy that define table schemas have no methods.
 # pylint: disable=too-few-public-methods
 
+# Each address added to the user map is sent on this channel
+USER_MAP_CHANNEL = "chainsync_user_map"
+
 
 def query_tables(session: Session) -> list[str]:
     """Return a list of tables in the database.
@@ -130,6 +135,8 @@ def initialize_session(drop: bool = False) -> Session:
         try:
             # create tables
             Base.metadata.create_all(engine)
+            # create_all skips tables that exist, so add any indexes that were added to the schema since
+            create_missing_indexes(session)
             # commit the transaction
             session.commit()
             exception = None
@@ -147,6 +154,220 @@ def initialize_session(drop: bool = False) -> Session:
     return session
 
 
+def create_missing_indexes(session: Session) -> None:
+    """Create the indexes defined in the schema that do not exist in the database.
+
+    `Base.metadata.create_all` does not touch existing tables, so this is the migration path for indexes that are
+    added to the schema after a database was created. Rows that would violate a new unique index are deleted
+    before it is built, keeping one row of each duplicate. Indexes listed in a table's `replaced_indexes` info
+    are dropped once their replacements exist.
+
+    Arguments
+    ---------
+    session : Session
+        The initialized session object
+    """
+    connection = session.connection()
+    existing_tables = set(inspect(connection).get_table_names())
+    try:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_indexes = {index["name"] for index in inspect(connection).get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                if index.unique:
+                    delete_duplicate_rows(session, table.name, [column.name for column in index.columns], commit=False)
+                index.create(bind=connection)
+            for index_name in table.info.get("replaced_indexes", ()):
+                session.execute(text(f'DROP INDEX IF EXISTS "{index_name}"'))
+        session.commit()
+    except exc.SQLAlchemyError as err:
+        session.rollback()
+        logging.error("Error creating missing indexes: %s", err)
+        raise err
+
+
+def delete_duplicate_rows(session: Session, table_name: str, column_names: list[str], commit: bool = True) -> int:
+    """Delete the rows that have the same values in some columns as another row, keeping one row of each.
+
+    Rows with a null in any of the columns are never duplicates, the same as for a unique index.
+
+    Arguments
+    ---------
+    session : Session
+        The initialized session object
+    table_name : str
+        The name of the table
+    column_names : list[str]
+        The columns that identify a row
+    commit : bool, optional
+        If False, leave committing the deletes to the caller
+
+    Returns
+    -------
+    int
+        The number of deleted rows
+    """
+    # Rows with equal keys are always in the same partition, since a unique index has to include the partition key
+    same_key = " AND ".join(f'older."{column_name}" = newer."{column_name}"' for column_name in column_names)
+    try:
+        result = session.execute(
+            text(
+                f'DELETE FROM "{table_name}" AS older USING "{table_name}" AS newer '
+                f"WHERE older.tableoid = newer.tableoid AND older.ctid < newer.ctid AND {same_key}"
+            )
+        )
+        if commit:
+            session.commit()
+    except exc.SQLAlchemyError as err:
+        session.rollback()
+        logging.error("Error deleting duplicate rows from %s: %s", table_name, err)
+        raise err
+    num_deleted = result.rowcount  # type: ignore
+    if num_deleted > 0:
+        logging.warning("Deleted %s duplicate rows from %s", num_deleted, table_name)
+    return num_deleted
+
+
+def partition_table_by_block_number(session: Session, table_name: str, partition_size: int, end_block: int) -> None:
+    """Convert an existing table into one that is range partitioned on blockNumber.
+
+    The table is recreated as a partitioned table, with partitions of `partition_size` blocks covering
+    blocks up to `end_block` and a default partition for any later blocks, and the existing rows are copied over.
+    The primary key is extended with blockNumber, since postgres requires unique constraints to include the
+    partition key. Tables that are already partitioned are left as is.
+
+    Arguments
+    ---------
+    session : Session
+        The initialized session object
+    table_name : str
+        The name of the table to partition; it must have a blockNumber column
+    partition_size : int
+        The number of blocks in each partition
+    end_block : int
+        Create partitions covering every block before this one
+    """
+    if _is_partitioned(session, table_name):
+        logging.info("Table %s is already partitioned", table_name)
+        return
+    inspector = inspect(session.get_bind())
+    column_names = [column["name"] for column in inspector.get_columns(table_name)]
+    if "blockNumber" not in column_names:
+        raise ValueError(f"Table {table_name} does not have a blockNumber column")
+    for constraint in inspector.get_unique_constraints(table_name):
+        if "blockNumber" not in constraint["column_names"]:
+            raise ValueError(f"Unique constraint {constraint['name']} on {table_name} does not include blockNumber")
+    primary_key = inspector.get_pk_constraint(table_name)["constrained_columns"]
+    if "blockNumber" not in primary_key:
+        primary_key.append("blockNumber")
+    sequences = []
+    for column_name in primary_key:
+        sequence = session.execute(
+            text("SELECT pg_get_serial_sequence(:table_name, :column_name)"),
+            {"table_name": table_name, "column_name": column_name},
+        ).scalar()
+        if sequence is not None:
+            sequences.append((sequence, column_name))
+
+    old_table_name = f"{table_name}_unpartitioned"
+    try:
+        session.execute(text(f'ALTER TABLE "{table_name}" RENAME TO "{old_table_name}"'))
+        session.execute(
+            text(
+                f'CREATE TABLE "{table_name}" (LIKE "{old_table_name}" INCLUDING DEFAULTS) '
+                'PARTITION BY RANGE ("blockNumber")'
+            )
+        )
+        session.execute(text(f'CREATE TABLE "{table_name}_default" PARTITION OF "{table_name}" DEFAULT'))
+        create_block_number_partitions(session, table_name, partition_size, end_block, commit=False)
+        session.execute(text(f'INSERT INTO "{table_name}" SELECT * FROM "{old_table_name}"'))
+        # Keep the id sequences when the old table is dropped
+        for sequence, column_name in sequences:
+            session.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY "{table_name}"."{column_name}"'))
+        session.execute(text(f'DROP TABLE "{old_table_name}"'))
+        primary_key_columns = ", ".join(f'"{column_name}"' for column_name in primary_key)
+        session.execute(text(f'ALTER TABLE "{table_name}" ADD PRIMARY KEY ({primary_key_columns})'))
+        if table_name in Base.metadata.tables:
+            # Indexes on a partitioned table are created on every partition, including ones attached later
+            for index in Base.metadata.tables[table_name].indexes:
+                index.create(bind=session.connection())
+        session.commit()
+    except exc.SQLAlchemyError as err:
+        session.rollback()
+        logging.error("Error partitioning table %s: %s", table_name, err)
+        raise err
+
+
+def create_block_number_partitions(
+    session: Session, table_name: str, partition_size: int, end_block: int, commit: bool = True
+) -> None:
+    """Create the missing blockNumber range partitions of a partitioned table, up to `end_block`.
+
+    Rows of a new partition's range that are in the default partition are moved into the new partition,
+    so this can be run at any time to keep the default partition small.
+
+    Arguments
+    ---------
+    session : Session
+        The initialized session object
+    table_name : str
+        The name of a table created by `partition_table_by_block_number`
+    partition_size : int
+        The number of blocks in each partition; must match the size the table was partitioned with
+    end_block : int
+        Create partitions covering every block before this one
+    commit : bool, optional
+        If False, leave committing the new partitions to the caller
+    """
+    if partition_size <= 0:
+        raise ValueError(f"{partition_size=} must be positive")
+    existing_partitions = set(
+        session.execute(
+            text("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = CAST(:table_name AS regclass)"),
+            {"table_name": table_name},
+        ).scalars()
+    )
+    try:
+        for partition_start in range(0, end_block, partition_size):
+            partition_name = f"{table_name}_p{partition_start}"
+            if partition_name in existing_partitions:
+                continue
+            partition_end = partition_start + partition_size
+            session.execute(text(f'CREATE TABLE "{partition_name}" (LIKE "{table_name}")'))
+            # Attaching fails if the default partition has rows in the new range, so move them first
+            session.execute(
+                text(
+                    f'WITH moved AS (DELETE FROM "{table_name}_default" '
+                    f'WHERE "blockNumber" >= {partition_start} AND "blockNumber" < {partition_end} RETURNING *) '
+                    f'INSERT INTO "{partition_name}" SELECT * FROM moved'
+                )
+            )
+            session.execute(
+                text(
+                    f'ALTER TABLE "{table_name}" ATTACH PARTITION "{partition_name}" '
+                    f"FOR VALUES FROM ({partition_start}) TO ({partition_end})"
+                )
+            )
+        if commit:
+            session.commit()
+    except exc.SQLAlchemyError as err:
+        session.rollback()
+        logging.error("Error creating partitions for table %s: %s", table_name, err)
+        raise err
+
+
+def _is_partitioned(session: Session, table_name: str) -> bool:
+    """Return True if the table is a partitioned table."""
+    result = session.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = CAST(:table_name AS regclass)"),
+        {"table_name": table_name},
+    ).first()
+    return result is not None
+
+
 def close_session(session: Session) -> None:
     """Close the session.
 
@@ -190,6 +411,10 @@ def add_user_map(username: str, addresses: list[str], session: Session) -> None:
         # This merge adds the row if not exist (keyed by address), otherwise will overwrite with this entry
         session.merge(UserMap(address=address, username=username))
 
+    # Delivered on commit, so cached usernames are invalidated, see `chainsync.dashboard.UserLookupCache`.
+    # Sent after every address is checked, since executing flushes the merged rows
+    for address in addresses:
+        notify(session, USER_MAP_CHANNEL, address)
     try:
         session.commit()
     except exc.DataError as err:
@@ -215,7 +440,7 @@ def get_user_map(session: Session, address: str | None = None) -> pd.DataFrame:
     query = session.query(UserMap)
     if address is not None:
         query = query.filter(UserMap.address == address)
-    return pd.read_sql(query.statement, con=session.connection())
+    return read_query(session, query.statement)
 
 
 class TableWithBlockNumber(Base):
@@ -1,11 +1,24 @@
 """CRUD tests for CheckpointInfo"""
+from decimal import Decimal
+
 import numpy as np
 import pytest
 
 # Ignoring unsued import warning, fixtures are used through variable name
 from chainsync.test_fixtures import db_session, dummy_session  # pylint: disable=unused-import
 
-from .interface import add_user_map, drop_table, get_user_map, query_tables
+from chainsync.db.hyperdrive.schema import WalletDelta, WalletInfoFromChain
+from sqlalchemy import inspect, text
+
+from .interface import (
+    add_user_map,
+    create_block_number_partitions,
+    create_missing_indexes,
+    drop_table,
+    get_user_map,
+    partition_table_by_block_number,
+    query_tables,
+)
 
 # fixture arguments in test function have to be the same as the fixture name
 # pylint: disable=redefined-outer-name
@@ -94,3 +107,69 @@ class TestUserMapInterface:
         assert len(user_map_df) == 4
         np.testing.assert_array_equal(user_map_df["username"], ["a", "a", "a", "a"])
         np.testing.assert_array_equal(user_map_df["address"], ["1", "2", "3", "5"])
+
+
+class TestMigrations:
+    """Testing index and partition migrations on an existing database"""
+
+    def test_create_missing_indexes(self, db_session):
+        """Indexes dropped from an existing table are recreated"""
+        db_session.execute(text("DROP INDEX ix_wallet_delta_position_block_unique"))
+        db_session.commit()
+        create_missing_indexes(db_session)
+        index_names = [index["name"] for index in inspect(db_session.get_bind()).get_indexes("wallet_delta")]
+        assert "ix_wallet_delta_position_block_unique" in index_names
+
+    def test_create_unique_index_over_duplicates(self, db_session):
+        """Duplicates written before an index was made unique are deleted, and the old index is replaced"""
+        # The table as written by older versions, with a non-unique index and a position recorded twice in a block
+        db_session.execute(text("DROP INDEX ix_wallet_info_from_chain_position_block_unique"))
+        db_session.execute(
+            text(
+                "CREATE INDEX ix_wallet_info_from_chain_position_block "
+                'ON wallet_info_from_chain ("walletAddress", "tokenType", "blockNumber")'
+            )
+        )
+        db_session.add_all(
+            [
+                WalletInfoFromChain(blockNumber=1, walletAddress="0x1", tokenType="BASE", tokenValue=Decimal(1)),
+                WalletInfoFromChain(blockNumber=1, walletAddress="0x1", tokenType="BASE", tokenValue=Decimal(1)),
+                WalletInfoFromChain(blockNumber=2, walletAddress="0x1", tokenType="BASE", tokenValue=Decimal(2)),
+            ]
+        )
+        db_session.commit()
+        create_missing_indexes(db_session)
+
+        rows = db_session.execute(text('SELECT "blockNumber" FROM wallet_info_from_chain ORDER BY "blockNumber"'))
+        assert rows.scalars().all() == [1, 2]
+        indexes = {
+            index["name"]: index["unique"]
+            for index in inspect(db_session.get_bind()).get_indexes("wallet_info_from_chain")
+        }
+        assert indexes["ix_wallet_info_from_chain_position_block_unique"]
+        assert "ix_wallet_info_from_chain_position_block" not in indexes
+
+    def test_partition_table_by_block_number(self, db_session):
+        """Existing rows are kept, and new rows are routed to partitions"""
+        db_session.add_all(
+            [WalletDelta(transactionHash=f"0x{block}", blockNumber=block, delta=Decimal(block)) for block in (1, 15)]
+        )
+        db_session.commit()
+        partition_table_by_block_number(db_session, "wallet_delta", partition_size=10, end_block=20)
+        # Block 25 lands in the default partition until its partition is created
+        db_session.add(WalletDelta(transactionHash="0x25", blockNumber=25, delta=Decimal(25)))
+        db_session.commit()
+        create_block_number_partitions(db_session, "wallet_delta", partition_size=10, end_block=30)
+
+        partition_rows = db_session.execute(
+            text('SELECT tableoid::regclass::text, "blockNumber", id FROM wallet_delta ORDER BY "blockNumber"')
+        ).all()
+        assert [tuple(row) for row in partition_rows] == [
+            ("wallet_delta_p0", 1, 1),
+            ("wallet_delta_p10", 15, 2),
+            ("wallet_delta_p20", 25, 3),
+        ]
+        index_names = [index["name"] for index in inspect(db_session.get_bind()).get_indexes("wallet_delta_p20")]
+        assert any("walletAddress" in index_name for index_name in index_names)
+        # Partitioning again is a no-op
+        partition_table_by_block_number(db_session, "wallet_delta", partition_size=10, end_block=30)
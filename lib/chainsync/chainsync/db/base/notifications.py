@@ -0,0 +1,73 @@
+"""Postgres LISTEN/NOTIFY, for waking up readers when writers commit new rows instead of polling."""
+from __future__ import annotations
+
+from psycopg import sql
+from sqlalchemy import Engine, func, select
+from sqlalchemy.orm import Session
+
+
+def notify(session: Session, channel: str, payload: str) -> None:
+    """Queue a notification in the session's transaction.
+
+    Postgres delivers it to listeners when the transaction commits, and drops it if the transaction rolls back,
+    so listeners never hear about rows they can't read yet.
+
+    Arguments
+    ---------
+    session: Session
+        The initialized session object
+    channel: str
+        The channel to notify
+    payload: str
+        The message, shorter than 8000 bytes
+    """
+    session.execute(select(func.pg_notify(channel, payload)))
+
+
+class NotificationListener:
+    """Listens to a postgres channel on a dedicated connection, outside of any session."""
+
+    def __init__(self, engine: Engine, channel: str):
+        """Open a connection and start listening.
+
+        Arguments
+        ---------
+        engine: Engine
+            The engine of the database, e.g. `session.get_bind()`
+        channel: str
+            The channel to listen to
+        """
+        self.channel = channel
+        self._connection = engine.raw_connection()
+        driver_connection = self._connection.driver_connection
+        assert driver_connection is not None
+        # Notifications are only delivered outside of transactions
+        driver_connection.autocommit = True
+        driver_connection.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+        self._driver_connection = driver_connection
+
+    def wait(self, timeout: float) -> list[str]:
+        """Wait for notifications.
+
+        Arguments
+        ---------
+        timeout: float
+            The maximum number of seconds to wait for the first notification
+
+        Returns
+        -------
+        list[str]
+            The payloads of every notification received, in order; empty if the wait timed out
+        """
+        payloads = [
+            notification.payload for notification in self._driver_connection.notifies(timeout=timeout, stop_after=1)
+        ]
+        # Notifications that arrived together are all handled now
+        payloads.extend(notification.payload for notification in self._driver_connection.notifies(timeout=0))
+        return payloads
+
+    def close(self) -> None:
+        """Stop listening and return the connection to the pool."""
+        self._driver_connection.execute(sql.SQL("UNLISTEN {}").format(sql.Identifier(self.channel)))
+        self._driver_connection.autocommit = False
+        self._connection.close()
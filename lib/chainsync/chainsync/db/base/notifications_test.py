@@ -0,0 +1,23 @@
+"""Tests for notifications.py"""
+from .notifications import NotificationListener, notify
+
+# fixture arguments in test function have to be the same as the fixture name
+# pylint: disable=redefined-outer-name
+
+
+def test_notifications_on_commit(db_session):
+    """Listeners only hear about committed transactions, in order."""
+    listener = NotificationListener(db_session.get_bind(), "test_channel")
+    try:
+        notify(db_session, "test_channel", "rolled back")
+        db_session.rollback()
+        notify(db_session, "test_channel", "first")
+        assert listener.wait(timeout=0.1) == []
+        db_session.commit()
+        notify(db_session, "test_channel", "second")
+        notify(db_session, "other_channel", "ignored")
+        db_session.commit()
+        assert listener.wait(timeout=5) == ["first", "second"]
+        assert listener.wait(timeout=0.1) == []
+    finally:
+        listener.close()
@@ -0,0 +1,88 @@
+"""Read query results into dataframes with server side cursors."""
+from __future__ import annotations
+
+from typing import Iterator
+
+import pandas as pd
+from sqlalchemy import Float, Numeric, Select, cast
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import Label
+
+# The number of rows fetched from the server side cursor at a time
+DEFAULT_CHUNK_SIZE = 10_000
+
+
+def read_query(session: Session, statement: Select, coerce_float: bool = True) -> pd.DataFrame:
+    """Read the result of a query into a dataframe, a drop in replacement for `pd.read_sql`.
+
+    With `coerce_float`, numeric columns are cast to float8 by postgres instead of being read as python Decimals
+    and converted afterwards, which is where most of the time of `pd.read_sql` goes.
+
+    Arguments
+    ---------
+    session : Session
+        The initialized session object
+    statement : Select
+        The query to run, e.g. `session.query(...).statement`
+    coerce_float : bool
+        If true, will return floats in dataframe. Otherwise, will return fixed point Decimal
+
+    Returns
+    -------
+    DataFrame
+        The query result
+    """
+    result = _execute_streaming(session, statement, coerce_float, DEFAULT_CHUNK_SIZE)
+    columns = list(result.keys())
+    rows = [row for partition in result.partitions() for row in partition]
+    return pd.DataFrame.from_records(rows, columns=columns, coerce_float=coerce_float)
+
+
+def iter_query_chunks(
+    session: Session, statement: Select, coerce_float: bool = True, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[pd.DataFrame]:
+    """Read the result of a query as dataframes of at most `chunk_size` rows, for results too large for memory.
+
+    The server side cursor is open until the iterator is exhausted, so the session can not run other queries
+    in the meantime.
+
+    Arguments
+    ---------
+    session : Session
+        The initialized session object
+    statement : Select
+        The query to run, e.g. `session.query(...).statement`
+    coerce_float : bool
+        If true, will return floats in dataframe. Otherwise, will return fixed point Decimal
+    chunk_size : int, optional
+        The maximum number of rows in each dataframe
+
+    Yields
+    ------
+    DataFrame
+        The next chunk of the query result
+    """
+    result = _execute_streaming(session, statement, coerce_float, chunk_size)
+    columns = list(result.keys())
+    for partition in result.partitions():
+        yield pd.DataFrame.from_records(partition, columns=columns, coerce_float=coerce_float)
+
+
+def _execute_streaming(session: Session, statement: Select, coerce_float: bool, chunk_size: int):
+    """Execute the statement with a server side cursor that fetches `chunk_size` rows at a time."""
+    if coerce_float:
+        statement = _cast_numeric_columns_to_float(statement)
+    return session.connection().execute(statement, execution_options={"stream_results": True, "yield_per": chunk_size})
+
+
+def _cast_numeric_columns_to_float(statement: Select) -> Select:
+    """Select the numeric columns of a query as float8 instead."""
+    columns = []
+    for column in statement.selected_columns:
+        # Types built on numeric storage (e.g. scaled integers) have their own result processing, so leave them be
+        if type(column.type) is Numeric:  # pylint: disable=unidiomatic-typecheck
+            element = column.element if isinstance(column, Label) else column
+            columns.append(cast(element, Float).label(column.name))
+        else:
+            columns.append(column)
+    return statement.with_only_columns(*columns, maintain_column_froms=True)
@@ -0,0 +1,48 @@
+"""Tests for readers.py"""
+from datetime import datetime
+from decimal import Decimal
+
+import pandas as pd
+from chainsync.db.hyperdrive import PoolInfo
+
+from .readers import iter_query_chunks, read_query
+
+# fixture arguments in test function have to be the same as the fixture name
+# pylint: disable=redefined-outer-name
+
+
+class TestReadQuery:
+    """Testing the server side cursor readers against pd.read_sql"""
+
+    def test_matches_read_sql(self, db_session):
+        """The dataframe is the same as the one from pd.read_sql."""
+        db_session.add_all(
+            [
+                PoolInfo(
+                    blockNumber=block,
+                    timestamp=datetime.fromtimestamp(block),
+                    shareReserves=Decimal(f"{block}.123456789012345678"),
+                    sharePrice=None if block % 3 == 0 else Decimal("1.000000000000000001"),
+                )
+                for block in range(10)
+            ]
+        )
+        db_session.commit()
+        statement = db_session.query(PoolInfo).order_by(PoolInfo.blockNumber).statement
+        for coerce_float in (True, False):
+            expected = pd.read_sql(statement, con=db_session.connection(), coerce_float=coerce_float)
+            pd.testing.assert_frame_equal(read_query(db_session, statement, coerce_float=coerce_float), expected)
+        # Empty results keep their columns
+        empty = read_query(db_session, db_session.query(PoolInfo).filter(PoolInfo.blockNumber < 0).statement)
+        assert len(empty) == 0 and list(empty.columns) == list(expected.columns)
+
+    def test_chunks(self, db_session):
+        """Chunked dataframes cover every row in order."""
+        db_session.add_all(
+            [PoolInfo(blockNumber=block, timestamp=datetime.fromtimestamp(block)) for block in range(25)]
+        )
+        db_session.commit()
+        statement = db_session.query(PoolInfo).order_by(PoolInfo.blockNumber).statement
+        chunks = list(iter_query_chunks(db_session, statement, chunk_size=10))
+        assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+        assert pd.concat(chunks)["blockNumber"].to_list() == list(range(25))
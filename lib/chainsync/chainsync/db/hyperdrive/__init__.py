@@ -1,16 +1,36 @@
 """Hyperdrive database utilities."""
-from .chain_to_db import data_chain_to_db, init_data_chain_to_db
+from .chain_to_db import (
+    BLOCKS_WRITTEN_CHANNEL,
+    HyperdriveBlockData,
+    backfill_chain_to_db,
+    data_chain_to_db,
+    fetch_block_data,
+    fetch_block_range_data,
+    init_data_chain_to_db,
+    parse_blocks_written,
+    remove_partial_blocks_from_db,
+    track_wallet_positions,
+    write_block_data_to_db,
+    write_blocks_data_to_db,
+)
 from .convert_data import (
     convert_checkpoint_info,
+    convert_checkpoint_info_rows,
     convert_hyperdrive_transactions_for_block,
+    convert_hyperdrive_transactions_for_block_range,
+    convert_hyperdrive_transactions_with_receipts,
     convert_pool_config,
     convert_pool_info,
+    convert_pool_info_rows,
     get_wallet_info,
 )
 from .interface import (
+    POOL_ROLLUP_RESOLUTIONS,
     add_checkpoint_infos,
+    add_pnl_snapshot,
     add_pool_config,
     add_pool_infos,
+    add_ticker_from_wallet_deltas,
     add_transactions,
     add_wallet_deltas,
     add_wallet_infos,
@@ -21,24 +41,38 @@ from .interface import (
     get_current_wallet_info,
     get_latest_block_number_from_analysis_table,
     get_latest_block_number_from_pool_info_table,
+    get_latest_pnl_snapshot_block,
+    get_latest_wallet_pnl,
     get_pool_analysis,
     get_pool_config,
     get_pool_info,
+    get_pool_rollup,
     get_ticker,
     get_transactions,
     get_wallet_deltas,
     get_wallet_info_history,
     get_wallet_pnl,
+    insert_rows_on_conflict_do_nothing,
+    is_latest_wallet_synced,
+    is_pool_rollup_synced,
+    rebuild_latest_wallet,
+    rebuild_pool_rollup,
+    update_pool_rollup,
+    upsert_latest_wallet,
 )
 from .schema import (
     CheckpointInfo,
     CurrentWallet,
     HyperdriveTransaction,
+    LatestWallet,
+    PnlSnapshot,
     PoolAnalysis,
     PoolConfig,
     PoolInfo,
+    PoolRollup,
     Ticker,
     WalletDelta,
     WalletInfoFromChain,
     WalletPNL,
 )
+from .wallet_positions import WalletPosition, WalletPositionEngine, WalletPositionMetrics
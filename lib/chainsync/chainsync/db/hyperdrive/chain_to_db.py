@@ -1,33 +1,41 @@
 """Functions for gathering data from the chain and adding it to the db"""
+from __future__ import annotations
+
+import json
 import logging
 import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Sequence
 
+from chainsync.db.base import Base, notify
 from eth_typing import BlockNumber
 from ethpy.base import fetch_contract_transactions_for_block
 from ethpy.hyperdrive import get_hyperdrive_checkpoint_info, get_hyperdrive_config, get_hyperdrive_pool_info
+from sqlalchemy import exc
 from sqlalchemy.orm import Session
 from web3 import Web3
 from web3.contract.contract import Contract
 
 from .convert_data import (
-    convert_checkpoint_info,
+    convert_checkpoint_info_rows,
     convert_hyperdrive_transactions_for_block,
+    convert_hyperdrive_transactions_for_block_range,
     convert_pool_config,
-    convert_pool_info,
+    convert_pool_info_rows,
     get_wallet_info,
 )
-from .interface import (
-    add_checkpoint_infos,
-    add_pool_config,
-    add_pool_infos,
-    add_transactions,
-    add_wallet_deltas,
-    add_wallet_infos,
-)
+from .interface import add_pool_config, insert_rows_on_conflict_do_nothing
+from .schema import CheckpointInfo, HyperdriveTransaction, PoolInfo, WalletDelta, WalletInfoFromChain
+from .wallet_positions import WalletPositionEngine
 
 _RETRY_COUNT = 10
 _RETRY_SLEEP_SECONDS = 1
 
+# Notified with the committed block range every time blocks are written, see `parse_blocks_written`
+BLOCKS_WRITTEN_CHANNEL = "chainsync_blocks_written"
+
 
 def init_data_chain_to_db(
     hyperdrive_contract: Contract,
@@ -49,15 +57,73 @@ def init_data_chain_to_db(
     add_pool_config(convert_pool_config(pool_config_dict), session)
 
 
+@dataclass
+class HyperdriveBlockData:
+    """All of the data gathered from the chain for a single block, ready to be written to the db.
+
+    The pool info and checkpoint info are table rows, see `convert_pool_info_rows` and `convert_checkpoint_info_rows`.
+    """
+
+    block_number: BlockNumber
+    pool_info: dict[str, Any]
+    checkpoint_info: dict[str, Any]
+    transactions: list[HyperdriveTransaction]
+    wallet_deltas: list[WalletDelta]
+    wallet_infos: list[WalletInfoFromChain]
+
+
 def data_chain_to_db(
     web3: Web3,
     base_contract: Contract,
     hyperdrive_contract: Contract,
     block_number: BlockNumber,
     session: Session,
+    position_engine: WalletPositionEngine | None = None,
 ) -> None:
-    """Function to query and insert data to dashboard"""
-    # Query and add block_pool_info
+    """Function to query and insert data to dashboard
+
+    If `position_engine` is set, wallet info comes from the engine instead of querying every balance from the chain.
+    """
+    if position_engine is None:
+        block_data = fetch_block_data(web3, base_contract, hyperdrive_contract, block_number)
+    else:
+        block_data = fetch_block_data(web3, base_contract, hyperdrive_contract, block_number, query_wallet_info=False)
+        track_wallet_positions([block_data], position_engine)
+    write_block_data_to_db(block_data, session)
+
+
+def fetch_block_data(
+    web3: Web3,
+    base_contract: Contract,
+    hyperdrive_contract: Contract,
+    block_number: BlockNumber,
+    hyperdrive_transactions: tuple[list[HyperdriveTransaction], list[WalletDelta]] | None = None,
+    query_wallet_info: bool = True,
+) -> HyperdriveBlockData:
+    """Query all hyperdrive data for a block from the chain, without touching the db.
+
+    Arguments
+    ---------
+    web3: Web3
+        web3 provider object
+    base_contract: Contract
+        The deployed base contract instance
+    hyperdrive_contract: Contract
+        The deployed hyperdrive contract instance
+    block_number: BlockNumber
+        The block number to query
+    hyperdrive_transactions: tuple[list[HyperdriveTransaction], list[WalletDelta]] | None, optional
+        The transactions and wallet deltas of the block, if they were already fetched for a range of blocks;
+        otherwise they are fetched from the full block
+    query_wallet_info: bool, optional
+        If False, the wallet balances are not queried and `wallet_infos` is left empty, see `track_wallet_positions`
+
+    Returns
+    -------
+    HyperdriveBlockData
+        The data to be written to the db for the block
+    """
+    # Query block_pool_info
     pool_info_dict = None
     for _ in range(_RETRY_COUNT):
         try:
@@ -69,10 +135,9 @@ def data_chain_to_db(
             continue
     if pool_info_dict is None:
         raise ValueError("Error in getting pool info")
-    block_pool_info = convert_pool_info(pool_info_dict)
-    add_pool_infos([block_pool_info], session)
+    block_pool_info = convert_pool_info_rows([pool_info_dict])[0]
 
-    # Query and add block_checkpoint_info
+    # Query block_checkpoint_info
     checkpoint_info_dict = None
     for _ in range(_RETRY_COUNT):
         try:
@@ -84,47 +149,307 @@ def data_chain_to_db(
             continue
     if checkpoint_info_dict is None:
         raise ValueError("Error in getting checkpoint info")
-    block_checkpoint_info = convert_checkpoint_info(checkpoint_info_dict)
-    add_checkpoint_infos([block_checkpoint_info], session)
+    block_checkpoint_info = convert_checkpoint_info_rows([checkpoint_info_dict])[0]
 
-    # Query and add block_transactions and wallet deltas
+    # Query block_transactions and wallet deltas
     block_transactions = None
     wallet_deltas = None
-    for _ in range(_RETRY_COUNT):
-        try:
-            transactions = fetch_contract_transactions_for_block(web3, hyperdrive_contract, block_number)
-            (
-                block_transactions,
-                wallet_deltas,
-            ) = convert_hyperdrive_transactions_for_block(web3, hyperdrive_contract, transactions)
-            break
-        except ValueError:
-            logging.warning("Error in fetch_contract_transactions_for_block, retrying")
-            time.sleep(_RETRY_SLEEP_SECONDS)
-            continue
+    if hyperdrive_transactions is not None:
+        block_transactions, wallet_deltas = hyperdrive_transactions
+    else:
+        for _ in range(_RETRY_COUNT):
+            try:
+                transactions = fetch_contract_transactions_for_block(web3, hyperdrive_contract, block_number)
+                (
+                    block_transactions,
+                    wallet_deltas,
+                ) = convert_hyperdrive_transactions_for_block(web3, hyperdrive_contract, transactions)
+                break
+            except ValueError:
+                logging.warning("Error in fetch_contract_transactions_for_block, retrying")
+                time.sleep(_RETRY_SLEEP_SECONDS)
+                continue
     # This case only happens if fetch_contract_transactions throws an exception
     # e.g., the web3 call fails. fetch_contract_transactions_for_block will return
     # empty lists (which doesn't execute the if statement below) if there are no hyperdrive
     # transactions for the block
     if block_transactions is None or wallet_deltas is None:
         raise ValueError("Error in getting transactions")
-    add_transactions(block_transactions, session)
-    add_wallet_deltas(wallet_deltas, session)
 
-    # Query and add wallet info
-    # TODO put the wallet info query as an optional block,
-    # and check these wallet values with what we get from the deltas
-    wallet_info_for_transactions = None
+    # Query wallet info
+    wallet_info_for_transactions: list[WalletInfoFromChain] | None = []
+    if query_wallet_info:
+        wallet_info_for_transactions = None
+        for _ in range(_RETRY_COUNT):
+            try:
+                wallet_info_for_transactions = get_wallet_info(
+                    hyperdrive_contract, base_contract, block_number, block_transactions, block_pool_info["sharePrice"]
+                )
+                break
+            except ValueError:
+                logging.warning("Error in get_wallet_info, retrying")
+                time.sleep(_RETRY_SLEEP_SECONDS)
+                continue
+        if wallet_info_for_transactions is None:
+            raise ValueError("Error in getting wallet_info")
+    return HyperdriveBlockData(
+        block_number=block_number,
+        pool_info=block_pool_info,
+        checkpoint_info=block_checkpoint_info,
+        transactions=block_transactions,
+        wallet_deltas=wallet_deltas,
+        wallet_infos=wallet_info_for_transactions,
+    )
+
+
+def fetch_block_range_data(
+    web3: Web3,
+    base_contract: Contract,
+    hyperdrive_contract: Contract,
+    start_block: BlockNumber,
+    end_block: BlockNumber,
+    query_wallet_info: bool = True,
+) -> list[HyperdriveBlockData]:
+    """Query all hyperdrive data for a range of blocks from the chain, without touching the db.
+
+    The transactions for the whole range come from a single log query, see
+    `convert_hyperdrive_transactions_for_block_range`; the remaining data is queried per block.
+
+    Arguments
+    ---------
+    web3: Web3
+        web3 provider object
+    base_contract: Contract
+        The deployed base contract instance
+    hyperdrive_contract: Contract
+        The deployed hyperdrive contract instance
+    start_block: BlockNumber
+        The first block to query
+    end_block: BlockNumber
+        The last block to query, inclusive
+    query_wallet_info: bool, optional
+        If False, the wallet balances are not queried, see `fetch_block_data`
+
+    Returns
+    -------
+    list[HyperdriveBlockData]
+        The data to be written to the db for each block, in block order
+    """
+    range_transactions = None
     for _ in range(_RETRY_COUNT):
         try:
-            wallet_info_for_transactions = get_wallet_info(
-                hyperdrive_contract, base_contract, block_number, block_transactions, block_pool_info
+            range_transactions = convert_hyperdrive_transactions_for_block_range(
+                web3, hyperdrive_contract, start_block, end_block
             )
             break
         except ValueError:
-            logging.warning("Error in fetch_contract_transactions_for_block, retrying")
+            logging.warning("Error in convert_hyperdrive_transactions_for_block_range, retrying")
             time.sleep(_RETRY_SLEEP_SECONDS)
             continue
-    if wallet_info_for_transactions is None:
-        raise ValueError("Error in getting wallet_info")
-    add_wallet_infos(wallet_info_for_transactions, session)
+    if range_transactions is None:
+        raise ValueError("Error in getting transactions")
+    # Group the rows by block, so every block in the range gets an entry (possibly empty)
+    transactions_by_block: dict[int, tuple[list[HyperdriveTransaction], list[WalletDelta]]] = {
+        block_number: ([], []) for block_number in range(start_block, end_block + 1)
+    }
+    for transaction in range_transactions[0]:
+        transactions_by_block[transaction.blockNumber][0].append(transaction)
+    for wallet_delta in range_transactions[1]:
+        transactions_by_block[wallet_delta.blockNumber][1].append(wallet_delta)
+    return [
+        fetch_block_data(
+            web3,
+            base_contract,
+            hyperdrive_contract,
+            BlockNumber(block_number),
+            hyperdrive_transactions=block_transactions,
+            query_wallet_info=query_wallet_info,
+        )
+        for block_number, block_transactions in transactions_by_block.items()
+    ]
+
+
+def track_wallet_positions(blocks_data: Sequence[HyperdriveBlockData], position_engine: WalletPositionEngine) -> None:
+    """Fill in the wallet info of blocks from their wallet deltas, instead of querying the chain.
+
+    Arguments
+    ---------
+    blocks_data: Sequence[HyperdriveBlockData]
+        The data from `fetch_block_data` for consecutive blocks, in block order; their `wallet_infos` are replaced
+    position_engine: WalletPositionEngine
+        The engine holding the wallet balances as of the block before the first one
+    """
+    for block_data in blocks_data:
+        block_data.wallet_infos = position_engine.apply_block(
+            block_data.block_number, block_data.wallet_deltas, block_data.pool_info["sharePrice"]
+        )
+
+
+def write_block_data_to_db(block_data: HyperdriveBlockData, session: Session) -> None:
+    """Write the data for a block to the db in a single transaction.
+
+    Arguments
+    ---------
+    block_data: HyperdriveBlockData
+        The data from `fetch_block_data`
+    session: Session
+        The initialized session object
+    """
+    write_blocks_data_to_db([block_data], session)
+
+
+def write_blocks_data_to_db(blocks_data: Sequence[HyperdriveBlockData], session: Session) -> None:
+    """Write the data for many blocks to the db with one bulk insert per table and a single commit.
+
+    Rows that already exist (e.g., a block that is written twice) are skipped.
+    Since all blocks are committed atomically, the latest block in the pool info table is a high-water mark:
+    every block up to and including it has been fully written.
+    Listeners on `BLOCKS_WRITTEN_CHANNEL` are notified of the block range when the commit succeeds.
+
+    Arguments
+    ---------
+    blocks_data: Sequence[HyperdriveBlockData]
+        The data from `fetch_block_data` for each block, in block order
+    session: Session
+        The initialized session object
+    """
+    if len(blocks_data) == 0:
+        return
+    table_rows: list[tuple[type[Base], list]] = [
+        (CheckpointInfo, [block_data.checkpoint_info for block_data in blocks_data]),
+        (HyperdriveTransaction, [row for block_data in blocks_data for row in block_data.transactions]),
+        (WalletDelta, [row for block_data in blocks_data for row in block_data.wallet_deltas]),
+        (WalletInfoFromChain, [row for block_data in blocks_data for row in block_data.wallet_infos]),
+        (PoolInfo, [block_data.pool_info for block_data in blocks_data]),
+    ]
+    try:
+        for table, rows in table_rows:
+            insert_rows_on_conflict_do_nothing(table, rows, session)
+        notify(
+            session,
+            BLOCKS_WRITTEN_CHANNEL,
+            json.dumps({"start_block": blocks_data[0].block_number, "end_block": blocks_data[-1].block_number}),
+        )
+        session.commit()
+    except exc.DataError as err:
+        session.rollback()
+        logging.error(
+            "Error writing blocks %s to %s: %s", blocks_data[0].block_number, blocks_data[-1].block_number, err
+        )
+        raise err
+
+
+def parse_blocks_written(payload: str) -> tuple[int, int]:
+    """Parse a notification on `BLOCKS_WRITTEN_CHANNEL`.
+
+    Arguments
+    ---------
+    payload: str
+        The payload of the notification
+
+    Returns
+    -------
+    tuple[int, int]
+        The first and last block that were written, inclusive
+    """
+    block_range = json.loads(payload)
+    return int(block_range["start_block"]), int(block_range["end_block"])
+
+
+def backfill_chain_to_db(
+    web3: Web3,
+    base_contract: Contract,
+    hyperdrive_contract: Contract,
+    start_block: BlockNumber,
+    end_block: BlockNumber,
+    session: Session,
+    num_workers: int = 8,
+    chunk_size: int = 10,
+    position_engine: WalletPositionEngine | None = None,
+) -> None:
+    """Fetch a range of blocks concurrently and write them to the db in block order.
+
+    Blocks are split into chunks that are fetched by a bounded pool of worker threads (see `fetch_block_range_data`),
+    while the calling thread writes each block as soon as it and every block before it are available.
+    Each chunk is written with a single commit, and an interrupted backfill can be resumed from the pool info
+    high-water mark, see `write_blocks_data_to_db`.
+
+    Arguments
+    ---------
+    web3: Web3
+        web3 provider object
+    base_contract: Contract
+        The deployed base contract instance
+    hyperdrive_contract: Contract
+        The deployed hyperdrive contract instance
+    start_block: BlockNumber
+        The first block to write
+    end_block: BlockNumber
+        The last block to write, inclusive
+    session: Session
+        The initialized session object
+    num_workers: int, optional
+        The number of threads fetching blocks from the chain
+    chunk_size: int, optional
+        The number of consecutive blocks fetched by a worker at a time
+    position_engine: WalletPositionEngine | None, optional
+        If set, wallet info comes from the engine as blocks are written, instead of being queried by the workers
+    """
+    # pylint: disable=too-many-arguments
+
+    def _fetch_chunk(chunk_start: int, chunk_end: int) -> list[HyperdriveBlockData]:
+        return fetch_block_range_data(
+            web3,
+            base_contract,
+            hyperdrive_contract,
+            BlockNumber(chunk_start),
+            BlockNumber(chunk_end - 1),
+            query_wallet_info=position_engine is None,
+        )
+
+    # Bound the number of fetched chunks held in memory while waiting to be written
+    max_pending_chunks = 2 * num_workers
+    pending_chunks: deque[Future[list[HyperdriveBlockData]]] = deque()
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        try:
+            for chunk_start in range(start_block, end_block + 1, chunk_size):
+                chunk_end = min(chunk_start + chunk_size, end_block + 1)
+                pending_chunks.append(executor.submit(_fetch_chunk, chunk_start, chunk_end))
+                # Write chunks in block order once enough are in flight
+                while len(pending_chunks) >= max_pending_chunks:
+                    _write_chunk(pending_chunks.popleft().result(), end_block, session, position_engine)
+            while len(pending_chunks) > 0:
+                _write_chunk(pending_chunks.popleft().result(), end_block, session, position_engine)
+        except BaseException:
+            # Don't fetch the rest of the range if a chunk can't be fetched or written
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+
+def _write_chunk(
+    chunk: list[HyperdriveBlockData],
+    end_block: BlockNumber,
+    session: Session,
+    position_engine: WalletPositionEngine | None,
+) -> None:
+    """Write a fetched chunk of blocks to the db in a single transaction."""
+    if position_engine is not None:
+        track_wallet_positions(chunk, position_engine)
+    write_blocks_data_to_db(chunk, session)
+    if len(chunk) > 0:
+        logging.info("Backfilled through block %s of %s", chunk[-1].block_number, end_block)
+
+
+def remove_partial_blocks_from_db(after_block: int, session: Session) -> None:
+    """Remove data for blocks after the pool info high-water mark, left behind by an interrupted write.
+
+    Arguments
+    ---------
+    after_block: int
+        The latest block in the pool info table; data for any later block is removed
+    session: Session
+        The initialized session object
+    """
+    for table in [CheckpointInfo, HyperdriveTransaction, WalletDelta, WalletInfoFromChain]:
+        session.query(table).filter(table.blockNumber > after_block).delete()
+    session.commit()
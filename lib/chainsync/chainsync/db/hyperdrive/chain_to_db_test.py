@@ -0,0 +1,181 @@
+"""Tests for chain_to_db.py"""
+import time
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from chainsync.db.base import NotificationListener
+from eth_typing import BlockNumber
+
+from . import chain_to_db
+from .chain_to_db import (
+    BLOCKS_WRITTEN_CHANNEL,
+    HyperdriveBlockData,
+    backfill_chain_to_db,
+    fetch_block_range_data,
+    parse_blocks_written,
+    remove_partial_blocks_from_db,
+    write_block_data_to_db,
+    write_blocks_data_to_db,
+)
+from .interface import (
+    add_checkpoint_infos,
+    add_transactions,
+    get_all_wallet_info,
+    get_checkpoint_info,
+    get_latest_block_number_from_pool_info_table,
+    get_transactions,
+    get_wallet_deltas,
+)
+from .schema import CheckpointInfo, HyperdriveTransaction, WalletDelta, WalletInfoFromChain
+
+
+def _fake_block_data(block_number: int) -> HyperdriveBlockData:
+    """Block data with one transaction, as if fetched from the chain."""
+    timestamp = datetime.fromtimestamp(1000 + block_number)
+    return HyperdriveBlockData(
+        block_number=BlockNumber(block_number),
+        pool_info={"blockNumber": block_number, "timestamp": timestamp, "sharePrice": Decimal(1)},
+        checkpoint_info={"blockNumber": block_number, "timestamp": timestamp},
+        transactions=[
+            HyperdriveTransaction(blockNumber=block_number, transactionHash=f"0x{block_number}", event_value=Decimal(1))
+        ],
+        wallet_deltas=[
+            WalletDelta(
+                transactionHash=f"0x{block_number}", blockNumber=block_number, walletAddress="0x1", tokenType="BASE"
+            )
+        ],
+        # A wallet with two transactions in a block gets its balances listed twice
+        wallet_infos=[
+            WalletInfoFromChain(blockNumber=block_number, walletAddress="0x1", tokenType="BASE") for _ in range(2)
+        ],
+    )
+
+
+def _no_range_transactions(web3, hyperdrive_contract, start_block, end_block):
+    """A block range without any hyperdrive transactions."""
+    return [], []
+
+
+# These tests are using fixtures defined in conftest.py
+class TestBackfillChainToDb:
+    """Testing the concurrent backfill of block data"""
+
+    def test_backfill_writes_every_block_in_order(self, db_session, monkeypatch):
+        """Blocks fetched out of order are written in block order, without gaps."""
+
+        def fake_fetch_block_data(
+            web3, base_contract, hyperdrive_contract, block_number, hyperdrive_transactions=None, query_wallet_info=True
+        ):
+            # Later blocks finish fetching first
+            time.sleep(0.001 * (40 - block_number))
+            return _fake_block_data(block_number)
+
+        written_blocks = []
+        original_write = chain_to_db.write_blocks_data_to_db
+
+        def recording_write(blocks_data, session):
+            written_blocks.extend(block_data.block_number for block_data in blocks_data)
+            original_write(blocks_data, session)
+
+        monkeypatch.setattr(chain_to_db, "convert_hyperdrive_transactions_for_block_range", _no_range_transactions)
+        monkeypatch.setattr(chain_to_db, "fetch_block_data", fake_fetch_block_data)
+        monkeypatch.setattr(chain_to_db, "write_blocks_data_to_db", recording_write)
+        backfill_chain_to_db(
+            None, None, None, BlockNumber(5), BlockNumber(37), db_session, num_workers=4, chunk_size=3  # type: ignore
+        )
+        assert written_blocks == list(range(5, 38))
+        assert get_latest_block_number_from_pool_info_table(db_session) == 37
+        assert len(get_transactions(db_session)) == 33
+
+    def test_backfill_stops_on_error(self, db_session, monkeypatch):
+        """A failed fetch raises, and the high-water mark stays below the failed block."""
+
+        def failing_fetch_block_data(
+            web3, base_contract, hyperdrive_contract, block_number, hyperdrive_transactions=None, query_wallet_info=True
+        ):
+            if block_number == 12:
+                raise ValueError("Error in getting pool info")
+            return _fake_block_data(block_number)
+
+        monkeypatch.setattr(chain_to_db, "convert_hyperdrive_transactions_for_block_range", _no_range_transactions)
+        monkeypatch.setattr(chain_to_db, "fetch_block_data", failing_fetch_block_data)
+        with pytest.raises(ValueError):
+            backfill_chain_to_db(
+                None,  # type: ignore
+                None,  # type: ignore
+                None,  # type: ignore
+                BlockNumber(1),
+                BlockNumber(30),
+                db_session,
+                num_workers=2,
+                chunk_size=2,
+            )
+        assert get_latest_block_number_from_pool_info_table(db_session) < 12
+
+    def test_remove_partial_blocks(self, db_session):
+        """Rows past the pool info high-water mark are removed."""
+        add_checkpoint_infos(
+            [
+                CheckpointInfo(**_fake_block_data(1).checkpoint_info),
+                CheckpointInfo(**_fake_block_data(2).checkpoint_info),
+            ],
+            db_session,
+        )
+        add_transactions(_fake_block_data(1).transactions + _fake_block_data(2).transactions, db_session)
+        remove_partial_blocks_from_db(1, db_session)
+        assert get_checkpoint_info(db_session)["blockNumber"].tolist() == [1]
+        assert get_transactions(db_session)["blockNumber"].tolist() == [1]
+
+    def test_write_blocks_skips_existing_rows(self, db_session):
+        """Blocks are written in one transaction, and rewriting a block does not duplicate or fail."""
+        write_blocks_data_to_db([_fake_block_data(1), _fake_block_data(2)], db_session)
+        write_block_data_to_db(_fake_block_data(2), db_session)
+        assert get_latest_block_number_from_pool_info_table(db_session) == 2
+        assert get_transactions(db_session)["blockNumber"].tolist() == [1, 2]
+        assert get_checkpoint_info(db_session)["blockNumber"].tolist() == [1, 2]
+        assert get_wallet_deltas(db_session)["blockNumber"].tolist() == [1, 2]
+        assert get_all_wallet_info(db_session)["blockNumber"].tolist() == [1, 2]
+
+    def test_write_blocks_notifies_block_range(self, db_session):
+        """Listeners are told which blocks were committed."""
+        listener = NotificationListener(db_session.get_bind(), BLOCKS_WRITTEN_CHANNEL)
+        try:
+            write_blocks_data_to_db([_fake_block_data(1), _fake_block_data(2)], db_session)
+            write_block_data_to_db(_fake_block_data(3), db_session)
+            assert [parse_blocks_written(payload) for payload in listener.wait(timeout=5)] == [(1, 2), (3, 3)]
+        finally:
+            listener.close()
+
+
+class TestFetchBlockRangeData:
+    """Testing fetching a range of blocks with a single transaction query"""
+
+    def test_range_transactions_are_grouped_by_block(self, monkeypatch):
+        """Each block gets the transactions and deltas of the range query that belong to it."""
+        range_queries = []
+
+        def fake_range_transactions(web3, hyperdrive_contract, start_block, end_block):
+            range_queries.append((start_block, end_block))
+            transactions = [
+                HyperdriveTransaction(blockNumber=block_number, transactionHash=f"0x{block_number}")
+                for block_number in [4, 6, 6]
+            ]
+            wallet_deltas = [WalletDelta(blockNumber=6, transactionHash="0x6", walletAddress="0xa", delta=Decimal(1))]
+            return transactions, wallet_deltas
+
+        def fake_fetch_block_data(
+            web3, base_contract, hyperdrive_contract, block_number, hyperdrive_transactions=None, query_wallet_info=True
+        ):
+            assert hyperdrive_transactions is not None
+            block_data = _fake_block_data(block_number)
+            block_data.transactions, block_data.wallet_deltas = hyperdrive_transactions
+            return block_data
+
+        monkeypatch.setattr(chain_to_db, "convert_hyperdrive_transactions_for_block_range", fake_range_transactions)
+        monkeypatch.setattr(chain_to_db, "fetch_block_data", fake_fetch_block_data)
+        block_data = fetch_block_range_data(None, None, None, BlockNumber(3), BlockNumber(6))  # type: ignore
+        assert range_queries == [(3, 6)]
+        assert [data.block_number for data in block_data] == [3, 4, 5, 6]
+        assert [len(data.transactions) for data in block_data] == [0, 1, 0, 2]
+        assert [len(data.wallet_deltas) for data in block_data] == [0, 0, 0, 1]
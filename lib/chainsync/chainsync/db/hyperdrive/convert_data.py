@@ -6,15 +6,22 @@ import logging
 from decimal import Decimal
 from typing import Any
 
+from chainsync.db.base import Base
 from eth_typing import BlockNumber
-from ethpy.base import get_token_balance, get_transaction_logs
+from ethpy.base import (
+    fetch_contract_transactions_for_block_range,
+    get_erc20_balances,
+    get_transaction_logs,
+    get_wallet_snapshot,
+)
 from ethpy.hyperdrive import AssetIdPrefix, decode_asset_id, encode_asset_id
 from fixedpointmath import FixedPoint
 from hexbytes import HexBytes
 from web3 import Web3
 from web3.contract.contract import Contract
-from web3.types import TxData
+from web3.types import TxData, TxReceipt
 
+from .fixed_numeric import unscale_to_decimal
 from .schema import CheckpointInfo, HyperdriveTransaction, PoolConfig, PoolInfo, WalletDelta, WalletInfoFromChain
 
 
@@ -23,6 +30,8 @@ def convert_hyperdrive_transactions_for_block(
 ) -> tuple[list[HyperdriveTransaction], list[WalletDelta]]:
     """Fetch transactions related to the contract.
 
+    Unlike `convert_hyperdrive_transactions_for_block_range`, reverted transactions are included.
+
     Arguments
     ---------
     web3: Web3
@@ -38,29 +47,119 @@ def convert_hyperdrive_transactions_for_block(
         A list of HyperdriveTransaction objects ready to be inserted into Postgres, and
         a list of wallet delta objects ready to be inserted into Postgres
     """
+    transactions_and_receipts: list[tuple[TxData, TxReceipt]] = []
+    for transaction in transactions:
+        try:
+            hyperdrive_contract.decode_function_input(transaction["input"])
+        except ValueError:  # if the input is not meant for the contract, ignore it
+            continue
+        tx_hash = transaction.get("hash") or HexBytes("")
+        transactions_and_receipts.append((transaction, web3.eth.get_transaction_receipt(tx_hash)))
+    return convert_hyperdrive_transactions_with_receipts(hyperdrive_contract, transactions_and_receipts)
+
+
+def convert_hyperdrive_transactions_for_block_range(
+    web3: Web3, hyperdrive_contract: Contract, start_block: BlockNumber, end_block: BlockNumber
+) -> tuple[list[HyperdriveTransaction], list[WalletDelta]]:
+    """Fetch and convert the hyperdrive transactions for a range of blocks.
+
+    This derives the same rows as `convert_hyperdrive_transactions_for_block` from one `eth_getLogs` query
+    over the range and batched receipts of the matching transactions, instead of full blocks.
+    Reverted transactions emit no logs, so unlike in the per-block version they are not included.
+
+    Arguments
+    ---------
+    web3: Web3
+        web3 provider object
+    hyperdrive_contract: Contract
+        The contract to query the transactions from
+    start_block: BlockNumber
+        The first block of the range
+    end_block: BlockNumber
+        The last block of the range, inclusive
+
+    Returns
+    -------
+    tuple[list[HyperdriveTransaction], list[WalletDelta]]
+        A list of HyperdriveTransaction objects ready to be inserted into Postgres, and
+        a list of wallet delta objects ready to be inserted into Postgres, ordered by block
+    """
+    return convert_hyperdrive_transactions_with_receipts(
+        hyperdrive_contract,
+        fetch_contract_transactions_for_block_range(web3, hyperdrive_contract, start_block, end_block),
+    )
+
+
+def convert_hyperdrive_transactions_with_receipts(
+    hyperdrive_contract: Contract, transactions_and_receipts: list[tuple[TxData, TxReceipt]]
+) -> tuple[list[HyperdriveTransaction], list[WalletDelta]]:
+    """Convert already fetched hyperdrive transactions and their receipts, without any chain queries.
+
+    Arguments
+    ---------
+    hyperdrive_contract: Contract
+        The contract the transactions were sent to
+    transactions_and_receipts: list[tuple[TxData, TxReceipt]]
+        The (transaction, receipt) pairs, e.g. from `fetch_contract_transactions_for_block_range`
 
+    Returns
+    -------
+    tuple[list[HyperdriveTransaction], list[WalletDelta]]
+        A list of HyperdriveTransaction objects ready to be inserted into Postgres, and
+        a list of wallet delta objects ready to be inserted into Postgres
+    """
     out_transactions: list[HyperdriveTransaction] = []
     out_wallet_deltas: list[WalletDelta] = []
-    for transaction in transactions:
-        transaction_dict = dict(transaction)
-        # Convert the HexBytes fields to their hex representation
-        tx_hash = transaction.get("hash") or HexBytes("")
-        transaction_dict["hash"] = tx_hash.hex()
-        # Decode the transaction input
+    for transaction, tx_receipt in transactions_and_receipts:
         try:
-            method, params = hyperdrive_contract.decode_function_input(transaction["input"])
-            transaction_dict["input"] = {"method": method.fn_name, "params": params}
+            hyperdrive_transaction, wallet_deltas = _convert_hyperdrive_transaction(
+                hyperdrive_contract, transaction, tx_receipt
+            )
         except ValueError:  # if the input is not meant for the contract, ignore it
             continue
-        tx_receipt = web3.eth.get_transaction_receipt(tx_hash)
-        logs = get_transaction_logs(hyperdrive_contract, tx_receipt)
-        receipt: dict[str, Any] = _convert_object_hexbytes_to_strings(tx_receipt)  # type: ignore
-        out_transactions.append(_build_hyperdrive_transaction_object(transaction_dict, logs, receipt))
-        # Build wallet deltas based on transaction logs
-        out_wallet_deltas.extend(_build_wallet_deltas(logs, transaction_dict["hash"], transaction_dict["blockNumber"]))
+        out_transactions.append(hyperdrive_transaction)
+        out_wallet_deltas.extend(wallet_deltas)
     return out_transactions, out_wallet_deltas
 
 
+def _convert_hyperdrive_transaction(
+    hyperdrive_contract: Contract, transaction: TxData, tx_receipt: TxReceipt
+) -> tuple[HyperdriveTransaction, list[WalletDelta]]:
+    """Build the db objects for a single hyperdrive transaction from the transaction and its receipt.
+
+    Arguments
+    ---------
+    hyperdrive_contract: Contract
+        The contract the transaction was sent to
+    transaction: TxData
+        The transaction
+    tx_receipt: TxReceipt
+        The receipt of the transaction
+
+    Returns
+    -------
+    tuple[HyperdriveTransaction, list[WalletDelta]]
+        The transaction object and the wallet deltas from its logs
+
+    Raises
+    ------
+    ValueError
+        If the transaction input can't be decoded for the hyperdrive contract
+    """
+    transaction_dict = dict(transaction)
+    # Convert the HexBytes fields to their hex representation
+    tx_hash = transaction.get("hash") or HexBytes("")
+    transaction_dict["hash"] = tx_hash.hex()
+    # Decode the transaction input
+    method, params = hyperdrive_contract.decode_function_input(transaction["input"])
+    transaction_dict["input"] = {"method": method.fn_name, "params": params}
+    logs = get_transaction_logs(hyperdrive_contract, tx_receipt)
+    receipt: dict[str, Any] = _convert_object_hexbytes_to_strings(tx_receipt)  # type: ignore
+    # Build wallet deltas based on transaction logs
+    wallet_deltas = _build_wallet_deltas(logs, transaction_dict["hash"], transaction_dict["blockNumber"])
+    return _build_hyperdrive_transaction_object(transaction_dict, logs, receipt), wallet_deltas
+
+
 def _convert_object_hexbytes_to_strings(obj: Any) -> Any:
     """Recursively converts all HexBytes in an object to strings.
 
@@ -102,20 +201,24 @@ def _convert_scaled_value_to_decimal(input_val: int | None) -> Decimal | None:
         The unscaled Decimal value
     """
     if input_val is not None:
-        # TODO add this cast within fixedpoint
-        fp_val = FixedPoint(scaled_value=input_val)
-        str_val = str(fp_val)
-        return Decimal(str_val)
+        return unscale_to_decimal(input_val)
     return None
 
 
+def _convert_fixedpoint_to_decimal(value: FixedPoint) -> Decimal:
+    """Converts a FixedPoint to the equivalent Decimal without formatting it as a string."""
+    if not value.isfinite():  # nan and inf don't have a scaled value
+        return Decimal(str(value))
+    return unscale_to_decimal(value.scaled_value, value.decimal_places)
+
+
 # TODO move this function to hyperdrive_interface and return a list of dictionaries
 def get_wallet_info(
     hyperdrive_contract: Contract,
     base_contract: Contract,
     block_number: BlockNumber,
     transactions: list[HyperdriveTransaction],
-    pool_info: PoolInfo,
+    share_price: Decimal | None,
 ) -> list[WalletInfoFromChain]:
     """Retrieve wallet information at a given block given a transaction.
 
@@ -133,8 +236,8 @@ def get_wallet_info(
         The block number to query
     transactions : list[HyperdriveTransaction]
         The list of transactions to get events from
-    pool_info : PoolInfo
-        The associated pool info, used to extract share price
+    share_price : Decimal | None
+        The share price from the block's pool info, stored with SHORT positions
 
     Returns
     -------
@@ -142,14 +245,35 @@ def get_wallet_info(
         The list of WalletInfo objects ready to be inserted into postgres
     """
     # pylint: disable=too-many-locals
+    # LP and withdrawal tokens always have 0 maturity
+    lp_token_id = encode_asset_id(AssetIdPrefix.LP.value, timestamp=0)
+    withdrawal_token_id = encode_asset_id(AssetIdPrefix.WITHDRAWAL_SHARE.value, timestamp=0)
+    # Gather every wallet and token id touched by the transactions, so all balances are fetched at once
+    wallet_addrs: list[str] = []
+    token_ids: list[int] = [lp_token_id, withdrawal_token_id]
+    for transaction in transactions:
+        if transaction.event_operator is None:
+            continue
+        if transaction.event_operator not in wallet_addrs:
+            wallet_addrs.append(transaction.event_operator)
+        if (transaction.event_id is not None) and (transaction.event_prefix is not None):
+            if AssetIdPrefix(transaction.event_prefix).name in ("LONG", "SHORT"):
+                if int(transaction.event_id) not in token_ids:
+                    token_ids.append(int(transaction.event_id))
+    if len(wallet_addrs) == 0:
+        return []
+    base_balances = get_erc20_balances(base_contract, wallet_addrs, block_number)
+    token_balances = get_wallet_snapshot(hyperdrive_contract, wallet_addrs, token_ids, block_number)
+
     out_wallet_info = []
     for transaction in transactions:
         wallet_addr = transaction.event_operator
         if wallet_addr is None:
             continue
+        wallet_idx = wallet_addrs.index(wallet_addr)
 
-        # Query and add base tokens to walletinfo
-        num_base_token = get_token_balance(base_contract, wallet_addr, block_number, None)
+        # Add base tokens to walletinfo
+        num_base_token = base_balances[wallet_idx]
         if num_base_token is not None:
             out_wallet_info.append(
                 WalletInfoFromChain(
@@ -161,11 +285,8 @@ def get_wallet_info(
                 )
             )
 
-        # Query and add LP tokens to wallet info
-        lp_token_prefix = AssetIdPrefix.LP.value
-        # LP tokens always have 0 maturity
-        lp_token_id = encode_asset_id(lp_token_prefix, timestamp=0)
-        num_lp_token = get_token_balance(hyperdrive_contract, wallet_addr, block_number, lp_token_id)
+        # Add LP tokens to wallet info
+        num_lp_token = token_balances[wallet_idx, token_ids.index(lp_token_id)]
         if num_lp_token is not None:
             out_wallet_info.append(
                 WalletInfoFromChain(
@@ -179,11 +300,8 @@ def get_wallet_info(
                 )
             )
 
-        # Query and add withdraw tokens to wallet info
-        withdrawal_token_prefix = AssetIdPrefix.WITHDRAWAL_SHARE.value
-        # Withdrawal tokens always have 0 maturity
-        withdrawal_token_id = encode_asset_id(withdrawal_token_prefix, timestamp=0)
-        num_withdrawal_token = get_token_balance(hyperdrive_contract, wallet_addr, block_number, withdrawal_token_id)
+        # Add withdraw tokens to wallet info
+        num_withdrawal_token = token_balances[wallet_idx, token_ids.index(withdrawal_token_id)]
         if num_withdrawal_token is not None:
             out_wallet_info.append(
                 WalletInfoFromChain(
@@ -197,7 +315,7 @@ def get_wallet_info(
                 )
             )
 
-        # Query and add shorts and/or longs if they exist in transaction
+        # Add shorts and/or longs if they exist in transaction
         token_id = transaction.event_id
         token_prefix = transaction.event_prefix
         token_maturity_time = transaction.event_maturity_time
@@ -207,11 +325,11 @@ def get_wallet_info(
                 token_type = base_token_type + "-" + str(token_maturity_time)
                 # Check here if token is short
                 # If so, add share price from pool info to data
-                share_price = None
+                token_share_price = None
                 if (base_token_type) == "SHORT":
-                    share_price = pool_info.sharePrice
+                    token_share_price = share_price
 
-                num_custom_token = get_token_balance(hyperdrive_contract, wallet_addr, block_number, int(token_id))
+                num_custom_token = token_balances[wallet_idx, token_ids.index(int(token_id))]
                 if num_custom_token is not None:
                     out_wallet_info.append(
                         WalletInfoFromChain(
@@ -221,7 +339,7 @@ def get_wallet_info(
                             tokenType=token_type,
                             tokenValue=_convert_scaled_value_to_decimal(num_custom_token),
                             maturityTime=token_maturity_time,
-                            sharePrice=share_price,
+                            sharePrice=token_share_price,
                         )
                     )
     return out_wallet_info
@@ -240,18 +358,7 @@ def convert_pool_config(pool_config_dict: dict[str, Any]) -> PoolConfig:
     PoolConfig
         The db object for pool config
     """
-    args_dict = {}
-    for key in PoolConfig.__annotations__:
-        if key not in pool_config_dict:
-            logging.warning("Missing %s from pool config", key)
-            value = None
-        else:
-            value = pool_config_dict[key]
-            if isinstance(value, FixedPoint):
-                value = Decimal(str(value))
-        args_dict[key] = value
-    pool_config = PoolConfig(**args_dict)
-    return pool_config
+    return PoolConfig(**_convert_to_table_rows(PoolConfig, [pool_config_dict], "pool config")[0])
 
 
 def convert_pool_info(pool_info_dict: dict[str, Any]) -> PoolInfo:
@@ -267,18 +374,25 @@ def convert_pool_info(pool_info_dict: dict[str, Any]) -> PoolInfo:
     PoolInfo
         The db object for pool info
     """
-    args_dict = {}
-    for key in PoolInfo.__annotations__:
-        if key not in pool_info_dict:
-            logging.warning("Missing %s from pool info", key)
-            value = None
-        else:
-            value = pool_info_dict[key]
-            if isinstance(value, FixedPoint):
-                value = Decimal(str(value))
-        args_dict[key] = value
-    block_pool_info = PoolInfo(**args_dict)
-    return block_pool_info
+    return PoolInfo(**convert_pool_info_rows([pool_info_dict])[0])
+
+
+def convert_pool_info_rows(pool_info_dicts: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Converts many pool_info_dicts to rows for the pool info table, without building db objects.
+
+    The rows can be written directly with `insert_rows_on_conflict_do_nothing`.
+
+    Arguments
+    ---------
+    pool_info_dicts: list[dict[str, Any]]
+        The dictionaries returned from hyperdrive_instance.get_hyperdrive_pool_info
+
+    Returns
+    -------
+    list[dict[str, Any]]
+        One dictionary per pool info, mapping the pool info column names to postgres compatible values
+    """
+    return _convert_to_table_rows(PoolInfo, pool_info_dicts, "pool info")
 
 
 def convert_checkpoint_info(checkpoint_info_dict: dict[str, Any]) -> CheckpointInfo:
@@ -294,19 +408,44 @@ def convert_checkpoint_info(checkpoint_info_dict: dict[str, Any]) -> CheckpointI
     CheckpointInfo
         The db object for checkpoints
     """
-    args_dict = {}
-    for key in CheckpointInfo.__annotations__:
-        # Keys must match
-        if key not in checkpoint_info_dict:
-            logging.warning("Missing %s from checkpoint info", key)
-            value = None
-        else:
-            value = checkpoint_info_dict[key]
-            if isinstance(value, FixedPoint):
-                value = Decimal(str(value))
-        args_dict[key] = value
-    block_checkpoint_info = CheckpointInfo(**args_dict)
-    return block_checkpoint_info
+    return CheckpointInfo(**convert_checkpoint_info_rows([checkpoint_info_dict])[0])
+
+
+def convert_checkpoint_info_rows(checkpoint_info_dicts: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Converts many checkpoint_info_dicts to rows for the checkpoint info table, without building db objects.
+
+    The rows can be written directly with `insert_rows_on_conflict_do_nothing`.
+
+    Arguments
+    ---------
+    checkpoint_info_dicts: list[dict[str, Any]]
+        The dictionaries returned from hyperdrive_instance.get_hyperdrive_checkpoint_info
+
+    Returns
+    -------
+    list[dict[str, Any]]
+        One dictionary per checkpoint, mapping the checkpoint info column names to postgres compatible values
+    """
+    return _convert_to_table_rows(CheckpointInfo, checkpoint_info_dicts, "checkpoint info")
+
+
+def _convert_to_table_rows(table: type[Base], input_dicts: list[dict[str, Any]], name: str) -> list[dict[str, Any]]:
+    """Converts dictionaries from hyperdrive_interface to rows of a table, one column at a time.
+
+    Keys must match the table's columns; missing keys are set to None, and FixedPoint values become Decimals.
+    """
+    columns: dict[str, list[Any]] = {}
+    for key in table.__annotations__:
+        column = [input_dict.get(key, None) for input_dict in input_dicts]
+        if any(key not in input_dict for input_dict in input_dicts):
+            logging.warning("Missing %s from %s", key, name)
+        # Skip the per value conversion for columns without any FixedPoints, e.g. block numbers and timestamps
+        if any(isinstance(value, FixedPoint) for value in column):
+            column = [
+                _convert_fixedpoint_to_decimal(value) if isinstance(value, FixedPoint) else value for value in column
+            ]
+        columns[key] = column
+    return [dict(zip(columns, row_values)) for row_values in zip(*columns.values())]
 
 
 # TODO this function likely should be decoupled from postgres and added into
@@ -0,0 +1,158 @@
+"""Tests for convert_data.py"""
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+from eth_typing import BlockNumber
+from ethpy.base import fetch_contract_transactions_for_block
+from fixedpointmath import FixedPoint
+from hexbytes import HexBytes
+from web3._utils.method_formatters import PYTHONIC_RESULT_FORMATTERS
+from web3._utils.rpc_abi import RPC
+
+from .convert_data import (
+    _convert_fixedpoint_to_decimal,
+    _convert_scaled_value_to_decimal,
+    convert_checkpoint_info,
+    convert_checkpoint_info_rows,
+    convert_hyperdrive_transactions_for_block,
+    convert_hyperdrive_transactions_for_block_range,
+)
+
+HYPERDRIVE_ADDRESS = "0x" + "11" * 20
+
+
+class TestDecimalConversion:
+    """Testing conversion of scaled values to Decimals"""
+
+    def test_scaled_value_matches_string_conversion(self):
+        """The direct conversion is exact and matches going through the FixedPoint string."""
+        for scaled_value in [0, 1, -1, 10**18, 123456789 * 10**15 + 7, -(2**255), 2**256 - 1]:
+            expected = Decimal(str(FixedPoint(scaled_value=scaled_value)))
+            assert _convert_scaled_value_to_decimal(scaled_value) == expected
+            assert _convert_fixedpoint_to_decimal(FixedPoint(scaled_value=scaled_value)) == expected
+        assert _convert_scaled_value_to_decimal(None) is None
+
+    def test_special_values(self):
+        """FixedPoint nan is converted to a Decimal nan."""
+        assert _convert_fixedpoint_to_decimal(FixedPoint("nan")).is_nan()
+
+
+class TestRowConversion:
+    """Testing conversion of hyperdrive interface dictionaries to table rows"""
+
+    def test_checkpoint_info_rows(self):
+        """Rows hold the table's columns with Decimals in place of FixedPoints, and missing keys as None."""
+        timestamp = datetime.fromtimestamp(1000)
+        checkpoint_info_dicts = [
+            {
+                "blockNumber": block_number,
+                "timestamp": timestamp,
+                "sharePrice": FixedPoint(scaled_value=block_number * 10**17),
+                "longSharePrice": FixedPoint("1.5"),
+            }
+            for block_number in [1, 2]
+        ]
+        rows = convert_checkpoint_info_rows(checkpoint_info_dicts)
+        assert rows == [
+            {
+                "blockNumber": block_number,
+                "timestamp": timestamp,
+                "sharePrice": Decimal(block_number) / 10,
+                "longSharePrice": Decimal("1.5"),
+                "shortBaseVolume": None,
+            }
+            for block_number in [1, 2]
+        ]
+        checkpoint_info = convert_checkpoint_info(checkpoint_info_dicts[1])
+        assert checkpoint_info.blockNumber == 2
+        assert checkpoint_info.sharePrice == Decimal("0.2")
+        assert convert_checkpoint_info_rows([]) == []
+
+
+class _FakeChain:
+    """A block with a successful and a reverted hyperdrive transaction, served through both fetch paths"""
+
+    def __init__(self, block_number):
+        self.block_number = block_number
+        self.raw_transactions = {}
+        self.raw_receipts = {}
+        for transaction_index, status in enumerate([1, 0]):
+            tx_hash = "0x" + f"{transaction_index + 1:02x}" * 32
+            self.raw_transactions[tx_hash] = {
+                "hash": tx_hash,
+                "blockNumber": hex(block_number),
+                "transactionIndex": hex(transaction_index),
+                "nonce": hex(transaction_index),
+                "from": "0x" + "22" * 20,
+                "to": HYPERDRIVE_ADDRESS,
+                "input": "0x",
+                "value": "0x0",
+            }
+            self.raw_receipts[tx_hash] = {
+                "transactionHash": tx_hash,
+                "blockNumber": hex(block_number),
+                "transactionIndex": hex(transaction_index),
+                "status": hex(status),
+                "gasUsed": hex(21000),
+                "logs": [],
+            }
+        self.eth = SimpleNamespace(
+            get_logs=self.get_logs, get_block=self.get_block, get_transaction_receipt=self.get_transaction_receipt
+        )
+        self.provider = SimpleNamespace(make_batch_request=self.make_batch_request)
+
+    def get_logs(self, _):
+        # Only the successful transaction emits logs
+        return [
+            {
+                "transactionHash": HexBytes("0x" + "01" * 32),
+                "blockNumber": self.block_number,
+                "transactionIndex": 0,
+                "logIndex": 0,
+            }
+        ]
+
+    def get_block(self, _, full_transactions):
+        assert full_transactions
+        format_transaction = PYTHONIC_RESULT_FORMATTERS[RPC.eth_getTransactionByHash]
+        return {
+            "number": self.block_number,
+            "transactions": [format_transaction(transaction) for transaction in self.raw_transactions.values()],
+        }
+
+    def get_transaction_receipt(self, tx_hash):
+        return PYTHONIC_RESULT_FORMATTERS[RPC.eth_getTransactionReceipt](self.raw_receipts[tx_hash.hex()])
+
+    def make_batch_request(self, requests):
+        raw_results = {
+            "eth_getTransactionByHash": self.raw_transactions,
+            "eth_getTransactionReceipt": self.raw_receipts,
+        }
+        return [{"jsonrpc": "2.0", "id": 0, "result": raw_results[method][params[0]]} for method, params in requests]
+
+
+class TestTransactionConversion:
+    """Testing that the per-block and block range paths build the same rows"""
+
+    def test_reverted_transactions(self):
+        """The per-block path keeps reverted transactions, and both paths agree on the successful ones."""
+        chain = _FakeChain(7)
+        hyperdrive_contract = SimpleNamespace(
+            address=HYPERDRIVE_ADDRESS,
+            decode_function_input=lambda _: (SimpleNamespace(fn_name="openLong"), {"_baseAmount": 10**18}),
+        )
+        block_transactions, block_wallet_deltas = convert_hyperdrive_transactions_for_block(
+            chain,  # type: ignore
+            hyperdrive_contract,  # type: ignore
+            fetch_contract_transactions_for_block(chain, hyperdrive_contract, BlockNumber(7)),  # type: ignore
+        )
+        range_transactions, range_wallet_deltas = convert_hyperdrive_transactions_for_block_range(
+            chain, hyperdrive_contract, BlockNumber(7), BlockNumber(7)  # type: ignore
+        )
+        assert [transaction.transactionHash for transaction in block_transactions] == [
+            "0x" + "01" * 32,
+            "0x" + "02" * 32,
+        ]
+        assert block_transactions[:1] == range_transactions
+        assert block_wallet_deltas == range_wallet_deltas
@@ -0,0 +1,125 @@
+"""Column types for 18 decimal fixed point values, and exact conversions between Decimals and scaled integers."""
+from __future__ import annotations
+
+import os
+from decimal import Decimal, localcontext
+
+from sqlalchemy import BigInteger, Dialect, Numeric, TypeDecorator
+
+# The number of decimals in the scaled integers returned by the hyperdrive contract
+FIXED_POINT_DECIMALS = 18
+
+# Set to "compact" when creating a database to store values in bounded or fixed width columns.
+# Existing columns are not altered, so this has to stay the same for the lifetime of the database.
+NUMERIC_STORAGE_ENV = "CHAINSYNC_NUMERIC_STORAGE"
+
+
+def unscale_to_decimal(scaled_value: int, decimal_places: int = FIXED_POINT_DECIMALS) -> Decimal:
+    """Shift the exponent of the integer's Decimal representation.
+
+    Unlike Decimal arithmetic (e.g. `scaleb`), this is exact regardless of the decimal context precision.
+
+    Arguments
+    ---------
+    scaled_value: int
+        The scaled integer
+    decimal_places: int, optional
+        The number of decimals the integer is scaled by
+
+    Returns
+    -------
+    Decimal
+        The unscaled value
+    """
+    sign, digits, exponent = Decimal(scaled_value).as_tuple()
+    return Decimal((sign, digits, int(exponent) - decimal_places))
+
+
+def scale_decimal(value: Decimal, decimal_places: int = FIXED_POINT_DECIMALS) -> int:
+    """Convert a Decimal to the equivalent scaled integer, the inverse of `unscale_to_decimal`.
+
+    Arguments
+    ---------
+    value: Decimal
+        A finite value with at most `decimal_places` decimals
+    decimal_places: int, optional
+        The number of decimals to scale by
+
+    Returns
+    -------
+    int
+        The scaled integer
+    """
+    if not value.is_finite():
+        raise ValueError(f"{value=} does not have a scaled integer representation")
+    sign, digits, exponent = value.as_tuple()
+    shifted = Decimal((sign, digits, int(exponent) + decimal_places))
+    if shifted != shifted.to_integral_value():
+        raise ValueError(f"{value=} has more than {decimal_places} decimals")
+    # Decimal's int() is exact for integral values of any size
+    return int(shifted)
+
+
+class ScaledBigInteger(TypeDecorator):
+    """A Decimal stored as an int8 scaled by 1e18, for values whose magnitude is below ~9.2.
+
+    Reads and writes Decimals like `Numeric(scale=18)`, so readers and writers don't change,
+    but the column is fixed width and sums and comparisons in SQL run on integers.
+    Like `Numeric(scale=18)`, values with more decimals are rounded; nan and inf can't be stored and raise a ValueError.
+    """
+
+    # pylint: disable=too-many-ancestors,abstract-method
+
+    impl = BigInteger
+    cache_ok = True
+
+    @property
+    def python_type(self) -> type:
+        return Decimal
+
+    def process_bind_param(self, value: Decimal | float | None, dialect: Dialect) -> int | None:
+        if value is None:
+            return None
+        # Floats, e.g. from dataframes, are converted through their shortest repr like psycopg does
+        value = Decimal(str(value)) if isinstance(value, float) else Decimal(value)
+        if not value.is_finite():
+            raise ValueError(f"{value=} can't be stored as a scaled integer")
+        with localcontext() as context:
+            # Enough precision that rounding to an integer is the only rounding
+            context.prec = 100
+            return int(value.scaleb(FIXED_POINT_DECIMALS).to_integral_value())
+
+    def process_result_value(self, value: int | None, dialect: Dialect) -> Decimal | None:
+        if value is None:
+            return None
+        return unscale_to_decimal(value)
+
+
+def build_fixed_numeric_types(storage: str | None = None) -> tuple[Numeric | TypeDecorator, Numeric | TypeDecorator]:
+    """Build the column types for token amounts and for ratios (prices, rates and fees).
+
+    Arguments
+    ---------
+    storage: str | None, optional
+        "numeric" for NUMERIC(1000, 18) columns, or "compact" for NUMERIC(38, 18) amounts and int8 scaled ratios;
+        defaults to the `CHAINSYNC_NUMERIC_STORAGE` environment variable, or "numeric" if it is not set
+
+    Returns
+    -------
+    tuple[Numeric | TypeDecorator, Numeric | TypeDecorator]
+        The (amount, ratio) column types
+    """
+    if storage is None:
+        storage = os.getenv(NUMERIC_STORAGE_ENV, "numeric")
+    if storage == "numeric":
+        # Precision here indicates the total number of significant digits to store,
+        # while scale indicates the number of digits to the right of the decimal
+        # The high precision doesn't actually allocate memory in postgres, as numeric is variable size
+        # https://stackoverflow.com/questions/40686571/performance-of-numeric-type-with-high-precisions-and-scales-in-postgresql
+        # Separate instances, so the amount and ratio columns of a table can be told apart
+        return Numeric(precision=1000, scale=18), Numeric(precision=1000, scale=18)
+    if storage == "compact":
+        # 20 integer digits hold any realistic token amount; larger values fail to insert with a DataError
+        # instead of being rounded
+        return Numeric(precision=38, scale=18), ScaledBigInteger()
+    raise ValueError(f"Unknown {NUMERIC_STORAGE_ENV}={storage}, must be 'numeric' or 'compact'")
@@ -0,0 +1,68 @@
+"""Tests for fixed_numeric.py"""
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import Column, MetaData, Numeric, Table, select, text
+
+from .fixed_numeric import ScaledBigInteger, build_fixed_numeric_types, scale_decimal, unscale_to_decimal
+
+
+class TestScaledConversion:
+    """Testing exact conversion between Decimals and scaled integers"""
+
+    def test_round_trip(self):
+        """Scaling and unscaling are exact inverses, for values of any size."""
+        for scaled_value in [0, 1, -1, 10**18, 123456789 * 10**15 + 7, -(2**255), 2**256 - 1]:
+            assert scale_decimal(unscale_to_decimal(scaled_value)) == scaled_value
+        assert scale_decimal(Decimal("1.5")) == 15 * 10**17
+        assert scale_decimal(Decimal("2E+3")) == 2 * 10**21
+
+    def test_invalid_values(self):
+        """Values without an exact scaled integer are rejected."""
+        with pytest.raises(ValueError):
+            scale_decimal(Decimal("1e-19"))
+        with pytest.raises(ValueError):
+            scale_decimal(Decimal("nan"))
+
+
+class TestScaledBigInteger:
+    """Testing the int8 column type"""
+
+    def test_bind_and_result(self):
+        """Values are stored as scaled integers and read back as the same Decimals."""
+        column_type = ScaledBigInteger()
+        dialect = None  # unused by the conversions
+        assert column_type.process_bind_param(Decimal("1.000000000000000001"), dialect) == 10**18 + 1
+        assert column_type.process_result_value(10**18 + 1, dialect) == Decimal("1.000000000000000001")
+        # Rounded to 18 decimals, like Numeric(scale=18)
+        assert column_type.process_bind_param(Decimal("0.0000000000000000015"), dialect) == 2
+        assert column_type.process_bind_param(0.1, dialect) == 10**17
+        with pytest.raises(ValueError):
+            column_type.process_bind_param(float("nan"), dialect)
+        with pytest.raises(ValueError):
+            column_type.process_bind_param(Decimal("-inf"), dialect)
+        assert column_type.process_bind_param(None, dialect) is None
+        assert column_type.process_result_value(None, dialect) is None
+
+    def test_storage(self, db_session):
+        """The column is a bigint in postgres, and round trips Decimals."""
+        table = Table("scaled_values", MetaData(), Column("value", ScaledBigInteger()))
+        connection = db_session.connection()
+        table.create(connection)
+        connection.execute(table.insert(), [{"value": Decimal("1.25")}, {"value": Decimal("-0.000000000000000001")}])
+        assert connection.execute(select(table.c.value)).scalars().all() == [Decimal("1.25"), Decimal("-1E-18")]
+        # Integer math in sql
+        assert connection.execute(text("SELECT sum(value) FROM scaled_values")).scalar() == 125 * 10**16 - 1
+        db_session.rollback()
+
+
+def test_build_fixed_numeric_types():
+    """The default storage is unchanged, and compact storage uses bounded types."""
+    amount_type, ratio_type = build_fixed_numeric_types("numeric")
+    assert isinstance(amount_type, Numeric) and amount_type.precision == 1000
+    assert isinstance(ratio_type, Numeric) and ratio_type.precision == 1000
+    amount_type, ratio_type = build_fixed_numeric_types("compact")
+    assert isinstance(amount_type, Numeric) and amount_type.precision == 38
+    assert isinstance(ratio_type, ScaledBigInteger)
+    with pytest.raises(ValueError):
+        build_fixed_numeric_types("float")
@@ -2,25 +2,72 @@
 from __future__ import annotations
 
 import logging
+from datetime import datetime
+from typing import Any, Sequence
 
 import pandas as pd
-from chainsync.db.base import get_latest_block_number_from_table
-from sqlalchemy import exc
+from chainsync.db.base import (
+    Base,
+    concat_cold_storage_rows,
+    get_latest_block_number_from_table,
+    read_query,
+    split_cold_storage_query,
+)
+from sqlalchemy import String, cast, delete, exc, func, inspect, literal, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
 from sqlalchemy.orm import Session
 
 from .schema import (
     CheckpointInfo,
     CurrentWallet,
     HyperdriveTransaction,
+    LatestWallet,
+    PnlSnapshot,
     PoolAnalysis,
     PoolConfig,
     PoolInfo,
+    PoolRollup,
     Ticker,
     WalletDelta,
     WalletInfoFromChain,
     WalletPNL,
 )
 
+# The bucket lengths of the pool rollups, in seconds
+POOL_ROLLUP_RESOLUTIONS = (60, 300, 3600, 86400)
+
+
+def insert_rows_on_conflict_do_nothing(
+    table: type[Base], rows: Sequence[Base | dict[str, Any]], session: Session
+) -> None:
+    """Insert many rows into a table with a single executemany, skipping rows that conflict with existing ones.
+
+    Rows are inserted with core `insert ... on conflict do nothing` statements instead of the ORM unit of work,
+    and the session is not committed, so several tables can be written in one atomic transaction.
+
+    Arguments
+    ---------
+    table : type[Base]
+        The table schema class to insert into
+    rows : Sequence[Base | dict[str, Any]]
+        Instances of `table`, or dictionaries mapping column names to values
+    session : Session
+        The initialized session object
+    """
+    if len(rows) == 0:
+        return
+    # Autoincrement ids are assigned by postgres
+    column_names = [
+        attr.key
+        for attr in inspect(table).column_attrs
+        if not (attr.columns[0].primary_key and attr.columns[0].autoincrement is True)
+    ]
+    values = [
+        row if isinstance(row, dict) else {column_name: getattr(row, column_name) for column_name in column_names}
+        for row in rows
+    ]
+    session.execute(insert(table).on_conflict_do_nothing(), values)
+
 
 def add_transactions(transactions: list[HyperdriveTransaction], session: Session) -> None:
     """Add transactions to the poolinfo table.
@@ -80,7 +127,7 @@ def get_pool_config(session: Session, contract_address: str | None = None, coerc
     query = session.query(PoolConfig)
     if contract_address is not None:
         query = query.filter(PoolConfig.contractAddress == contract_address)
-    return pd.read_sql(query.statement, con=session.connection(), coerce_float=coerce_float)
+    return read_query(session, query.statement, coerce_float=coerce_float)
 
 
 def add_pool_config(pool_config: PoolConfig, session: Session) -> None:
@@ -247,6 +294,9 @@ def get_pool_info(
     if (end_block is not None) and (end_block < 0):
         end_block = get_latest_block_number_from_pool_info_table(session) + end_block + 1
 
+    # Blocks rolled out to parquet are read from there, and skipped in postgres
+    cold_rows, start_block = split_cold_storage_query(PoolInfo, start_block, end_block, coerce_float=coerce_float)
+
     if start_block is not None:
         query = query.filter(PoolInfo.blockNumber >= start_block)
     if end_block is not None:
@@ -255,7 +305,7 @@ def get_pool_info(
     # Always sort by time in order
     query = query.order_by(PoolInfo.timestamp)
 
-    return pd.read_sql(query.statement, con=session.connection(), coerce_float=coerce_float)
+    return concat_cold_storage_rows(cold_rows, read_query(session, query.statement, coerce_float=coerce_float))
 
 
 def get_transactions(
@@ -292,16 +342,25 @@ def get_transactions(
     if (end_block is not None) and (end_block < 0):
         end_block = get_latest_block_number_from_table(HyperdriveTransaction, session) + end_block + 1
 
+    # Blocks rolled out to parquet are read from there, and skipped in postgres
+    cold_rows, start_block = split_cold_storage_query(
+        HyperdriveTransaction, start_block, end_block, coerce_float=coerce_float
+    )
+
     if start_block is not None:
         query = query.filter(HyperdriveTransaction.blockNumber >= start_block)
     if end_block is not None:
         query = query.filter(HyperdriveTransaction.blockNumber < end_block)
 
-    return pd.read_sql(query.statement, con=session.connection(), coerce_float=coerce_float)
+    return concat_cold_storage_rows(cold_rows, read_query(session, query.statement, coerce_float=coerce_float))
 
 
 def get_checkpoint_info(
-    session: Session, start_block: int | None = None, end_block: int | None = None, coerce_float=True
+    session: Session,
+    start_block: int | None = None,
+    end_block: int | None = None,
+    coerce_float=True,
+    start_time: datetime | None = None,
 ) -> pd.DataFrame:
     """Get all info associated with a given checkpoint.
 
@@ -322,6 +381,8 @@ def get_checkpoint_info(
         matches python slicing notation, e.g., list[:3], list[:-3]
     coerce_float : bool
         If true, will return floats in dataframe. Otherwise, will return fixed point Decimal
+    start_time : datetime | None, optional
+        If set, only checkpoints at or after this time are returned
 
     Returns
     -------
@@ -340,11 +401,13 @@ def get_checkpoint_info(
         query = query.filter(CheckpointInfo.blockNumber >= start_block)
     if end_block is not None:
         query = query.filter(CheckpointInfo.blockNumber < end_block)
+    if start_time is not None:
+        query = query.filter(CheckpointInfo.timestamp >= start_time)
 
     # Always sort by time in order
     query = query.order_by(CheckpointInfo.timestamp)
 
-    return pd.read_sql(query.statement, con=session.connection(), coerce_float=coerce_float)
+    return read_query(session, query.statement, coerce_float=coerce_float)
 
 
 def get_all_wallet_info(
@@ -383,7 +446,7 @@ def get_all_wallet_info(
     if end_block is not None:
         query = query.filter(WalletInfoFromChain.blockNumber < end_block)
 
-    return pd.read_sql(query.statement, con=session.connection(), coerce_float=coerce_float)
+    return read_query(session, query.statement, coerce_float=coerce_float)
 
 
 def get_wallet_info_history(session: Session, coerce_float=True) -> dict[str, pd.DataFrame]:
@@ -523,12 +586,15 @@ def get_wallet_deltas(
     if (end_block is not None) and (end_block < 0):
         end_block = get_latest_block_number_from_table(WalletDelta, session) + end_block + 1
 
+    # Blocks rolled out to parquet are read from there, and skipped in postgres
+    cold_rows, start_block = split_cold_storage_query(WalletDelta, start_block, end_block, coerce_float=coerce_float)
+
     if start_block is not None:
         query = query.filter(WalletDelta.blockNumber >= start_block)
     if end_block is not None:
         query = query.filter(WalletDelta.blockNumber < end_block)
 
-    return pd.read_sql(query.statement, con=session.connection(), coerce_float=coerce_float)
+    return concat_cold_storage_rows(cold_rows, read_query(session, query.statement, coerce_float=coerce_float))
 
 
 def get_all_traders(
@@ -561,6 +627,9 @@ def get_all_traders(
     if (end_block is not None) and (end_block < 0):
         end_block = get_latest_block_number_from_table(WalletDelta, session) + end_block + 1
 
+    # Blocks rolled out to parquet are read from there, and skipped in postgres
+    cold_rows, start_block = split_cold_storage_query(WalletDelta, start_block, end_block, coerce_float=coerce_float)
+
     if start_block is not None:
         query = query.filter(WalletDelta.blockNumber >= start_block)
     if end_block is not None:
@@ -570,9 +639,13 @@ def get_all_traders(
         return []
     query = query.distinct()
 
-    results = pd.read_sql(query.statement, con=session.connection(), coerce_float=coerce_float)
+    results = read_query(session, query.statement, coerce_float=coerce_float)
 
-    return results["walletAddress"].to_list()
+    traders = results["walletAddress"].to_list()
+    if cold_rows is not None:
+        # Keep the wallets whose deltas are all in cold storage
+        traders = list(dict.fromkeys(cold_rows["walletAddress"].dropna().to_list() + traders))
+    return traders
 
 
 # Analysis schema interfaces
@@ -590,6 +663,13 @@ def add_current_wallet(current_wallet: list[CurrentWallet], session: Session) ->
     """
     for wallet in current_wallet:
         session.add(wallet)
+    upsert_latest_wallet(
+        [
+            {column.name: getattr(wallet, column.name) for column in LatestWallet.__table__.columns}
+            for wallet in current_wallet
+        ],
+        session,
+    )
     try:
         session.commit()
     except exc.DataError as err:
@@ -598,6 +678,79 @@ def add_current_wallet(current_wallet: list[CurrentWallet], session: Session) ->
         raise err
 
 
+def upsert_latest_wallet(current_wallet: pd.DataFrame | Sequence[dict[str, Any]], session: Session) -> None:
+    """Update the latest wallet positions with a batch of current wallet rows, without committing.
+
+    Call this in the same transaction as the insert into the current_wallet table, so the two tables never diverge.
+
+    Arguments
+    ---------
+    current_wallet: pd.DataFrame | Sequence[dict[str, Any]]
+        Rows following the schema of CurrentWallet; only the latest row of each position is kept
+    session: Session
+        The initialized session object
+    """
+    rows = pd.DataFrame(current_wallet, columns=[column.name for column in LatestWallet.__table__.columns])
+    rows = rows[rows["walletAddress"].notna() & rows["tokenType"].notna()]
+    if len(rows) == 0:
+        return
+    # Keep the latest row of each position in the batch
+    rows = rows.sort_values("blockNumber", kind="stable").drop_duplicates(["walletAddress", "tokenType"], keep="last")
+    statement = insert(LatestWallet)
+    statement = statement.on_conflict_do_update(
+        index_elements=[LatestWallet.walletAddress, LatestWallet.tokenType],
+        set_={column.name: statement.excluded[column.name] for column in LatestWallet.__table__.columns},
+        # Never overwrite a position with an older update
+        where=LatestWallet.blockNumber <= statement.excluded.blockNumber,
+    )
+    session.execute(statement, rows.astype(object).where(rows.notna(), None).to_dict("records"))
+
+
+def rebuild_latest_wallet(session: Session) -> None:
+    """Rebuild the latest wallet positions from the current_wallet history, e.g. for databases created before it.
+
+    Arguments
+    ---------
+    session: Session
+        The initialized session object
+    """
+    columns = [column.name for column in LatestWallet.__table__.columns]
+    history = (
+        select(*(CurrentWallet.__table__.c[column] for column in columns))
+        .where(CurrentWallet.walletAddress.is_not(None), CurrentWallet.tokenType.is_not(None))
+        .distinct(CurrentWallet.walletAddress, CurrentWallet.tokenType)
+        .order_by(CurrentWallet.walletAddress, CurrentWallet.tokenType, CurrentWallet.blockNumber.desc())
+    )
+    try:
+        session.execute(delete(LatestWallet))
+        session.execute(insert(LatestWallet).from_select(columns, history))
+        session.commit()
+    except exc.DataError as err:
+        session.rollback()
+        logging.error("Error on rebuilding latest_wallet: %s", err)
+        raise err
+
+
+def is_latest_wallet_synced(session: Session) -> bool:
+    """Check that the latest wallet positions include every update in the current_wallet table.
+
+    Arguments
+    ---------
+    session: Session
+        The initialized session object
+
+    Returns
+    -------
+    bool
+        True if the latest update in both tables is at the same block
+    """
+    # For some reason, pylint doesn't like func.max from sqlalchemy
+    # pylint: disable=not-callable
+    current_wallet_block = session.query(func.max(CurrentWallet.blockNumber)).scalar()
+    latest_wallet_block = session.query(func.max(LatestWallet.blockNumber)).scalar()
+    return current_wallet_block == latest_wallet_block
+
+
 def get_current_wallet(session: Session, end_block: int | None = None, coerce_float=True) -> pd.DataFrame:
     """Get all current wallet data in history and returns as a pandas dataframe.
 
@@ -619,39 +772,38 @@ def get_current_wallet(session: Session, end_block: int | None = None, coerce_fl
     DataFrame
         A DataFrame that consists of the queried wallet info data
     """
-    # TODO this function might not scale, as it's looking across all blocks from the beginning of time
-    # Ways to improve: add indexes on walletAddress, tokenType, blockNumber
-
-    # Postgres SQL query (this one is fast, but isn't supported by sqlite)
-    # select distinct on (walletAddress, tokenType) * from CurrentWallet
-    # order by blockNumber DESC;
-    # This query selects distinct walletAddress and tokenType from current wallets,
-    # selecting only the first entry of each group. Since we order each group by descending blockNumber,
-    # this first entry is the latest entry of blockNumber.
-
-    # Generic SQL query (this one is slow, but is database agnostic)
-
-    query = session.query(CurrentWallet)
-
+    latest_block = get_latest_block_number_from_table(CurrentWallet, session)
     # Support for negative indices
     if end_block is None:
-        end_block = get_latest_block_number_from_table(CurrentWallet, session) + 1
-
+        end_block = latest_block + 1
     elif end_block < 0:
-        end_block = get_latest_block_number_from_table(CurrentWallet, session) + end_block + 1
-
-    query = query.filter(CurrentWallet.blockNumber < end_block)
-    query = query.distinct(CurrentWallet.walletAddress, CurrentWallet.tokenType)
-    query = query.order_by(CurrentWallet.walletAddress, CurrentWallet.tokenType, CurrentWallet.blockNumber.desc())
-    current_wallet = pd.read_sql(query.statement, con=session.connection(), coerce_float=coerce_float)
+        end_block = latest_block + end_block + 1
+
+    # Same columns as CurrentWallet without id, as id is autofilled when inserting
+    columns = [column for column in CurrentWallet.__table__.columns if column.name != "id"]
+    if end_block > latest_block and is_latest_wallet_synced(session):
+        # Every update is before end_block, so the latest positions are the answer,
+        # read from a table with one row per position instead of the whole history
+        query = session.query(*(LatestWallet.__table__.c[column.name] for column in columns))
+        query = query.order_by(LatestWallet.walletAddress, LatestWallet.tokenType)
+    else:
+        # Postgres SQL query (this one is fast, but isn't supported by sqlite)
+        # select distinct on (walletAddress, tokenType) * from CurrentWallet
+        # order by blockNumber DESC;
+        # This query selects distinct walletAddress and tokenType from current wallets,
+        # selecting only the first entry of each group. Since we order each group by descending blockNumber,
+        # this first entry is the latest entry of blockNumber.
+        # The (walletAddress, tokenType, blockNumber) index serves the ordering.
+        query = session.query(*columns)
+        query = query.filter(CurrentWallet.blockNumber < end_block)
+        query = query.distinct(CurrentWallet.walletAddress, CurrentWallet.tokenType)
+        query = query.order_by(CurrentWallet.walletAddress, CurrentWallet.tokenType, CurrentWallet.blockNumber.desc())
+    current_wallet = read_query(session, query.statement, coerce_float=coerce_float)
 
     # Rename blockNumber column to be latest_block_update, and set the new blockNumber to be the query block
     current_wallet["latest_block_update"] = current_wallet["blockNumber"]
     current_wallet["blockNumber"] = end_block - 1
 
-    # Drop id, as id is autofilled when inserting
-    current_wallet = current_wallet.drop("id", axis=1)
-
     # filter non-base zero positions here
     has_value = current_wallet["value"] > 0
     is_base = current_wallet["tokenType"] == "BASE"
@@ -711,7 +863,161 @@ def get_pool_analysis(
     # Always sort by block in order
     query = query.order_by(PoolAnalysis.blockNumber)
 
-    return pd.read_sql(query.statement, con=session.connection(), coerce_float=coerce_float)
+    return read_query(session, query.statement, coerce_float=coerce_float)
+
+
+def update_pool_rollup(
+    session: Session, start_block: int, end_block: int, resolutions: Sequence[int] = POOL_ROLLUP_RESOLUTIONS
+) -> None:
+    """Fold the pool analysis of a block range into the pool rollups, in one SQL statement per resolution.
+
+    Block ranges have to be folded in in order; a range that is already in a bucket is skipped,
+    so running the same range twice doesn't change the rollups.
+
+    Arguments
+    ---------
+    session : Session
+        The initialized session object
+    start_block : int
+        The first block of the range
+    end_block : int
+        The block after the last block of the range, matching python slicing notation
+    resolutions : Sequence[int], optional
+        The bucket lengths to update, in seconds
+    """
+    # pylint: disable=not-callable
+    spot_price = PoolAnalysis.spot_price
+    block_number = PoolAnalysis.blockNumber
+
+    def _first(column, order_by=block_number):
+        return func.array_agg(aggregate_order_by(column, order_by)).filter(column.is_not(None))[1]
+
+    columns = [column.name for column in PoolRollup.__table__.columns]
+    try:
+        for resolution in resolutions:
+            # Timestamps are naive UTC
+            bucket = func.timezone(
+                "UTC",
+                func.to_timestamp(func.floor(func.extract("epoch", PoolInfo.timestamp) / resolution) * resolution),
+            )
+            buckets = (
+                select(
+                    literal(resolution).label("resolution"),
+                    bucket.label("timestamp"),
+                    func.min(block_number).label("firstBlock"),
+                    func.max(block_number).label("lastBlock"),
+                    _first(spot_price).label("open"),
+                    func.max(spot_price).label("high"),
+                    func.min(spot_price).label("low"),
+                    _first(spot_price, block_number.desc()).label("close"),
+                    _first(PoolAnalysis.fixed_rate, block_number.desc()).label("fixed_rate"),
+                    _first(PoolInfo.longsOutstanding, block_number.desc()).label("longsOutstanding"),
+                    _first(PoolInfo.shortsOutstanding, block_number.desc()).label("shortsOutstanding"),
+                )
+                .join(PoolInfo, PoolInfo.blockNumber == block_number)
+                .where(block_number >= start_block, block_number < end_block)
+                .group_by(bucket)
+            )
+            statement = insert(PoolRollup).from_select(columns, buckets)
+            excluded = statement.excluded
+            statement = statement.on_conflict_do_update(
+                index_elements=[PoolRollup.resolution, PoolRollup.timestamp],
+                set_={
+                    "firstBlock": func.least(PoolRollup.firstBlock, excluded.firstBlock),
+                    "lastBlock": func.greatest(PoolRollup.lastBlock, excluded.lastBlock),
+                    "open": func.coalesce(PoolRollup.open, excluded.open),
+                    "high": func.greatest(PoolRollup.high, excluded.high),
+                    "low": func.least(PoolRollup.low, excluded.low),
+                    "close": func.coalesce(excluded.close, PoolRollup.close),
+                    "fixed_rate": func.coalesce(excluded.fixed_rate, PoolRollup.fixed_rate),
+                    "longsOutstanding": func.coalesce(excluded.longsOutstanding, PoolRollup.longsOutstanding),
+                    "shortsOutstanding": func.coalesce(excluded.shortsOutstanding, PoolRollup.shortsOutstanding),
+                },
+                where=PoolRollup.lastBlock < excluded.firstBlock,
+            )
+            session.execute(statement)
+        session.commit()
+    except exc.DataError as err:
+        session.rollback()
+        logging.error("Error on updating pool_rollup: %s", err)
+        raise err
+
+
+def rebuild_pool_rollup(session: Session, resolutions: Sequence[int] = POOL_ROLLUP_RESOLUTIONS) -> None:
+    """Rebuild the pool rollups from the pool analysis in postgres, e.g. for databases created before them.
+
+    Arguments
+    ---------
+    session : Session
+        The initialized session object
+    resolutions : Sequence[int], optional
+        The bucket lengths to build, in seconds
+    """
+    try:
+        session.execute(delete(PoolRollup))
+    except exc.DataError as err:
+        session.rollback()
+        logging.error("Error on rebuilding pool_rollup: %s", err)
+        raise err
+    # Committed together with the delete
+    update_pool_rollup(session, 0, get_latest_block_number_from_analysis_table(session) + 1, resolutions)
+
+
+def is_pool_rollup_synced(session: Session) -> bool:
+    """Check that the pool rollups include every block in the pool_analysis table.
+
+    Arguments
+    ---------
+    session : Session
+        The initialized session object
+
+    Returns
+    -------
+    bool
+        True if the latest block in both tables is the same
+    """
+    # pylint: disable=not-callable
+    analysis_block = session.query(func.max(PoolAnalysis.blockNumber)).scalar()
+    rollup_block = session.query(func.max(PoolRollup.lastBlock)).scalar()
+    return analysis_block == rollup_block
+
+
+def get_pool_rollup(
+    session: Session,
+    resolution: int,
+    start_time: datetime | None = None,
+    num_buckets: int | None = None,
+    coerce_float=True,
+) -> pd.DataFrame:
+    """Get the pool rollups of a resolution and returns as a pandas dataframe.
+
+    Arguments
+    ---------
+    session : Session
+        The initialized session object
+    resolution : int
+        The bucket length in seconds, one of the resolutions the rollups are updated at
+    start_time : datetime | None, optional
+        The start of the first bucket to get
+    num_buckets : int | None, optional
+        If set, only get the latest `num_buckets` buckets
+    coerce_float : bool
+        If true, will return floats in dataframe. Otherwise, will return fixed point Decimal
+
+    Returns
+    -------
+    DataFrame
+        A DataFrame that consists of the queried rollups, sorted by timestamp
+    """
+    query = session.query(PoolRollup).filter(PoolRollup.resolution == resolution)
+    if start_time is not None:
+        query = query.filter(PoolRollup.timestamp >= start_time)
+    if num_buckets is not None:
+        latest = query.order_by(PoolRollup.timestamp.desc()).limit(num_buckets).subquery()
+        query = session.query(latest).order_by(latest.c.timestamp)
+    else:
+        query = query.order_by(PoolRollup.timestamp)
+    return read_query(session, query.statement, coerce_float=coerce_float)
 
 
 def get_ticker(
@@ -760,7 +1066,66 @@ def get_ticker(
     # Always sort by block in order
     query = query.order_by(Ticker.blockNumber)
 
-    return pd.read_sql(query.statement, con=session.connection(), coerce_float=coerce_float)
+    return read_query(session, query.statement, coerce_float=coerce_float)
+
+
+def add_ticker_from_wallet_deltas(session: Session, start_block: int, end_block: int) -> None:
+    """Build the ticker rows of a block range from wallet_delta, transactions and pool_info in one SQL statement.
+
+    There is one ticker row per transaction, with the token diffs of the transaction as "<baseTokenType>: <delta>"
+    strings, like `chainsync.analysis.calc_ticker` builds in pandas.
+
+    Arguments
+    ---------
+    session : Session
+        The initialized session object
+    start_block : int
+        The first block of the range
+    end_block : int
+        The block after the last block of the range, matching python slicing notation
+    """
+    # pylint: disable=not-callable
+    wallet_delta = WalletDelta.__table__.c
+    by_delta_id = aggregate_order_by(wallet_delta.walletAddress, wallet_delta.id)
+    token_diff = wallet_delta.baseTokenType + ": " + cast(wallet_delta.delta, String)
+    ticker_rows = (
+        select(
+            wallet_delta.blockNumber.label("blockNumber"),
+            PoolInfo.timestamp.label("timestamp"),
+            # The wallet of the first delta in the transaction
+            func.array_agg(by_delta_id)[1].label("walletAddress"),
+            HyperdriveTransaction.input_method.label("trade_type"),
+            func.array_agg(aggregate_order_by(token_diff, wallet_delta.id))
+            .filter(token_diff.is_not(None))
+            .label("token_diffs"),
+        )
+        .select_from(WalletDelta.__table__)
+        .join(PoolInfo, PoolInfo.blockNumber == wallet_delta.blockNumber)
+        .outerjoin(HyperdriveTransaction, HyperdriveTransaction.transactionHash == wallet_delta.transactionHash)
+        .where(wallet_delta.blockNumber >= start_block, wallet_delta.blockNumber < end_block)
+        .group_by(
+            wallet_delta.transactionHash,
+            wallet_delta.blockNumber,
+            PoolInfo.timestamp,
+            HyperdriveTransaction.input_method,
+        )
+        .subquery()
+    )
+    columns = ["blockNumber", "timestamp", "walletAddress", "trade_type", "token_diffs"]
+    # Drop rows with nonexistent wallets
+    statement = insert(Ticker).from_select(
+        columns,
+        select(*(ticker_rows.c[column] for column in columns))
+        .where(ticker_rows.c.walletAddress.is_not(None))
+        .order_by(ticker_rows.c.blockNumber),
+    )
+    try:
+        session.execute(statement)
+        session.commit()
+    except exc.DataError as err:
+        session.rollback()
+        logging.error("Error on adding ticker: %s", err)
+        raise err
 
 
 # Lots of arguments, most are defaults
@@ -804,6 +1169,20 @@ def get_wallet_pnl(
     if (end_block is not None) and (end_block < 0):
         end_block = get_latest_block_number_from_table(WalletPNL, session) + end_block + 1
 
+    # Blocks rolled out to parquet are read from there, and skipped in postgres
+    query_start_block = start_block
+    cold_rows, start_block = split_cold_storage_query(
+        WalletPNL,
+        start_block,
+        end_block,
+        filters=None if wallet_address is None else [("walletAddress", "in", wallet_address)],
+        coerce_float=coerce_float,
+    )
+    if cold_rows is not None and return_timestamp:
+        # Join the timestamp like the query below does
+        timestamps = get_pool_info(session, query_start_block, start_block, coerce_float=coerce_float)
+        cold_rows = cold_rows.merge(timestamps[["blockNumber", "timestamp"]], on="blockNumber")
+
     if start_block is not None:
         query = query.filter(WalletPNL.blockNumber >= start_block)
     if end_block is not None:
@@ -818,4 +1197,108 @@ def get_wallet_pnl(
     # Always sort by block in order
     query = query.order_by(WalletPNL.blockNumber)
 
-    return pd.read_sql(query.statement, con=session.connection(), coerce_float=coerce_float)
+    return concat_cold_storage_rows(cold_rows, read_query(session, query.statement, coerce_float=coerce_float))
+
+
+def add_pnl_snapshot(pnl_snapshot: PnlSnapshot, session: Session) -> None:
+    """Record that wallet pnl was snapshotted at a block, after its wallet_pnl rows are added.
+
+    Arguments
+    ---------
+    pnl_snapshot: PnlSnapshot
+        The snapshot to record
+    session: Session
+        The initialized session object
+    """
+    session.merge(pnl_snapshot)
+    try:
+        session.commit()
+    except exc.DataError as err:
+        session.rollback()
+        logging.error("Error on adding pnl_snapshot: %s", err)
+        raise err
+
+
+def get_latest_pnl_snapshot_block(
+    session: Session, end_block: int | None = None, full_only: bool = False
+) -> int | None:
+    """Get the block of the latest pnl snapshot.
+
+    Arguments
+    ---------
+    session: Session
+        The initialized session object
+    end_block: int | None, optional
+        If set, only consider snapshots before this block
+    full_only: bool, optional
+        If True, only consider full snapshots
+
+    Returns
+    -------
+    int | None
+        The block of the latest snapshot, or None if there is none
+    """
+    # pylint: disable=not-callable
+    query = session.query(func.max(PnlSnapshot.blockNumber))
+    if end_block is not None:
+        query = query.filter(PnlSnapshot.blockNumber < end_block)
+    if full_only:
+        query = query.filter(PnlSnapshot.isFull.is_(True))
+    return query.scalar()
+
+
+def get_latest_wallet_pnl(
+    session: Session,
+    end_block: int | None = None,
+    wallet_address: list[str] | None = None,
+    coerce_float=True,
+) -> pd.DataFrame:
+    """Get the latest pnl of every wallet, as of the latest pnl snapshot that has the wallet.
+
+    Snapshots in between full snapshots only have the wallets that changed, so this reads the latest rows of each
+    wallet since the latest full snapshot. For databases without recorded snapshots, where every batch wrote a full
+    snapshot, this is the latest block of the wallet_pnl table.
+
+    Arguments
+    ---------
+    session : Session
+        The initialized session object
+    end_block : int | None, optional
+        The block after the latest snapshot to consider, matching python slicing notation
+    wallet_address : list[str] | None, optional
+        If set, only get the pnl of these wallets
+    coerce_float : bool
+        If true, will return floats in dataframe. Otherwise, will return fixed point Decimal
+
+    Returns
+    -------
+    DataFrame
+        The wallet_pnl rows of the latest snapshot of each wallet
+    """
+    # pylint: disable=not-callable
+    if (end_block is not None) and (end_block < 0):
+        end_block = get_latest_block_number_from_table(WalletPNL, session) + end_block + 1
+    start_block = get_latest_pnl_snapshot_block(session, end_block, full_only=True)
+    if start_block is None:
+        latest_block_query = session.query(func.max(WalletPNL.blockNumber))
+        if end_block is not None:
+            latest_block_query = latest_block_query.filter(WalletPNL.blockNumber < end_block)
+        start_block = latest_block_query.scalar()
+    if start_block is None:
+        start_block = 0
+
+    latest_blocks = session.query(WalletPNL.walletAddress, func.max(WalletPNL.blockNumber).label("blockNumber"))
+    latest_blocks = latest_blocks.filter(WalletPNL.blockNumber >= start_block)
+    if end_block is not None:
+        latest_blocks = latest_blocks.filter(WalletPNL.blockNumber < end_block)
+    if wallet_address is not None:
+        latest_blocks = latest_blocks.filter(WalletPNL.walletAddress.in_(wallet_address))
+    latest_blocks = latest_blocks.group_by(WalletPNL.walletAddress).subquery()
+
+    query = session.query(WalletPNL).join(
+        latest_blocks,
+        (WalletPNL.walletAddress == latest_blocks.c.walletAddress)
+        & (WalletPNL.blockNumber == latest_blocks.c.blockNumber),
+    )
+    query = query.order_by(WalletPNL.walletAddress, WalletPNL.tokenType)
+    return read_query(session, query.statement, coerce_float=coerce_float)
@@ -1,16 +1,19 @@
 """CRUD tests for Transaction"""
-from datetime import datetime
+from datetime import datetime, timedelta
 from decimal import Decimal
 
 import numpy as np
 import pytest
+from chainsync.analysis import calc_ticker
 from chainsync.db.base import get_latest_block_number_from_table
 
 from .interface import (
     add_checkpoint_infos,
     add_current_wallet,
+    add_pnl_snapshot,
     add_pool_config,
     add_pool_infos,
+    add_ticker_from_wallet_deltas,
     add_transactions,
     add_wallet_deltas,
     add_wallet_infos,
@@ -21,19 +24,33 @@ from .interface import (
     get_current_wallet_info,
     get_latest_block_number_from_pool_info_table,
     get_latest_block_number_from_table,
+    get_latest_pnl_snapshot_block,
+    get_latest_wallet_pnl,
     get_pool_config,
     get_pool_info,
+    get_pool_rollup,
+    get_ticker,
     get_transactions,
     get_wallet_deltas,
+    is_latest_wallet_synced,
+    is_pool_rollup_synced,
+    rebuild_latest_wallet,
+    rebuild_pool_rollup,
+    update_pool_rollup,
+    upsert_latest_wallet,
 )
 from .schema import (
     CheckpointInfo,
     CurrentWallet,
     HyperdriveTransaction,
+    LatestWallet,
+    PnlSnapshot,
+    PoolAnalysis,
     PoolConfig,
     PoolInfo,
     WalletDelta,
     WalletInfoFromChain,
+    WalletPNL,
 )
 
 
@@ -145,6 +162,19 @@ class TestCheckpointInterface:
         checkpoints_df = get_checkpoint_info(db_session, start_block=1, end_block=-1)
         np.testing.assert_array_equal(checkpoints_df["sharePrice"], [3.2])
 
+    def test_time_query_checkpoints(self, db_session):
+        """Testing querying by timestamp of checkpoints via interface"""
+        checkpoint_1 = CheckpointInfo(blockNumber=0, timestamp=datetime(2023, 1, 1), sharePrice=Decimal("3.1"))
+        checkpoint_2 = CheckpointInfo(blockNumber=1, timestamp=datetime(2023, 1, 2), sharePrice=Decimal("3.2"))
+        checkpoint_3 = CheckpointInfo(blockNumber=2, timestamp=datetime(2023, 1, 3), sharePrice=Decimal("3.3"))
+        add_checkpoint_infos([checkpoint_1, checkpoint_2, checkpoint_3], db_session)
+
+        checkpoints_df = get_checkpoint_info(db_session, start_time=datetime(2023, 1, 2))
+        np.testing.assert_array_equal(checkpoints_df["sharePrice"], [3.2, 3.3])
+
+        checkpoints_df = get_checkpoint_info(db_session, end_block=2, start_time=datetime(2023, 1, 2))
+        np.testing.assert_array_equal(checkpoints_df["sharePrice"], [3.2])
+
 
 class TestPoolConfigInterface:
     """Testing postgres interface for poolconfig table"""
@@ -424,3 +454,205 @@ class TestCurrentWalletInterface:
         wallet_info_df = get_current_wallet(db_session).reset_index()
         np.testing.assert_array_equal(wallet_info_df["tokenType"], ["BASE", "LP"])
         np.testing.assert_array_equal(wallet_info_df["value"], [6.1, 5.1])
+
+    def test_latest_wallet(self, db_session):
+        """The latest positions table gives the same result as the history, and only for the latest block"""
+        add_current_wallet(
+            [
+                CurrentWallet(blockNumber=0, walletAddress="addr", tokenType="BASE", value=Decimal("3.1")),
+                CurrentWallet(blockNumber=1, walletAddress="addr", tokenType="LP", value=Decimal("5.1")),
+                CurrentWallet(blockNumber=2, walletAddress="addr", tokenType="BASE", value=Decimal("6.1")),
+            ],
+            db_session,
+        )
+        assert is_latest_wallet_synced(db_session)
+        latest_wallet = db_session.query(LatestWallet).order_by(LatestWallet.tokenType).all()
+        assert [(row.tokenType, row.blockNumber, row.value) for row in latest_wallet] == [
+            ("BASE", 2, Decimal("6.1")),
+            ("LP", 1, Decimal("5.1")),
+        ]
+        wallet_info_df = get_current_wallet(db_session)
+        np.testing.assert_array_equal(wallet_info_df["value"], [6.1, 5.1])
+        np.testing.assert_array_equal(wallet_info_df["latest_block_update"], [2, 1])
+        np.testing.assert_array_equal(wallet_info_df["blockNumber"], [2, 2])
+        # As of an earlier block reads the history
+        np.testing.assert_array_equal(get_current_wallet(db_session, end_block=2)["value"], [3.1, 5.1])
+
+        # An out of order update doesn't overwrite a newer position
+        upsert_latest_wallet(
+            [{"blockNumber": 1, "walletAddress": "addr", "tokenType": "BASE", "value": Decimal("1.0")}], db_session
+        )
+        assert db_session.get(LatestWallet, ("addr", "BASE")).value == Decimal("6.1")
+        db_session.rollback()
+
+        # Rebuilding from the history restores the table
+        db_session.query(LatestWallet).delete()
+        db_session.commit()
+        assert not is_latest_wallet_synced(db_session)
+        rebuild_latest_wallet(db_session)
+        assert is_latest_wallet_synced(db_session)
+        np.testing.assert_array_equal(get_current_wallet(db_session)["value"], [6.1, 5.1])
+
+
+class TestWalletPnlInterface:
+    """Testing postgres interface for the wallet_pnl and pnl_snapshot tables"""
+
+    def test_latest_wallet_pnl(self, db_session):
+        """The latest pnl of each wallet comes from its latest snapshot since the last full snapshot"""
+
+        def add_snapshot(block_number, wallet_pnls, is_full):
+            db_session.add_all(
+                [
+                    WalletPNL(blockNumber=block_number, walletAddress=address, tokenType=token_type, pnl=Decimal(pnl))
+                    for address, token_type, pnl in wallet_pnls
+                ]
+            )
+            add_pnl_snapshot(PnlSnapshot(blockNumber=block_number, isFull=is_full), db_session)
+
+        # Without recorded snapshots, the latest block is the snapshot
+        db_session.add(WalletPNL(blockNumber=0, walletAddress="addr_0", tokenType="BASE", pnl=Decimal(1)))
+        db_session.commit()
+        assert get_latest_wallet_pnl(db_session)["pnl"].to_list() == [1]
+
+        add_snapshot(1, [("addr_0", "BASE", 2), ("addr_0", "LP", 3), ("addr_1", "BASE", 4)], is_full=True)
+        add_snapshot(2, [("addr_1", "BASE", 5)], is_full=False)
+        assert get_latest_pnl_snapshot_block(db_session) == 2
+        assert get_latest_pnl_snapshot_block(db_session, full_only=True) == 1
+
+        latest_pnl = get_latest_wallet_pnl(db_session)
+        assert latest_pnl[["walletAddress", "tokenType", "blockNumber", "pnl"]].values.tolist() == [
+            ["addr_0", "BASE", 1, 2],
+            ["addr_0", "LP", 1, 3],
+            ["addr_1", "BASE", 2, 5],
+        ]
+        assert get_latest_wallet_pnl(db_session, end_block=2)["pnl"].to_list() == [2, 3, 4]
+        assert get_latest_wallet_pnl(db_session, wallet_address=["addr_1"])["pnl"].to_list() == [5]
+
+        # A full snapshot supersedes wallets that are no longer in it
+        add_snapshot(3, [("addr_1", "BASE", 6)], is_full=True)
+        assert get_latest_wallet_pnl(db_session)["walletAddress"].to_list() == ["addr_1"]
+
+
+class TestTickerInterface:
+    """Testing postgres interface for the ticker table"""
+
+    def test_add_ticker_from_wallet_deltas(self, db_session):
+        """The ticker built in sql matches the one built in pandas"""
+        add_pool_infos(
+            [PoolInfo(blockNumber=block, timestamp=datetime.fromtimestamp(block)) for block in range(3)], db_session
+        )
+        add_transactions(
+            [
+                HyperdriveTransaction(blockNumber=1, transactionHash="0x1", input_method="openLong"),
+                HyperdriveTransaction(blockNumber=1, transactionHash="0x2", input_method="addLiquidity"),
+                HyperdriveTransaction(blockNumber=2, transactionHash="0x3", input_method="closeLong"),
+            ],
+            db_session,
+        )
+        add_wallet_deltas(
+            [
+                WalletDelta(
+                    transactionHash="0x1",
+                    blockNumber=1,
+                    walletAddress="addr_0",
+                    baseTokenType="BASE",
+                    delta=Decimal("-1.5"),
+                ),
+                WalletDelta(
+                    transactionHash="0x1",
+                    blockNumber=1,
+                    walletAddress="addr_0",
+                    baseTokenType="LONG",
+                    delta=Decimal("1.6"),
+                ),
+                WalletDelta(
+                    transactionHash="0x2",
+                    blockNumber=1,
+                    walletAddress="addr_1",
+                    baseTokenType="LP",
+                    delta=Decimal("10"),
+                ),
+                WalletDelta(
+                    transactionHash="0x3", blockNumber=2, walletAddress=None, baseTokenType="BASE", delta=Decimal("1")
+                ),
+            ],
+            db_session,
+        )
+        add_ticker_from_wallet_deltas(db_session, 0, 3)
+        ticker = get_ticker(db_session).drop(columns="id")
+        expected = calc_ticker(
+            get_wallet_deltas(db_session, coerce_float=False),
+            get_transactions(db_session, coerce_float=False),
+            get_pool_info(db_session, coerce_float=False),
+        )
+        assert ticker.to_dict("records") == expected[ticker.columns].to_dict("records")
+        assert ticker["token_diffs"].to_list() == [
+            ["BASE: -1.500000000000000000", "LONG: 1.600000000000000000"],
+            ["LP: 10.000000000000000000"],
+        ]
+        # Only the requested block range is added
+        add_ticker_from_wallet_deltas(db_session, 2, 3)
+        assert len(get_ticker(db_session)) == 2
+
+
+class TestPoolRollupInterface:
+    """Testing postgres interface for the pool_rollup table"""
+
+    def test_update_pool_rollup(self, db_session):
+        """Rollups folded in block by block match rollups built at once"""
+        spot_prices = [
+            None if price is None else Decimal(price)
+            for price in ["0.95", "0.97", "0.93", "0.96", None, "0.94", "0.99"]
+        ]
+        # A block every 20 seconds, starting on the hour
+        add_pool_infos(
+            [
+                PoolInfo(
+                    blockNumber=block,
+                    timestamp=datetime(2023, 1, 1) + timedelta(seconds=20 * block),
+                    longsOutstanding=Decimal(block),
+                    shortsOutstanding=Decimal(2 * block),
+                )
+                for block in range(len(spot_prices))
+            ],
+            db_session,
+        )
+        db_session.add_all(
+            [
+                PoolAnalysis(blockNumber=block, spot_price=spot_price, fixed_rate=Decimal(block) / 100)
+                for block, spot_price in enumerate(spot_prices)
+            ]
+        )
+        db_session.commit()
+        for block in range(len(spot_prices)):
+            update_pool_rollup(db_session, block, block + 1, resolutions=[60, 3600])
+        # Folding in a range twice doesn't change the rollup
+        update_pool_rollup(db_session, 5, 7, resolutions=[60, 3600])
+        assert is_pool_rollup_synced(db_session)
+        incremental = {resolution: get_pool_rollup(db_session, resolution) for resolution in [60, 3600]}
+
+        minutes = incremental[60]
+        assert minutes["timestamp"].to_list() == [
+            datetime(2023, 1, 1, 0, 0),
+            datetime(2023, 1, 1, 0, 1),
+            datetime(2023, 1, 1, 0, 2),
+        ]
+        assert minutes[["firstBlock", "lastBlock"]].values.tolist() == [[0, 2], [3, 5], [6, 6]]
+        assert minutes[["open", "high", "low", "close"]].values.tolist() == [
+            [0.95, 0.97, 0.93, 0.93],
+            [0.96, 0.96, 0.94, 0.94],
+            [0.99, 0.99, 0.99, 0.99],
+        ]
+        assert minutes["fixed_rate"].to_list() == [0.02, 0.05, 0.06]
+        assert minutes["shortsOutstanding"].to_list() == [4, 10, 12]
+        hours = incremental[3600]
+        assert hours[["open", "high", "low", "close", "lastBlock"]].values.tolist() == [[0.95, 0.99, 0.93, 0.99, 6]]
+
+        rebuild_pool_rollup(db_session, resolutions=[60, 3600])
+        for resolution, rollup in incremental.items():
+            assert get_pool_rollup(db_session, resolution).equals(rollup)
+
+        # Only the latest buckets are read
+        latest = get_pool_rollup(db_session, 60, num_buckets=2)
+        assert latest["lastBlock"].to_list() == [5, 6]
+        assert get_pool_rollup(db_session, 60, start_time=datetime(2023, 1, 1, 0, 2))["lastBlock"].to_list() == [6]
@@ -5,17 +5,30 @@ from decimal import Decimal
 from typing import Union
 
 from chainsync.db.base import Base
-from sqlalchemy import ARRAY, BigInteger, Boolean, DateTime, Integer, Numeric, String
+from sqlalchemy import ARRAY, BigInteger, Boolean, DateTime, Index, Integer, Numeric, String
 from sqlalchemy.orm import Mapped, mapped_column
 
+from .fixed_numeric import build_fixed_numeric_types
+
 # pylint: disable=invalid-name
 
-# Postgres numeric type that matches fixedpoint
-# Precision here indicates the total number of significant digits to store,
-# while scale indicates the number of digits to the right of the decimal
-# The high precision doesn't actually allocate memory in postgres, as numeric is variable size
-# https://stackoverflow.com/questions/40686571/performance-of-numeric-type-with-high-precisions-and-scales-in-postgresql
-FIXED_NUMERIC = Numeric(precision=1000, scale=18)
+# Postgres numeric types that match fixedpoint
+# FIXED_NUMERIC is used for token amounts, and FIXED_RATIO for prices, rates and fees, which are bounded;
+# both are NUMERIC(1000, 18) unless the db is created with CHAINSYNC_NUMERIC_STORAGE=compact
+FIXED_NUMERIC, FIXED_RATIO = build_fixed_numeric_types()
+
+# Tables that can be range partitioned on blockNumber with `chainsync.db.base.partition_table_by_block_number`.
+# The transactions table is excluded, since a unique transactionHash can not be enforced across partitions.
+BLOCK_PARTITIONED_TABLES = (
+    "checkpoint_info",
+    "pool_info",
+    "wallet_info_from_chain",
+    "wallet_delta",
+    "pool_analysis",
+    "current_wallet",
+    "ticker",
+    "wallet_pnl",
+)
 
 
 ## Base schemas for raw data
@@ -28,19 +41,19 @@ class PoolConfig(Base):
 
     contractAddress: Mapped[str] = mapped_column(String, primary_key=True)
     baseToken: Mapped[Union[str, None]] = mapped_column(String, default=None)
-    initialSharePrice: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
+    initialSharePrice: Mapped[Union[Decimal, None]] = mapped_column(FIXED_RATIO, default=None)
     minimumShareReserves: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
     positionDuration: Mapped[Union[int, None]] = mapped_column(Integer, default=None)
     checkpointDuration: Mapped[Union[int, None]] = mapped_column(Integer, default=None)
     timeStretch: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
     governance: Mapped[Union[str, None]] = mapped_column(String, default=None)
     feeCollector: Mapped[Union[str, None]] = mapped_column(String, default=None)
-    curveFee: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
-    flatFee: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
-    governanceFee: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
+    curveFee: Mapped[Union[Decimal, None]] = mapped_column(FIXED_RATIO, default=None)
+    flatFee: Mapped[Union[Decimal, None]] = mapped_column(FIXED_RATIO, default=None)
+    governanceFee: Mapped[Union[Decimal, None]] = mapped_column(FIXED_RATIO, default=None)
     oracleSize: Mapped[Union[int, None]] = mapped_column(Integer, default=None)
     updateGap: Mapped[Union[int, None]] = mapped_column(Integer, default=None)
-    invTimeStretch: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
+    invTimeStretch: Mapped[Union[Decimal, None]] = mapped_column(FIXED_RATIO, default=None)
     updateGap: Mapped[Union[int, None]] = mapped_column(Integer, default=None)
 
 
@@ -50,9 +63,9 @@ class CheckpointInfo(Base):
     __tablename__ = "checkpoint_info"
 
     blockNumber: Mapped[int] = mapped_column(BigInteger, primary_key=True)
-    timestamp: Mapped[datetime] = mapped_column(DateTime)
-    sharePrice: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
-    longSharePrice: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
+    timestamp: Mapped[datetime] = mapped_column(DateTime, index=True)
+    sharePrice: Mapped[Union[Decimal, None]] = mapped_column(FIXED_RATIO, default=None)
+    longSharePrice: Mapped[Union[Decimal, None]] = mapped_column(FIXED_RATIO, default=None)
     shortBaseVolume: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
 
 
@@ -69,8 +82,8 @@ class PoolInfo(Base):
     shareReserves: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
     bondReserves: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
     lpTotalSupply: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
-    sharePrice: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
-    lpSharePrice: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
+    sharePrice: Mapped[Union[Decimal, None]] = mapped_column(FIXED_RATIO, default=None)
+    lpSharePrice: Mapped[Union[Decimal, None]] = mapped_column(FIXED_RATIO, default=None)
     longsOutstanding: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
     longAverageMaturityTime: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
     shortsOutstanding: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
@@ -87,6 +100,19 @@ class WalletInfoFromChain(Base):
     """Table/dataclass schema for wallet information."""
 
     __tablename__ = "wallet_info_from_chain"
+    __table_args__ = (
+        # Latest balance per position, see `get_current_wallet_info`;
+        # unique so rewriting a block doesn't duplicate its balances
+        Index(
+            "ix_wallet_info_from_chain_position_block_unique",
+            "walletAddress",
+            "tokenType",
+            "blockNumber",
+            unique=True,
+        ),
+        # The non-unique index this one replaces, see `chainsync.db.base.create_missing_indexes`
+        {"info": {"replaced_indexes": ["ix_wallet_info_from_chain_position_block"]}},
+    )
 
     # Default table primary key
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, init=False, autoincrement=True)
@@ -99,7 +125,7 @@ class WalletInfoFromChain(Base):
     tokenValue: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
     # While time here is in epoch seconds, we use Numeric to allow for (1) lossless storage and (2) allow for NaNs
     maturityTime: Mapped[Union[int, None]] = mapped_column(Numeric, default=None)
-    sharePrice: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
+    sharePrice: Mapped[Union[Decimal, None]] = mapped_column(FIXED_RATIO, default=None)
 
 
 # TODO: either make a more general TokenDelta, or rename this to HyperdriveDelta
@@ -107,6 +133,20 @@ class WalletDelta(Base):
     """Table/dataclass schema for wallet deltas."""
 
     __tablename__ = "wallet_delta"
+    __table_args__ = (
+        # Deltas of a position over a block range, used when rebuilding balances;
+        # unique per transaction so rewriting a block doesn't duplicate its deltas
+        Index(
+            "ix_wallet_delta_position_block_unique",
+            "walletAddress",
+            "tokenType",
+            "blockNumber",
+            "transactionHash",
+            unique=True,
+        ),
+        # The non-unique index this one replaces, see `chainsync.db.base.create_missing_indexes`
+        {"info": {"replaced_indexes": ["ix_wallet_delta_position_block"]}},
+    )
 
     # Default table primary key
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, init=False, autoincrement=True)
@@ -247,15 +287,45 @@ class PoolAnalysis(Base):
 
     blockNumber: Mapped[int] = mapped_column(BigInteger, primary_key=True)
 
-    spot_price: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
+    spot_price: Mapped[Union[Decimal, None]] = mapped_column(FIXED_RATIO, default=None)
     fixed_rate: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
     base_buffer: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
 
 
+class PoolRollup(Base):
+    """Table/dataclass schema for pool analysis rolled up into time buckets at several resolutions.
+
+    Each row is an ohlc candle of the spot price, with the fixed rate and outstanding positions at the end of the
+    bucket. Rows are updated as analysis rows arrive, so the dashboard reads a few candles instead of every block.
+    """
+
+    __tablename__ = "pool_rollup"
+
+    # The length of the buckets in seconds
+    resolution: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # The start of the bucket
+    timestamp: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    firstBlock: Mapped[int] = mapped_column(BigInteger)
+    lastBlock: Mapped[int] = mapped_column(BigInteger, index=True)
+
+    open: Mapped[Union[Decimal, None]] = mapped_column(FIXED_RATIO, default=None)
+    high: Mapped[Union[Decimal, None]] = mapped_column(FIXED_RATIO, default=None)
+    low: Mapped[Union[Decimal, None]] = mapped_column(FIXED_RATIO, default=None)
+    close: Mapped[Union[Decimal, None]] = mapped_column(FIXED_RATIO, default=None)
+    fixed_rate: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
+    longsOutstanding: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
+    shortsOutstanding: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
+
+
 class CurrentWallet(Base):
     """Table/dataclass schema for current wallet positions."""
 
     __tablename__ = "current_wallet"
+    __table_args__ = (
+        # Matches the distinct on (walletAddress, tokenType) order by blockNumber desc in `get_current_wallet`,
+        # so the latest row of each position is read from the index instead of sorting the whole table
+        Index("ix_current_wallet_position_block", "walletAddress", "tokenType", "blockNumber"),
+    )
 
     # Default table primary key
     id: Mapped[int] = mapped_column(BigInteger(), primary_key=True, init=False, autoincrement=True)
@@ -270,6 +340,27 @@ class CurrentWallet(Base):
     maturityTime: Mapped[Union[int, None]] = mapped_column(Numeric, default=None)
 
 
+class LatestWallet(Base):
+    """Table/dataclass schema for the latest position of every wallet and token.
+
+    Holds one row per (walletAddress, tokenType), upserted alongside CurrentWallet,
+    so reading the latest positions doesn't scan the CurrentWallet history.
+    """
+
+    __tablename__ = "latest_wallet"
+
+    # The block of the latest update to the position
+    blockNumber: Mapped[int] = mapped_column(BigInteger, index=True)
+    walletAddress: Mapped[str] = mapped_column(String, primary_key=True)
+    # tokenType is the baseTokenType appended with "-<maturity_time>" for LONG and SHORT
+    tokenType: Mapped[str] = mapped_column(String, primary_key=True)
+    # baseTokenType can be BASE, LONG, SHORT, LP, or WITHDRAWAL_SHARE
+    baseTokenType: Mapped[Union[str, None]] = mapped_column(String, default=None)
+    value: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
+    # While time here is in epoch seconds, we use Numeric to allow for (1) lossless storage and (2) allow for NaNs
+    maturityTime: Mapped[Union[int, None]] = mapped_column(Numeric, default=None)
+
+
 class Ticker(Base):
     """Table/dataclass schema for the live ticker.
 
@@ -277,6 +368,10 @@ class Ticker(Base):
     """
 
     __tablename__ = "ticker"
+    __table_args__ = (
+        # Ticker of a set of wallets over a block range, see `get_ticker`
+        Index("ix_ticker_wallet_block", "walletAddress", "blockNumber"),
+    )
 
     id: Mapped[int] = mapped_column(BigInteger(), primary_key=True, init=False, autoincrement=True)
     blockNumber: Mapped[int] = mapped_column(BigInteger, index=True)
@@ -295,6 +390,10 @@ class WalletPNL(Base):
     """
 
     __tablename__ = "wallet_pnl"
+    __table_args__ = (
+        # PNL of a set of wallets over a block range, see `get_wallet_pnl`
+        Index("ix_wallet_pnl_wallet_block", "walletAddress", "blockNumber"),
+    )
 
     # Default table primary key
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, init=False, autoincrement=True)
@@ -309,3 +408,23 @@ class WalletPNL(Base):
     maturityTime: Mapped[Union[int, None]] = mapped_column(Numeric, default=None)
     latest_block_update: Mapped[Union[int, None]] = mapped_column(BigInteger, default=None)
     pnl: Mapped[Union[Decimal, None]] = mapped_column(FIXED_NUMERIC, default=None)
+
+
+class PnlSnapshot(Base):
+    """Table/dataclass schema for the blocks that wallet pnl was snapshotted at.
+
+    A full snapshot has the pnl of every wallet at the block. In between full snapshots, a snapshot only has the
+    wallets whose positions changed since the previous snapshot, so the latest pnl of a wallet is in the latest
+    snapshot that has the wallet, see `get_latest_wallet_pnl`.
+    """
+
+    __tablename__ = "pnl_snapshot"
+
+    blockNumber: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    isFull: Mapped[bool] = mapped_column(Boolean)
+    numWallets: Mapped[Union[int, None]] = mapped_column(Integer, default=None)
+
+
+# Tables rolled out of postgres by `bin/run_cold_storage.py`, see `chainsync.db.base.roll_out_to_cold_storage`.
+# pool_info stays in postgres, since pool_analysis, the pool rollups and wallet_pnl are joined to it by block.
+COLD_STORAGE_TABLES = (HyperdriveTransaction, WalletDelta, WalletPNL)
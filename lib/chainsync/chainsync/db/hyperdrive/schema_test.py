@@ -2,7 +2,21 @@
 from datetime import datetime
 from decimal import Decimal
 
-from .schema import CheckpointInfo, HyperdriveTransaction, PoolConfig, PoolInfo, WalletDelta, WalletInfoFromChain
+from fixedpointmath import FixedPoint
+from sqlalchemy import Column, MetaData, Table, select
+
+from .convert_data import convert_pool_config
+from .fixed_numeric import build_fixed_numeric_types
+from .schema import (
+    FIXED_NUMERIC,
+    FIXED_RATIO,
+    CheckpointInfo,
+    HyperdriveTransaction,
+    PoolConfig,
+    PoolInfo,
+    WalletDelta,
+    WalletInfoFromChain,
+)
 
 # These tests are using fixtures defined in conftest.py
 
@@ -113,6 +127,46 @@ class TestPoolConfigTable:
         deleted_pool_config = db_session.query(PoolConfig).filter_by(contractAddress="0").first()
         assert deleted_pool_config is None
 
+    def test_compact_storage_round_trip(self, db_session):
+        """A realistic pool config fits the compact column types and reads back unchanged."""
+        compact_numeric, compact_ratio = build_fixed_numeric_types("compact")
+        column_types = {FIXED_NUMERIC: compact_numeric, FIXED_RATIO: compact_ratio}
+        table = Table(
+            "pool_config_compact",
+            MetaData(),
+            *[
+                Column(column.name, column_types.get(column.type, column.type), primary_key=column.primary_key)
+                for column in PoolConfig.__table__.columns
+            ],
+        )
+        inv_time_stretch = FixedPoint("0.045071688063194094")
+        pool_config = convert_pool_config(
+            {
+                "contractAddress": "0x" + "11" * 20,
+                "baseToken": "0x" + "22" * 20,
+                "initialSharePrice": FixedPoint(1),
+                "minimumShareReserves": FixedPoint(10),
+                "positionDuration": 604800,
+                "checkpointDuration": 3600,
+                # The python time stretch is the inverse of the contract's, about 22
+                "timeStretch": FixedPoint(1) / inv_time_stretch,
+                "invTimeStretch": inv_time_stretch,
+                "governance": "0x" + "33" * 20,
+                "feeCollector": "0x" + "44" * 20,
+                "curveFee": FixedPoint("0.1"),
+                "flatFee": FixedPoint("0.0005"),
+                "governanceFee": FixedPoint("0.15"),
+                "oracleSize": 10,
+                "updateGap": 3600,
+            }
+        )
+        row = {column.name: getattr(pool_config, column.name) for column in table.columns}
+        connection = db_session.connection()
+        table.create(connection)
+        connection.execute(table.insert(), [row])
+        assert connection.execute(select(table)).mappings().one() == row
+        db_session.rollback()
+
 
 class TestPoolInfoTable:
     """CRUD tests for poolinfo table"""
@@ -0,0 +1,256 @@
+"""Track wallet balances in memory from wallet deltas, instead of querying every balance from the chain."""
+from __future__ import annotations
+
+import logging
+import random
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Sequence
+
+from eth_typing import BlockNumber
+from ethpy.base import get_erc20_balances, get_wallet_snapshot
+from ethpy.hyperdrive import AssetIdPrefix, encode_asset_id
+from sqlalchemy.orm import Session
+from web3.contract.contract import Contract
+
+from .convert_data import _convert_scaled_value_to_decimal
+from .interface import get_current_wallet_info
+from .schema import WalletDelta, WalletInfoFromChain
+
+PositionKey = tuple[str, str]
+
+
+@dataclass
+class WalletPosition:
+    """The current balance of one token in one wallet.
+
+    Attributes
+    ----------
+    wallet_address: str
+        The address of the wallet
+    base_token_type: str
+        One of BASE, LONG, SHORT, LP, or WITHDRAWAL_SHARE
+    token_type: str
+        The base token type, appended with "-<maturity_time>" for LONG and SHORT
+    maturity_time: int | None
+        The maturity time of LONG and SHORT tokens
+    value: Decimal
+        The balance of the token
+    """
+
+    wallet_address: str
+    base_token_type: str
+    token_type: str
+    maturity_time: int | None
+    value: Decimal
+
+
+@dataclass
+class WalletPositionMetrics:
+    """Counters for the chain queries made by a position engine.
+
+    Attributes
+    ----------
+    positions_seeded: int
+        The number of positions whose first balance was read from the chain
+    positions_verified: int
+        The number of tracked balances that were sampled and compared with the chain
+    mismatches: int
+        The number of sampled balances that did not match the chain and were corrected
+    """
+
+    positions_seeded: int = 0
+    positions_verified: int = 0
+    mismatches: int = 0
+
+
+class WalletPositionEngine:
+    """Maintains the balance of every (wallet, token) pair by applying wallet deltas as blocks are ingested.
+
+    A position is read from the chain once, the first time it is touched, since its history before ingestion
+    started (or a token transfer that is not a hyperdrive trade) is not in the deltas.
+    After that, balances only change by deltas, and a random `verification_rate` fraction of the updated
+    balances is compared with the chain; mismatches are logged and replaced by the chain value.
+    Blocks must be applied in order.
+    """
+
+    def __init__(
+        self,
+        hyperdrive_contract: Contract,
+        base_contract: Contract,
+        verification_rate: float = 0.01,
+        snapshot_interval: int | None = 1000,
+        seed: int | None = None,
+    ) -> None:
+        """Initialize the engine.
+
+        Arguments
+        ---------
+        hyperdrive_contract: Contract
+            The deployed hyperdrive contract instance
+        base_contract: Contract
+            The deployed base contract instance
+        verification_rate: float, optional
+            The fraction of updated balances that are checked against the chain, between 0 and 1
+        snapshot_interval: int | None, optional
+            Every `snapshot_interval` blocks, the balance of every tracked position is included in the output rows;
+            if None, only updated positions are
+        seed: int | None, optional
+            Seed for the random sampling of balances to verify
+        """
+        # pylint: disable=too-many-arguments
+        if not 0 <= verification_rate <= 1:
+            raise ValueError(f"{verification_rate=} must be between 0 and 1")
+        self.hyperdrive_contract = hyperdrive_contract
+        self.base_contract = base_contract
+        self.verification_rate = verification_rate
+        self.snapshot_interval = snapshot_interval
+        self.positions: dict[PositionKey, WalletPosition] = {}
+        self.metrics = WalletPositionMetrics()
+        self._rng = random.Random(seed)
+
+    def load_from_db(self, session: Session, end_block: int | None = None) -> None:
+        """Restore the tracked positions from the latest wallet info rows in the db.
+
+        Arguments
+        ---------
+        session: Session
+            The initialized session object
+        end_block: int | None, optional
+            Only restore from rows before this block, matching python slicing notation
+        """
+        current_wallet_info = get_current_wallet_info(session, end_block=end_block, coerce_float=False).reset_index()
+        for _, row in current_wallet_info.iterrows():
+            maturity_time = row["maturityTime"]
+            self.positions[(row["walletAddress"], row["tokenType"])] = WalletPosition(
+                wallet_address=row["walletAddress"],
+                base_token_type=row["baseTokenType"],
+                token_type=row["tokenType"],
+                maturity_time=None if maturity_time is None or maturity_time != maturity_time else int(maturity_time),
+                value=Decimal(row["tokenValue"]),
+            )
+        logging.info("Loaded %s wallet positions from the db", len(self.positions))
+
+    def apply_block(
+        self, block_number: BlockNumber, wallet_deltas: Sequence[WalletDelta], share_price: Decimal | None
+    ) -> list[WalletInfoFromChain]:
+        """Apply the wallet deltas of a block and return the wallet info rows for the block.
+
+        Arguments
+        ---------
+        block_number: BlockNumber
+            The block the deltas are from
+        wallet_deltas: Sequence[WalletDelta]
+            The wallet deltas of every hyperdrive transaction in the block
+        share_price: Decimal | None
+            The share price from the block's pool info, stored with SHORT positions
+
+        Returns
+        -------
+        list[WalletInfoFromChain]
+            The balances of the positions updated in this block, or of every position on snapshot blocks
+        """
+        updated_keys: list[PositionKey] = []
+        new_keys: list[PositionKey] = []
+        for wallet_delta in wallet_deltas:
+            if wallet_delta.walletAddress is None or wallet_delta.tokenType is None:
+                continue
+            key = (wallet_delta.walletAddress, wallet_delta.tokenType)
+            if key not in self.positions:
+                base_token_type = wallet_delta.baseTokenType or wallet_delta.tokenType
+                self.positions[key] = WalletPosition(
+                    wallet_address=wallet_delta.walletAddress,
+                    base_token_type=base_token_type,
+                    token_type=wallet_delta.tokenType,
+                    maturity_time=(
+                        int(wallet_delta.maturityTime)
+                        if base_token_type in ("LONG", "SHORT") and wallet_delta.maturityTime is not None
+                        else None
+                    ),
+                    value=Decimal(0),
+                )
+                # The chain balance after this block already includes the block's deltas
+                new_keys.append(key)
+            elif key not in new_keys and wallet_delta.delta is not None:
+                self.positions[key].value += wallet_delta.delta
+            if key not in updated_keys:
+                updated_keys.append(key)
+        if len(new_keys) > 0:
+            self._read_from_chain(new_keys, block_number)
+            self.metrics.positions_seeded += len(new_keys)
+        sampled_keys = [
+            key for key in updated_keys if key not in new_keys and self._rng.random() < self.verification_rate
+        ]
+        if len(sampled_keys) > 0:
+            self._verify(sampled_keys, block_number)
+        if self.snapshot_interval is not None and block_number % self.snapshot_interval == 0:
+            output_keys = list(self.positions)
+        else:
+            output_keys = updated_keys
+        return [self._to_wallet_info(self.positions[key], block_number, share_price) for key in output_keys]
+
+    def _verify(self, keys: list[PositionKey], block_number: BlockNumber) -> None:
+        """Compare tracked balances with the chain, correcting any that differ."""
+        tracked_values = {key: self.positions[key].value for key in keys}
+        self._read_from_chain(keys, block_number)
+        self.metrics.positions_verified += len(keys)
+        for key, tracked_value in tracked_values.items():
+            if tracked_value != self.positions[key].value:
+                self.metrics.mismatches += 1
+                logging.warning(
+                    "Tracked balance %s of %s at block %s does not match the chain balance %s, correcting",
+                    tracked_value,
+                    key,
+                    block_number,
+                    self.positions[key].value,
+                )
+
+    def _read_from_chain(self, keys: list[PositionKey], block_number: BlockNumber) -> None:
+        """Set the balance of the positions to their value on chain, with one batch per token contract."""
+        base_keys = [key for key in keys if self.positions[key].base_token_type == "BASE"]
+        token_keys = [key for key in keys if self.positions[key].base_token_type != "BASE"]
+        if len(base_keys) > 0:
+            base_balances = get_erc20_balances(self.base_contract, [wallet for wallet, _ in base_keys], block_number)
+            for key, balance in zip(base_keys, base_balances):
+                self._set_chain_value(key, balance)
+        if len(token_keys) > 0:
+            wallet_addresses = list(dict.fromkeys(wallet for wallet, _ in token_keys))
+            token_ids = list(dict.fromkeys(self._token_id(self.positions[key]) for key in token_keys))
+            token_balances = get_wallet_snapshot(self.hyperdrive_contract, wallet_addresses, token_ids, block_number)
+            for key in token_keys:
+                self._set_chain_value(
+                    key,
+                    token_balances[
+                        wallet_addresses.index(key[0]), token_ids.index(self._token_id(self.positions[key]))
+                    ],
+                )
+
+    def _set_chain_value(self, key: PositionKey, balance: int | None) -> None:
+        if balance is None:
+            raise ValueError(f"Failed to read the balance of {key} from the chain")
+        value = _convert_scaled_value_to_decimal(balance)
+        assert value is not None
+        self.positions[key].value = value
+
+    @staticmethod
+    def _token_id(position: WalletPosition) -> int:
+        """The hyperdrive multitoken id of a non-base position."""
+        if position.base_token_type in ("LONG", "SHORT"):
+            assert position.maturity_time is not None
+            return encode_asset_id(AssetIdPrefix[position.base_token_type].value, position.maturity_time)
+        # LP and withdrawal tokens always have 0 maturity
+        return encode_asset_id(AssetIdPrefix[position.base_token_type].value, 0)
+
+    @staticmethod
+    def _to_wallet_info(
+        position: WalletPosition, block_number: BlockNumber, share_price: Decimal | None
+    ) -> WalletInfoFromChain:
+        return WalletInfoFromChain(
+            blockNumber=block_number,
+            walletAddress=position.wallet_address,
+            baseTokenType=position.base_token_type,
+            tokenType=position.token_type,
+            tokenValue=position.value,
+            maturityTime=position.maturity_time,
+            sharePrice=share_price if position.base_token_type == "SHORT" else None,
+        )
@@ -0,0 +1,130 @@
+"""Tests for wallet_positions.py"""
+from decimal import Decimal
+
+import numpy as np
+from eth_typing import BlockNumber
+from ethpy.hyperdrive import AssetIdPrefix, encode_asset_id
+
+from . import wallet_positions
+from .interface import add_wallet_infos
+from .schema import WalletDelta, WalletInfoFromChain
+from .wallet_positions import WalletPositionEngine
+
+MATURITY_TIME = 1000
+LONG_ID = encode_asset_id(AssetIdPrefix.LONG.value, MATURITY_TIME)
+
+
+class _FakeChain:
+    """Balances on a fake chain, counting the balances read from it."""
+
+    def __init__(self, balances: dict[tuple[str, int | str], int]):
+        self.balances = balances
+        self.reads = 0
+
+    def get_erc20_balances(self, contract, wallet_addresses, block_number):
+        self.reads += len(wallet_addresses)
+        return [self.balances[(wallet, "BASE")] for wallet in wallet_addresses]
+
+    def get_wallet_snapshot(self, contract, wallet_addresses, token_ids, block_number):
+        self.reads += len(wallet_addresses) * len(token_ids)
+        return np.array(
+            [[self.balances.get((wallet, token_id), 0) for token_id in token_ids] for wallet in wallet_addresses],
+            dtype=object,
+        )
+
+
+def _open_long_deltas(wallet: str, block_number: int, bonds: int, base: int) -> list[WalletDelta]:
+    return [
+        WalletDelta(
+            transactionHash=f"0x{block_number}",
+            blockNumber=block_number,
+            walletAddress=wallet,
+            baseTokenType="LONG",
+            tokenType=f"LONG-{MATURITY_TIME}",
+            delta=Decimal(bonds),
+            maturityTime=MATURITY_TIME,
+        ),
+        WalletDelta(
+            transactionHash=f"0x{block_number}",
+            blockNumber=block_number,
+            walletAddress=wallet,
+            baseTokenType="BASE",
+            tokenType="BASE",
+            delta=Decimal(-base),
+        ),
+    ]
+
+
+class TestWalletPositionEngine:
+    """Testing tracking wallet balances from deltas"""
+
+    def test_positions_are_read_once_then_tracked(self, monkeypatch):
+        """New positions are read from the chain, later ones are only updated by deltas."""
+        chain = _FakeChain({("0xa", "BASE"): 90 * 10**18, ("0xa", LONG_ID): 11 * 10**18})
+        monkeypatch.setattr(wallet_positions, "get_erc20_balances", chain.get_erc20_balances)
+        monkeypatch.setattr(wallet_positions, "get_wallet_snapshot", chain.get_wallet_snapshot)
+        engine = WalletPositionEngine(None, None, verification_rate=0, snapshot_interval=None)  # type: ignore
+
+        wallet_infos = engine.apply_block(BlockNumber(1), _open_long_deltas("0xa", 1, 11, 10), Decimal(1))
+        assert {info.tokenType: info.tokenValue for info in wallet_infos} == {
+            f"LONG-{MATURITY_TIME}": Decimal(11),
+            "BASE": Decimal(90),
+        }
+        assert chain.reads == 2
+
+        wallet_infos = engine.apply_block(BlockNumber(2), _open_long_deltas("0xa", 2, 5, 4), Decimal(1))
+        assert {info.tokenType: info.tokenValue for info in wallet_infos} == {
+            f"LONG-{MATURITY_TIME}": Decimal(16),
+            "BASE": Decimal(86),
+        }
+        assert all(info.blockNumber == 2 and info.maturityTime in (None, MATURITY_TIME) for info in wallet_infos)
+        assert chain.reads == 2
+        assert engine.metrics.positions_seeded == 2
+
+    def test_verification_corrects_mismatches(self, monkeypatch):
+        """Sampled balances that differ from the chain are replaced with the chain value."""
+        chain = _FakeChain({("0xa", "BASE"): 90 * 10**18, ("0xa", LONG_ID): 11 * 10**18})
+        monkeypatch.setattr(wallet_positions, "get_erc20_balances", chain.get_erc20_balances)
+        monkeypatch.setattr(wallet_positions, "get_wallet_snapshot", chain.get_wallet_snapshot)
+        engine = WalletPositionEngine(None, None, verification_rate=1, snapshot_interval=None)  # type: ignore
+        engine.apply_block(BlockNumber(1), _open_long_deltas("0xa", 1, 11, 10), Decimal(1))
+        # Base tokens minted outside of hyperdrive are not in the deltas
+        chain.balances[("0xa", "BASE")] = 186 * 10**18
+        chain.balances[("0xa", LONG_ID)] = 16 * 10**18
+        wallet_infos = engine.apply_block(BlockNumber(2), _open_long_deltas("0xa", 2, 5, 4), Decimal(1))
+        assert {info.tokenType: info.tokenValue for info in wallet_infos}["BASE"] == Decimal(186)
+        assert engine.metrics.positions_verified == 2
+        assert engine.metrics.mismatches == 1
+
+    def test_snapshot_blocks_include_every_position(self, monkeypatch):
+        """On snapshot blocks, positions that were not updated are included in the rows too."""
+        chain = _FakeChain({("0xa", "BASE"): 1, ("0xa", LONG_ID): 1, ("0xb", "BASE"): 1, ("0xb", LONG_ID): 1})
+        monkeypatch.setattr(wallet_positions, "get_erc20_balances", chain.get_erc20_balances)
+        monkeypatch.setattr(wallet_positions, "get_wallet_snapshot", chain.get_wallet_snapshot)
+        engine = WalletPositionEngine(None, None, verification_rate=0, snapshot_interval=10)  # type: ignore
+        engine.apply_block(BlockNumber(9), _open_long_deltas("0xa", 9, 1, 1), Decimal(1))
+        wallet_infos = engine.apply_block(BlockNumber(10), _open_long_deltas("0xb", 10, 1, 1), Decimal(1))
+        assert {info.walletAddress for info in wallet_infos} == {"0xa", "0xb"}
+        assert len(wallet_infos) == 4
+
+    def test_load_from_db(self, db_session):
+        """Positions are restored from the latest wallet info rows."""
+        add_wallet_infos(
+            [
+                WalletInfoFromChain(
+                    blockNumber=block_number,
+                    walletAddress="0xa",
+                    baseTokenType="LONG",
+                    tokenType=f"LONG-{MATURITY_TIME}",
+                    tokenValue=Decimal(block_number),
+                    maturityTime=MATURITY_TIME,
+                )
+                for block_number in [1, 2]
+            ],
+            db_session,
+        )
+        engine = WalletPositionEngine(None, None)  # type: ignore
+        engine.load_from_db(db_session)
+        position = engine.positions[("0xa", f"LONG-{MATURITY_TIME}")]
+        assert position.value == Decimal(2)
+        assert position.maturity_time == MATURITY_TIME
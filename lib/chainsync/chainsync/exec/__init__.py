@@ -1,3 +1,4 @@
 """Execution functions for chainsync"""
 from .acquire_data import acquire_data
-from .data_analysis import data_analysis
+from .acquire_data_pipelined import HyperdrivePipeline, StageMetrics, acquire_data_pipelined
+from .data_analysis import PnlSchedule, PnlScheduler, data_analysis
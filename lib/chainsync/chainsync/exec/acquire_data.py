@@ -1,20 +1,27 @@
 """Script to format on-chain hyperdrive pool, config, and transaction data post-processing."""
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
 import time
 
 from chainsync.db.base import initialize_session
 from chainsync.db.hyperdrive import (
+    WalletPositionEngine,
+    backfill_chain_to_db,
     data_chain_to_db,
     get_latest_block_number_from_pool_info_table,
     init_data_chain_to_db,
+    remove_partial_blocks_from_db,
 )
 from eth_typing import BlockNumber
 from ethpy import EthConfig, build_eth_config
+from ethpy.base import BlockHeader, BlockStream
 from ethpy.hyperdrive import HyperdriveAddresses, fetch_hyperdrive_address_from_url, get_web3_and_hyperdrive_contracts
 from sqlalchemy.orm import Session
+from web3 import Web3
+from web3.contract.contract import Contract
 
 _SLEEP_AMOUNT = 1
 
@@ -28,6 +35,8 @@ def acquire_data(
     db_session: Session | None = None,
     contract_addresses: HyperdriveAddresses | None = None,
     exit_on_catch_up: bool = False,
+    backfill_workers: int = 8,
+    wallet_verification_rate: float | None = None,
 ):
     """Execute the data acquisition pipeline.
 
@@ -36,7 +45,8 @@ def acquire_data(
     start_block : int
         The starting block to filter the query on
     lookback_block_limit : int
-        The maximum number of blocks to look back when filling in missing data
+        The maximum number of blocks to look back when starting with an empty database.
+        Restarts always resume from the latest block in the database, so no blocks are skipped.
     eth_config: EthConfig | None
         Configuration for urls to the rpc and artifacts. If not set, will look for addresses
         in eth.env.
@@ -48,13 +58,133 @@ def acquire_data(
         defined in eth_config.
     exit_on_catch_up: bool
         If True, will exit after catching up to current block
+    backfill_workers: int
+        The number of threads fetching blocks concurrently when more than one block behind the chain
+    wallet_verification_rate: float | None
+        If set, wallet balances are tracked from the wallet deltas (see `WalletPositionEngine`),
+        and only this fraction of the updated balances is verified against the chain.
+        Otherwise, the balance of every wallet that transacted is queried from the chain on every block.
     """
     ## Initialization
     # eth config
     if eth_config is None:
         # Load parameters from env vars if they exist
         eth_config = build_eth_config()
+    (
+        web3,
+        base_contract,
+        hyperdrive_contract,
+        db_session,
+        data_latest_block_number,
+        block_number,
+    ) = initialize_acquire_data(start_block, lookback_block_limit, eth_config, db_session, contract_addresses)
+    position_engine = None
+    if wallet_verification_rate is not None:
+        position_engine = WalletPositionEngine(
+            hyperdrive_contract, base_contract, verification_rate=wallet_verification_rate
+        )
+        position_engine.load_from_db(db_session)
 
+    # This if statement executes only on initial run (based on data_latest_block_number check),
+    # and if the chain has executed until start_block (based on latest_mined_block check)
+    if data_latest_block_number < block_number < web3.eth.get_block_number():
+        data_chain_to_db(web3, base_contract, hyperdrive_contract, block_number, db_session, position_engine)
+
+    # Main data loop
+    # monitor for new blocks & add pool info per block
+    logging.info("Monitoring for pool info updates...")
+    if eth_config.WS_URL is not None and not exit_on_catch_up:
+        # Backfill up to the current head first, since the stream dispatches missed blocks one at a time
+        latest_mined_block = web3.eth.get_block_number()
+        if latest_mined_block > block_number:
+            logging.info("Backfilling blocks %s to %s", block_number + 1, latest_mined_block)
+            backfill_chain_to_db(
+                web3,
+                base_contract,
+                hyperdrive_contract,
+                BlockNumber(block_number + 1),
+                latest_mined_block,
+                db_session,
+                num_workers=backfill_workers,
+                position_engine=position_engine,
+            )
+            block_number = latest_mined_block
+        # Push new blocks from a websocket subscription instead of polling
+        block_stream = BlockStream(web3, ws_url=eth_config.WS_URL, poll_interval=_SLEEP_AMOUNT, halt_on_errors=True)
+
+        async def _acquire_block(header: BlockHeader) -> None:
+            # Run in a thread so the websocket keeps being serviced while the block is written
+            await asyncio.to_thread(
+                data_chain_to_db,
+                web3,
+                base_contract,
+                hyperdrive_contract,
+                BlockNumber(header.number),
+                db_session,
+                position_engine,
+            )
+
+        block_stream.register(_acquire_block)
+        asyncio.run(block_stream.run(start_block=block_number))
+        return
+    while True:
+        latest_mined_block = web3.eth.get_block_number()
+        # Only execute if we are on a new block
+        if latest_mined_block <= block_number:
+            time.sleep(_SLEEP_AMOUNT)
+            if exit_on_catch_up:
+                break
+            continue
+        # Backfilling for blocks that need updating
+        if latest_mined_block - block_number > 1:
+            logging.info("Backfilling blocks %s to %s", block_number + 1, latest_mined_block)
+            backfill_chain_to_db(
+                web3,
+                base_contract,
+                hyperdrive_contract,
+                BlockNumber(block_number + 1),
+                latest_mined_block,
+                db_session,
+                num_workers=backfill_workers,
+                position_engine=position_engine,
+            )
+        else:
+            logging.info("Block %s", latest_mined_block)
+            data_chain_to_db(web3, base_contract, hyperdrive_contract, latest_mined_block, db_session, position_engine)
+        block_number = latest_mined_block
+        time.sleep(_SLEEP_AMOUNT)
+
+
+def initialize_acquire_data(
+    start_block: int,
+    lookback_block_limit: int,
+    eth_config: EthConfig,
+    db_session: Session | None,
+    contract_addresses: HyperdriveAddresses | None,
+) -> tuple[Web3, Contract, Contract, Session, int, BlockNumber]:
+    """Connect to the chain and db, write the pool config, and find the block to resume from.
+
+    Arguments
+    ---------
+    start_block : int
+        The starting block to filter the query on
+    lookback_block_limit : int
+        The maximum number of blocks to look back when starting with an empty database
+    eth_config: EthConfig
+        Configuration for urls to the rpc and artifacts
+    db_session: Session | None
+        Session object for connecting to db. If None, will initialize a new session based on
+        postgres.env.
+    contract_addresses: HyperdriveAddresses | None
+        If set, will use these addresses instead of querying the artifact url
+        defined in eth_config.
+
+    Returns
+    -------
+    tuple[Web3, Contract, Contract, Session, int, BlockNumber]
+        The web3 provider, base contract, hyperdrive contract and db session,
+        the latest block in the db, and the block to resume from
+    """
     # postgres session
     if db_session is None:
         db_session = initialize_session()
@@ -69,46 +199,17 @@ def acquire_data(
     ## Get starting point for restarts
     # Get last entry of pool info in db
     data_latest_block_number = get_latest_block_number_from_pool_info_table(db_session)
+    # Pool info is written last for each block, so anything after it is from an interrupted write
+    remove_partial_blocks_from_db(data_latest_block_number, db_session)
     # Using max of latest block in database or specified start block
     block_number: BlockNumber = BlockNumber(max(start_block, data_latest_block_number))
     # Make sure to not grab current block, as the current block is subject to change
     # Current block is still being built
     latest_mined_block = web3.eth.get_block_number()
-    lookback_block_limit = BlockNumber(lookback_block_limit)
-
-    if (latest_mined_block - block_number) > lookback_block_limit:
+    if data_latest_block_number == 0 and (latest_mined_block - block_number) > lookback_block_limit:
         block_number = BlockNumber(latest_mined_block - lookback_block_limit)
         logging.warning("Starting block is past lookback block limit, starting at block %s", block_number)
 
     # Collect initial data
     init_data_chain_to_db(hyperdrive_contract, db_session)
-    # This if statement executes only on initial run (based on data_latest_block_number check),
-    # and if the chain has executed until start_block (based on latest_mined_block check)
-    if data_latest_block_number < block_number < latest_mined_block:
-        data_chain_to_db(web3, base_contract, hyperdrive_contract, block_number, db_session)
-
-    # Main data loop
-    # monitor for new blocks & add pool info per block
-    logging.info("Monitoring for pool info updates...")
-    while True:
-        latest_mined_block = web3.eth.get_block_number()
-        # Only execute if we are on a new block
-        if latest_mined_block <= block_number:
-            time.sleep(_SLEEP_AMOUNT)
-            if exit_on_catch_up:
-                break
-            continue
-        # Backfilling for blocks that need updating
-        for block_int in range(block_number + 1, latest_mined_block + 1):
-            block_number: BlockNumber = BlockNumber(block_int)
-            logging.info("Block %s", block_number)
-            # Explicit check against loopback block limit
-            if (latest_mined_block - block_number) > lookback_block_limit:
-                logging.warning(
-                    "Querying block_number %s out of %s, unable to keep up with chain block iteration",
-                    block_number,
-                    latest_mined_block,
-                )
-                continue
-            data_chain_to_db(web3, base_contract, hyperdrive_contract, block_number, db_session)
-        time.sleep(_SLEEP_AMOUNT)
+    return web3, base_contract, hyperdrive_contract, db_session, data_latest_block_number, block_number
@@ -0,0 +1,367 @@
+"""Data acquisition as a pipeline of stages, where fetching, decoding, converting and writing blocks overlap."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from chainsync.db.hyperdrive import (
+    HyperdriveBlockData,
+    HyperdriveTransaction,
+    WalletDelta,
+    WalletPositionEngine,
+    convert_checkpoint_info_rows,
+    convert_hyperdrive_transactions_with_receipts,
+    convert_pool_info_rows,
+    get_wallet_info,
+    write_blocks_data_to_db,
+)
+from eth_typing import BlockNumber
+from ethpy import EthConfig, build_eth_config
+from ethpy.base import fetch_contract_transactions_for_block_range
+from ethpy.hyperdrive import HyperdriveAddresses, get_hyperdrive_checkpoint_info, get_hyperdrive_pool_info
+from sqlalchemy.orm import Session
+from web3 import Web3
+from web3.contract.contract import Contract
+from web3.types import TxData, TxReceipt
+
+from .acquire_data import initialize_acquire_data
+
+_SLEEP_AMOUNT = 1
+_RETRY_COUNT = 10
+_RETRY_SLEEP_SECONDS = 1
+_METRICS_LOG_INTERVAL_SECONDS = 60
+
+
+@dataclass
+class StageMetrics:
+    """Throughput metrics for a single pipeline stage.
+
+    Attributes
+    ----------
+    items_processed: int
+        The number of blocks that went through the stage
+    busy_seconds: float
+        The time spent processing blocks
+    idle_seconds: float
+        The time spent waiting for the previous stage
+    blocked_seconds: float
+        The time spent waiting for the next stage to make room in its queue, i.e. under backpressure
+    """
+
+    items_processed: int = 0
+    busy_seconds: float = 0
+    idle_seconds: float = 0
+    blocked_seconds: float = 0
+
+    @property
+    def items_per_second(self) -> float:
+        """The throughput of the stage while it is busy."""
+        if self.busy_seconds == 0:
+            return 0
+        return self.items_processed / self.busy_seconds
+
+
+@dataclass
+class RawBlock:
+    """The raw chain data for a block, as returned by the fetch stage."""
+
+    block_number: BlockNumber
+    pool_info_dict: dict[str, Any]
+    checkpoint_info_dict: dict[str, Any]
+    transactions_and_receipts: list[tuple[TxData, TxReceipt]] = field(default_factory=list)
+
+
+class HyperdrivePipeline:
+    """Ingests hyperdrive blocks with four stages connected by bounded queues.
+
+    Each stage works on one block at a time and hands it to the next one, so while block N is written
+    block N+1 is converted, N+2 is decoded and N+3 is fetched. The queues are bounded, so a slow stage
+    (usually the db write or the chain queries) pauses the stages before it instead of buffering without limit.
+    Blocks are always written in order, and the write stage commits every block it has available in one batch.
+    """
+
+    STAGE_NAMES = ("fetch", "decode", "convert", "write")
+
+    def __init__(
+        self,
+        web3: Web3,
+        base_contract: Contract,
+        hyperdrive_contract: Contract,
+        db_session: Session,
+        queue_size: int = 4,
+        max_write_batch: int = 100,
+        position_engine: WalletPositionEngine | None = None,
+    ) -> None:
+        """Initialize the pipeline.
+
+        Arguments
+        ---------
+        web3: Web3
+            web3 provider object
+        base_contract: Contract
+            The deployed base contract instance
+        hyperdrive_contract: Contract
+            The deployed hyperdrive contract instance
+        db_session: Session
+            The initialized session object
+        queue_size: int, optional
+            The maximum number of blocks waiting between two stages
+        max_write_batch: int, optional
+            The maximum number of blocks written in a single commit
+        position_engine: WalletPositionEngine | None, optional
+            If set, the convert stage takes wallet info from the engine instead of querying every balance
+        """
+        # pylint: disable=too-many-arguments
+        self.web3 = web3
+        self.base_contract = base_contract
+        self.hyperdrive_contract = hyperdrive_contract
+        self.db_session = db_session
+        self.queue_size = queue_size
+        self.max_write_batch = max_write_batch
+        self.position_engine = position_engine
+        self.metrics: dict[str, StageMetrics] = {name: StageMetrics() for name in self.STAGE_NAMES}
+        self.last_written_block: BlockNumber | None = None
+
+    async def run(self, start_block: BlockNumber, exit_on_catch_up: bool = False) -> None:
+        """Ingest blocks starting at `start_block` until the pipeline fails, or until caught up if `exit_on_catch_up`.
+
+        Arguments
+        ---------
+        start_block: BlockNumber
+            The first block to ingest
+        exit_on_catch_up: bool, optional
+            If True, stop after the latest mined block at the time of catching up is written
+        """
+        queues: list[asyncio.Queue] = [asyncio.Queue(maxsize=self.queue_size) for _ in range(len(self.STAGE_NAMES))]
+        tasks = [
+            asyncio.create_task(self._produce_blocks(start_block, queues[0], exit_on_catch_up)),
+            asyncio.create_task(self._run_stage("fetch", self.fetch, queues[0], queues[1])),
+            asyncio.create_task(self._run_stage("decode", self.decode, queues[1], queues[2])),
+            asyncio.create_task(self._run_stage("convert", self.convert, queues[2], queues[3])),
+            asyncio.create_task(self._run_write_stage(queues[3])),
+        ]
+        metrics_task = asyncio.create_task(self._log_metrics())
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            # Surface the first failure; the remaining stages are cancelled below
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks + [metrics_task]:
+                task.cancel()
+            await asyncio.gather(*tasks, metrics_task, return_exceptions=True)
+
+    def fetch(self, block_number: BlockNumber) -> RawBlock:
+        """Query the raw pool info, checkpoint info and hyperdrive transactions of a block from the chain."""
+        return RawBlock(
+            block_number=block_number,
+            pool_info_dict=_call_with_retries(
+                get_hyperdrive_pool_info, self.web3, self.hyperdrive_contract, block_number
+            ),
+            checkpoint_info_dict=_call_with_retries(
+                get_hyperdrive_checkpoint_info, self.web3, self.hyperdrive_contract, block_number
+            ),
+            transactions_and_receipts=_call_with_retries(
+                fetch_contract_transactions_for_block_range,
+                self.web3,
+                self.hyperdrive_contract,
+                block_number,
+                block_number,
+            ),
+        )
+
+    def decode(self, raw_block: RawBlock) -> tuple[RawBlock, tuple[list[HyperdriveTransaction], list[WalletDelta]]]:
+        """Decode the block's transactions and logs into transactions and wallet deltas."""
+        return raw_block, convert_hyperdrive_transactions_with_receipts(
+            self.hyperdrive_contract, raw_block.transactions_and_receipts
+        )
+
+    def convert(
+        self, decoded_block: tuple[RawBlock, tuple[list[HyperdriveTransaction], list[WalletDelta]]]
+    ) -> HyperdriveBlockData:
+        """Convert the block to db objects, querying the balances of the wallets that transacted."""
+        raw_block, (transactions, wallet_deltas) = decoded_block
+        pool_info = convert_pool_info_rows([raw_block.pool_info_dict])[0]
+        if self.position_engine is not None:
+            # Blocks arrive in order, so the engine can apply them as they are converted
+            wallet_infos = self.position_engine.apply_block(
+                raw_block.block_number, wallet_deltas, pool_info["sharePrice"]
+            )
+        else:
+            wallet_infos = _call_with_retries(
+                get_wallet_info,
+                self.hyperdrive_contract,
+                self.base_contract,
+                raw_block.block_number,
+                transactions,
+                pool_info["sharePrice"],
+            )
+        return HyperdriveBlockData(
+            block_number=raw_block.block_number,
+            pool_info=pool_info,
+            checkpoint_info=convert_checkpoint_info_rows([raw_block.checkpoint_info_dict])[0],
+            transactions=transactions,
+            wallet_deltas=wallet_deltas,
+            wallet_infos=wallet_infos,
+        )
+
+    def write(self, blocks_data: list[HyperdriveBlockData]) -> None:
+        """Write a batch of consecutive blocks to the db in one transaction."""
+        write_blocks_data_to_db(blocks_data, self.db_session)
+
+    async def _produce_blocks(self, start_block: BlockNumber, out_queue: asyncio.Queue, exit_on_catch_up: bool) -> None:
+        """Feed every mined block number, starting at `start_block`, to the fetch stage."""
+        next_block = start_block
+        while True:
+            latest_mined_block = await asyncio.to_thread(self.web3.eth.get_block_number)
+            while next_block <= latest_mined_block:
+                await out_queue.put(BlockNumber(next_block))
+                next_block = BlockNumber(next_block + 1)
+            if exit_on_catch_up:
+                await out_queue.put(None)
+                return
+            await asyncio.sleep(_SLEEP_AMOUNT)
+
+    async def _run_stage(
+        self, name: str, process: Callable[[Any], Any], in_queue: asyncio.Queue, out_queue: asyncio.Queue
+    ) -> None:
+        """Process items from `in_queue` one at a time in a worker thread, passing the results to `out_queue`.
+
+        A None item marks the end of the input and is forwarded to the next stage.
+        """
+        metrics = self.metrics[name]
+        while True:
+            wait_start = time.time()
+            item = await in_queue.get()
+            metrics.idle_seconds += time.time() - wait_start
+            if item is None:
+                await out_queue.put(None)
+                return
+            process_start = time.time()
+            result = await asyncio.to_thread(process, item)
+            metrics.busy_seconds += time.time() - process_start
+            metrics.items_processed += 1
+            put_start = time.time()
+            await out_queue.put(result)
+            metrics.blocked_seconds += time.time() - put_start
+
+    async def _run_write_stage(self, in_queue: asyncio.Queue) -> None:
+        """Write blocks in order, batching every block that is ready into a single commit."""
+        metrics = self.metrics["write"]
+        finished = False
+        while not finished:
+            wait_start = time.time()
+            batch: list[HyperdriveBlockData] = []
+            item = await in_queue.get()
+            metrics.idle_seconds += time.time() - wait_start
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.max_write_batch or in_queue.empty():
+                    break
+                item = in_queue.get_nowait()
+            finished = item is None
+            if len(batch) > 0:
+                process_start = time.time()
+                await asyncio.to_thread(self.write, batch)
+                metrics.busy_seconds += time.time() - process_start
+                metrics.items_processed += len(batch)
+                self.last_written_block = batch[-1].block_number
+                logging.info("Wrote blocks %s to %s", batch[0].block_number, batch[-1].block_number)
+
+    async def _log_metrics(self) -> None:
+        """Periodically log the throughput of each stage."""
+        while True:
+            await asyncio.sleep(_METRICS_LOG_INTERVAL_SECONDS)
+            logging.info(
+                "Pipeline stage metrics: %s",
+                ", ".join(
+                    f"{name}: {metrics.items_per_second:.2f} blocks/s busy, "
+                    f"{metrics.idle_seconds:.1f}s idle, {metrics.blocked_seconds:.1f}s blocked"
+                    for name, metrics in self.metrics.items()
+                ),
+            )
+
+
+# Lots of arguments
+# pylint: disable=too-many-arguments
+def acquire_data_pipelined(
+    start_block: int = 0,
+    lookback_block_limit: int = 10000,
+    eth_config: EthConfig | None = None,
+    db_session: Session | None = None,
+    contract_addresses: HyperdriveAddresses | None = None,
+    exit_on_catch_up: bool = False,
+    queue_size: int = 4,
+    wallet_verification_rate: float | None = None,
+) -> HyperdrivePipeline:
+    """Execute the data acquisition pipeline with overlapping stages, see `HyperdrivePipeline`.
+
+    Arguments
+    ---------
+    start_block : int
+        The starting block to filter the query on
+    lookback_block_limit : int
+        The maximum number of blocks to look back when starting with an empty database.
+        Restarts always resume from the latest block in the database, so no blocks are skipped.
+    eth_config: EthConfig | None
+        Configuration for urls to the rpc and artifacts. If not set, will look for addresses
+        in eth.env.
+    db_session: Session | None
+        Session object for connecting to db. If None, will initialize a new session based on
+        postgres.env.
+    contract_addresses: HyperdriveAddresses | None
+        If set, will use these addresses instead of querying the artifact url
+        defined in eth_config.
+    exit_on_catch_up: bool
+        If True, will exit after catching up to current block
+    queue_size: int
+        The maximum number of blocks waiting between two stages
+    wallet_verification_rate: float | None
+        If set, wallet balances are tracked from the wallet deltas (see `WalletPositionEngine`),
+        and only this fraction of the updated balances is verified against the chain.
+
+    Returns
+    -------
+    HyperdrivePipeline
+        The pipeline, with its stage metrics
+    """
+    if eth_config is None:
+        # Load parameters from env vars if they exist
+        eth_config = build_eth_config()
+    (
+        web3,
+        base_contract,
+        hyperdrive_contract,
+        db_session,
+        data_latest_block_number,
+        block_number,
+    ) = initialize_acquire_data(start_block, lookback_block_limit, eth_config, db_session, contract_addresses)
+    # The resume block itself still needs to be written on an initial run
+    if block_number <= data_latest_block_number:
+        block_number = BlockNumber(block_number + 1)
+    position_engine = None
+    if wallet_verification_rate is not None:
+        position_engine = WalletPositionEngine(
+            hyperdrive_contract, base_contract, verification_rate=wallet_verification_rate
+        )
+        position_engine.load_from_db(db_session)
+    pipeline = HyperdrivePipeline(
+        web3, base_contract, hyperdrive_contract, db_session, queue_size=queue_size, position_engine=position_engine
+    )
+    logging.info("Monitoring for pool info updates...")
+    asyncio.run(pipeline.run(block_number, exit_on_catch_up=exit_on_catch_up))
+    return pipeline
+
+
+def _call_with_retries(func: Callable[..., Any], *args: Any) -> Any:
+    """Call a function that queries the chain, retrying when it fails with a ValueError."""
+    for _ in range(_RETRY_COUNT - 1):
+        try:
+            return func(*args)
+        except ValueError:
+            logging.warning("Error in %s, retrying", func.__name__)
+            time.sleep(_RETRY_SLEEP_SECONDS)
+    return func(*args)
@@ -0,0 +1,75 @@
+"""Tests for acquire_data_pipelined.py"""
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from eth_typing import BlockNumber
+
+from .acquire_data_pipelined import HyperdrivePipeline, RawBlock
+
+
+class _FakePipeline(HyperdrivePipeline):
+    """Pipeline with stages that record what they processed instead of querying the chain and db."""
+
+    def __init__(self, latest_block: int, fail_on_block: int | None = None, **kwargs):
+        web3 = SimpleNamespace(eth=SimpleNamespace(get_block_number=lambda: latest_block))
+        super().__init__(web3, None, None, None, **kwargs)  # type: ignore
+        self.fail_on_block = fail_on_block
+        self.written_batches: list[list[int]] = []
+        self.in_flight: dict[str, int] = {}
+        self.max_concurrent_stages = 0
+        self._lock = threading.Lock()
+
+    def _track(self, name: str, block_number: int) -> None:
+        with self._lock:
+            self.in_flight[name] = block_number
+            self.max_concurrent_stages = max(self.max_concurrent_stages, len(self.in_flight))
+        time.sleep(0.005)
+        with self._lock:
+            del self.in_flight[name]
+
+    def fetch(self, block_number):
+        if block_number == self.fail_on_block:
+            raise ValueError("Error in getting pool info")
+        self._track("fetch", block_number)
+        return RawBlock(block_number=block_number, pool_info_dict={}, checkpoint_info_dict={})
+
+    def decode(self, raw_block):
+        self._track("decode", raw_block.block_number)
+        return raw_block, ([], [])
+
+    def convert(self, decoded_block):
+        self._track("convert", decoded_block[0].block_number)
+        return SimpleNamespace(block_number=decoded_block[0].block_number)
+
+    def write(self, blocks_data):
+        self._track("write", blocks_data[0].block_number)
+        self.written_batches.append([block_data.block_number for block_data in blocks_data])
+
+
+class TestHyperdrivePipeline:
+    """Testing the staged ingestion pipeline"""
+
+    def test_blocks_are_written_in_order(self):
+        """Every block is written once and in order, with stages working on different blocks at the same time."""
+        pipeline = _FakePipeline(latest_block=40, queue_size=2, max_write_batch=5)
+        asyncio.run(pipeline.run(BlockNumber(3), exit_on_catch_up=True))
+        written_blocks = [block for batch in pipeline.written_batches for block in batch]
+        assert written_blocks == list(range(3, 41))
+        assert max(len(batch) for batch in pipeline.written_batches) <= 5
+        assert pipeline.last_written_block == 40
+        assert pipeline.max_concurrent_stages > 1
+        for name in HyperdrivePipeline.STAGE_NAMES:
+            assert pipeline.metrics[name].items_processed == 38
+            assert pipeline.metrics[name].items_per_second > 0
+
+    def test_stage_failure_stops_pipeline(self):
+        """A failing stage raises out of the pipeline, and later blocks are never written."""
+        pipeline = _FakePipeline(latest_block=40, fail_on_block=10)
+        with pytest.raises(ValueError):
+            asyncio.run(pipeline.run(BlockNumber(1), exit_on_catch_up=True))
+        written_blocks = [block for batch in pipeline.written_batches for block in batch]
+        assert written_blocks == list(range(1, len(written_blocks) + 1))
+        assert all(block < 10 for block in written_blocks)
@@ -4,19 +4,133 @@ from __future__ import annotations
 import logging
 import os
 import time
+from dataclasses import dataclass
 
-from chainsync.analysis import data_to_analysis
-from chainsync.db.base import initialize_session
+from chainsync.analysis import data_to_analysis, snapshot_wallet_pnl
+from chainsync.db.base import NotificationListener, initialize_session
 from chainsync.db.hyperdrive import (
+    BLOCKS_WRITTEN_CHANNEL,
     get_latest_block_number_from_analysis_table,
     get_latest_block_number_from_pool_info_table,
+    get_latest_pnl_snapshot_block,
     get_pool_config,
+    is_latest_wallet_synced,
+    is_pool_rollup_synced,
+    parse_blocks_written,
+    rebuild_latest_wallet,
+    rebuild_pool_rollup,
 )
 from ethpy import EthConfig, build_eth_config
 from ethpy.hyperdrive import HyperdriveAddresses, fetch_hyperdrive_address_from_url, get_web3_and_hyperdrive_contracts
 from sqlalchemy.orm import Session
 
 _SLEEP_AMOUNT = 1
+# Poll for new blocks when no notification arrived for this many seconds
+_LISTEN_TIMEOUT = 10
+
+
+@dataclass
+class PnlSchedule:
+    """How often wallet pnl is snapshotted into the wallet_pnl table.
+
+    Attributes
+    ----------
+    block_interval: int
+        The minimum number of blocks between snapshots
+    time_interval: float
+        The minimum number of seconds between snapshots
+    full_snapshot_interval: int
+        The number of blocks between full snapshots of every wallet. Snapshots in between only have the wallets
+        whose positions changed since the previous snapshot, so positions that only change in value with the pool
+        are refreshed at this cadence
+    """
+
+    block_interval: int = 1
+    time_interval: float = 0
+    full_snapshot_interval: int = 100
+
+
+class PnlScheduler:
+    """Decides when to snapshot wallet pnl, and for which wallets, following a `PnlSchedule`."""
+
+    def __init__(self, schedule: PnlSchedule, last_snapshot_block: int | None = None):
+        """Initialize the scheduler.
+
+        Wallet changes from before a restart are not known, so the first snapshot is always a full one.
+
+        Arguments
+        ---------
+        schedule: PnlSchedule
+            The snapshot cadence
+        last_snapshot_block: int | None, optional
+            The block of the latest snapshot in the db, if any
+        """
+        self.schedule = schedule
+        self.last_snapshot_block = last_snapshot_block
+        self.last_snapshot_time: float | None = None
+        self.last_full_snapshot_block: int | None = None
+        self.changed_wallets: set[str] = set()
+
+    def record_changed_wallets(self, wallet_addresses: list[str]) -> None:
+        """Remember the wallets whose positions changed, for the next snapshot.
+
+        Arguments
+        ---------
+        wallet_addresses: list[str]
+            The wallets whose positions changed in the latest batch
+        """
+        self.changed_wallets.update(wallet_addresses)
+
+    def next_snapshot(self, block_number: int, now: float | None = None) -> tuple[bool, list[str] | None]:
+        """Check whether a snapshot is due at a block, and which wallets it has.
+
+        Arguments
+        ---------
+        block_number: int
+            The latest analyzed block
+        now: float | None, optional
+            The current time in seconds, defaults to `time.time()`
+
+        Returns
+        -------
+        tuple[bool, list[str] | None]
+            Whether a snapshot is due, and the wallets to snapshot, or None for a full snapshot
+        """
+        if now is None:
+            now = time.time()
+        if self.last_snapshot_block is not None and block_number <= self.last_snapshot_block:
+            return False, None
+        if (
+            self.last_snapshot_block is None
+            or self.last_full_snapshot_block is None
+            or block_number - self.last_full_snapshot_block >= self.schedule.full_snapshot_interval
+        ):
+            return True, None
+        if block_number - self.last_snapshot_block < self.schedule.block_interval:
+            return False, None
+        if self.last_snapshot_time is not None and now - self.last_snapshot_time < self.schedule.time_interval:
+            return False, None
+        if len(self.changed_wallets) == 0:
+            return False, None
+        return True, sorted(self.changed_wallets)
+
+    def mark_snapshot(self, block_number: int, is_full: bool, now: float | None = None) -> None:
+        """Record that a snapshot was taken.
+
+        Arguments
+        ---------
+        block_number: int
+            The block of the snapshot
+        is_full: bool
+            Whether the snapshot had every wallet
+        now: float | None, optional
+            The current time in seconds, defaults to `time.time()`
+        """
+        self.last_snapshot_block = block_number
+        self.last_snapshot_time = time.time() if now is None else now
+        if is_full:
+            self.last_full_snapshot_block = block_number
+        self.changed_wallets.clear()
 
 
 def data_analysis(
@@ -25,6 +139,9 @@ def data_analysis(
     db_session: Session | None = None,
     contract_addresses: HyperdriveAddresses | None = None,
     exit_on_catch_up: bool = False,
+    pnl_verification_rate: float = 0.0,
+    pnl_schedule: PnlSchedule | None = None,
+    listen_for_blocks: bool = True,
 ):
     """Execute the data acquisition pipeline.
 
@@ -45,6 +162,12 @@ def data_analysis(
         defined in eth_config.
     exit_on_catch_up: bool
         If True, will exit after catching up to current block
+    pnl_verification_rate: float
+        The fraction of positions whose closeout pnl is checked against a preview on the chain
+    pnl_schedule: PnlSchedule | None
+        How often to snapshot wallet pnl. Defaults to `PnlSchedule()`
+    listen_for_blocks: bool
+        If True, wait for notifications of written blocks instead of polling the pool info table every second
     """
     ## Initialization
     # eth config
@@ -66,6 +189,16 @@ def data_analysis(
     ## Get starting point for restarts
     analysis_latest_block_number = get_latest_block_number_from_analysis_table(db_session)
 
+    # The latest positions table is kept in sync from here on, but may be missing history from before it existed
+    if not is_latest_wallet_synced(db_session):
+        logging.info("Rebuilding latest wallet positions from the current wallet history")
+        rebuild_latest_wallet(db_session)
+    if not is_pool_rollup_synced(db_session):
+        logging.info("Rebuilding pool rollups from the pool analysis")
+        rebuild_pool_rollup(db_session)
+
+    pnl_scheduler = PnlScheduler(pnl_schedule or PnlSchedule(), get_latest_pnl_snapshot_block(db_session))
+
     # Using max of latest block in database or specified start block
     block_number = max(start_block, analysis_latest_block_number)
 
@@ -76,29 +209,63 @@ def data_analysis(
     # Retry 10 times
     for _ in range(10):
         pool_config_df = get_pool_config(db_session, coerce_float=False)
-        pool_config_len = len(pool_config_df)
-        if pool_config_len == 0:
-            time.sleep(_SLEEP_AMOUNT)
-    if pool_config_df is None:
+        if len(pool_config_df) > 0:
+            break
+        time.sleep(_SLEEP_AMOUNT)
+    if pool_config_df is None or len(pool_config_df) == 0:
         raise ValueError("Error in getting pool config from db")
     assert len(pool_config_df) == 1
     pool_config = pool_config_df.iloc[0]
 
     # Main data loop
     # monitor for new blocks & add pool info per block
+    # Blocks are written with a notification of their range, so wait for those instead of polling,
+    # and fall back to polling when none arrive for a while, e.g. for writers that don't notify
+    listener = None
+    if listen_for_blocks and not exit_on_catch_up:
+        listener = NotificationListener(db_session.get_bind(), BLOCKS_WRITTEN_CHANNEL)
     logging.info("Monitoring database for updates...")
-    while True:
-        latest_data_block_number = get_latest_block_number_from_pool_info_table(db_session)
-        # Only execute if we are on a new block
-        if latest_data_block_number <= block_number:
-            time.sleep(_SLEEP_AMOUNT)
-            if exit_on_catch_up:
-                break
-            continue
-        # Does batch analysis on range(analysis_start_block, latest_data_block_number) blocks
-        analysis_start_block = block_number + 1
-        analysis_end_block = latest_data_block_number + 1
-        logging.info("Running batch %s to %s", analysis_start_block, analysis_end_block)
-        data_to_analysis(analysis_start_block, analysis_end_block, pool_config, db_session, hyperdrive_contract)
-        block_number = latest_data_block_number
-        time.sleep(_SLEEP_AMOUNT)
+    try:
+        # Blocks written before listening started are found by polling once
+        should_poll = True
+        while True:
+            latest_data_block_number = None
+            if listener is not None and not should_poll:
+                block_ranges = [parse_blocks_written(payload) for payload in listener.wait(_LISTEN_TIMEOUT)]
+                if len(block_ranges) > 0:
+                    latest_data_block_number = max(end_block for _, end_block in block_ranges)
+            if latest_data_block_number is None:
+                latest_data_block_number = get_latest_block_number_from_pool_info_table(db_session)
+            should_poll = False
+            # Only execute if we are on a new block
+            if latest_data_block_number <= block_number:
+                if exit_on_catch_up:
+                    break
+                if listener is None:
+                    time.sleep(_SLEEP_AMOUNT)
+                continue
+            # Does batch analysis on range(analysis_start_block, latest_data_block_number) blocks
+            analysis_start_block = block_number + 1
+            analysis_end_block = latest_data_block_number + 1
+            logging.info("Running batch %s to %s", analysis_start_block, analysis_end_block)
+            changed_wallets = data_to_analysis(
+                analysis_start_block, analysis_end_block, pool_config, db_session, hyperdrive_contract, calc_pnl=False
+            )
+            pnl_scheduler.record_changed_wallets(changed_wallets)
+            is_due, pnl_wallets = pnl_scheduler.next_snapshot(latest_data_block_number)
+            if is_due:
+                snapshot_wallet_pnl(
+                    analysis_end_block,
+                    pool_config,
+                    db_session,
+                    hyperdrive_contract,
+                    wallet_addresses=pnl_wallets,
+                    pnl_verification_rate=pnl_verification_rate,
+                )
+                pnl_scheduler.mark_snapshot(latest_data_block_number, is_full=pnl_wallets is None)
+            block_number = latest_data_block_number
+            if listener is None:
+                time.sleep(_SLEEP_AMOUNT)
+    finally:
+        if listener is not None:
+            listener.close()
@@ -0,0 +1,32 @@
+"""Tests for data_analysis.py"""
+from .data_analysis import PnlSchedule, PnlScheduler
+
+
+class TestPnlScheduler:
+    """Testing the cadence of pnl snapshots"""
+
+    def test_schedule(self):
+        """Changed wallets are snapshotted on the block and time cadence, with periodic full snapshots."""
+        scheduler = PnlScheduler(PnlSchedule(block_interval=2, time_interval=10, full_snapshot_interval=10))
+        # The first snapshot is always full
+        assert scheduler.next_snapshot(5, now=0) == (True, None)
+        scheduler.mark_snapshot(5, is_full=True, now=0)
+        assert scheduler.next_snapshot(5, now=100) == (False, None)
+
+        scheduler.record_changed_wallets(["addr_1", "addr_0"])
+        # Too few blocks, then too little time since the last snapshot
+        assert scheduler.next_snapshot(6, now=100) == (False, None)
+        assert scheduler.next_snapshot(7, now=5) == (False, None)
+        assert scheduler.next_snapshot(7, now=100) == (True, ["addr_0", "addr_1"])
+        scheduler.mark_snapshot(7, is_full=False, now=100)
+
+        # Nothing changed, so no snapshot until the next full one
+        assert scheduler.next_snapshot(12, now=200) == (False, None)
+        assert scheduler.next_snapshot(15, now=200) == (True, None)
+
+    def test_restart(self):
+        """After a restart, snapshots continue after the latest one in the db, starting with a full snapshot."""
+        scheduler = PnlScheduler(PnlSchedule(), last_snapshot_block=20)
+        scheduler.record_changed_wallets(["addr_0"])
+        assert scheduler.next_snapshot(20) == (False, None)
+        assert scheduler.next_snapshot(21) == (True, None)
@@ -1,16 +1,43 @@
 """Base utilities for working with contracts via web3"""
 from .abi import load_abi_from_file, load_all_abis
-from .contract import deploy_contract, deploy_contract_and_return, get_token_balance
-from .errors import ABIError, UnknownBlockError, decode_error_selector_for_contract
+from .block_stream import BlockHeader, BlockStream, BlockStreamMetrics
+from .contract import (
+    deploy_contract,
+    deploy_contract_and_return,
+    get_erc20_balances,
+    get_token_balance,
+    get_wallet_snapshot,
+)
+from .errors import (
+    ABIError,
+    BlockConsumerError,
+    CassetteMissError,
+    UnknownBlockError,
+    decode_error_selector_for_contract,
+)
+from .funding import check_signer_balances, fund_accounts, send_pipelined_transactions, set_anvil_account_balances
 from .receipts import get_event_object, get_transaction_logs
-from .rpc_interface import get_account_balance, set_anvil_account_balance
+from .rpc_cassette import RPCCassetteProvider
+from .rpc_interface import (
+    chain_snapshot,
+    evm_revert,
+    evm_snapshot,
+    get_account_balance,
+    is_anvil_chain,
+    make_batch_request,
+    set_anvil_account_balance,
+)
 from .transactions import (
+    PreviewResult,
+    PreviewTransaction,
     async_smart_contract_transact,
     async_wait_for_transaction_receipt,
     eth_transfer,
     fetch_contract_transactions_for_block,
+    fetch_contract_transactions_for_block_range,
     smart_contract_preview_transaction,
+    smart_contract_preview_transactions,
     smart_contract_read,
     smart_contract_transact,
 )
-from .web3_setup import initialize_web3_with_http_provider
+from .web3_setup import initialize_web3_with_cassette_provider, initialize_web3_with_http_provider
@@ -0,0 +1,226 @@
+"""Stream new block headers to registered consumers over a websocket subscription, falling back to polling."""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+import websockets
+from web3 import Web3
+
+from .errors import BlockConsumerError
+
+
+@dataclass
+class BlockHeader:
+    """The subset of a block header that is passed to block stream consumers.
+
+    Attributes
+    ----------
+    number: int
+        The block number
+    timestamp: int
+        The block timestamp, in seconds
+    hash: str
+        The hex encoded block hash
+    """
+
+    number: int
+    timestamp: int
+    hash: str
+
+
+BlockConsumer = Callable[[BlockHeader], Awaitable[None]]
+
+
+@dataclass
+class BlockStreamMetrics:
+    """Health metrics for a block stream.
+
+    Attributes
+    ----------
+    blocks_received: int
+        The number of block headers dispatched to consumers
+    last_block_number: int | None
+        The number of the most recent block
+    using_websocket: bool
+        True if headers currently arrive from the websocket subscription, False if polling
+    lag_seconds: float | None
+        Wall clock time minus block timestamp when the most recent block was received
+    max_lag_seconds: float
+        The largest `lag_seconds` observed
+    consumer_seconds: dict[str, float]
+        The time each consumer spent handling the most recent block
+    """
+
+    blocks_received: int = 0
+    last_block_number: int | None = None
+    using_websocket: bool = False
+    lag_seconds: float | None = None
+    max_lag_seconds: float = 0
+    consumer_seconds: dict[str, float] = field(default_factory=dict)
+
+
+class BlockStream:
+    """Fans out every new block header to registered async consumers.
+
+    Headers come from an `eth_subscribe("newHeads")` websocket subscription when `ws_url` is set,
+    otherwise (or while the websocket is down) the `web3` provider is polled. Every block is delivered exactly once
+    and in order; blocks missed while reconnecting are fetched from `web3` before new headers are dispatched.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+        self,
+        web3: Web3,
+        ws_url: str | None = None,
+        poll_interval: float = 1,
+        ws_retry_interval: float = 30,
+        halt_on_errors: bool = False,
+    ) -> None:
+        """Initialize the block stream.
+
+        Arguments
+        ---------
+        web3: Web3
+            web3 provider object, used for polling and for filling in missed blocks
+        ws_url: str | None, optional
+            The websocket url of the node; if not set the stream only polls
+        poll_interval: float, optional
+            Seconds between polls when not subscribed over websocket
+        ws_retry_interval: float, optional
+            Seconds to poll for after a websocket failure before trying to reconnect
+        halt_on_errors: bool, optional
+            If True, an exception raised by a consumer stops the stream; otherwise it is logged
+        """
+        self.web3 = web3
+        self.ws_url = ws_url
+        self.poll_interval = poll_interval
+        self.ws_retry_interval = ws_retry_interval
+        self.halt_on_errors = halt_on_errors
+        self.metrics = BlockStreamMetrics()
+        self._consumers: dict[str, BlockConsumer] = {}
+        self._stop_event = asyncio.Event()
+
+    def register(self, consumer: BlockConsumer, name: str | None = None) -> None:
+        """Register an async consumer that is awaited with each new block header.
+
+        Arguments
+        ---------
+        consumer: BlockConsumer
+            The async callable to register
+        name: str | None, optional
+            The name used for metrics, defaults to the consumer's `__name__`
+        """
+        if name is None:
+            name = getattr(consumer, "__name__", repr(consumer))
+        self._consumers[name] = consumer
+
+    def stop(self) -> None:
+        """Stop the stream after the block that is currently being dispatched."""
+        self._stop_event.set()
+
+    async def run(self, start_block: int | None = None) -> None:
+        """Stream blocks to consumers until `stop` is called.
+
+        Arguments
+        ---------
+        start_block: int | None, optional
+            Dispatch every block after this one; if not set, streaming starts at the next new block
+        """
+        if start_block is None:
+            start_block = await asyncio.to_thread(self.web3.eth.get_block_number)
+        self.metrics.last_block_number = start_block
+        while not self._stop_event.is_set():
+            if self.ws_url is not None:
+                try:
+                    await self._run_websocket()
+                except (OSError, asyncio.TimeoutError, websockets.WebSocketException, ValueError) as exc:
+                    logging.warning("Block stream websocket failed, falling back to polling: %s", exc)
+            self.metrics.using_websocket = False
+            await self._run_polling(None if self.ws_url is None else self.ws_retry_interval)
+
+    async def _run_websocket(self) -> None:
+        """Subscribe to new heads and dispatch them until the connection drops or the stream is stopped."""
+        assert self.ws_url is not None
+        async with websockets.connect(self.ws_url) as websocket:
+            request = {"jsonrpc": "2.0", "id": 1, "method": "eth_subscribe", "params": ["newHeads"]}
+            await websocket.send(json.dumps(request))
+            response = json.loads(await websocket.recv())
+            if "result" not in response:
+                raise ValueError(f"newHeads subscription failed with {response=}")
+            self.metrics.using_websocket = True
+            logging.info("Subscribed to new blocks at %s", self.ws_url)
+            # Catch up on anything produced while we were connecting
+            await self._dispatch_through(await asyncio.to_thread(self.web3.eth.get_block_number))
+            async for message in websocket:
+                raw_header = json.loads(message)["params"]["result"]
+                header = BlockHeader(
+                    number=int(raw_header["number"], 16),
+                    timestamp=int(raw_header["timestamp"], 16),
+                    hash=raw_header["hash"],
+                )
+                await self._dispatch_through(header.number, header)
+                if self._stop_event.is_set():
+                    return
+
+    async def _run_polling(self, duration: float | None) -> None:
+        """Poll for new blocks for `duration` seconds, or until the stream is stopped if `duration` is None."""
+        start_time = time.time()
+        while not self._stop_event.is_set():
+            await self._dispatch_through(await asyncio.to_thread(self.web3.eth.get_block_number))
+            if duration is not None and time.time() - start_time >= duration:
+                return
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _dispatch_through(self, block_number: int, header: BlockHeader | None = None) -> None:
+        """Dispatch every block after the last dispatched one, up to and including `block_number`."""
+        assert self.metrics.last_block_number is not None
+        for missing_block_number in range(self.metrics.last_block_number + 1, block_number):
+            if self._stop_event.is_set():
+                return
+            await self._dispatch(await self._fetch_header(missing_block_number))
+        if block_number > self.metrics.last_block_number and not self._stop_event.is_set():
+            await self._dispatch(header if header is not None else await self._fetch_header(block_number))
+
+    async def _fetch_header(self, block_number: int) -> BlockHeader:
+        """Fetch a block header with web3."""
+        block = await asyncio.to_thread(self.web3.eth.get_block, block_number)
+        block_hash: Any = block.get("hash")
+        return BlockHeader(
+            number=block_number,
+            timestamp=block.get("timestamp", 0),
+            hash=block_hash.hex() if block_hash is not None else "",
+        )
+
+    async def _dispatch(self, header: BlockHeader) -> None:
+        """Run all consumers on a header and update the metrics."""
+        lag_seconds = time.time() - header.timestamp
+        self.metrics.blocks_received += 1
+        self.metrics.last_block_number = header.number
+        self.metrics.lag_seconds = lag_seconds
+        self.metrics.max_lag_seconds = max(self.metrics.max_lag_seconds, lag_seconds)
+        names = list(self._consumers)
+        results = await asyncio.gather(
+            *(self._timed_consume(name, self._consumers[name], header) for name in names), return_exceptions=True
+        )
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                if self.halt_on_errors:
+                    raise BlockConsumerError(f"Block consumer {name} failed on block {header.number}") from result
+                logging.error("Block consumer %s failed on block %s: %s", name, header.number, result)
+
+    async def _timed_consume(self, name: str, consumer: BlockConsumer, header: BlockHeader) -> None:
+        """Run a consumer, recording how long it took."""
+        start_time = time.time()
+        try:
+            await consumer(header)
+        finally:
+            self.metrics.consumer_seconds[name] = time.time() - start_time
@@ -0,0 +1,79 @@
+"""Tests for block_stream.py"""
+import asyncio
+
+import pytest
+
+from .block_stream import BlockHeader, BlockStream
+from .errors import BlockConsumerError
+
+
+class FakeEth:
+    """Chain whose head advances by `blocks_per_poll` every time the block number is read."""
+
+    def __init__(self, blocks_per_poll: int):
+        self.blocks_per_poll = blocks_per_poll
+        self.block_number = 10
+
+    def get_block_number(self):
+        self.block_number += self.blocks_per_poll
+        return self.block_number
+
+    def get_block(self, block_number):
+        return {"number": block_number, "timestamp": 1000 + block_number, "hash": bytes([block_number])}
+
+
+class FakeWeb3:
+    """Duck typed web3 with only the calls the block stream makes."""
+
+    def __init__(self, blocks_per_poll: int = 1):
+        self.eth = FakeEth(blocks_per_poll)
+
+
+class TestBlockStream:
+    """Tests for the polling mode of BlockStream."""
+
+    def test_every_block_dispatched_in_order(self):
+        """Blocks skipped between polls are filled in, and every consumer sees every block."""
+        block_stream = BlockStream(FakeWeb3(blocks_per_poll=3), poll_interval=0)  # type: ignore
+        seen: dict[str, list[int]] = {"first": [], "second": []}
+
+        async def first(header: BlockHeader):
+            seen["first"].append(header.number)
+            if header.number >= 20:
+                block_stream.stop()
+
+        async def second(header: BlockHeader):
+            seen["second"].append(header.number)
+
+        block_stream.register(first)
+        block_stream.register(second)
+        asyncio.run(block_stream.run(start_block=5))
+        assert seen["first"] == list(range(6, 21))
+        assert seen["second"] == seen["first"]
+        assert block_stream.metrics.blocks_received == 15
+        assert block_stream.metrics.last_block_number == 20
+        assert not block_stream.metrics.using_websocket
+        assert set(block_stream.metrics.consumer_seconds) == {"first", "second"}
+
+    def test_consumer_errors(self):
+        """Consumer failures are logged by default, and stop the stream when halting on errors."""
+        block_stream = BlockStream(FakeWeb3(), poll_interval=0)  # type: ignore
+        seen = []
+
+        async def failing(header: BlockHeader):
+            raise ValueError(f"bad block {header.number}")
+
+        async def counting(header: BlockHeader):
+            seen.append(header.number)
+            if len(seen) == 3:
+                block_stream.stop()
+
+        block_stream.register(failing)
+        block_stream.register(counting)
+        asyncio.run(block_stream.run())
+        assert len(seen) == 3
+
+        halting_stream = BlockStream(FakeWeb3(), poll_interval=0, halt_on_errors=True)  # type: ignore
+        halting_stream.register(failing)
+        with pytest.raises(BlockConsumerError):
+            asyncio.run(halting_stream.run())
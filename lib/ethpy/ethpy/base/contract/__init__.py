@@ -1,3 +1,3 @@
 """Token interface helper functions."""
 from .deploy_contract import deploy_contract, deploy_contract_and_return
-from .token import get_token_balance
+from .token import get_erc20_balances, get_token_balance, get_wallet_snapshot
@@ -4,9 +4,13 @@ from __future__ import annotations
 
 import logging
 import time
+from typing import Any, Sequence
 
+import numpy as np
 from eth_typing import BlockNumber
-from web3.contract.contract import Contract
+from web3.contract.contract import Contract, ContractFunction
+
+from ..rpc_interface import make_batch_request
 
 
 def get_token_balance(
@@ -48,3 +52,96 @@ def get_token_balance(
             time.sleep(1)
             continue
     return balance
+
+
+def get_wallet_snapshot(
+    contract: Contract, wallet_addresses: Sequence[str], token_ids: Sequence[int], block_number: BlockNumber
+) -> np.ndarray:
+    """Queries the given ERC1155 contract for every wallet's balance of every token id in a single batch.
+
+    Arguments
+    ---------
+    contract : Contract
+        The ERC1155 contract to query, e.g. hyperdrive.
+    wallet_addresses: Sequence[str]
+        The wallet addresses to use for query
+    token_ids: Sequence[int]
+        The token ids to query
+    block_number: BlockNumber
+        The block number to query
+
+    Returns
+    -------
+    np.ndarray
+        An object array of shape (len(wallet_addresses), len(token_ids)), where entry [i, j] is the balance of
+        token_ids[j] held by wallet_addresses[i] as an int, or None if the lookup failed
+    """
+    functions = [
+        contract.functions.balanceOf(token_id, wallet_address)
+        for wallet_address in wallet_addresses
+        for token_id in token_ids
+    ]
+    balances = _batch_call_balances(contract, functions, block_number)
+    return np.array(balances, dtype=object).reshape(len(wallet_addresses), len(token_ids))
+
+
+def get_erc20_balances(contract: Contract, wallet_addresses: Sequence[str], block_number: BlockNumber) -> np.ndarray:
+    """Queries the given ERC20 contract for every wallet's balance in a single batch.
+
+    Arguments
+    ---------
+    contract : Contract
+        The ERC20 contract to query, e.g. the base token.
+    wallet_addresses: Sequence[str]
+        The wallet addresses to use for query
+    block_number: BlockNumber
+        The block number to query
+
+    Returns
+    -------
+    np.ndarray
+        An object array of shape (len(wallet_addresses),) holding each balance as an int, or None if the lookup failed
+    """
+    functions = [contract.functions.balanceOf(wallet_address) for wallet_address in wallet_addresses]
+    return np.array(_batch_call_balances(contract, functions, block_number), dtype=object)
+
+
+def _batch_call_balances(
+    contract: Contract, functions: Sequence[ContractFunction], block_number: BlockNumber
+) -> list[int | None]:
+    """Call the uint256 returning balance functions in one batch, retrying any failed calls."""
+    # pylint: disable=protected-access
+    retry_count = 10
+    requests: list[tuple[str, Any]] = [
+        (
+            "eth_call",
+            [
+                {"to": contract.address, "data": function._encode_transaction_data()},
+                hex(block_number),
+            ],
+        )
+        for function in functions
+    ]
+    balances: list[int | None] = [None] * len(requests)
+    pending = list(range(len(requests)))
+    for attempt_count in range(retry_count):
+        try:
+            responses = make_batch_request(contract.w3, [requests[idx] for idx in pending])
+        except ValueError:
+            responses = []
+        failed = []
+        for idx, response in zip(pending, responses):
+            result = response.get("result")
+            if result is None or result == "0x":
+                failed.append(idx)
+            else:
+                balances[idx] = int(result, 16)
+        failed.extend(pending[len(responses) :])
+        pending = failed
+        if len(pending) == 0:
+            break
+        logging.warning(
+            "Error in getting %s token balances, retrying %s/%s", len(pending), attempt_count + 1, retry_count
+        )
+        time.sleep(1)
+    return balances
@@ -0,0 +1,54 @@
+"""Tests for token.py"""
+from eth_abi import decode, encode
+from web3 import Web3
+from web3.providers.base import BaseProvider
+
+from .token import get_wallet_snapshot
+
+CONTRACT_ADDRESS = Web3.to_checksum_address("0x" + "11" * 20)
+WALLET_ADDRESSES = [Web3.to_checksum_address("0x" + f"{idx:02x}" * 20) for idx in range(1, 4)]
+ABI = [
+    {
+        "name": "balanceOf",
+        "type": "function",
+        "stateMutability": "view",
+        "inputs": [{"name": "tokenId", "type": "uint256"}, {"name": "account", "type": "address"}],
+        "outputs": [{"name": "", "type": "uint256"}],
+    },
+]
+
+
+class FakeMultiTokenProvider(BaseProvider):
+    """Provider that answers balanceOf(tokenId, account) batches with tokenId * the account's last byte."""
+
+    def __init__(self):
+        super().__init__()
+        self.num_batches = 0
+
+    def make_request(self, method, params):
+        raise AssertionError("Balances should be fetched in a single batch")
+
+    def make_batch_request(self, requests):
+        self.num_batches += 1
+        responses = []
+        for request_id, (_, params) in enumerate(requests):
+            token_id, account = decode(["uint256", "address"], bytes.fromhex(params[0]["data"][10:]))
+            result = "0x" + encode(["uint256"], [token_id * int(account[-2:], 16)]).hex()
+            responses.append({"jsonrpc": "2.0", "id": request_id, "result": result})
+        return responses
+
+    def is_connected(self, show_traceback=False):
+        return True
+
+
+def test_get_wallet_snapshot():
+    """The wallet by token matrix is fetched in one batch."""
+    provider = FakeMultiTokenProvider()
+    contract = Web3(provider).eth.contract(address=CONTRACT_ADDRESS, abi=ABI)
+    token_ids = [2**248 + 1, 7]
+    snapshot = get_wallet_snapshot(contract, WALLET_ADDRESSES, token_ids, block_number=5)  # type: ignore
+    assert provider.num_batches == 1
+    assert snapshot.shape == (3, 2)
+    for wallet_idx in range(3):
+        for token_idx, token_id in enumerate(token_ids):
+            assert snapshot[wallet_idx, token_idx] == token_id * (wallet_idx + 1)
@@ -1,3 +1,3 @@
 """Custom error reporting and contract error parsing."""
 from .errors import decode_error_selector_for_contract
-from .types import ABIError, UnknownBlockError
+from .types import ABIError, BlockConsumerError, CassetteMissError, UnknownBlockError
@@ -15,3 +15,11 @@ class ABIError(TypedDict, total=True):
 
 class UnknownBlockError(Exception):
     """UnknownBlockError throws when contract trasaction receipts with status == 0."""
+
+
+class CassetteMissError(Exception):
+    """CassetteMissError throws when a replayed rpc cassette has no recorded response for a request."""
+
+
+class BlockConsumerError(Exception):
+    """BlockConsumerError throws when a block stream consumer fails and the stream is set to halt on errors."""
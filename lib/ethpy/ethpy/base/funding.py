@@ -0,0 +1,276 @@
+"""Functions for funding and sending transactions from many accounts with few round trips"""
+from __future__ import annotations
+
+import time
+from typing import Any, Sequence
+
+from eth_account.signers.local import LocalAccount
+from eth_typing import ChecksumAddress
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.contract.contract import Contract
+from web3.exceptions import TimeExhausted
+from web3.types import RPCResponse, TxParams
+
+from .rpc_interface import make_batch_request
+
+
+def set_anvil_account_balances(
+    web3: Web3, account_addresses: Sequence[str], amounts_wei: Sequence[int]
+) -> list[RPCResponse]:
+    """Set the ETH balance of many accounts on an anvil chain in a single batch
+
+    Arguments
+    ---------
+    web3 : Web3
+        web3 provider object
+    account_addresses : Sequence[str]
+        The checksum addresses of the accounts to fund
+    amounts_wei : Sequence[int]
+        The balance to set for each account, in wei
+
+    Returns
+    -------
+    list[RPCResponse]
+        success can be checked by inspecting `rpc_response.error` for each account
+    """
+    if len(account_addresses) != len(amounts_wei):
+        raise ValueError(f"{len(account_addresses)=} must equal {len(amounts_wei)=}")
+    for account_address in account_addresses:
+        if not web3.is_checksum_address(account_address):
+            raise ValueError(f"argument {account_address=} must be a checksum address")
+    return make_batch_request(
+        web3,
+        [
+            ("anvil_setBalance", [account_address, hex(amount_wei)])
+            for account_address, amount_wei in zip(account_addresses, amounts_wei)
+        ],
+    )
+
+
+def send_pipelined_transactions(
+    web3: Web3,
+    transactions: Sequence[tuple[LocalAccount, TxParams]],
+    max_priority_fee: int | None = None,
+    timeout: float = 120,
+    poll_latency: float = 0.1,
+) -> list[dict[str, Any]]:
+    """Sign and send many transactions without waiting for each one to be mined
+
+    Nonces are assigned locally per signer, gas is estimated and transactions are submitted in JSON-RPC batches,
+    and all receipts are awaited together at the end.
+
+    Arguments
+    ---------
+    web3 : Web3
+        web3 provider object
+    transactions : Sequence[tuple[LocalAccount, TxParams]]
+        The (signer, transaction) pairs to send, in order; each transaction needs at least "to",
+        and optionally "value", "data" and "gas"
+    max_priority_fee : int | None, optional
+        Amount of tip to provide to the miner when a block is mined
+    timeout : float, optional
+        The amount of time in seconds to wait for all transactions to be mined
+    poll_latency : float, optional
+        The amount of time in seconds to wait between receipt polls
+
+    Returns
+    -------
+    list[dict[str, Any]]
+        The raw JSON-RPC receipts, in the same order as `transactions`
+    """
+    # pylint: disable=too-many-locals
+    if len(transactions) == 0:
+        return []
+    chain_id = web3.eth.chain_id
+    if max_priority_fee is None:
+        max_priority_fee = web3.eth.max_priority_fee
+    base_fee = web3.eth.get_block("pending").get("baseFeePerGas", None)
+    if base_fee is None:
+        raise AssertionError("The latest block does not have a baseFeePerGas")
+    # The transactions may span several blocks, so leave headroom for the base fee to rise
+    max_fee_per_gas = max_priority_fee + 2 * base_fee
+
+    # Estimate gas for every transaction that does not specify it
+    raw_params = [
+        {
+            "from": signer.address,
+            "to": txn["to"],
+            "value": hex(txn.get("value", 0)),
+            "data": HexBytes(txn.get("data", b"")).hex(),
+        }
+        for signer, txn in transactions
+    ]
+    estimate_indices = [idx for idx, (_, txn) in enumerate(transactions) if "gas" not in txn]
+    estimates = make_batch_request(web3, [("eth_estimateGas", [raw_params[idx]]) for idx in estimate_indices])
+    gas_limits: dict[int, int] = {}
+    for idx, response in zip(estimate_indices, estimates):
+        if "result" not in response:
+            raise ValueError(f"Gas estimation failed for transaction {idx}: {response.get('error')}")
+        gas_limits[idx] = int(response["result"], 16)
+
+    # Sign with locally tracked nonces
+    nonces: dict[str, int] = {}
+    signed_txns: list[str] = []
+    for idx, (signer, txn) in enumerate(transactions):
+        if signer.address not in nonces:
+            nonces[signer.address] = web3.eth.get_transaction_count(signer.address, "pending")
+        unsent_txn = {
+            "to": txn["to"],
+            "value": txn.get("value", 0),
+            "data": HexBytes(txn.get("data", b"")),
+            "nonce": nonces[signer.address],
+            "chainId": chain_id,
+            "gas": txn.get("gas", gas_limits.get(idx)),
+            "maxFeePerGas": max_fee_per_gas,
+            "maxPriorityFeePerGas": max_priority_fee,
+        }
+        nonces[signer.address] += 1
+        signed_txns.append(signer.sign_transaction(unsent_txn).rawTransaction.hex())
+
+    responses = make_batch_request(web3, [("eth_sendRawTransaction", [signed_txn]) for signed_txn in signed_txns])
+    tx_hashes: list[str] = []
+    for idx, response in enumerate(responses):
+        if "result" not in response:
+            raise ValueError(f"Sending transaction {idx} failed: {response.get('error')}")
+        tx_hashes.append(response["result"])
+    return _wait_for_transaction_receipts(web3, tx_hashes, timeout, poll_latency)
+
+
+def fund_accounts(
+    web3: Web3,
+    signer: LocalAccount,
+    account_addresses: Sequence[ChecksumAddress],
+    eth_amounts_wei: Sequence[int],
+    base_token_contract: Contract | None = None,
+    base_amounts: Sequence[int] | None = None,
+    set_anvil_eth_balances: bool = False,
+) -> list[dict[str, Any]]:
+    """Fund many accounts with ETH and, optionally, ERC20 base tokens using pipelined transactions
+
+    Arguments
+    ---------
+    web3 : Web3
+        web3 provider object
+    signer : LocalAccount
+        The LocalAccount that holds the funds and signs the transfers
+    account_addresses : Sequence[ChecksumAddress]
+        The accounts to fund
+    eth_amounts_wei : Sequence[int]
+        The amount of ETH to send to each account, in wei
+    base_token_contract : Contract | None, optional
+        The ERC20 contract of the base token; if not set, only ETH is sent
+    base_amounts : Sequence[int] | None, optional
+        The scaled amount of base tokens to send to each account
+    set_anvil_eth_balances : bool, optional
+        If True, the ETH is added to the accounts with a single anvil_setBalance batch instead of being sent
+        from the signer, which only works on anvil chains
+
+    Returns
+    -------
+    list[dict[str, Any]]
+        The raw JSON-RPC receipts of all ETH transfers followed by all base token transfers
+    """
+    if len(account_addresses) != len(eth_amounts_wei):
+        raise ValueError(f"{len(account_addresses)=} must equal {len(eth_amounts_wei)=}")
+    if base_token_contract is not None and (base_amounts is None or len(account_addresses) != len(base_amounts)):
+        raise ValueError("base_amounts must be set with one entry per account when funding base tokens")
+    check_signer_balances(
+        web3,
+        Web3.to_checksum_address(signer.address),
+        0 if set_anvil_eth_balances else sum(eth_amounts_wei),
+        base_token_contract,
+        sum(base_amounts) if base_amounts is not None else 0,
+    )
+    transactions: list[tuple[LocalAccount, TxParams]] = []
+    if set_anvil_eth_balances:
+        # Add the amounts to the current balances, so the accounts end up as if the ETH had been sent
+        balances = make_batch_request(
+            web3, [("eth_getBalance", [account_address, "latest"]) for account_address in account_addresses]
+        )
+        responses = set_anvil_account_balances(
+            web3,
+            account_addresses,
+            [int(balance["result"], 16) + amount_wei for balance, amount_wei in zip(balances, eth_amounts_wei)],
+        )
+        failed = [response.get("error") for response in responses if "error" in response]
+        if len(failed) > 0:
+            raise ValueError(f"Setting anvil balances failed: {failed=}")
+    else:
+        transactions.extend(
+            (signer, {"to": account_address, "value": amount_wei})  # type: ignore
+            for account_address, amount_wei in zip(account_addresses, eth_amounts_wei)
+            if amount_wei > 0
+        )
+    if base_token_contract is not None and base_amounts is not None:
+        transactions.extend(
+            (
+                signer,
+                {
+                    "to": base_token_contract.address,
+                    "data": base_token_contract.encodeABI(fn_name="transfer", args=[account_address, base_amount]),
+                },
+            )
+            for account_address, base_amount in zip(account_addresses, base_amounts)
+            if base_amount > 0
+        )
+    return send_pipelined_transactions(web3, transactions)
+
+
+def check_signer_balances(
+    web3: Web3,
+    signer_address: ChecksumAddress,
+    total_eth_wei: int,
+    base_token_contract: Contract | None = None,
+    total_base: int = 0,
+) -> None:
+    """Check that a signer holds enough ETH and base tokens to fund a set of accounts
+
+    Arguments
+    ---------
+    web3 : Web3
+        web3 provider object
+    signer_address : ChecksumAddress
+        The address of the account that holds the funds
+    total_eth_wei : int
+        The total amount of ETH to be sent, in wei
+    base_token_contract : Contract | None, optional
+        The ERC20 contract of the base token; if not set, only the ETH balance is checked
+    total_base : int, optional
+        The total scaled amount of base tokens to be sent
+    """
+    if total_eth_wei > 0:
+        signer_eth_balance = web3.eth.get_balance(signer_address)
+        if signer_eth_balance < total_eth_wei:
+            raise AssertionError(
+                f"Signer {signer_address=} has {signer_eth_balance=}, which must be >= {total_eth_wei=}"
+            )
+    if base_token_contract is not None and total_base > 0:
+        signer_base_balance = base_token_contract.functions.balanceOf(signer_address).call()
+        if signer_base_balance < total_base:
+            raise AssertionError(f"Signer {signer_address=} has {signer_base_balance=}, which must be >= {total_base=}")
+
+
+def _wait_for_transaction_receipts(
+    web3: Web3, tx_hashes: Sequence[str], timeout: float, poll_latency: float
+) -> list[dict[str, Any]]:
+    """Poll for all receipts in batches until every transaction is mined, then check their status"""
+    receipts: dict[int, dict[str, Any]] = {}
+    start_time = time.time()
+    while len(receipts) < len(tx_hashes):
+        pending = [idx for idx in range(len(tx_hashes)) if idx not in receipts]
+        responses = make_batch_request(web3, [("eth_getTransactionReceipt", [tx_hashes[idx]]) for idx in pending])
+        for idx, response in zip(pending, responses):
+            if response.get("result") is not None:
+                receipts[idx] = response["result"]
+        if len(receipts) == len(tx_hashes):
+            break
+        if time.time() - start_time > timeout:
+            raise TimeExhausted(
+                f"{len(tx_hashes) - len(receipts)} transactions are not in the chain after {timeout} seconds"
+            )
+        time.sleep(poll_latency)
+    failed = [tx_hashes[idx] for idx, receipt in receipts.items() if int(receipt["status"], 16) != 1]
+    if len(failed) > 0:
+        raise ValueError(f"Transactions reverted: {failed=}")
+    return [receipts[idx] for idx in range(len(tx_hashes))]
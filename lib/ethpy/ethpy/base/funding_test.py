@@ -0,0 +1,108 @@
+"""Tests for funding.py"""
+from types import SimpleNamespace
+
+import pytest
+from eth_account import Account
+from web3 import Web3
+from web3.providers.base import BaseProvider
+
+from ..test_fixtures.deploy_hyperdrive import initialize_deploy_account
+from .funding import check_signer_balances, fund_accounts, send_pipelined_transactions, set_anvil_account_balances
+from .rpc_interface import is_anvil_chain
+from .web3_setup import initialize_web3_with_http_provider
+
+ACCOUNT_ADDRESSES = [Web3.to_checksum_address("0x" + byte * 20) for byte in ["ab", "cd"]]
+
+
+class FakeAnvilProvider(BaseProvider):
+    """Provider that keeps balances and counts the requests it receives."""
+
+    def __init__(self, client_version="anvil/v0.1.0"):
+        super().__init__()
+        self.client_version = client_version
+        self.balances: dict[str, int] = {}
+        self.requests: list[str] = []
+
+    def make_request(self, method, params):
+        self.requests.append(method)
+        result = None
+        if method == "anvil_setBalance":
+            self.balances[params[0]] = int(params[1], 16)
+        elif method == "eth_getBalance":
+            result = hex(self.balances.get(params[0], 0))
+        elif method == "web3_clientVersion":
+            result = self.client_version
+        return {"jsonrpc": "2.0", "id": 0, "result": result}
+
+    def is_connected(self, show_traceback=False):
+        return True
+
+
+def _fake_base_token_contract(balance):
+    """A stand-in for an ERC20 contract that only answers balanceOf"""
+    return SimpleNamespace(functions=SimpleNamespace(balanceOf=lambda _: SimpleNamespace(call=lambda: balance)))
+
+
+def test_is_anvil_chain():
+    """The client version tells anvil apart from other nodes."""
+    assert is_anvil_chain(Web3(FakeAnvilProvider()))
+    assert not is_anvil_chain(Web3(FakeAnvilProvider(client_version="Geth/v1.13.0")))
+
+
+def test_set_anvil_account_balances():
+    """Every balance is set, and mismatched arguments are rejected before anything is sent."""
+    provider = FakeAnvilProvider()
+    web3 = Web3(provider)
+    set_anvil_account_balances(web3, ACCOUNT_ADDRESSES, [1, 2])
+    assert provider.balances == dict(zip(ACCOUNT_ADDRESSES, [1, 2]))
+    with pytest.raises(ValueError):
+        set_anvil_account_balances(web3, ACCOUNT_ADDRESSES, [1])
+    with pytest.raises(ValueError):
+        set_anvil_account_balances(web3, [ACCOUNT_ADDRESSES[0].lower()], [1])
+    assert provider.requests == ["anvil_setBalance", "anvil_setBalance"]
+
+
+def test_check_signer_balances():
+    """Both the ETH and the base token totals are checked against the signer's balances."""
+    provider = FakeAnvilProvider()
+    web3 = Web3(provider)
+    provider.balances[ACCOUNT_ADDRESSES[0]] = 10
+    check_signer_balances(web3, ACCOUNT_ADDRESSES[0], 10, _fake_base_token_contract(5), 5)
+    with pytest.raises(AssertionError):
+        check_signer_balances(web3, ACCOUNT_ADDRESSES[0], 11)
+    with pytest.raises(AssertionError):
+        check_signer_balances(web3, ACCOUNT_ADDRESSES[0], 10, _fake_base_token_contract(5), 6)
+
+
+def test_fund_accounts_with_anvil_balances():
+    """On anvil, the ETH amounts are added to the current balances without sending any transactions."""
+    provider = FakeAnvilProvider()
+    web3 = Web3(provider)
+    signer = Account.create()
+    provider.balances[ACCOUNT_ADDRESSES[0]] = 1
+    receipts = fund_accounts(web3, signer, ACCOUNT_ADDRESSES, [2, 3], set_anvil_eth_balances=True)
+    assert receipts == []
+    assert provider.balances == dict(zip(ACCOUNT_ADDRESSES, [3, 3]))
+    assert "eth_sendRawTransaction" not in provider.requests
+
+
+def test_send_pipelined_transactions(local_chain):
+    """Transactions from one signer get consecutive nonces and all land on the chain."""
+    web3 = initialize_web3_with_http_provider(local_chain, reset_provider=False)
+    signer = initialize_deploy_account(web3)
+    start_nonce = web3.eth.get_transaction_count(signer.address, "pending")
+    base_fee = web3.eth.get_block("pending")["baseFeePerGas"]
+    max_priority_fee = 10**9
+    amounts = [1, 2, 3]
+    recipients = [ACCOUNT_ADDRESSES[0], ACCOUNT_ADDRESSES[1], ACCOUNT_ADDRESSES[0]]
+    receipts = send_pipelined_transactions(
+        web3,
+        [(signer, {"to": recipient, "value": amount}) for recipient, amount in zip(recipients, amounts)],
+        max_priority_fee=max_priority_fee,
+    )
+    transactions = [web3.eth.get_transaction(receipt["transactionHash"]) for receipt in receipts]
+    assert [transaction["nonce"] for transaction in transactions] == [start_nonce, start_nonce + 1, start_nonce + 2]
+    assert [transaction["to"] for transaction in transactions] == recipients
+    assert all(transaction["maxFeePerGas"] == max_priority_fee + 2 * base_fee for transaction in transactions)
+    assert web3.eth.get_balance(ACCOUNT_ADDRESSES[0]) == 4
+    assert web3.eth.get_balance(ACCOUNT_ADDRESSES[1]) == 2
@@ -0,0 +1,190 @@
+"""A web3 provider that records JSON-RPC traffic to disk and replays it deterministically."""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Literal, Sequence
+
+from web3._utils.encoding import Web3JsonEncoder
+from web3.providers.base import BaseProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+from .errors import CassetteMissError
+from .rpc_interface import make_provider_batch_request
+
+CassetteMode = Literal["record", "replay"]
+
+
+def get_request_key(method: RPCEndpoint | str, params: Any) -> str:
+    """Build the lookup key for a JSON-RPC request.
+
+    Arguments
+    ---------
+    method : RPCEndpoint | str
+        The JSON-RPC method name, e.g. "eth_call"
+    params : Any
+        The (already formatted) JSON-RPC params
+
+    Returns
+    -------
+    str
+        A sha256 hex digest of the canonical json encoding of the method and params
+    """
+    payload = json.dumps([method, params], cls=Web3JsonEncoder, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RPCCassetteProvider(BaseProvider):
+    """Provider that records every request/response pair, or replays them without a node.
+
+    The cassette is a json-lines file where each line holds the request key, the ordinal of that request
+    (i.e., how many times the same request was seen before it), the method name and the raw response.
+    Identical requests made repeatedly (e.g., ``eth_blockNumber``) are replayed in the order they were recorded,
+    so a replay walks through the exact chain history that was observed while recording.
+    Once all recorded responses of a request are used up, the last one is repeated.
+    """
+
+    def __init__(
+        self,
+        cassette_path: str,
+        mode: CassetteMode = "replay",
+        provider: BaseProvider | None = None,
+        replay_latency: float = 0,
+    ) -> None:
+        """Initialize the cassette.
+
+        Arguments
+        ---------
+        cassette_path : str
+            The json-lines file to record to or replay from
+        mode : CassetteMode
+            "record" forwards requests to `provider` and writes the responses to the cassette, replacing any
+            previous recording, "replay" serves requests from the cassette only
+        provider : BaseProvider | None
+            The provider connected to a node, required when recording
+        replay_latency : float
+            Seconds to sleep before returning each replayed response, to emulate a remote node
+        """
+        super().__init__()
+        if mode not in ("record", "replay"):
+            raise ValueError(f"{mode=} must be one of 'record' or 'replay'")
+        if mode == "record" and provider is None:
+            raise ValueError("A provider connected to a node is required when recording")
+        self.cassette_path = cassette_path
+        self.mode = mode
+        self.provider = provider
+        self.replay_latency = replay_latency
+        self._lock = threading.Lock()
+        # request key -> ordered list of responses
+        self._responses: dict[str, list[RPCResponse]] = defaultdict(list)
+        # request key -> number of times the request has been made in this session
+        self._request_counts: dict[str, int] = defaultdict(int)
+        if mode == "record":
+            # Start a new recording, since the ordinals of an older one would collide with the new ones
+            with open(cassette_path, mode="w", encoding="UTF-8"):
+                pass
+        elif os.path.exists(cassette_path):
+            self._load()
+        else:
+            raise FileNotFoundError(f"Cassette {cassette_path=} does not exist")
+
+    def _load(self) -> None:
+        """Build the in-memory index from the cassette file."""
+        with open(self.cassette_path, mode="r", encoding="UTF-8") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self._responses[entry["key"]].append(entry["response"])
+        logging.info("Loaded %s unique requests from cassette %s", len(self._responses), self.cassette_path)
+
+    def _append(self, key: str, ordinal: int, method: RPCEndpoint | str, response: RPCResponse) -> None:
+        """Append a recorded response to the cassette file."""
+        entry = {"key": key, "ordinal": ordinal, "method": method, "response": response}
+        with open(self.cassette_path, mode="a", encoding="UTF-8") as file:
+            file.write(json.dumps(entry, cls=Web3JsonEncoder, separators=(",", ":")) + "\n")
+
+    def _replay(self, key: str, method: RPCEndpoint | str) -> RPCResponse:
+        """Return the next recorded response for the request key."""
+        responses = self._responses.get(key)
+        if not responses:
+            raise CassetteMissError(f"No recorded response for {method=} with request key {key}")
+        ordinal = self._request_counts[key]
+        self._request_counts[key] += 1
+        return responses[min(ordinal, len(responses) - 1)]
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        """Record or replay a single JSON-RPC request.
+
+        Arguments
+        ---------
+        method : RPCEndpoint
+            The JSON-RPC method name
+        params : Any
+            The JSON-RPC params
+
+        Returns
+        -------
+        RPCResponse
+            The response from the node, or the recorded response when replaying
+        """
+        key = get_request_key(method, params)
+        if self.mode == "replay":
+            with self._lock:
+                response = self._replay(key, method)
+            if self.replay_latency > 0:
+                time.sleep(self.replay_latency)
+            return response
+        assert self.provider is not None
+        response = self.provider.make_request(method, params)
+        with self._lock:
+            ordinal = self._request_counts[key]
+            self._request_counts[key] += 1
+            self._responses[key].append(response)
+            self._append(key, ordinal, method, response)
+        return response
+
+    def make_batch_request(self, requests: Sequence[tuple[str, Any]]) -> list[RPCResponse]:
+        """Record or replay a batch of JSON-RPC requests.
+
+        Each item is stored as if it had been requested individually, so cassettes recorded with or without
+        batching replay the same way.
+
+        Arguments
+        ---------
+        requests : Sequence[tuple[str, Any]]
+            A list of (method, params) pairs
+
+        Returns
+        -------
+        list[RPCResponse]
+            The responses, in the same order as the requests
+        """
+        keys = [get_request_key(method, params) for method, params in requests]
+        if self.mode == "replay":
+            with self._lock:
+                responses = [self._replay(key, method) for key, (method, _) in zip(keys, requests)]
+            if self.replay_latency > 0:
+                time.sleep(self.replay_latency)
+            return responses
+        assert self.provider is not None
+        responses = make_provider_batch_request(self.provider, requests)
+        with self._lock:
+            for key, (method, _), response in zip(keys, requests, responses):
+                ordinal = self._request_counts[key]
+                self._request_counts[key] += 1
+                self._responses[key].append(response)
+                self._append(key, ordinal, method, response)
+        return responses
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        """Replaying cassettes are always connected; recording ones defer to the wrapped provider."""
+        if self.mode == "replay":
+            return True
+        assert self.provider is not None
+        return self.provider.is_connected(show_traceback)
@@ -0,0 +1,74 @@
+"""Tests for rpc_cassette.py"""
+import pytest
+from web3.providers.base import BaseProvider
+
+from .errors import CassetteMissError
+from .rpc_cassette import RPCCassetteProvider
+
+
+class FakeNodeProvider(BaseProvider):
+    """Provider that returns an increasing block number and echoes everything else."""
+
+    def __init__(self):
+        super().__init__()
+        self.block_number = 0
+        self.num_requests = 0
+
+    def make_request(self, method, params):
+        self.num_requests += 1
+        if method == "eth_blockNumber":
+            self.block_number += 1
+            return {"jsonrpc": "2.0", "id": 0, "result": hex(self.block_number)}
+        return {"jsonrpc": "2.0", "id": 0, "result": [method, params]}
+
+    def is_connected(self, show_traceback=False):
+        return True
+
+
+class TestRPCCassetteProvider:
+    """Tests for RPCCassetteProvider."""
+
+    def test_record_then_replay(self, tmp_path):
+        """Replayed responses match the recorded ones, in order, without touching the node."""
+        cassette_path = str(tmp_path / "cassette.jsonl")
+        node = FakeNodeProvider()
+        recorder = RPCCassetteProvider(cassette_path, mode="record", provider=node)
+        recorded = [recorder.make_request("eth_blockNumber", []) for _ in range(3)]  # type: ignore
+        recorded.append(recorder.make_request("eth_call", [{"to": "0x01", "data": "0x02"}, "latest"]))  # type: ignore
+        assert node.num_requests == 4
+
+        player = RPCCassetteProvider(cassette_path, mode="replay")
+        assert player.is_connected()
+        replayed = [player.make_request("eth_blockNumber", []) for _ in range(3)]  # type: ignore
+        replayed.append(player.make_request("eth_call", [{"data": "0x02", "to": "0x01"}, "latest"]))  # type: ignore
+        assert replayed == recorded
+        # Once recorded responses are exhausted the last one is repeated
+        assert player.make_request("eth_blockNumber", []) == recorded[2]  # type: ignore
+
+    def test_replay_miss(self, tmp_path):
+        """Requests that were never recorded raise."""
+        cassette_path = str(tmp_path / "cassette.jsonl")
+        recorder = RPCCassetteProvider(cassette_path, mode="record", provider=FakeNodeProvider())
+        recorder.make_request("eth_blockNumber", [])  # type: ignore
+        player = RPCCassetteProvider(cassette_path, mode="replay")
+        with pytest.raises(CassetteMissError):
+            player.make_request("eth_chainId", [])  # type: ignore
+
+    def test_invalid_arguments(self, tmp_path):
+        """Recording requires a provider and replaying requires an existing cassette."""
+        cassette_path = str(tmp_path / "cassette.jsonl")
+        with pytest.raises(ValueError):
+            RPCCassetteProvider(cassette_path, mode="record")
+        with pytest.raises(FileNotFoundError):
+            RPCCassetteProvider(cassette_path, mode="replay")
+
+    def test_record_twice(self, tmp_path):
+        """Recording again replaces the previous recording instead of appending to it."""
+        cassette_path = str(tmp_path / "cassette.jsonl")
+        node = FakeNodeProvider()
+        recorder = RPCCassetteProvider(cassette_path, mode="record", provider=node)
+        recorder.make_request("eth_blockNumber", [])  # type: ignore
+        recorder = RPCCassetteProvider(cassette_path, mode="record", provider=node)
+        recorded = recorder.make_request("eth_blockNumber", [])  # type: ignore
+        player = RPCCassetteProvider(cassette_path, mode="replay")
+        assert player.make_request("eth_blockNumber", []) == recorded  # type: ignore
@@ -1,9 +1,19 @@
 """Functions for interfacing with the anvil or ethereum RPC endpoint"""
 from __future__ import annotations
 
+from contextlib import contextmanager
+from typing import Any, Iterator, Sequence
+
+from eth_utils import to_bytes, to_text
 from web3 import Web3
+from web3._utils.encoding import FriendlyJsonSerde, Web3JsonEncoder
+from web3._utils.request import make_post_request
+from web3.providers import BaseProvider, HTTPProvider
 from web3.types import RPCEndpoint, RPCResponse
 
+# Some nodes cap the number of requests in a single batch; larger batches are split into chunks of this size
+DEFAULT_MAX_BATCH_SIZE = 500
+
 
 def set_anvil_account_balance(web3: Web3, account_address: str, amount_wei: int) -> RPCResponse:
     """Set an the account using the web3 provider
@@ -25,6 +35,23 @@ def set_anvil_account_balance(web3: Web3, account_address: str, amount_wei: int)
     return rpc_response
 
 
+def is_anvil_chain(web3: Web3) -> bool:
+    """Check whether the web3 provider is connected to an anvil node
+
+    Arguments
+    ---------
+    web3 : Web3
+        web3 provider object
+
+    Returns
+    -------
+    bool
+        True if the node reports an anvil client version
+    """
+    rpc_response = web3.provider.make_request(method=RPCEndpoint("web3_clientVersion"), params=[])
+    return str(rpc_response.get("result", "")).lower().startswith("anvil")
+
+
 def get_account_balance(web3: Web3, account_address: str) -> int | None:
     """Get the balance for an account deployed on the web3 provider"""
     if not web3.is_checksum_address(account_address):
@@ -34,3 +61,130 @@ def get_account_balance(web3: Web3, account_address: str) -> int | None:
     if hex_result is not None:
         return int(hex_result, base=16)  # cast hex to int
     return None
+
+
+def evm_snapshot(web3: Web3) -> str:
+    """Take a snapshot of the current chain state on an anvil (or hardhat/ganache) node
+
+    Arguments
+    ---------
+    web3 : Web3
+        web3 provider object
+
+    Returns
+    -------
+    str
+        The snapshot id, to be passed to `evm_revert`
+    """
+    rpc_response = web3.provider.make_request(method=RPCEndpoint("evm_snapshot"), params=[])
+    snapshot_id = rpc_response.get("result")
+    if snapshot_id is None:
+        raise ValueError(f"Failed to take a chain snapshot: {rpc_response=}")
+    return snapshot_id
+
+
+def evm_revert(web3: Web3, snapshot_id: str) -> None:
+    """Revert the chain state to a snapshot taken with `evm_snapshot`
+
+    Snapshots are consumed when reverted to, so a new snapshot must be taken to revert to the same state again.
+
+    Arguments
+    ---------
+    web3 : Web3
+        web3 provider object
+    snapshot_id : str
+        The id returned by `evm_snapshot`
+    """
+    rpc_response = web3.provider.make_request(method=RPCEndpoint("evm_revert"), params=[snapshot_id])
+    if rpc_response.get("result") is not True:
+        raise ValueError(f"Failed to revert to chain snapshot {snapshot_id=}: {rpc_response=}")
+
+
+@contextmanager
+def chain_snapshot(web3: Web3) -> Iterator[str]:
+    """Context manager that reverts all chain state changes made inside of it, e.g. for what-if scenarios
+
+    Arguments
+    ---------
+    web3 : Web3
+        web3 provider object
+
+    Yields
+    ------
+    str
+        The snapshot id that will be reverted to on exit
+    """
+    snapshot_id = evm_snapshot(web3)
+    try:
+        yield snapshot_id
+    finally:
+        evm_revert(web3, snapshot_id)
+
+
+def make_batch_request(
+    web3: Web3, requests: Sequence[tuple[str, Any]], max_batch_size: int = DEFAULT_MAX_BATCH_SIZE
+) -> list[RPCResponse]:
+    """Send many JSON-RPC requests in as few round trips as possible.
+
+    Requests bypass the web3 middleware stack, so params must already be in their raw JSON-RPC format
+    (e.g., hex strings for quantities) and the raw responses are returned.
+
+    Arguments
+    ---------
+    web3 : Web3
+        web3 provider object
+    requests : Sequence[tuple[str, Any]]
+        A list of (method, params) pairs, e.g. [("eth_getBalance", [address, "latest"])]
+    max_batch_size : int, optional
+        The maximum number of requests sent in a single batch
+
+    Returns
+    -------
+    list[RPCResponse]
+        The responses, in the same order as the requests;
+        success can be checked per item by inspecting `rpc_response.get("error")`
+    """
+    responses: list[RPCResponse] = []
+    for start in range(0, len(requests), max_batch_size):
+        responses.extend(make_provider_batch_request(web3.provider, requests[start : start + max_batch_size]))
+    return responses
+
+
+def make_provider_batch_request(provider: BaseProvider, requests: Sequence[tuple[str, Any]]) -> list[RPCResponse]:
+    """Send a single batch of JSON-RPC requests with the given provider.
+
+    Providers that implement `make_batch_request` handle the batch themselves, HTTP providers send one
+    JSON-RPC batch POST, and any other provider falls back to one request per item.
+
+    Arguments
+    ---------
+    provider : BaseProvider
+        The provider to send the requests with
+    requests : Sequence[tuple[str, Any]]
+        A list of (method, params) pairs
+
+    Returns
+    -------
+    list[RPCResponse]
+        The responses, in the same order as the requests
+    """
+    if len(requests) == 0:
+        return []
+    provider_batch_request = getattr(provider, "make_batch_request", None)
+    if callable(provider_batch_request):
+        return provider_batch_request(requests)
+    if isinstance(provider, HTTPProvider):
+        request_data = [
+            {"jsonrpc": "2.0", "method": method, "params": params or [], "id": request_id}
+            for request_id, (method, params) in enumerate(requests)
+        ]
+        encoded = FriendlyJsonSerde().json_encode(request_data, Web3JsonEncoder)
+        raw_response = make_post_request(
+            provider.endpoint_uri, to_bytes(text=encoded), **provider.get_request_kwargs()  # type: ignore
+        )
+        responses = FriendlyJsonSerde().json_decode(to_text(raw_response))
+        if not isinstance(responses, list):
+            # The node rejected the batch as a whole, e.g. because it does not support batching
+            raise ValueError(f"Batch request failed with {responses=}")
+        return sorted(responses, key=lambda response: response["id"])
+    return [provider.make_request(RPCEndpoint(method), params) for method, params in requests]
@@ -0,0 +1,63 @@
+"""Tests for rpc_interface.py"""
+import copy
+
+import pytest
+from web3 import Web3
+from web3.providers.base import BaseProvider
+
+from .rpc_interface import chain_snapshot, evm_revert, evm_snapshot, get_account_balance, set_anvil_account_balance
+
+ACCOUNT_ADDRESS = Web3.to_checksum_address("0x" + "ab" * 20)
+
+
+class FakeAnvilProvider(BaseProvider):
+    """Provider that keeps balances, and snapshots them like anvil does."""
+
+    def __init__(self):
+        super().__init__()
+        self.balances: dict[str, int] = {}
+        self.snapshots: dict[str, dict[str, int]] = {}
+
+    def make_request(self, method, params):
+        result = None
+        if method == "anvil_setBalance":
+            self.balances[params[0]] = int(params[1], 16)
+        elif method == "eth_getBalance":
+            result = hex(self.balances.get(params[0], 0))
+        elif method == "evm_snapshot":
+            result = hex(len(self.snapshots))
+            self.snapshots[result] = copy.deepcopy(self.balances)
+        elif method == "evm_revert":
+            # Reverting consumes the snapshot
+            result = params[0] in self.snapshots
+            if result:
+                self.balances = self.snapshots.pop(params[0])
+        return {"jsonrpc": "2.0", "id": 0, "result": result}
+
+    def is_connected(self, show_traceback=False):
+        return True
+
+
+def test_chain_snapshot_reverts_state():
+    """Changes made inside the context are reverted on exit, even if it raises."""
+    web3 = Web3(FakeAnvilProvider())
+    set_anvil_account_balance(web3, ACCOUNT_ADDRESS, 1)
+    with chain_snapshot(web3):
+        set_anvil_account_balance(web3, ACCOUNT_ADDRESS, 2)
+        assert get_account_balance(web3, ACCOUNT_ADDRESS) == 2
+    assert get_account_balance(web3, ACCOUNT_ADDRESS) == 1
+
+    with pytest.raises(RuntimeError):
+        with chain_snapshot(web3):
+            set_anvil_account_balance(web3, ACCOUNT_ADDRESS, 3)
+            raise RuntimeError("failed scenario")
+    assert get_account_balance(web3, ACCOUNT_ADDRESS) == 1
+
+
+def test_evm_revert_consumes_snapshot():
+    """A snapshot can only be reverted to once."""
+    web3 = Web3(FakeAnvilProvider())
+    snapshot_id = evm_snapshot(web3)
+    evm_revert(web3, snapshot_id)
+    with pytest.raises(ValueError):
+        evm_revert(web3, snapshot_id)
@@ -2,18 +2,78 @@
 from __future__ import annotations
 
 import logging
+from dataclasses import dataclass, field
 from typing import Any, Sequence
 
 from eth_account.signers.local import LocalAccount
 from eth_typing import BlockNumber, ChecksumAddress
 from hexbytes import HexBytes
 from web3 import Web3
+from web3._utils.abi import get_abi_output_types
+from web3._utils.method_formatters import PYTHONIC_RESULT_FORMATTERS
+from web3._utils.rpc_abi import RPC
 from web3._utils.threads import Timeout
-from web3.contract.contract import Contract
+from web3.contract.contract import Contract, ContractFunction
 from web3.exceptions import ContractCustomError, ContractLogicError, TimeExhausted, TransactionNotFound
-from web3.types import ABI, ABIFunctionComponents, ABIFunctionParams, BlockData, TxData, TxParams, TxReceipt, Wei
+from web3.types import (
+    ABI,
+    ABIFunctionComponents,
+    ABIFunctionParams,
+    BlockData,
+    BlockIdentifier,
+    TxData,
+    TxParams,
+    TxReceipt,
+    Wei,
+)
 
 from .errors.errors import decode_error_selector_for_contract
+from .rpc_interface import DEFAULT_MAX_BATCH_SIZE, make_batch_request
+
+# Selectors for the builtin solidity revert payloads `Error(string)` and `Panic(uint256)`
+_ERROR_STRING_SELECTOR = "0x08c379a0"
+_PANIC_SELECTOR = "0x4e487b71"
+
+
+@dataclass
+class PreviewTransaction:
+    """A hypothetical contract transaction to be previewed with `smart_contract_preview_transactions`.
+
+    Attributes
+    ----------
+    signer_address : ChecksumAddress
+        The address that would sign the transaction.
+    function_name_or_signature : str
+        The name of the function
+    fn_args : tuple
+        The arguments passed to the contract method.
+    block_identifier : BlockIdentifier | None
+        The block to preview the transaction at; defaults to "latest"
+    """
+
+    signer_address: ChecksumAddress
+    function_name_or_signature: str
+    fn_args: tuple = ()
+    block_identifier: BlockIdentifier | None = None
+
+
+@dataclass
+class PreviewResult:
+    """The outcome of a previewed transaction.
+
+    Attributes
+    ----------
+    success : bool
+        False if the transaction would revert
+    values : dict[str, Any]
+        Return values of the previewed transaction, keyed like `smart_contract_preview_transaction`
+    revert_reason : str | None
+        The decoded revert reason, or the node's error message, when the transaction would revert
+    """
+
+    success: bool
+    values: dict[str, Any] = field(default_factory=dict)
+    revert_reason: str | None = None
 
 
 def smart_contract_read(contract: Contract, function_name_or_signature: str, *fn_args, **fn_kwargs) -> dict[str, Any]:
@@ -48,26 +108,7 @@ def smart_contract_read(contract: Contract, function_name_or_signature: str, *fn
     else:
         function = contract.get_function_by_name(function_name_or_signature)(*fn_args)
     return_values = function.call(**fn_kwargs)
-    if not isinstance(return_values, Sequence):  # could be list or tuple
-        return_values = [return_values]
-    if contract.abi:  # not all contracts have an associated ABI
-        # NOTE: this will break if a function signature is passed.  need to update this helper
-        return_names_and_types = _contract_function_abi_outputs(contract.abi, function_name_or_signature)
-        if return_names_and_types is not None:
-            if len(return_names_and_types) != len(return_values):
-                raise AssertionError(
-                    f"{len(return_names_and_types)=} must equal {len(return_values)=}."
-                    f"\n{return_names_and_types=}\n{return_values=}"
-                )
-            function_return_dict = {}
-            for var_name_and_type, var_value in zip(return_names_and_types, return_values):
-                var_name = var_name_and_type[0]
-                if var_name:
-                    function_return_dict[var_name] = var_value
-                else:
-                    function_return_dict["value"] = var_value
-            return function_return_dict
-    return {f"value{idx}": value for idx, value in enumerate(return_values)}
+    return _build_function_return_dict(contract, function_name_or_signature, return_values)
 
 
 def smart_contract_preview_transaction(
@@ -109,26 +150,67 @@ def smart_contract_preview_transaction(
     else:
         function = contract.get_function_by_name(function_name_or_signature)(*fn_args)
     return_values = function.call({"from": signer_address}, **fn_kwargs)
-    if not isinstance(return_values, Sequence):  # could be list or tuple
-        return_values = [return_values]
-    if contract.abi:  # not all contracts have an associated ABI
-        # NOTE: this will break if a function signature is passed.  need to update this helper
-        return_names_and_types = _contract_function_abi_outputs(contract.abi, function_name_or_signature)
-        if return_names_and_types is not None:
-            if len(return_names_and_types) != len(return_values):
-                raise AssertionError(
-                    f"{len(return_names_and_types)=} must equal {len(return_values)=}."
-                    f"\n{return_names_and_types=}\n{return_values=}"
-                )
-            function_return_dict = {}
-            for var_name_and_type, var_value in zip(return_names_and_types, return_values):
-                var_name = var_name_and_type[0]
-                if var_name:
-                    function_return_dict[var_name] = var_value
-                else:
-                    function_return_dict["value"] = var_value
-            return function_return_dict
-    return {f"value{idx}": value for idx, value in enumerate(return_values)}
+    return _build_function_return_dict(contract, function_name_or_signature, return_values)
+
+
+def smart_contract_preview_transactions(
+    contract: Contract,
+    previews: Sequence[PreviewTransaction],
+    max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+) -> list[PreviewResult]:
+    """Returns the values from many transactions without submitting them, using a single batched round trip.
+
+    Unlike `smart_contract_preview_transaction`, a reverting preview does not raise;
+    the revert reason is reported in the corresponding result instead.
+
+    Arguments
+    ---------
+    contract : web3.contract.contract.Contract
+        The contract that we are reading from.
+    previews : Sequence[PreviewTransaction]
+        The transactions to preview.
+    max_batch_size : int, optional
+        The maximum number of previews sent in a single JSON-RPC batch.
+
+    Returns
+    -------
+    list[PreviewResult]
+        One result per preview, in the same order as `previews`.
+    """
+    functions: list[ContractFunction] = []
+    requests: list[tuple[str, Any]] = []
+    for preview in previews:
+        function = _get_contract_function(contract, preview.function_name_or_signature, *preview.fn_args)
+        call_params = {
+            "from": preview.signer_address,
+            "to": contract.address,
+            "data": function._encode_transaction_data(),  # pylint: disable=protected-access
+        }
+        functions.append(function)
+        requests.append(("eth_call", [call_params, _format_block_identifier(preview.block_identifier)]))
+    responses = make_batch_request(contract.w3, requests, max_batch_size)
+    results: list[PreviewResult] = []
+    for preview, function, response in zip(previews, functions, responses):
+        error = response.get("error")
+        if error is not None:
+            results.append(PreviewResult(success=False, revert_reason=_decode_rpc_error(error, contract)))
+            continue
+        try:
+            return_values = contract.w3.codec.decode(
+                get_abi_output_types(function.abi), HexBytes(response["result"])  # type: ignore
+            )
+        except Exception as exc:  # pylint: disable=broad-except
+            results.append(PreviewResult(success=False, revert_reason=f"Unable to decode result: {exc}"))
+            continue
+        if len(return_values) == 1:  # match web3, which unwraps single return values
+            return_values = return_values[0]
+        results.append(
+            PreviewResult(
+                success=True,
+                values=_build_function_return_dict(contract, preview.function_name_or_signature, return_values),
+            )
+        )
+    return results
 
 
 async def async_wait_for_transaction_receipt(
@@ -382,6 +464,137 @@ def fetch_contract_transactions_for_block(web3: Web3, contract: Contract, block_
     return contract_transactions
 
 
+def fetch_contract_transactions_for_block_range(
+    web3: Web3,
+    contract: Contract,
+    start_block: BlockNumber,
+    end_block: BlockNumber,
+    max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+) -> list[tuple[TxData, TxReceipt]]:
+    """Fetch transactions sent to a contract, and their receipts, for a range of blocks.
+
+    Instead of downloading every full block, the contract's logs for the whole range are fetched with a single
+    `eth_getLogs` call, and only the transactions that emitted them (and their receipts) are fetched in batches.
+    Transactions that reverted emit no logs and are therefore not returned.
+
+    Arguments
+    ---------
+    web3: Web3
+        web3 provider object
+    contract: Contract
+        The contract to query the transactions for
+    start_block: BlockNumber
+        The first block of the range
+    end_block: BlockNumber
+        The last block of the range, inclusive
+    max_batch_size: int, optional
+        The maximum number of requests sent in a single JSON-RPC batch
+
+    Returns
+    -------
+    list[tuple[TxData, TxReceipt]]
+        The (transaction, receipt) pairs of the transactions sent to the contract, ordered by block and
+        transaction index
+    """
+    logs = web3.eth.get_logs({"address": contract.address, "fromBlock": start_block, "toBlock": end_block})
+    # Dedupe the transaction hashes, keeping the chain order of the logs
+    tx_hashes = list(
+        dict.fromkeys(
+            log["transactionHash"].hex()
+            for log in sorted(logs, key=lambda log: (log["blockNumber"], log["transactionIndex"], log["logIndex"]))
+        )
+    )
+    if len(tx_hashes) == 0:
+        return []
+    responses = make_batch_request(
+        web3,
+        [("eth_getTransactionByHash", [tx_hash]) for tx_hash in tx_hashes]
+        + [("eth_getTransactionReceipt", [tx_hash]) for tx_hash in tx_hashes],
+        max_batch_size,
+    )
+    format_transaction = PYTHONIC_RESULT_FORMATTERS[RPC.eth_getTransactionByHash]
+    format_receipt = PYTHONIC_RESULT_FORMATTERS[RPC.eth_getTransactionReceipt]
+    contract_transactions: list[tuple[TxData, TxReceipt]] = []
+    for tx_hash, transaction_response, receipt_response in zip(
+        tx_hashes, responses[: len(tx_hashes)], responses[len(tx_hashes) :]
+    ):
+        if transaction_response.get("result") is None or receipt_response.get("result") is None:
+            raise ValueError(
+                f"Failed to fetch transaction {tx_hash}: "
+                f"{transaction_response.get('error')=}, {receipt_response.get('error')=}"
+            )
+        transaction: TxData = format_transaction(transaction_response["result"])
+        # Logs can also come from calls made by other contracts, which are not hyperdrive transactions
+        if transaction.get("to") != contract.address:
+            continue
+        contract_transactions.append((transaction, format_receipt(receipt_response["result"])))
+    return contract_transactions
+
+
+def _get_contract_function(contract: Contract, function_name_or_signature: str, *fn_args) -> ContractFunction:
+    """Get the callable contract function from a function name or signature & bind the arguments"""
+    if "(" in function_name_or_signature:
+        return contract.get_function_by_signature(function_name_or_signature)(*fn_args)
+    return contract.get_function_by_name(function_name_or_signature)(*fn_args)
+
+
+def _format_block_identifier(block_identifier: BlockIdentifier | None) -> str:
+    """Format a block identifier as a raw JSON-RPC param"""
+    if block_identifier is None:
+        return "latest"
+    if isinstance(block_identifier, str):
+        return block_identifier
+    if isinstance(block_identifier, bytes):
+        return HexBytes(block_identifier).hex()
+    return hex(int(block_identifier))
+
+
+def _decode_rpc_error(error: Any, contract: Contract) -> str:
+    """Get a human readable revert reason from a JSON-RPC error response"""
+    if not isinstance(error, dict):
+        return str(error)
+    data = error.get("data")
+    if isinstance(data, dict):  # some nodes nest the revert data
+        data = data.get("data")
+    if isinstance(data, str) and len(data) >= 10:
+        selector = data[:10]
+        if selector == _ERROR_STRING_SELECTOR:
+            return contract.w3.codec.decode(["string"], HexBytes(data[10:]))[0]
+        if selector == _PANIC_SELECTOR:
+            return f"Panic({contract.w3.codec.decode(['uint256'], HexBytes(data[10:]))[0]})"
+        if contract.abi:
+            error_name = decode_error_selector_for_contract(selector, contract)
+            if error_name != "UnknownError":
+                return error_name
+    return str(error.get("message", error))
+
+
+def _build_function_return_dict(
+    contract: Contract, function_name_or_signature: str, return_values: Any
+) -> dict[str, Any]:
+    """Name the values returned from a contract function using the contract abi"""
+    if not isinstance(return_values, Sequence):  # could be list or tuple
+        return_values = [return_values]
+    if contract.abi:  # not all contracts have an associated ABI
+        # NOTE: this will break if a function signature is passed.  need to update this helper
+        return_names_and_types = _contract_function_abi_outputs(contract.abi, function_name_or_signature)
+        if return_names_and_types is not None:
+            if len(return_names_and_types) != len(return_values):
+                raise AssertionError(
+                    f"{len(return_names_and_types)=} must equal {len(return_values)=}."
+                    f"\n{return_names_and_types=}\n{return_values=}"
+                )
+            function_return_dict = {}
+            for var_name_and_type, var_value in zip(return_names_and_types, return_values):
+                var_name = var_name_and_type[0]
+                if var_name:
+                    function_return_dict[var_name] = var_value
+                else:
+                    function_return_dict["value"] = var_value
+            return function_return_dict
+    return {f"value{idx}": value for idx, value in enumerate(return_values)}
+
+
 def _get_name_and_type_from_abi(abi_outputs: ABIFunctionComponents | ABIFunctionParams) -> tuple[str, str]:
     """Retrieve and narrow the types for abi outputs"""
     return_value_name: str | None = abi_outputs.get("name")
@@ -0,0 +1,78 @@
+"""Tests for transactions.py"""
+from eth_abi import encode
+from web3 import Web3
+from web3.providers.base import BaseProvider
+
+from .transactions import PreviewTransaction, smart_contract_preview_transactions
+
+CONTRACT_ADDRESS = Web3.to_checksum_address("0x" + "11" * 20)
+SIGNER_ADDRESS = Web3.to_checksum_address("0x" + "22" * 20)
+ABI = [
+    {
+        "name": "closeLong",
+        "type": "function",
+        "stateMutability": "nonpayable",
+        "inputs": [{"name": "_bondAmount", "type": "uint256"}],
+        "outputs": [{"name": "", "type": "uint256"}],
+    },
+    {
+        "name": "removeLiquidity",
+        "type": "function",
+        "stateMutability": "nonpayable",
+        "inputs": [{"name": "_shares", "type": "uint256"}],
+        "outputs": [
+            {"name": "baseProceeds", "type": "uint256"},
+            {"name": "withdrawalShares", "type": "uint256"},
+        ],
+    },
+    {"name": "InvalidTradeSize", "type": "error", "inputs": []},
+]
+
+
+class FakeBatchProvider(BaseProvider):
+    """Provider that answers eth_call batches based on the encoded amount."""
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def make_request(self, method, params):
+        raise AssertionError("Previews should be sent as a single batch")
+
+    def make_batch_request(self, requests):
+        """Double the amount, and revert with InvalidTradeSize() on zero."""
+        self.batches.append(requests)
+        responses = []
+        for request_id, (_, params) in enumerate(requests):
+            amount = int(params[0]["data"][10:], 16)
+            if amount == 0:
+                error = {"code": 3, "message": "execution reverted", "data": "0x7ac17d25"}
+                responses.append({"jsonrpc": "2.0", "id": request_id, "error": error})
+            elif params[0]["data"].startswith(Web3.keccak(text="closeLong(uint256)").hex()[:10]):
+                result = "0x" + encode(["uint256"], [2 * amount]).hex()
+                responses.append({"jsonrpc": "2.0", "id": request_id, "result": result})
+            else:
+                result = "0x" + encode(["uint256", "uint256"], [amount, 3 * amount]).hex()
+                responses.append({"jsonrpc": "2.0", "id": request_id, "result": result})
+        return responses
+
+    def is_connected(self, show_traceback=False):
+        return True
+
+
+def test_smart_contract_preview_transactions():
+    """Previews are sent in one batch, decoded like single previews, and reverts are reported per item."""
+    provider = FakeBatchProvider()
+    contract = Web3(provider).eth.contract(address=CONTRACT_ADDRESS, abi=ABI)
+    previews = [
+        PreviewTransaction(SIGNER_ADDRESS, "closeLong", (5,), block_identifier=12),
+        PreviewTransaction(SIGNER_ADDRESS, "closeLong", (0,)),
+        PreviewTransaction(SIGNER_ADDRESS, "removeLiquidity", (7,)),
+    ]
+    results = smart_contract_preview_transactions(contract, previews)
+    assert len(provider.batches) == 1
+    assert provider.batches[0][0][1][1] == hex(12)
+    assert provider.batches[0][1][1][1] == "latest"
+    assert results[0].success and results[0].values == {"value": 10}
+    assert not results[1].success and results[1].revert_reason == "InvalidTradeSize"
+    assert results[2].success and results[2].values == {"baseProceeds": 7, "withdrawalShares": 21}
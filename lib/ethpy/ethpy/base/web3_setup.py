@@ -6,6 +6,8 @@ from web3 import Web3
 from web3.middleware import geth_poa
 from web3.types import RPCEndpoint
 
+from .rpc_cassette import CassetteMode, RPCCassetteProvider
+
 
 def initialize_web3_with_http_provider(
     ethereum_node: URI | str, request_kwargs: dict | None = None, reset_provider: bool = False
@@ -36,3 +38,44 @@ def initialize_web3_with_http_provider(
         # TODO: Check that the user is running on anvil, raise error if not
         _ = web3.provider.make_request(method=RPCEndpoint("anvil_reset"), params=[])
     return web3
+
+
+def initialize_web3_with_cassette_provider(
+    cassette_path: str,
+    mode: CassetteMode = "replay",
+    ethereum_node: URI | str | None = None,
+    request_kwargs: dict | None = None,
+    replay_latency: float = 0,
+) -> Web3:
+    """Initialize a Web3 instance that records to, or replays from, an rpc cassette.
+
+    Arguments
+    ---------
+    cassette_path: str
+        The cassette file to record to or replay from
+    mode: CassetteMode
+        "record" to forward requests to `ethereum_node` and save the responses,
+        "replay" to serve all requests from the cassette without a node
+    ethereum_node: URI | str | None
+        Address of the http provider, required when recording
+    request_kwargs: dict
+        Keyword arguments forwarded to the HTTPProvider when recording
+    replay_latency: float
+        Seconds of latency injected into every replayed request
+
+    Returns
+    -------
+    Web3
+        The web3 instance wrapping the cassette provider
+    """
+    http_provider = None
+    if mode == "record":
+        if ethereum_node is None:
+            raise ValueError("ethereum_node must be set when recording a cassette")
+        if request_kwargs is None:
+            request_kwargs = {}
+        http_provider = Web3.HTTPProvider(ethereum_node, request_kwargs)
+    provider = RPCCassetteProvider(cassette_path, mode=mode, provider=http_provider, replay_latency=replay_latency)
+    web3 = Web3(provider)
+    web3.middleware_onion.inject(geth_poa.geth_poa_middleware, layer=0)
+    return web3
@@ -1,4 +1,5 @@
 """Defines the eth chain connection configuration from env vars."""
+from __future__ import annotations
 
 import os
 from dataclasses import dataclass
@@ -17,8 +18,16 @@ class EthConfig:
         The url of the artifacts server from which we get addresses.
     RPC_URL: URI | str
         The url to the ethereum node
+    WS_URL: str | None
+        The websocket url to the ethereum node, used to subscribe to new blocks instead of polling
     ABI_DIR: str
         The path to the abi directory
+    RPC_CASSETTE_PATH: str | None
+        If set, all rpc requests go through a cassette file at this path
+    RPC_CASSETTE_MODE: str
+        Either "record" (query RPC_URL and save responses) or "replay" (serve responses from the cassette)
+    RPC_CASSETTE_LATENCY: float
+        Seconds of latency injected into every replayed request
     """
 
     # default values for local contracts
@@ -26,7 +35,11 @@ class EthConfig:
     # pylint: disable=invalid-name
     ARTIFACTS_URL: str = "http://localhost:8080"
     RPC_URL: URI = URI("http://localhost:8546")
+    WS_URL: str | None = None
     ABI_DIR: str = "./packages/hyperdrive/src/abis"
+    RPC_CASSETTE_PATH: str | None = None
+    RPC_CASSETTE_MODE: str = "replay"
+    RPC_CASSETTE_LATENCY: float = 0
 
 
 def build_eth_config() -> EthConfig:
@@ -43,13 +56,25 @@ def build_eth_config() -> EthConfig:
 
     artifacts_url = os.getenv("ARTIFACTS_URL")
     rpc_url = os.getenv("RPC_URL")
+    ws_url = os.getenv("WS_URL")
     abi_dir = os.getenv("ABI_DIR")
+    rpc_cassette_path = os.getenv("RPC_CASSETTE_PATH")
+    rpc_cassette_mode = os.getenv("RPC_CASSETTE_MODE")
+    rpc_cassette_latency = os.getenv("RPC_CASSETTE_LATENCY")
 
     arg_dict = {}
     if artifacts_url is not None:
         arg_dict["ARTIFACTS_URL"] = artifacts_url
     if rpc_url is not None:
         arg_dict["RPC_URL"] = rpc_url
+    if ws_url is not None:
+        arg_dict["WS_URL"] = ws_url
     if abi_dir is not None:
         arg_dict["ABI_DIR"] = abi_dir
+    if rpc_cassette_path is not None:
+        arg_dict["RPC_CASSETTE_PATH"] = rpc_cassette_path
+    if rpc_cassette_mode is not None:
+        arg_dict["RPC_CASSETTE_MODE"] = rpc_cassette_mode
+    if rpc_cassette_latency is not None:
+        arg_dict["RPC_CASSETTE_LATENCY"] = float(rpc_cassette_latency)
     return EthConfig(**arg_dict)
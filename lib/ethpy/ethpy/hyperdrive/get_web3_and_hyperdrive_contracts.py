@@ -4,7 +4,7 @@ from __future__ import annotations
 import os
 
 from ethpy import EthConfig
-from ethpy.base import initialize_web3_with_http_provider, load_all_abis
+from ethpy.base import initialize_web3_with_cassette_provider, initialize_web3_with_http_provider, load_all_abis
 from web3 import Web3
 from web3.contract.contract import Contract
 
@@ -37,7 +37,16 @@ def get_web3_and_hyperdrive_contracts(
         contract_addresses = fetch_hyperdrive_address_from_url(os.path.join(eth_config.ARTIFACTS_URL, "addresses.json"))
 
     # point to chain env
-    web3 = initialize_web3_with_http_provider(eth_config.RPC_URL, reset_provider=False)
+    if eth_config.RPC_CASSETTE_PATH is not None:
+        # Record or replay all rpc traffic, e.g., for offline benchmarks
+        web3 = initialize_web3_with_cassette_provider(
+            eth_config.RPC_CASSETTE_PATH,
+            mode=eth_config.RPC_CASSETTE_MODE,  # type: ignore
+            ethereum_node=eth_config.RPC_URL,
+            replay_latency=eth_config.RPC_CASSETTE_LATENCY,
+        )
+    else:
+        web3 = initialize_web3_with_http_provider(eth_config.RPC_URL, reset_provider=False)
     # setup base contract interface
     abis = load_all_abis(eth_config.ABI_DIR)
     # set up the ERC20 contract for minting base tokens
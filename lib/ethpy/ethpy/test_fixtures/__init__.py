@@ -1,2 +1,8 @@
 """Test fixtures for ethpy"""
-from .local_chain import local_chain, local_hyperdrive_chain
+from .local_chain import (
+    local_chain,
+    local_hyperdrive_chain,
+    reverting_hyperdrive_chain,
+    session_chain,
+    session_hyperdrive_chain,
+)
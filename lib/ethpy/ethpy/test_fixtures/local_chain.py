@@ -1,11 +1,12 @@
 """Test fixture for deploying local anvil chain and initializing hyperdrive"""
+import os
 import subprocess
 import time
 from typing import Iterator, NamedTuple
 
 import pytest
 from eth_account.signers.local import LocalAccount
-from ethpy.base import initialize_web3_with_http_provider
+from ethpy.base import evm_revert, evm_snapshot, initialize_web3_with_http_provider
 from ethpy.base.abi.load_abis import load_all_abis
 from ethpy.hyperdrive import HyperdriveAddresses
 from web3 import Web3
@@ -17,16 +18,32 @@ from .deploy_hyperdrive import deploy_and_initialize_hyperdrive, deploy_hyperdri
 # pylint: disable=redefined-outer-name
 
 
-@pytest.fixture(scope="function")
-def local_chain() -> Iterator[str]:
-    """Launches a local anvil chain for testing. Kills the anvil chain after.
+# Each pytest-xdist worker gets its own block of ports, so parallel workers don't share anvil processes
+_LOCAL_CHAIN_PORT = 9999
+_SESSION_CHAIN_PORT = 10999
+_PORTS_PER_WORKER = 2
+
+
+def _get_worker_port(base_port: int) -> int:
+    """Offsets the given port by the pytest-xdist worker index, e.g. worker "gw2" gets `base_port + 4`."""
+    worker_id = os.getenv("PYTEST_XDIST_WORKER", "gw0")
+    worker_index = int(worker_id.removeprefix("gw")) if worker_id.removeprefix("gw").isdigit() else 0
+    return base_port + _PORTS_PER_WORKER * worker_index
+
+
+def _launch_anvil(anvil_port: int) -> tuple[subprocess.Popen, str]:
+    """Launches a local anvil chain on the given port.
+
+    Arguments
+    ---------
+    anvil_port: int
+        The port to bind the chain to
 
     Returns
     -------
-    Iterator[str]
-        Yields the URI of the local RPC node
+    tuple[subprocess.Popen, str]
+        The anvil process and the URI of the local RPC node
     """
-    anvil_port = 9999
     host = "127.0.0.1"  # localhost
 
     # Assuming anvil command is accessible in path
@@ -43,12 +60,45 @@ def local_chain() -> Iterator[str]:
     # TODO Hack, wait for anvil chain to initialize
     time.sleep(3)
 
+    return anvil_process, local_chain_
+
+
+@pytest.fixture(scope="function")
+def local_chain() -> Iterator[str]:
+    """Launches a local anvil chain for testing. Kills the anvil chain after.
+
+    Returns
+    -------
+    Iterator[str]
+        Yields the URI of the local RPC node
+    """
+    anvil_process, local_chain_ = _launch_anvil(_get_worker_port(_LOCAL_CHAIN_PORT))
+
     yield local_chain_
 
     # Kill anvil process at end
     anvil_process.kill()
 
 
+@pytest.fixture(scope="session")
+def session_chain() -> Iterator[str]:
+    """Launches a local anvil chain that is shared by all tests in the session. Kills the anvil chain after.
+
+    Tests using this chain should go through `reverting_hyperdrive_chain` so state changes don't leak between tests.
+
+    Returns
+    -------
+    Iterator[str]
+        Yields the URI of the local RPC node
+    """
+    anvil_process, session_chain_ = _launch_anvil(_get_worker_port(_SESSION_CHAIN_PORT))
+
+    yield session_chain_
+
+    # Kill anvil process at end
+    anvil_process.kill()
+
+
 class LocalHyperdriveChain(NamedTuple):
     """Return value from the local_hyperdrive_chain fixture."""
 
@@ -142,3 +192,41 @@ def local_hyperdrive_chain(local_chain: str) -> LocalHyperdriveChain:
             web3.py contract instance for the base token contract
     """
     return create_hyperdrive_chain(local_chain)
+
+
+@pytest.fixture(scope="session")
+def session_hyperdrive_chain(session_chain: str) -> LocalHyperdriveChain:
+    """Deploys and initializes hyperdrive once per test session.
+
+    Arguments
+    ---------
+    session_chain: str
+        The `session_chain` test fixture that binds to the shared anvil chain rpc url
+
+    Returns
+    -------
+    LocalHyperdriveChain
+        The deployed hyperdrive chain, see `local_hyperdrive_chain`
+    """
+    return create_hyperdrive_chain(session_chain)
+
+
+@pytest.fixture(scope="function")
+def reverting_hyperdrive_chain(session_hyperdrive_chain: LocalHyperdriveChain) -> Iterator[LocalHyperdriveChain]:
+    """Gives a test the session hyperdrive chain, reverting any state changes the test made when it finishes.
+
+    This is a drop in replacement for `local_hyperdrive_chain` that skips the per test deployment.
+
+    Arguments
+    ---------
+    session_hyperdrive_chain: LocalHyperdriveChain
+        The `session_hyperdrive_chain` test fixture with hyperdrive deployed once per session
+
+    Returns
+    -------
+    Iterator[LocalHyperdriveChain]
+        Yields the deployed hyperdrive chain, see `local_hyperdrive_chain`
+    """
+    snapshot_id = evm_snapshot(session_hyperdrive_chain.web3)
+    yield session_hyperdrive_chain
+    evm_revert(session_hyperdrive_chain.web3, snapshot_id)
@@ -42,7 +42,7 @@ class TestBotToDb:
     # pylint: disable=too-many-locals, too-many-statements
     def test_bot_to_db(
         self,
-        local_hyperdrive_chain: LocalHyperdriveChain,
+        reverting_hyperdrive_chain: LocalHyperdriveChain,
         cycle_trade_policy: Type[BasePolicy],
         db_session: Session,
     ):
@@ -50,10 +50,10 @@ class TestBotToDb:
         All arguments are fixtures.
         """
         # Get hyperdrive chain info
-        uri: URI | None = cast(HTTPProvider, local_hyperdrive_chain.web3.provider).endpoint_uri
+        uri: URI | None = cast(HTTPProvider, reverting_hyperdrive_chain.web3.provider).endpoint_uri
         rpc_url = uri if uri else URI("http://localhost:8545")
-        deploy_account: LocalAccount = local_hyperdrive_chain.deploy_account
-        hyperdrive_contract_addresses: HyperdriveAddresses = local_hyperdrive_chain.hyperdrive_contract_addresses
+        deploy_account: LocalAccount = reverting_hyperdrive_chain.deploy_account
+        hyperdrive_contract_addresses: HyperdriveAddresses = reverting_hyperdrive_chain.hyperdrive_contract_addresses
 
         # Build environment config
         env_config = EnvironmentConfig(
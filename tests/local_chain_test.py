@@ -1,4 +1,12 @@
 """Tests bringing up local chain"""
+import pytest
+from ethpy.base import get_account_balance, set_anvil_account_balance
+from ethpy.test_fixtures.local_chain import LocalHyperdriveChain
+from web3 import Web3
+from web3.types import RPCEndpoint
+
+# An address that no deployment funds, so it starts with no eth
+UNUSED_ADDRESS = Web3.to_checksum_address("0x" + "ab" * 20)
 
 
 class TestLocalChain:
@@ -10,3 +18,20 @@ class TestLocalChain:
         """Create and entry"""
         print(local_chain)
         print(local_hyperdrive_chain)
+
+
+class TestRevertingHyperdriveChain:
+    """Tests that the reverting hyperdrive chain doesn't leak state between tests"""
+
+    # Both cases change the same state, so whichever runs second fails if the changes of the first leaked
+    @pytest.mark.parametrize("new_balance", [1, 2])
+    def test_state_is_reverted(self, reverting_hyperdrive_chain: LocalHyperdriveChain, new_balance: int):
+        """Each test starts from the state right after deploying hyperdrive."""
+        web3 = reverting_hyperdrive_chain.web3
+        deploy_block_number = web3.eth.get_block_number()
+        assert get_account_balance(web3, UNUSED_ADDRESS) == 0
+
+        set_anvil_account_balance(web3, UNUSED_ADDRESS, new_balance)
+        web3.provider.make_request(method=RPCEndpoint("evm_mine"), params=[])
+        assert get_account_balance(web3, UNUSED_ADDRESS) == new_balance
+        assert web3.eth.get_block_number() == deploy_block_number + 1